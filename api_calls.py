@@ -89,6 +89,26 @@ def poll_for_completion(task_id: str) -> int:
     return task_value
 
 
+def stream_until_completion(task_id: str) -> int:
+    """Returns task value of completed task, waiting for it using server-sent events instead of polling"""
+    # Keep a single request open, receiving an event each time the task state changes
+    with requests.get(f"{backend_url}/tasks/{task_id}/events", stream=True) as events_response:
+        events_response.raise_for_status()
+        for line in events_response.iter_lines(decode_unicode=True):
+            # Skip event types, keep-alive comments and blank lines between events
+            if not line.startswith("data:"):
+                continue
+            event = json.loads(line.removeprefix("data:"))
+            print(event)
+            if event["taskStatus"] == states.SUCCESS:
+                task_value = event["taskValue"]
+                print(f"Task completed with value {task_value}")
+                return task_value
+            if event["taskStatus"] in states.READY_STATES:
+                raise RuntimeError(f"Task {task_id} did not succeed: {event['taskStatus']}")
+    raise RuntimeError(f"Event stream for task {task_id} ended before the task completed")
+
+
 def get_building_statuses(model_id: int) -> GeoDataFrame:
     # Retrieve building statuses
     building_response = requests.get(f"{backend_url}/models/{model_id}/buildings")
@@ -133,7 +153,7 @@ def stop_task(task_id: str):
 def main():
     perform_health_check()
     flood_generation_task_id = generate_flood_model()
-    model_output_id = poll_for_completion(flood_generation_task_id)
+    model_output_id = stream_until_completion(flood_generation_task_id)
     get_building_statuses(model_output_id)
     get_depths_at_point(flood_generation_task_id)
 
@@ -0,0 +1,10 @@
+#!/bin/bash
+
+# Entrypoint for running the Celery beat scheduler, which sends periodic tasks such as refreshing New Zealand layers.
+# Only one beat scheduler may run, so it has its own service rather than being embedded in the scalable workers.
+
+# Activate python virtual environment
+source /venv/bin/activate
+
+# Keep the schedule in the persistent data volume, so that restarts do not forget when each task last ran
+celery -A src.tasks beat --loglevel=INFO --schedule /stored_data/celerybeat-schedule
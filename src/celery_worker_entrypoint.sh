@@ -1,11 +1,23 @@
 #!/bin/bash
 
-# Entrypoint for running a Celery worker
+# Entrypoint for running Celery workers
 
 # Activate python virtual environment
 source /venv/bin/activate
 
 # Run health-checker application, which reports back on the health of this container.
-# And in parallel run the celery workers
-health-checker --listener 0.0.0.0:5001 --log-level error --script-timeout 10 --script "celery -A src.tasks inspect ping"  \
-& celery -A src.tasks worker -P threads --loglevel=INFO
+health-checker --listener 0.0.0.0:5001 --log-level error --script-timeout 10 --script "celery -A src.tasks inspect ping" &
+
+# In parallel run a celery worker for each task queue, so that long-running ingestion does not hold up quick tasks.
+# The number of threads for each queue can be set with environment variables.
+celery -A src.tasks worker -P threads --loglevel=INFO -Q interactive -n interactive@%h \
+  --concurrency "${CELERY_INTERACTIVE_CONCURRENCY:-8}" &
+celery -A src.tasks worker -P threads --loglevel=INFO -Q ingest -n ingest@%h \
+  --concurrency "${CELERY_INGEST_CONCURRENCY:-4}" &
+# Periodic maintenance tasks are sent by the single celery_beat service, see celery_beat_entrypoint.sh
+celery -A src.tasks worker -P threads --loglevel=INFO -Q maintenance -n maintenance@%h \
+  --concurrency "${CELERY_MAINTENANCE_CONCURRENCY:-1}" &
+
+# Exit as soon as any worker stops, so that docker restarts the container
+wait -n
+exit $?
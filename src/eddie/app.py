@@ -20,13 +20,15 @@ import importlib
 import logging
 from http.client import OK
 
-from flask import Flask, jsonify, make_response, Response
+from flask import Flask, make_response, request, Response
 from flask_cors import CORS
 from flask_swagger_ui import get_swaggerui_blueprint
 
+from eddie import tasks
 from eddie.check_celery_alive import check_celery_alive
 from eddie.discover_plugins import discover_plugins
-from eddie.geoserver import get_terria_catalog
+from eddie.geoserver import get_cached_terria_catalog
+from eddie.task_events import stream_task_events
 
 # Initialise flask server object
 app = Flask(__name__)
@@ -85,15 +87,46 @@ def health_check() -> Response:
 def terria_catalog() -> Response:
     """
     Return a terria catalog that includes entries for static files and input layers from geoserver.
+    The catalog is served from a cache, with an ETag and Last-Modified header so that clients can revalidate it.
     Supported methods: GET
 
     Returns
     -------
     Response
-        The HTTP Response. Expect OK if health check is successful
+        The HTTP Response. Expect OK, or NOT_MODIFIED if the client's copy of the catalog is current.
+    """
+    catalog = get_cached_terria_catalog()
+    response = make_response(catalog.body, OK)
+    response.mimetype = "application/json"
+    response.set_etag(catalog.etag)
+    response.last_modified = catalog.last_modified
+    # Let clients keep the catalog, but have them check it is still current before using it
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route('/tasks/<task_id>/events', methods=['GET'])
+def task_events(task_id: str) -> Response:
+    """
+    Stream the state and progress of a task as Server-Sent Events until it finishes, so clients do not need to poll.
+    Each event is typed with the task status, such as PROGRESS or SUCCESS, so clients listen for those event types.
+    Supported methods: GET
+
+    Parameters
+    ----------
+    task_id : str
+        The id of the celery task to stream events for.
+
+    Returns
+    -------
+    Response
+        The HTTP Response. Expect OK, with an event stream that ends after the task succeeds, fails, or is stopped.
     """
-    catalog = get_terria_catalog()
-    return make_response(jsonify(catalog), OK)
+    response = Response(stream_task_events(tasks.app.AsyncResult(task_id)), OK, mimetype="text/event-stream")
+    response.cache_control.no_cache = True
+    # Stop reverse proxies from buffering events until the stream ends
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 
 # Development server
@@ -22,14 +22,17 @@ import logging
 from typing import Callable, Dict, Tuple
 
 from flask import Response, make_response
-from kombu.exceptions import OperationalError
 
-from eddie import tasks
+from eddie.worker_heartbeat import get_live_worker_count
+
+# Response header reporting the number of live Celery workers
+WORKER_COUNT_HEADER = "X-Celery-Workers"
 
 
 def check_celery_alive(f: Callable[..., Response]) -> Callable[..., Response]:
     """
-    Check if the Celery workers are running and return INTERNAL_SERVER_ERROR if they are down using function decorator.
+    Check if the Celery workers are running and return SERVICE_UNAVAILABLE if they are down using function decorator.
+    Liveness is read from worker heartbeats, and the number of live workers is reported in the X-Celery-Workers header.
 
     Parameters
     ----------
@@ -60,14 +63,13 @@ def check_celery_alive(f: Callable[..., Response]) -> Callable[..., Response]:
         Response
             SERVICE_UNAVAILABLE if Celery workers are down, otherwise response from function `f`.
         """
-        try:
-            ping_celery_response = tasks.app.control.ping()
-            if len(ping_celery_response) == 0:
-                logging.warning("Celery workers not active, may indicate a fault")
-                return make_response("Celery workers not active", SERVICE_UNAVAILABLE)
-        except OperationalError:
+        worker_count = get_live_worker_count()
+        if worker_count == 0:
             logging.warning("Celery workers not active, may indicate a fault")
-            return make_response("Celery workers not active", SERVICE_UNAVAILABLE)
-        return f(*args, **kwargs)
+            response = make_response("Celery workers not active", SERVICE_UNAVAILABLE)
+        else:
+            response = make_response(f(*args, **kwargs))
+        response.headers[WORKER_COUNT_HEADER] = str(worker_count)
+        return response
 
     return decorated_function
@@ -203,7 +203,33 @@ class EnvVariable:  # pylint: disable=too-few-public-methods
     POSTGRES_USER = _get_env_variable("POSTGRES_USER", default="postgres")
     POSTGRES_PASSWORD = _get_env_variable("POSTGRES_PASSWORD")
 
+    STATIC_FILE_LOAD_WORKERS = int(_get_env_variable("STATIC_FILE_LOAD_WORKERS", default="4"))
+    PROCESS_POOL_ENABLED = _get_bool_env_variable("PROCESS_POOL_ENABLED", default=False)
+    PROCESS_POOL_WORKERS = int(_get_env_variable("PROCESS_POOL_WORKERS", default="2"))
+    PROCESS_POOL_MIN_COORDINATES = int(_get_env_variable("PROCESS_POOL_MIN_COORDINATES", default="100000"))
+    NZ_BOUNDARY_CACHE_TTL = float(_get_env_variable("NZ_BOUNDARY_CACHE_TTL", default="300"))
+    NZ_BOUNDARY_SIMPLIFY_TOLERANCE = float(_get_env_variable("NZ_BOUNDARY_SIMPLIFY_TOLERANCE", default="100"))
+    AOI_MODE = _get_env_variable("AOI_MODE", default="polygon")
+    ARCGIS_AOI_SIMPLIFY_TOLERANCE = float(_get_env_variable("ARCGIS_AOI_SIMPLIFY_TOLERANCE", default="10"))
+    WFS_ID_BATCH_SIZE = int(_get_env_variable("WFS_ID_BATCH_SIZE", default="200"))
+    PROVIDER_CACHE_ENABLED = _get_bool_env_variable("PROVIDER_CACHE_ENABLED", default=True)
+    PROVIDER_CACHE_DIR = pathlib.Path(_get_env_variable(
+        "PROVIDER_CACHE_DIR", default=f"{_get_env_variable('DATA_DIR', default='stored_data')}/provider_cache"
+    ))
+    PROVIDER_CACHE_MAX_SIZE_MB = int(_get_env_variable("PROVIDER_CACHE_MAX_SIZE_MB", default="10240"))
+    PROVIDER_CACHE_TTL = float(_get_env_variable("PROVIDER_CACHE_TTL", default="604800"))
+    NZ_LAYER_REFRESH_INTERVAL = float(_get_env_variable("NZ_LAYER_REFRESH_INTERVAL", default="604800"))
+    NZ_LAYER_SWAP_LOCK_TIMEOUT = float(_get_env_variable("NZ_LAYER_SWAP_LOCK_TIMEOUT", default="2"))
+    PROVIDER_RATE_LIMITS = _get_env_variable(
+        "PROVIDER_RATE_LIMITS", default="LINZ=10/4,StatsNZ=10/4,MFE=10/4,ArcGIS=20/8", allow_empty=True
+    )
+    PROVIDER_RATE_LIMIT_TIMEOUT = float(_get_env_variable("PROVIDER_RATE_LIMIT_TIMEOUT", default="600"))
+    PROVIDER_RATE_LIMIT_LEASE_TTL = float(_get_env_variable("PROVIDER_RATE_LIMIT_LEASE_TTL", default="300"))
+    PROVIDER_RATE_LIMIT_BACK_OFF = float(_get_env_variable("PROVIDER_RATE_LIMIT_BACK_OFF", default="5"))
+    PROVIDER_RATE_LIMIT_RETRIES = int(_get_env_variable("PROVIDER_RATE_LIMIT_RETRIES", default="3"))
+
     MESSAGE_BROKER_HOST = _get_env_variable("MESSAGE_BROKER_HOST", default="localhost")
+    CELERY_HEARTBEAT_INTERVAL = float(_get_env_variable("CELERY_HEARTBEAT_INTERVAL", default="5"))
 
     GEOSERVER_HOST = _get_env_variable("GEOSERVER_HOST", default="http://localhost")
     GEOSERVER_PORT = _get_env_variable("GEOSERVER_PORT", default="8088")
@@ -211,5 +237,25 @@ class EnvVariable:  # pylint: disable=too-few-public-methods
     GEOSERVER_INTERNAL_PORT = _get_env_variable("GEOSERVER_INTERNAL_PORT", default=GEOSERVER_PORT)
     GEOSERVER_ADMIN_NAME = _get_env_variable("GEOSERVER_ADMIN_NAME", default="admin")
     GEOSERVER_ADMIN_PASSWORD = _get_env_variable("GEOSERVER_ADMIN_PASSWORD", default="geoserver")
+    GEOSERVER_LAYER_CACHE_TTL = float(_get_env_variable("GEOSERVER_LAYER_CACHE_TTL", default="60"))
+    GEOSERVER_RASTER_PUBLISH_MODE = _get_env_variable("GEOSERVER_RASTER_PUBLISH_MODE", default="link")
+    GEOSERVER_RECONCILE_WORKERS = int(_get_env_variable("GEOSERVER_RECONCILE_WORKERS", default="8"))
+    GEOSERVER_COG_WORKSPACES = _get_env_variable("GEOSERVER_COG_WORKSPACES", default="", allow_empty=True)
+    GEOSERVER_COG_COMPRESSION = _get_env_variable("GEOSERVER_COG_COMPRESSION", default="DEFLATE")
+    GEOSERVER_COG_CACHE_MAX_SIZE_MB = int(_get_env_variable("GEOSERVER_COG_CACHE_MAX_SIZE_MB", default="20480"))
+    GEOSERVER_MOSAIC_WORKSPACES = _get_env_variable("GEOSERVER_MOSAIC_WORKSPACES", default="", allow_empty=True)
+    GEOSERVER_CONTAINER_DATA_DIR = _get_env_variable("GEOSERVER_CONTAINER_DATA_DIR", default="/opt/geoserver_data")
+    GEOSERVER_SEED_ENABLED = _get_bool_env_variable("GEOSERVER_SEED_ENABLED", default=False)
+    GEOSERVER_SEED_GRIDSETS = _get_env_variable("GEOSERVER_SEED_GRIDSETS", default="EPSG:900913")
+    GEOSERVER_SEED_FORMAT = _get_env_variable("GEOSERVER_SEED_FORMAT", default="image/png")
+    GEOSERVER_SEED_ZOOM_START = int(_get_env_variable("GEOSERVER_SEED_ZOOM_START", default="10"))
+    GEOSERVER_SEED_ZOOM_STOP = int(_get_env_variable("GEOSERVER_SEED_ZOOM_STOP", default="15"))
+    GEOSERVER_SEED_THREADS = int(_get_env_variable("GEOSERVER_SEED_THREADS", default="2"))
+    GEOSERVER_SEED_TIMEOUT = float(_get_env_variable("GEOSERVER_SEED_TIMEOUT", default="1800"))
+
+    TERRIA_VECTOR_LAYER_FORMAT = _get_env_variable("TERRIA_VECTOR_LAYER_FORMAT", default="wfs")
+    TERRIA_CATALOG_CACHE_TTL = float(_get_env_variable("TERRIA_CATALOG_CACHE_TTL", default="300"))
+    TERRIA_CATALOG_PARTIAL_CACHE_TTL = float(_get_env_variable("TERRIA_CATALOG_PARTIAL_CACHE_TTL", default="15"))
+    TERRIA_CATALOG_REQUEST_TIMEOUT = float(_get_env_variable("TERRIA_CATALOG_REQUEST_TIMEOUT", default="10"))
 
     IS_ON_GITHUB_ACTIONS = _get_bool_env_variable("GITHUB_ACTIONS", default=False)
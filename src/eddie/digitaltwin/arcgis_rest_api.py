@@ -21,16 +21,27 @@ retrieve geographic data for a specified area of interest.
 """
 
 import asyncio
+from http import HTTPStatus
+import json
 import logging
-from typing import List, Dict, Union, NamedTuple
+from typing import List, Dict, Optional, Union, NamedTuple
 
 import aiohttp
 import geopandas as gpd
 import pandas as pd
 import requests
+import shapely
+
+from eddie import process_pool, rate_limiter
+from eddie.config import EnvVariable
+from eddie.digitaltwin import progress, provider_cache
+from eddie.digitaltwin.utils import filter_to_area_of_interest
 
 log = logging.getLogger(__name__)
 
+# Name of ArcGIS REST API services in the provider cache and rate limits
+PROVIDER_NAME = "ArcGIS"
+
 
 class RecordCounts(NamedTuple):
     """
@@ -48,7 +59,30 @@ class RecordCounts(NamedTuple):
     total_record_count: int
 
 
-def get_feature_layer_record_counts(url: str) -> RecordCounts:
+def get_feature_layer_version(url: str) -> Optional[str]:
+    """
+    Retrieve the time the data of the feature layer was last edited, used to tell when cached data is out of date.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the feature layer.
+
+    Returns
+    -------
+    Optional[str]
+        The last edit date of the feature layer data, or None if the feature layer does not track edits.
+    """
+    with rate_limiter.provider_slot(PROVIDER_NAME):
+        response = requests.get(url=url, params={"f": "json"})
+    editing_info = response.json().get("editingInfo", {})
+    last_edit_date = editing_info.get("dataLastEditDate", editing_info.get("lastEditDate"))
+    return str(last_edit_date) if last_edit_date is not None else None
+
+
+def get_feature_layer_record_counts(
+        url: str,
+        geometry_params: Optional[Dict[str, Union[str, int]]] = None) -> RecordCounts:
     """
     Retrieve the maximum and total record counts from the feature layer.
 
@@ -56,6 +90,8 @@ def get_feature_layer_record_counts(url: str) -> RecordCounts:
     ----------
     url : str
         The URL of the feature layer.
+    geometry_params : Optional[Dict[str, Union[str, int]]] = None
+        Spatial filter query parameters. If provided, only records matching the filter are counted.
 
     Returns
     -------
@@ -69,13 +105,17 @@ def get_feature_layer_record_counts(url: str) -> RecordCounts:
     """
     # Set up parameters for the initial request to get the maximum record count
     params = {"f": "json"}
-    response = requests.get(url=url, params=params)
+    with rate_limiter.provider_slot(PROVIDER_NAME):
+        response = requests.get(url=url, params=params)
     # Extract the maximum record count from the response
     max_record_count = response.json()["maxRecordCount"]
-    # Set up parameters for the second request to get the total record count
+    # Set up parameters for the second request to get the total record count within the spatial filter
     params["where"] = "1=1"
-    params["returnCountOnly"] = True
-    response = requests.get(url=f"{url}/query", params=params)
+    params["returnCountOnly"] = "true"
+    params.update(geometry_params or {})
+    # POST since the spatial filter polygon may be too long for a URL
+    with rate_limiter.provider_slot(PROVIDER_NAME):
+        response = requests.post(url=f"{url}/query", data=params)
     try:
         # Extract the total record count from the response
         total_record_count = response.json()["count"]
@@ -86,6 +126,37 @@ def get_feature_layer_record_counts(url: str) -> RecordCounts:
     return RecordCounts(max_record_count, total_record_count)
 
 
+def to_esri_polygon_json(area_of_interest: gpd.GeoDataFrame) -> str:
+    """
+    Convert the area of interest into an Esri JSON polygon, simplified so that the query stays small.
+    Every part of a multipart area is included as its own ring, so a single query covers the whole area.
+
+    Parameters
+    ----------
+    area_of_interest : gpd.GeoDataFrame
+        A GeoDataFrame representing the area of interest.
+
+    Returns
+    -------
+    str
+        The Esri JSON polygon, in the CRS of the area of interest.
+    """
+    tolerance = EnvVariable.ARCGIS_AOI_SIMPLIFY_TOLERANCE
+    # Buffer before simplifying, so that the simplified polygon still covers all the area of interest
+    aoi_geometry = area_of_interest.union_all().buffer(tolerance).simplify(tolerance)
+    rings = []
+    for polygon in getattr(aoi_geometry, "geoms", [aoi_geometry]):
+        # Esri polygons have clockwise outer rings and anticlockwise holes
+        polygon = shapely.geometry.polygon.orient(polygon, sign=-1.0)
+        rings.append(polygon.exterior.coords[:])
+        rings.extend(interior.coords[:] for interior in polygon.interiors)
+    esri_polygon = {
+        "rings": [[list(coordinate) for coordinate in ring] for ring in rings],
+        "spatialReference": {"wkid": area_of_interest.crs.to_epsg()},
+    }
+    return json.dumps(esri_polygon, separators=(",", ":"))
+
+
 def gen_query_param_list(
         url: str,
         area_of_interest: gpd.GeoDataFrame = None,
@@ -119,8 +190,6 @@ def gen_query_param_list(
     # Raise an error if output_sr is provided when area_of_interest is already given
     if area_of_interest is not None and output_sr is not None:
         raise ValueError("`output_sr` should not be provided when `area_of_interest` is given.")
-    # Retrieves the maximum and total record counts from the feature layer
-    max_record_count, total_record_count = get_feature_layer_record_counts(url)
     # Base query parameters used in each API call
     query_params_base = {
         "where": "1=1",
@@ -128,23 +197,25 @@ def gen_query_param_list(
         "outSR": output_sr,
         "f": "geojson",
     }
+    geometry_params = {}
 
     # Check if a specific area of interest (AOI) is provided
     if area_of_interest is not None:
-        # Extract the bounding box coordinates from the area of interest
-        x_min, y_min, x_max, y_max = area_of_interest.total_bounds
-        # Create a string representation of the bounding box coordinates for use in the API query
-        aoi_geom = f"{x_min},{y_min},{x_max},{y_max}"
         # Get the EPSG code of the Coordinate Reference System (CRS) of the area of interest
         aoi_crs = area_of_interest.crs.to_epsg()
-        # Update the base query parameters with AOI-specific details
-        query_params_base.update({
-            "geometry": aoi_geom,
-            "geometryType": "esriGeometryEnvelope",
+        # Filter to features intersecting the area of interest, so that those crossing its edge are included
+        geometry_params = {
+            "geometry": to_esri_polygon_json(area_of_interest),
+            "geometryType": "esriGeometryPolygon",
             "inSR": aoi_crs,
-            "spatialRel": "esriSpatialRelContains",
-            "outSR": aoi_crs
-        })
+            "spatialRel": "esriSpatialRelIntersects",
+        }
+        # Update the base query parameters with AOI-specific details
+        query_params_base.update(geometry_params)
+        query_params_base["outSR"] = aoi_crs
+
+    # Retrieves the maximum record count, and the number of records within the area of interest
+    max_record_count, total_record_count = get_feature_layer_record_counts(url, geometry_params)
 
     # Initialize an empty list to hold all query parameters
     query_params_list = []
@@ -165,7 +236,8 @@ async def _fetch_geo_data(
         url: str,
         query_param: Dict[str, Union[str, int]]) -> gpd.GeoDataFrame:
     """
-    Fetch geographic data using the provided query parameters within a single API call.
+    Fetch geographic data using the provided query parameters within a single API call, within the rate limit.
+    Calls rejected for exceeding the rate limit are retried after pausing every worker's requests to ArcGIS.
 
     Parameters
     ----------
@@ -183,13 +255,21 @@ async def _fetch_geo_data(
     """
     # Construct the query URL for the REC feature layer
     query_url = f"{url}/query"
-    # Send a GET request to the provided query URL with the query parameters
-    async with session.get(query_url, params=query_param) as resp:
-        # Parse the API response as JSON
-        resp_json = await resp.json(content_type=None)
-        # Convert the JSON response into a GeoDataFrame
-        resp_gdf = gpd.GeoDataFrame.from_features(resp_json)
-        return resp_gdf
+    # Send a POST request to the provided query URL, since the area of interest polygon may be too long for a URL
+    retries = EnvVariable.PROVIDER_RATE_LIMIT_RETRIES
+    for attempt in range(retries + 1):
+        async with rate_limiter.provider_slot_async(PROVIDER_NAME):
+            async with session.post(query_url, data=query_param) as resp:
+                # Read the GeoJSON API response
+                resp_geojson = await resp.read()
+        if resp.status != HTTPStatus.TOO_MANY_REQUESTS or attempt == retries:
+            break
+        retry_after = rate_limiter.parse_retry_after(resp.headers.get("Retry-After"))
+        await asyncio.sleep(rate_limiter.back_off(PROVIDER_NAME, retry_after))
+    # Convert the GeoJSON into a GeoDataFrame, in another process if enabled so that other threads are not stalled
+    resp_gdf = await process_pool.parse_geojson_async(resp_geojson)
+    progress.record_rows_fetched(len(resp_gdf))
+    return resp_gdf
 
 
 async def fetch_geo_data_for_aoi(
@@ -217,14 +297,18 @@ async def fetch_geo_data_for_aoi(
     async with aiohttp.ClientSession() as session:
         # Generate a list of API query parameters used to retrieve data
         query_param_list = gen_query_param_list(url, area_of_interest, output_sr)
+        if not query_param_list:
+            # There are no records to fetch, e.g. the area of interest does not contain any features
+            empty_crs = area_of_interest.crs if area_of_interest is not None else output_sr or 2193
+            return gpd.GeoDataFrame(geometry=[], crs=empty_crs)
         # Create a list of tasks to fetch data for each query parameter
         tasks = [_fetch_geo_data(session, url, query_param) for query_param in query_param_list]
         # Wait for all tasks to complete and retrieve the results
         query_results = await asyncio.gather(*tasks, return_exceptions=True)
         # Concatenate the results into a single GeoDataFrame and reset the index
         geo_data = gpd.GeoDataFrame(pd.concat(query_results, ignore_index=True)).reset_index(drop=True)
-        # Move the 'geometry' column to the last column
-        geo_data['geometry'] = geo_data.pop('geometry')
+        # Move the 'geometry' column to the last column, by selection since popping it would downcast to a DataFrame
+        geo_data = geo_data[[column for column in geo_data.columns if column != "geometry"] + ["geometry"]]
         # Convert all column names to lowercase
         geo_data.columns = geo_data.columns.str.lower()
         # Get the unique EPSG code from the query parameters
@@ -265,7 +349,16 @@ def fetch_arcgis_rest_api_data(
         # Log the start of the data fetching process
         log.info(f"Fetching geographic data from {url} using the ArcGIS REST API.")
         # Fetch geographic data for the area of interest using the ArcGIS REST API
-        geo_data = asyncio.run(fetch_geo_data_for_aoi(url, area_of_interest, output_sr))
+        progress.set_layer_stage("fetching")
+        crs = area_of_interest.crs.to_epsg() if area_of_interest is not None else output_sr or 2193
+        # The layer version is only needed to look up the provider cache, so it is not requested without the cache
+        layer_version = get_feature_layer_version(url) if EnvVariable.PROVIDER_CACHE_ENABLED else None
+        cache_key = provider_cache.ProviderCacheKey.create(PROVIDER_NAME, url, crs, area_of_interest, layer_version)
+        geo_data = provider_cache.fetch_with_cache(
+            cache_key, lambda: asyncio.run(fetch_geo_data_for_aoi(url, area_of_interest, output_sr)))
+        if area_of_interest is not None:
+            # The query polygon is simplified, so drop features outside the exact area of interest
+            geo_data = filter_to_area_of_interest(geo_data, area_of_interest)
         # Log the successful data retrieval
         log.info(f"Successfully fetched geographic data from {url} using the ArcGIS REST API.")
         return geo_data
@@ -20,22 +20,37 @@ This script fetches geospatial data from various providers using the 'geoapis' l
 It also saves user log information in the database.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import logging
 import pathlib
-from typing import Set, Tuple
+from typing import Any, List, Optional, Set, Tuple
 
 import geopandas as gpd
 import pandas as pd
+import requests
 from sqlalchemy import insert
-from sqlalchemy.engine import Connection
+from sqlalchemy.engine import Connection, Engine
 from sqlalchemy.sql import text
 
-from eddie.digitaltwin.get_data_using_geoapis import fetch_vector_data_using_geoapis
+from eddie import process_pool
+from eddie.config import EnvVariable
+from eddie.digitaltwin import layer_statistics, progress, static_file_manifest
+from eddie.digitaltwin.get_data_using_geoapis import (
+    fetch_vector_data_by_ids_using_geoapis,
+    fetch_vector_data_ids_using_geoapis,
+    fetch_vector_data_using_geoapis
+)
 from eddie.digitaltwin.tables import GeospatialLayers, UserLogInfo, check_table_exists, create_table
 import eddie.geoserver as gs
 
 log = logging.getLogger(__name__)
 
+# File extensions of static files that can be served
+STATIC_FILE_SUFFIXES = {".geojson", ".shp", ".geodb", ".tif", ".tiff", ".geotiff", ".sld"}
+# Directory of the static files that are served
+STATIC_FILE_DIRECTORY = pathlib.Path("./src/static/geo")
+
 
 class NoNonIntersectionError(Exception):
     """Exception raised when no non-intersecting area is found."""
@@ -165,44 +180,82 @@ def get_vector_data_id_not_in_db(
     return ids_not_in_db
 
 
-def nz_geospatial_layers_data_to_db(
+def get_ids_not_in_db(conn: Connection, ids: List[Any], table_name: str, unique_column_name: str) -> List[Any]:
+    """
+    Get the IDs that are not present in the specified database table, comparing them within the database.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    ids : List[Any]
+        The IDs to look for.
+    table_name : str
+        The name of the table in the database.
+    unique_column_name : str
+        The name of the unique column in the table.
+
+    Returns
+    -------
+    List[Any]
+        The IDs that are not present in the table.
+    """
+    # IDs are compared as text, since the type of the unique column varies between layers
+    ids_by_text = {str(feature_id): feature_id for feature_id in ids}
+    query = text(f"""
+    SELECT probe.id
+    FROM unnest(CAST(:ids AS text[])) AS probe(id)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM "{table_name}" AS stored WHERE CAST(stored."{unique_column_name}" AS text) = probe.id
+    );
+    """).bindparams(ids=list(ids_by_text))
+    return [ids_by_text[row.id] for row in conn.execute(query)]
+
+
+def nz_geospatial_layer_data_to_db(
     conn: Connection,
+    data_provider: str,
+    layer_id: int,
+    table_name: str,
     crs: int = 2193,
     verbose: bool = False
 ) -> None:
     """
-    Fetch New Zealand geospatial layers data using 'geoapis' and store it into the database.
+    Fetch a single New Zealand geospatial layer using 'geoapis' and store it into the database, if it is not already.
 
     Parameters
     ----------
     conn : Connection
         The connection used to connect to the database.
+    data_provider : str
+        The data provider of the geospatial layer.
+    layer_id : int
+        The ID of the geospatial layer.
+    table_name : str
+        The database table name of the geospatial layer.
     crs : int = 2193
         The coordinate reference system (CRS) code to use. Default is 2193.
     verbose : bool = False
         Whether to print messages. Default is False.
     """
-    # Get New Zealand geospatial layers
-    nz_geo_layers = get_nz_geospatial_layers(conn)
-
-    workspace_name = gs.Workspaces.INPUT_LAYERS_WORKSPACE
-    data_store = gs.create_main_db_store(workspace_name)
-    # Iterate over each NZ geospatial layer
-    for _, layer_row in nz_geo_layers.iterrows():
-        # Extract geospatial layer information
-        data_provider, layer_id, table_name, _ = get_geospatial_layer_info(layer_row)
-
+    with progress.track_layer(table_name, data_provider):
         # Check if the table already exists in the database
         if check_table_exists(conn, table_name):
             log.info(f"'{table_name}' data already exists in the database.")
-        else:
-            # Fetch vector data using geoapis
-            log.info(f"Fetching '{table_name}' data ({data_provider} {layer_id}).")
-            vector_data = fetch_vector_data_using_geoapis(data_provider, layer_id, crs, verbose)
-            # Insert vector data into the database
-            log.info(f"Adding '{table_name}' data ({data_provider} {layer_id}) to the database.")
-            vector_data.to_postgis(table_name, conn, index=False, if_exists="replace")
-            gs.create_datastore_layer(conn, workspace_name, data_store, table_name)
+            return
+        # Fetch vector data using geoapis
+        log.info(f"Fetching '{table_name}' data ({data_provider} {layer_id}).")
+        vector_data = fetch_vector_data_using_geoapis(data_provider, layer_id, crs, verbose)
+        # Insert vector data into the database
+        log.info(f"Adding '{table_name}' data ({data_provider} {layer_id}) to the database.")
+        progress.set_layer_stage("writing")
+        vector_data.to_postgis(table_name, conn, index=False, if_exists="replace")
+        progress.record_rows_written(vector_data)
+        workspace_name = gs.Workspaces.INPUT_LAYERS_WORKSPACE
+        layer_statistics.update_vector_layer_statistics(conn, workspace_name, table_name)
+        progress.set_layer_stage("publishing")
+        data_store = gs.create_main_db_store(workspace_name)
+        gs.create_datastore_layer(conn, workspace_name, data_store, table_name)
 
 
 def get_non_intersection_area_from_db(
@@ -254,7 +307,7 @@ def get_non_intersection_area_from_db(
     if user_log_intersections.empty:
         return catchment_area
     # Compute the non-intersecting area by overlaying the catchment area with the intersections
-    non_intersection_area = catchment_area.overlay(user_log_intersections, how='difference')
+    non_intersection_area = process_pool.overlay(catchment_area, user_log_intersections, how='difference')
     # Check if the non-intersecting area is empty
     if non_intersection_area.empty:
         raise NoNonIntersectionError(
@@ -300,9 +353,13 @@ def process_new_non_nz_geospatial_layers(
     else:
         # Insert vector data into the database
         log.info(f"Adding '{table_name}' data ({data_provider} {layer_id}) for the catchment area to the database.")
+        progress.set_layer_stage("writing")
         vector_data.to_postgis(table_name, conn, index=False, if_exists="replace")
-        # Serve data with geoserver
+        progress.record_rows_written(vector_data)
         workspace_name = gs.Workspaces.INPUT_LAYERS_WORKSPACE
+        layer_statistics.update_vector_layer_statistics(conn, workspace_name, table_name)
+        # Serve data with geoserver
+        progress.set_layer_stage("publishing")
         data_store = gs.create_main_db_store(workspace_name)
         gs.create_datastore_layer(conn, workspace_name, data_store, table_name)
 
@@ -318,7 +375,118 @@ def process_existing_non_nz_geospatial_layers(
     verbose: bool = False
 ) -> None:
     """
-    Fetch existing non-NZ geospatial layers data using 'geoapis' and store it into the database.
+    Fetch existing non-NZ geospatial layers data using 'geoapis' and store the features not already in the database.
+    Where the data provider supports it, only IDs are fetched first, so that stored features are not fetched again.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    data_provider : str
+        The data provider of the geospatial layer.
+    layer_id : int
+        The ID of the geospatial layer.
+    table_name : str
+        The database table name of the geospatial layer.
+    unique_column_name : str
+        The unique column name used for record identification in the database table.
+    area_of_interest : gpd.GeoDataFrame
+        A GeoDataFrame representing the area of interest.
+    crs : int = 2193
+        The coordinate reference system (CRS) code to use. Default is 2193.
+    verbose : bool = False
+        Whether to print messages. Default is False.
+    """
+    try:
+        vector_data_not_in_db = _fetch_vector_data_not_in_db_by_ids(
+            conn, data_provider, layer_id, table_name, unique_column_name, area_of_interest, crs)
+    except (requests.RequestException, ValueError) as error:
+        # Fall back to fetching every feature if the data provider does not support fetching IDs only.
+        # Some providers report errors with an OWS ExceptionReport and status 200, which fails to parse as JSON.
+        log.warning(f"Could not fetch '{table_name}' data ({data_provider} {layer_id}) by ID: {error}")
+        vector_data_not_in_db = _fetch_vector_data_not_in_db(
+            conn, data_provider, layer_id, table_name, unique_column_name, area_of_interest, crs, verbose)
+    if vector_data_not_in_db is None:
+        return
+    # Insert vector data into the database
+    log.info(f"Adding new '{table_name}' data ({data_provider} {layer_id}) for the catchment area to the database.")
+    progress.set_layer_stage("writing")
+    vector_data_not_in_db.to_postgis(table_name, conn, index=False, if_exists="append")
+    progress.record_rows_written(vector_data_not_in_db)
+    layer_statistics.update_vector_layer_statistics(conn, gs.Workspaces.INPUT_LAYERS_WORKSPACE, table_name)
+
+
+def _fetch_vector_data_not_in_db_by_ids(
+    conn: Connection,
+    data_provider: str,
+    layer_id: int,
+    table_name: str,
+    unique_column_name: str,
+    area_of_interest: gpd.GeoDataFrame,
+    crs: int = 2193
+) -> Optional[gpd.GeoDataFrame]:
+    """
+    Fetch the IDs of the features in the area of interest, then fetch full features only for the IDs that are not
+    already in the database, so that features that are already stored are not transferred again.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    data_provider : str
+        The data provider of the geospatial layer.
+    layer_id : int
+        The ID of the geospatial layer.
+    table_name : str
+        The database table name of the geospatial layer.
+    unique_column_name : str
+        The unique column name used for record identification in the database table.
+    area_of_interest : gpd.GeoDataFrame
+        A GeoDataFrame representing the area of interest.
+    crs : int = 2193
+        The coordinate reference system (CRS) code to use. Default is 2193.
+
+    Returns
+    -------
+    Optional[gpd.GeoDataFrame]
+        The features in the area of interest that are not in the database, or None if there are none.
+
+    Raises
+    ------
+    HTTPError
+        If the data provider does not support fetching features by ID.
+    """
+    log.info(f"Fetching '{table_name}' IDs ({data_provider} {layer_id}) for the catchment area.")
+    progress.set_layer_stage("probing")
+    ids = fetch_vector_data_ids_using_geoapis(data_provider, layer_id, unique_column_name, area_of_interest, crs)
+    if not ids:
+        log.info(f"The requested catchment area does not contain any '{table_name}' data ({data_provider} {layer_id}).")
+        return None
+    ids_not_in_db = get_ids_not_in_db(conn, ids, table_name, unique_column_name)
+    if not ids_not_in_db:
+        log.info(f"'{table_name}' data for the requested catchment area is already in the database.")
+        return None
+    log.info(f"Fetching {len(ids_not_in_db)} of {len(ids)} '{table_name}' features ({data_provider} {layer_id}).")
+    vector_data = fetch_vector_data_by_ids_using_geoapis(
+        data_provider, layer_id, unique_column_name, ids_not_in_db, area_of_interest, crs)
+    if vector_data.empty:
+        log.info(f"The requested catchment area does not contain any new '{table_name}' data.")
+        return None
+    return vector_data
+
+
+def _fetch_vector_data_not_in_db(
+    conn: Connection,
+    data_provider: str,
+    layer_id: int,
+    table_name: str,
+    unique_column_name: str,
+    area_of_interest: gpd.GeoDataFrame,
+    crs: int = 2193,
+    verbose: bool = False
+) -> Optional[gpd.GeoDataFrame]:
+    """
+    Fetch every feature in the area of interest, then keep only those that are not already in the database.
 
     Parameters
     ----------
@@ -338,6 +506,11 @@ def process_existing_non_nz_geospatial_layers(
         The coordinate reference system (CRS) code to use. Default is 2193.
     verbose : bool = False
         Whether to print messages. Default is False.
+
+    Returns
+    -------
+    Optional[gpd.GeoDataFrame]
+        The features in the area of interest that are not in the database, or None if there are none.
     """
     # Fetch vector data using geoapis
     log.info(f"Fetching '{table_name}' data ({data_provider} {layer_id}) for the catchment area.")
@@ -345,30 +518,30 @@ def process_existing_non_nz_geospatial_layers(
     # Check if the fetched vector data is empty
     if vector_data.empty:
         log.info(f"The requested catchment area does not contain any '{table_name}' data ({data_provider} {layer_id}).")
-    else:
-        # Get IDs from the vector data that are not in the database
-        ids_not_in_db = get_vector_data_id_not_in_db(
-            conn, vector_data, table_name, unique_column_name, area_of_interest)
-        # Check if there are IDs not in the database
-        if ids_not_in_db:
-            # Get vector data that contains only the IDs not present in the database
-            vector_data_not_in_db = vector_data[vector_data[unique_column_name].isin(ids_not_in_db)]
-            # Insert vector data into the database
-            log.info(
-                f"Adding new '{table_name}' data ({data_provider} {layer_id}) for the catchment area to the database.")
-            vector_data_not_in_db.to_postgis(table_name, conn, index=False, if_exists="append")
-        else:
-            log.info(f"'{table_name}' data for the requested catchment area is already in the database.")
-
-
-def non_nz_geospatial_layers_data_to_db(
+        return None
+    # Get IDs from the vector data that are not in the database
+    ids_not_in_db = get_vector_data_id_not_in_db(conn, vector_data, table_name, unique_column_name, area_of_interest)
+    # Check if there are IDs not in the database
+    if not ids_not_in_db:
+        log.info(f"'{table_name}' data for the requested catchment area is already in the database.")
+        return None
+    # Get vector data that contains only the IDs not present in the database
+    return vector_data[vector_data[unique_column_name].isin(ids_not_in_db)]
+
+
+def non_nz_geospatial_layer_data_to_db(
     conn: Connection,
     catchment_area: gpd.GeoDataFrame,
+    data_provider: str,
+    layer_id: int,
+    table_name: str,
+    unique_column_name: str,
     crs: int = 2193,
     verbose: bool = False
 ) -> None:
     """
-    Fetch non-NZ geospatial layers data using 'geoapis' and store it into the database.
+    Fetch the data of a single non-NZ geospatial layer using 'geoapis' for the part of the catchment area that is not
+    already in the database, and store it into the database.
 
     Parameters
     ----------
@@ -376,25 +549,27 @@ def non_nz_geospatial_layers_data_to_db(
         The connection used to connect to the database.
     catchment_area : gpd.GeoDataFrame
         A GeoDataFrame representing the catchment area.
+    data_provider : str
+        The data provider of the geospatial layer.
+    layer_id : int
+        The ID of the geospatial layer.
+    table_name : str
+        The database table name of the geospatial layer.
+    unique_column_name : str
+        The unique column name used for record identification in the database table.
     crs : int = 2193
         The coordinate reference system (CRS) code to use. Default is 2193.
     verbose : bool = False
         Whether to print messages. Default is False.
     """
-    # Get non-NZ geospatial layers from the database
-    non_nz_geo_layers = get_non_nz_geospatial_layers(conn)
-
-    # Iterate over each non-NZ geospatial layer
-    for _, layer_row in non_nz_geo_layers.iterrows():
-        # Extract geospatial layer information
-        data_provider, layer_id, table_name, unique_column_name = get_geospatial_layer_info(layer_row)
+    with progress.track_layer(table_name, data_provider):
         try:
             # Get the non-intersection area of the catchment area
             non_intersection_area = get_non_intersection_area_from_db(conn, catchment_area, table_name)
         except NoNonIntersectionError as error:
-            # Log the error and continue to the next layer
+            # Log the error and skip the layer
             log.info(error)
-            continue
+            return
 
         # Check if the table already exists in the database
         if check_table_exists(conn, table_name):
@@ -407,33 +582,6 @@ def non_nz_geospatial_layers_data_to_db(
                 conn, data_provider, layer_id, table_name, non_intersection_area, crs, verbose)
 
 
-def store_geospatial_layers_data_to_db(
-    conn: Connection,
-    catchment_area: gpd.GeoDataFrame,
-    crs: int = 2193,
-    verbose: bool = False
-) -> None:
-    """
-    Fetch geospatial layers data using 'geoapis' and store it into the database.
-
-    Parameters
-    ----------
-    conn : Connection
-        The connection used to connect to the database.
-    catchment_area : gpd.GeoDataFrame
-        A GeoDataFrame representing the catchment area.
-    crs : int = 2193
-        The coordinate reference system (CRS) code to use. Default is 2193.
-    verbose : bool = False
-        Whether to print messages. Default is False.
-    """
-    # Store New Zealand geospatial layers data to the database
-    nz_geospatial_layers_data_to_db(conn, crs, verbose)
-    # Store non-NZ geospatial layers data to the database
-    non_nz_geospatial_layers_data_to_db(conn, catchment_area, crs, verbose)
-    serve_static_files(conn, pathlib.Path("./src/static/geo"))
-
-
 def user_log_info_to_db(conn: Connection, catchment_area: gpd.GeoDataFrame) -> None:
     """
     Store user log information to the database.
@@ -458,7 +606,11 @@ def user_log_info_to_db(conn: Connection, catchment_area: gpd.GeoDataFrame) -> N
     conn.execute(query)
 
 
-def add_vector_file_to_db(conn: Connection, vector_file_path: pathlib.Path) -> str:
+def add_vector_file_to_db(
+    conn: Connection,
+    vector_file_path: pathlib.Path,
+    workspace_name: str = gs.Workspaces.STATIC_FILES_WORKSPACE
+) -> str:
     """
     Add a vector file to the database.
 
@@ -468,6 +620,8 @@ def add_vector_file_to_db(conn: Connection, vector_file_path: pathlib.Path) -> s
         The connection used to connect to the database.
     vector_file_path : pathlib.Path
         The Path to the vector file.
+    workspace_name : str = gs.Workspaces.STATIC_FILES_WORKSPACE
+        The name of the GeoServer workspace the vector file is served in, used to record its statistics.
 
     Raises
     ------
@@ -487,12 +641,38 @@ def add_vector_file_to_db(conn: Connection, vector_file_path: pathlib.Path) -> s
     if gdf.crs.to_epsg() is None:
         raise KeyError(f"CRS is not defined in EPSG# form in vector file {vector_file_path}.")
     gdf.to_postgis(file_name, conn, if_exists="replace")
+    layer_statistics.update_vector_layer_statistics(conn, workspace_name, file_name)
     return file_name
 
 
+def _load_vector_file(engine: Engine, vector_file_path: pathlib.Path, workspace_name: str) -> str:
+    """
+    Add a vector file to the database using a new connection, so that files can be loaded in parallel.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine used to connect to the database.
+    vector_file_path : pathlib.Path
+        The Path to the vector file.
+    workspace_name : str
+        The name of the GeoServer workspace the vector file is served in.
+
+    Returns
+    -------
+    str
+        The name of the database table created.
+    """
+    with engine.connect() as conn:
+        return add_vector_file_to_db(conn, vector_file_path, workspace_name)
+
+
 def serve_static_files(conn: Connection, vector_file_directory: pathlib.Path) -> None:
     """
     Add all vector files (.geojson, .shp, .geodb) in directory to db and serve them.
+    Rasters (.tif) and styles (.sld) are also served.
+    Files recorded in the static file manifest as published with identical contents are skipped, and GeoServer is
+    reconciled with the files so that layers and styles that are already up to date are not re-published.
 
     Parameters
     ----------
@@ -503,11 +683,13 @@ def serve_static_files(conn: Connection, vector_file_directory: pathlib.Path) ->
     """
     # Find the set of all served workspaces that deal with static files
     statics = {gs.Workspaces.STATIC_FILES_WORKSPACE, gs.Workspaces.EXTRUDED_LAYERS_WORKSPACE}
-    # Find the served workspaces that are not the static ones
-    non_statics = set(gs.Workspaces) - statics
+    # If no models have been run we may still want to serve the non-static datasets, so all stores are desired.
+    desired_state = gs.DesiredState(workspaces=set(gs.Workspaces))
+    manifest = static_file_manifest.read_manifest(conn)
+    file_states = []
+    changed_vector_files = []
     # Serve the static files
     for workspace_name in statics:
-        data_store = gs.create_main_db_store(workspace_name)
         if workspace_name == gs.Workspaces.EXTRUDED_LAYERS_WORKSPACE:
             # Extruded files are stored in another directory to help manage them
             directory = vector_file_directory / "3d"
@@ -517,18 +699,42 @@ def serve_static_files(conn: Connection, vector_file_directory: pathlib.Path) ->
             log.warning(f"Directory '{directory}' does not exist. Cannot serve static files from '{directory}'.")
             continue
         for file in directory.iterdir():
-            if not file.is_file():
+            if not file.is_file() or file.suffix not in STATIC_FILE_SUFFIXES:
                 continue
+            manifest_entry = manifest.get(file.as_posix())
+            file_state = static_file_manifest.get_static_file_state(file, workspace_name, manifest_entry)
+            file_states.append(file_state)
             # Serve each file according to its data type
             match file.suffix:
                 case ".geojson" | ".shp" | ".geodb":
-                    table_name = add_vector_file_to_db(conn, file)
-                    gs.create_datastore_layer(conn, workspace_name, data_store, table_name)
+                    unchanged = static_file_manifest.is_unchanged(file_state, manifest_entry)
+                    if not unchanged or not check_table_exists(conn, file_state.target_name):
+                        changed_vector_files.append((file, workspace_name))
+                    desired_state.featuretypes[(workspace_name, file_state.target_name)] = file_state.content_hash
                 case ".tif" | ".tiff" | ".geotiff":
-                    gs.add_gtiff_to_geoserver(file, workspace_name, file.stem)
+                    desired_state.coverages[(workspace_name, file_state.target_name)] = gs.CoverageSpec(
+                        file, file_state.content_hash)
                 case ".sld":
-                    gs.add_style(file, replace=True)
-    # If no models have been run we may still want to serve the non-static datasets, so create the stores.
-    for workspace_name in non_statics:
-        # These stores also should be initialised.
-        gs.create_main_db_store(workspace_name)
+                    desired_state.styles[file_state.target_name] = gs.StyleSpec(file, file_state.content_hash)
+    log.info(f"{len(changed_vector_files)} new or modified static vector files to load into the database.")
+    with ThreadPoolExecutor(max_workers=EnvVariable.STATIC_FILE_LOAD_WORKERS) as executor:
+        # Consume the results so that any exceptions are raised
+        loaded_files = executor.map(partial(_load_vector_file, conn.engine), *zip(*changed_vector_files))
+        for files_loaded, _ in enumerate(loaded_files):
+            progress.set_stage("static files", filesLoaded=files_loaded + 1, filesToLoad=len(changed_vector_files))
+    progress.set_stage("publishing static files")
+    report = gs.reconcile_geoserver(desired_state, conn.engine)
+    # Recording statistics invalidates cached catalogs, so only record them for rasters that were published or changed,
+    # or that have never had statistics recorded
+    published_coverages = {
+        (change.workspace_name, change.name) for change in report.applied if change.kind == gs.ChangeKind.COVERAGE
+    }
+    recorded_statistics = layer_statistics.read_layer_statistics(conn)
+    for coverage_key, coverage in desired_state.coverages.items():
+        if coverage_key in published_coverages or coverage_key not in recorded_statistics:
+            workspace_name, layer_name = coverage_key
+            layer_statistics.update_raster_layer_statistics(conn, workspace_name, layer_name, coverage.gtiff_filepath)
+    static_file_manifest.write_manifest(conn, file_states)
+    # Forget deleted files, so that a file later restored with the same contents is loaded again
+    static_file_manifest.delete_manifest_entries(
+        conn, manifest.keys() - {file_state.file_path.as_posix() for file_state in file_states})
@@ -21,12 +21,19 @@ using the 'geoapis' library. To access data from each provider, you'll need to s
 API key in the environment variables.
 """
 
-from typing import Optional
+from http import HTTPStatus
+import time
+from typing import Any, Dict, List, Optional
+import urllib.parse
 
 from geoapis.vector import Linz, StatsNz, WfsQueryBase
 import geopandas as gpd
+import pandas as pd
+import requests
 
-from eddie import config
+from eddie import config, rate_limiter
+from eddie.digitaltwin import progress, provider_cache
+from eddie.digitaltwin.utils import filter_to_area_of_interest
 
 
 class MFE(WfsQueryBase):
@@ -59,9 +66,50 @@ def clean_fetched_vector_data(fetched_data: gpd.GeoDataFrame) -> gpd.GeoDataFram
     """
     # Ensure consistent column naming convention by converting all column names to lowercase
     fetched_data.columns = fetched_data.columns.str.lower()
-    # Move the 'geometry' column to the end, ensuring spatial columns are located at the end of database tables
-    fetched_data['geometry'] = fetched_data.pop('geometry')
-    return fetched_data
+    # Move the 'geometry' column to the end, ensuring spatial columns are located at the end of database tables.
+    # Columns are reordered by selection, since popping the geometry column would downcast to a pandas DataFrame.
+    return fetched_data[[column for column in fetched_data.columns if column != "geometry"] + ["geometry"]]
+
+
+def _get_vector_fetcher(
+        data_provider: str,
+        crs: int = 2193,
+        verbose: bool = False,
+        bounding_polygon: Optional[gpd.GeoDataFrame] = None) -> WfsQueryBase:
+    """
+    Create the 'geoapis' vector fetcher for the specified data provider.
+
+    Parameters
+    -----------
+    data_provider : str
+        The data provider to use. Supported values: "StatsNZ", "LINZ", "MFE".
+    crs : int = 2193
+        The coordinate reference system (CRS) code to use. Default is 2193.
+    verbose : bool = False
+        Whether to print messages. Default is False.
+    bounding_polygon : Optional[gpd.GeoDataFrame] = None
+        Bounding polygon for data fetching. Default is all of New Zealand.
+
+    Returns
+    --------
+    WfsQueryBase
+        The vector fetcher for the data provider.
+
+    Raises
+    -------
+    ValueError
+        If an unsupported 'data_provider' value is provided.
+    """
+    if data_provider == "StatsNZ":
+        stats_nz_api_key = config.EnvVariable.STATSNZ_API_KEY
+        return StatsNz(key=stats_nz_api_key, crs=crs, bounding_polygon=bounding_polygon, verbose=verbose)
+    if data_provider == "LINZ":
+        linz_api_key = config.EnvVariable.LINZ_API_KEY
+        return Linz(key=linz_api_key, crs=crs, bounding_polygon=bounding_polygon, verbose=verbose)
+    if data_provider == "MFE":
+        mfe_api_key = config.EnvVariable.MFE_API_KEY
+        return MFE(key=mfe_api_key, crs=crs, bounding_polygon=bounding_polygon, verbose=verbose)
+    raise ValueError(f"Unsupported data_provider: {data_provider}")
 
 
 def fetch_vector_data_using_geoapis(
@@ -69,7 +117,8 @@ def fetch_vector_data_using_geoapis(
         layer_id: int,
         crs: int = 2193,
         verbose: bool = False,
-        bounding_polygon: Optional[gpd.GeoDataFrame] = None) -> gpd.GeoDataFrame:
+        bounding_polygon: Optional[gpd.GeoDataFrame] = None,
+        refresh_cache: bool = False) -> gpd.GeoDataFrame:
     """
     Fetch vector data using 'geoapis' based on the specified data provider, layer ID, and other parameters.
 
@@ -85,6 +134,8 @@ def fetch_vector_data_using_geoapis(
         Whether to print messages. Default is False.
     bounding_polygon : Optional[gpd.GeoDataFrame] = None
         Bounding polygon for data fetching. Default is all of New Zealand.
+    refresh_cache : bool = False
+        Whether to fetch from the data provider even if the data is in the provider cache. Default is False.
 
     Returns
     --------
@@ -97,25 +148,225 @@ def fetch_vector_data_using_geoapis(
         If an unsupported 'data_provider' value is provided.
     """
     # Determine the appropriate vector fetcher based on the data provider
-    if data_provider == "StatsNZ":
-        stats_nz_api_key = config.EnvVariable.STATSNZ_API_KEY
-        vector_fetcher = StatsNz(key=stats_nz_api_key, crs=crs, bounding_polygon=bounding_polygon, verbose=verbose)
-    elif data_provider == "LINZ":
-        linz_api_key = config.EnvVariable.LINZ_API_KEY
-        vector_fetcher = Linz(key=linz_api_key, crs=crs, bounding_polygon=bounding_polygon, verbose=verbose)
-    elif data_provider == "MFE":
-        mfe_api_key = config.EnvVariable.MFE_API_KEY
-        vector_fetcher = MFE(key=mfe_api_key, crs=crs, bounding_polygon=bounding_polygon, verbose=verbose)
-    else:
-        raise ValueError(f"Unsupported data_provider: {data_provider}")
-
-    # Fetch the vector data using the determined vector fetcher
-    vector_data = vector_fetcher.run(layer_id)
-    # Check if vector_data is not None and is an instance of gpd.GeoDataFrame
-    if vector_data is not None and isinstance(vector_data, gpd.GeoDataFrame):
-        # Clean the fetched vector data
-        vector_data = clean_fetched_vector_data(vector_data)
-    else:
+    vector_fetcher = _get_vector_fetcher(data_provider, crs, verbose, bounding_polygon)
+
+    def fetch() -> gpd.GeoDataFrame:
+        """
+        Fetch the vector data from the data provider using the determined vector fetcher.
+
+        Returns
+        --------
+        gpd.GeoDataFrame
+            The cleaned vector data, or an empty GeoDataFrame if no vector data was returned.
+        """
+        # The slot's lease is renewed while the whole layer is fetched, however long that takes
+        with rate_limiter.provider_slot(data_provider):
+            fetched_data = vector_fetcher.run(layer_id)
+        # Check if fetched_data is not None and is an instance of gpd.GeoDataFrame
+        if fetched_data is not None and isinstance(fetched_data, gpd.GeoDataFrame):
+            # Clean the fetched vector data
+            return clean_fetched_vector_data(fetched_data)
         # Create an empty GeoDataFrame to indicate no returned vector data
-        vector_data = gpd.GeoDataFrame()
+        return gpd.GeoDataFrame()
+
+    progress.set_layer_stage("fetching")
+    # Layer versions are not available through WFS, so cached layers are refreshed when they expire
+    cache_key = provider_cache.ProviderCacheKey.create(data_provider, layer_id, crs, bounding_polygon)
+    vector_data = provider_cache.fetch_with_cache(cache_key, fetch, refresh=refresh_cache)
+    progress.record_rows_fetched(len(vector_data))
     return vector_data
+
+
+def _query_wfs(
+        data_provider: str,
+        vector_fetcher: WfsQueryBase,
+        layer_id: int,
+        cql_filter: str,
+        property_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Send a WFS GetFeature query for a layer to the data provider of the vector fetcher, within its rate limit.
+    Queries rejected for exceeding the rate limit are retried after pausing every worker's requests to the provider.
+
+    Parameters
+    -----------
+    data_provider : str
+        The data provider to query. Supported values: "StatsNZ", "LINZ", "MFE".
+    vector_fetcher : WfsQueryBase
+        The vector fetcher of the data provider to query.
+    layer_id : int
+        The ID of the layer to query.
+    cql_filter : str
+        The CQL filter selecting the features to return.
+    property_name : Optional[str] = None
+        The only property to return for each feature, without geometry. Default returns all properties and geometry.
+
+    Returns
+    --------
+    Dict[str, Any]
+        The GeoJSON feature collection returned by the data provider.
+
+    Raises
+    -------
+    HTTPError
+        If the data provider responds with an error.
+    ValueError
+        If the response is not JSON, such as an OWS ExceptionReport sent with status 200.
+    """
+    wfs_url = urllib.parse.urlunparse((
+        vector_fetcher.SCHEME,
+        vector_fetcher.NETLOC_API,
+        f"{vector_fetcher.WFS_PATH_API_START}{vector_fetcher.key}{vector_fetcher.WFS_PATH_API_END}",
+        "", "", ""
+    ))
+    api_query = {
+        "service": "WFS",
+        "version": 2.0,
+        "request": "GetFeature",
+        "typeNames": f"layer-{layer_id}",
+        "outputFormat": "json",
+        "SRSName": f"EPSG:{vector_fetcher.crs}",
+        "cql_filter": cql_filter,
+    }
+    if property_name is not None:
+        api_query["propertyName"] = property_name
+    retries = config.EnvVariable.PROVIDER_RATE_LIMIT_RETRIES
+    for attempt in range(retries + 1):
+        with rate_limiter.provider_slot(data_provider):
+            response = requests.get(wfs_url, params=api_query)
+        if response.status_code != HTTPStatus.TOO_MANY_REQUESTS or attempt == retries:
+            break
+        retry_after = rate_limiter.parse_retry_after(response.headers.get("Retry-After"))
+        time.sleep(rate_limiter.back_off(data_provider, retry_after))
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_vector_data_ids_using_geoapis(
+        data_provider: str,
+        layer_id: int,
+        unique_column_name: str,
+        area_of_interest: gpd.GeoDataFrame,
+        crs: int = 2193) -> List[Any]:
+    """
+    Fetch only the unique IDs of the features within the bounding box of the area of interest, without their geometry.
+
+    Parameters
+    -----------
+    data_provider : str
+        The data provider to use. Supported values: "StatsNZ", "LINZ", "MFE".
+    layer_id : int
+        The ID of the layer to fetch.
+    unique_column_name : str
+        The name of the column that uniquely identifies each feature.
+    area_of_interest : gpd.GeoDataFrame
+        A GeoDataFrame representing the area of interest.
+    crs : int = 2193
+        The coordinate reference system (CRS) code to use. Default is 2193.
+
+    Returns
+    --------
+    List[Any]
+        The unique IDs of the features within the bounding box of the area of interest.
+
+    Raises
+    -------
+    HTTPError
+        If the data provider rejects the query for every known geometry name of the layer.
+    ValueError
+        If the data provider reports an error with a non-JSON response for the last known geometry name.
+    """
+    vector_fetcher = _get_vector_fetcher(data_provider, crs)
+    min_x, min_y, max_x, max_y = area_of_interest.to_crs(crs).total_bounds
+    # The name of the geometry property varies between layers, so try each known name in turn
+    for i, geometry_name in enumerate(vector_fetcher.GEOMETRY_NAMES):
+        cql_filter = f"bbox({geometry_name}, {max_y}, {max_x}, {min_y}, {min_x}, 'urn:ogc:def:crs:EPSG:{crs}')"
+        try:
+            feature_collection = _query_wfs(
+                data_provider, vector_fetcher, layer_id, cql_filter, property_name=unique_column_name
+            )
+            break
+        except (requests.HTTPError, ValueError):
+            # An unknown geometry name may be reported with an OWS ExceptionReport and status 200, failing to parse
+            if i == len(vector_fetcher.GEOMETRY_NAMES) - 1:
+                raise
+    # Property names are matched case-insensitively, since column names are lowercased when stored
+    return [
+        value
+        for feature in feature_collection["features"]
+        for key, value in feature["properties"].items()
+        if key.lower() == unique_column_name.lower()
+    ]
+
+
+def _format_cql_literal(value: str | int | float) -> str:
+    """
+    Format a value as a CQL literal.
+
+    Parameters
+    -----------
+    value : str | int | float
+        The value to format.
+
+    Returns
+    --------
+    str
+        The value as a CQL number, or as a quoted CQL string.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    escaped_value = str(value).replace("'", "''")
+    return f"'{escaped_value}'"
+
+
+def fetch_vector_data_by_ids_using_geoapis(
+        data_provider: str,
+        layer_id: int,
+        unique_column_name: str,
+        ids: List[Any],
+        area_of_interest: gpd.GeoDataFrame,
+        crs: int = 2193) -> gpd.GeoDataFrame:
+    """
+    Fetch the features with the specified unique IDs, in batches of WFS_ID_BATCH_SIZE,
+    keeping only those that intersect the area of interest.
+
+    Parameters
+    -----------
+    data_provider : str
+        The data provider to use. Supported values: "StatsNZ", "LINZ", "MFE".
+    layer_id : int
+        The ID of the layer to fetch.
+    unique_column_name : str
+        The name of the column that uniquely identifies each feature.
+    ids : List[Any]
+        The unique IDs of the features to fetch.
+    area_of_interest : gpd.GeoDataFrame
+        A GeoDataFrame representing the area of interest.
+    crs : int = 2193
+        The coordinate reference system (CRS) code to use. Default is 2193.
+
+    Returns
+    --------
+    gpd.GeoDataFrame
+        A GeoDataFrame containing the fetched vector data, or an empty GeoDataFrame if there is none.
+
+    Raises
+    -------
+    HTTPError
+        If the data provider responds with an error.
+    """
+    vector_fetcher = _get_vector_fetcher(data_provider, crs)
+    batch_size = config.EnvVariable.WFS_ID_BATCH_SIZE
+    progress.set_layer_stage("fetching")
+    batches = []
+    for i in range(0, len(ids), batch_size):
+        id_list = ", ".join(_format_cql_literal(feature_id) for feature_id in ids[i:i + batch_size])
+        feature_collection = _query_wfs(data_provider, vector_fetcher, layer_id, f"{unique_column_name} IN ({id_list})")
+        if feature_collection["features"]:
+            batch = gpd.GeoDataFrame.from_features(feature_collection, crs=crs)
+            progress.record_rows_fetched(len(batch))
+            batches.append(batch)
+    if not batches:
+        return gpd.GeoDataFrame()
+    vector_data = clean_fetched_vector_data(gpd.GeoDataFrame(pd.concat(batches, ignore_index=True), crs=crs))
+    # IDs were probed within the bounding box, so drop features outside the exact area of interest
+    return filter_to_area_of_interest(vector_data, area_of_interest)
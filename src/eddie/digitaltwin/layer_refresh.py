@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Refreshes New Zealand-wide layers without interrupting readers, using a blue/green swap of database tables.
+A new version of a layer is loaded into a shadow table and indexed while the current version is still served.
+The tables are then swapped by renaming them in a single transaction, and the replaced version is kept for rollback.
+"""
+
+import logging
+from typing import Dict
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+import sqlalchemy.exc
+
+from eddie.config import EnvVariable
+from eddie.digitaltwin import layer_statistics, progress
+from eddie.digitaltwin.data_to_db import get_geospatial_layer_info, get_nz_geospatial_layers
+from eddie.digitaltwin.get_data_using_geoapis import fetch_vector_data_using_geoapis
+from eddie.digitaltwin.tables import check_table_exists
+from eddie.digitaltwin.utils import retry_function
+import eddie.geoserver as gs
+from eddie.geoserver.tile_seeding import truncate_layer_cache
+
+log = logging.getLogger(__name__)
+
+# Suffix of the table a new version of a layer is loaded into
+SHADOW_TABLE_SUFFIX = "_next"
+# Suffix of the table the replaced version of a layer is kept in, for rollback
+PREVIOUS_TABLE_SUFFIX = "_previous"
+# Suffix of the temporary name of the live table while it is swapped with its previous version
+SWAP_TABLE_SUFFIX = "_swap"
+# Name of the geometry column of fetched layers, which the spatial index of a table is named after
+GEOMETRY_COLUMN = "geometry"
+# PostgreSQL truncates longer identifiers, which would make names collide and stop indexes being renamed
+MAX_IDENTIFIER_LENGTH = 63
+
+
+def _check_table_name_length(table_name: str) -> None:
+    """
+    Check that every table a layer table is swapped through, and the spatial index of each, can be named without being
+    truncated. The longest of these is the spatial index "idx_<table>_previous_swap_geometry", created by geopandas.
+
+    Parameters
+    ----------
+    table_name : str
+        The name of the layer table.
+
+    Raises
+    ------
+    ValueError
+        If the table name is too long to add the suffixes to.
+    """
+    longest_suffix = max(SHADOW_TABLE_SUFFIX, PREVIOUS_TABLE_SUFFIX + SWAP_TABLE_SUFFIX, key=len)
+    longest_index_name = f"idx_{table_name}{longest_suffix}_{GEOMETRY_COLUMN}"
+    if len(longest_index_name) > MAX_IDENTIFIER_LENGTH:
+        raise ValueError(f"Table name '{table_name}' is too long to be refreshed, since index "
+                         f"'{longest_index_name}' would be truncated.")
+
+
+def _rename_table(conn: Connection, old_name: str, new_name: str) -> None:
+    """
+    Rename a table and the indexes named after it, so that the old names are free to be used by another table.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    old_name : str
+        The current name of the table.
+    new_name : str
+        The new name of the table.
+    """
+    conn.execute(text(f'ALTER TABLE "{old_name}" RENAME TO "{new_name}";'))
+    index_names = conn.execute(text("""
+        SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = :table_name;
+    """), {"table_name": new_name}).scalars()
+    for index_name in index_names:
+        if old_name in index_name:
+            new_index_name = index_name.replace(old_name, new_name, 1)
+            conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{new_index_name}";'))
+
+
+def _swap_tables(conn: Connection, table_name: str, swap_in_name: str, swap_out_name: str) -> None:
+    """
+    In a single transaction, rename the live table of a layer to `swap_out_name`, then rename `swap_in_name` to the
+    live table name. Readers see either the old or the new version, and never a missing table.
+    Waiting for the lock on the live table is limited by NZ_LAYER_SWAP_LOCK_TIMEOUT, since queries queue behind it.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    table_name : str
+        The name of the live layer table.
+    swap_in_name : str
+        The name of the table to become the live table.
+    swap_out_name : str
+        The name to give the current live table. Any existing table with this name is dropped.
+    """
+    lock_timeout_ms = int(EnvVariable.NZ_LAYER_SWAP_LOCK_TIMEOUT * 1000)
+    # The database engine autocommits each statement, so use a separate connection with a real transaction
+    with conn.engine.connect().execution_options(isolation_level="READ COMMITTED") as swap_conn:
+        with swap_conn.begin():
+            swap_conn.execute(text(f"SET LOCAL lock_timeout = {lock_timeout_ms};"))
+            if check_table_exists(swap_conn, table_name):
+                # Keep the first name free for the live table being renamed
+                temp_name = f"{swap_out_name}{SWAP_TABLE_SUFFIX}" if swap_out_name == swap_in_name else swap_out_name
+                swap_conn.execute(text(f'DROP TABLE IF EXISTS "{temp_name}";'))
+                _rename_table(swap_conn, table_name, temp_name)
+            else:
+                temp_name = None
+            _rename_table(swap_conn, swap_in_name, table_name)
+            if temp_name is not None and temp_name != swap_out_name:
+                _rename_table(swap_conn, temp_name, swap_out_name)
+
+
+def _swap_tables_with_retries(conn: Connection, table_name: str, swap_in_name: str, swap_out_name: str) -> None:
+    """
+    Swap tables as in _swap_tables, retrying if the lock on the live table could not be taken in time.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    table_name : str
+        The name of the live layer table.
+    swap_in_name : str
+        The name of the table to become the live table.
+    swap_out_name : str
+        The name to give the current live table.
+    """
+    retry_function(_swap_tables, 5, 10, sqlalchemy.exc.OperationalError, conn, table_name, swap_in_name, swap_out_name)
+
+
+def _publish_refreshed_layer(conn: Connection, table_name: str) -> None:
+    """
+    Update the statistics of a swapped layer, make sure it is published, and clear its cached tiles.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    table_name : str
+        The name of the live layer table.
+    """
+    workspace_name = gs.Workspaces.INPUT_LAYERS_WORKSPACE
+    layer_statistics.update_vector_layer_statistics(conn, workspace_name, table_name)
+    data_store = gs.create_main_db_store(workspace_name)
+    gs.create_datastore_layer(conn, workspace_name, data_store, table_name)
+    truncate_layer_cache(table_name, workspace_name)
+
+
+def refresh_nz_geospatial_layer(
+    conn: Connection,
+    data_provider: str,
+    layer_id: int,
+    table_name: str,
+    crs: int = 2193,
+    verbose: bool = False
+) -> bool:
+    """
+    Fetch the latest version of a New Zealand geospatial layer into a shadow table, then swap it in for the current
+    version, keeping the current version for rollback.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    data_provider : str
+        The data provider of the geospatial layer.
+    layer_id : int
+        The ID of the geospatial layer.
+    table_name : str
+        The database table name of the geospatial layer.
+    crs : int = 2193
+        The coordinate reference system (CRS) code to use. Default is 2193.
+    verbose : bool = False
+        Whether to print messages. Default is False.
+
+    Returns
+    -------
+    bool
+        True if the layer was refreshed, False if the data provider returned no data and the current version was kept.
+    """
+    _check_table_name_length(table_name)
+    shadow_table_name = f"{table_name}{SHADOW_TABLE_SUFFIX}"
+    with progress.track_layer(table_name, data_provider):
+        log.info(f"Refreshing '{table_name}' data ({data_provider} {layer_id}).")
+        vector_data = fetch_vector_data_using_geoapis(data_provider, layer_id, crs, verbose, refresh_cache=True)
+        if vector_data.empty:
+            log.warning(f"Not refreshing '{table_name}' since {data_provider} returned no data for layer {layer_id}.")
+            return False
+        # Load the new version and its spatial index while the current version is still being served
+        progress.set_layer_stage("writing")
+        vector_data.to_postgis(shadow_table_name, conn, index=False, if_exists="replace")
+        conn.execute(text(f'ANALYZE "{shadow_table_name}";'))
+        progress.record_rows_written(vector_data)
+        progress.set_layer_stage("swapping")
+        _swap_tables_with_retries(conn, table_name, shadow_table_name, f"{table_name}{PREVIOUS_TABLE_SUFFIX}")
+        progress.set_layer_stage("publishing")
+        _publish_refreshed_layer(conn, table_name)
+    log.info(f"Refreshed '{table_name}', keeping the replaced version for rollback.")
+    return True
+
+
+def rollback_nz_geospatial_layer(conn: Connection, table_name: str) -> bool:
+    """
+    Swap the previous version of a refreshed layer back in, keeping the replaced version as the previous version.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    table_name : str
+        The database table name of the geospatial layer.
+
+    Returns
+    -------
+    bool
+        True if the layer was rolled back, False if there is no previous version.
+    """
+    _check_table_name_length(table_name)
+    previous_table_name = f"{table_name}{PREVIOUS_TABLE_SUFFIX}"
+    if not check_table_exists(conn, previous_table_name):
+        log.warning(f"Not rolling back '{table_name}' since it has no previous version.")
+        return False
+    _swap_tables_with_retries(conn, table_name, previous_table_name, previous_table_name)
+    _publish_refreshed_layer(conn, table_name)
+    log.info(f"Rolled back '{table_name}' to its previous version.")
+    return True
+
+
+def refresh_nz_geospatial_layers(conn: Connection, crs: int = 2193, verbose: bool = False) -> Dict[str, bool]:
+    """
+    Refresh every New Zealand geospatial layer in turn. A layer that fails to refresh keeps its current version.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    crs : int = 2193
+        The coordinate reference system (CRS) code to use. Default is 2193.
+    verbose : bool = False
+        Whether to print messages. Default is False.
+
+    Returns
+    -------
+    Dict[str, bool]
+        Maps the table name of each layer to whether it was refreshed.
+    """
+    nz_geo_layers = get_nz_geospatial_layers(conn)
+    progress.set_stage("refreshing new zealand layers")
+    progress.expect_layers(len(nz_geo_layers))
+    results = {}
+    for _, layer_row in nz_geo_layers.iterrows():
+        data_provider, layer_id, table_name, _ = get_geospatial_layer_info(layer_row)
+        try:
+            refreshed = refresh_nz_geospatial_layer(conn, data_provider, layer_id, table_name, crs, verbose)
+        except Exception:  # pylint: disable=broad-exception-caught
+            # Keep refreshing the other layers, since the failed layer is still served from its current version
+            log.exception(f"Failed to refresh '{table_name}'.")
+            refreshed = False
+        results[table_name] = refreshed
+    return results
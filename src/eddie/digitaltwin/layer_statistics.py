@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Maintains summary statistics of published layers in the 'layer_statistics' table, updated when layers are ingested.
+The statistics let map clients skip layers outside the view and choose how much data to request from heavy layers.
+"""
+
+from datetime import datetime, timezone
+import logging
+import pathlib
+from typing import Any
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection, Row
+
+from eddie.digitaltwin.tables import LayerStatistics, check_table_exists, create_table
+from eddie.geoserver.catalog_cache import bump_catalog_version
+
+log = logging.getLogger(__name__)
+
+
+def _write_layer_statistics(
+    conn: Connection,
+    workspace_name: str,
+    layer_name: str,
+    statistics: dict[str, Any]
+) -> None:
+    """
+    Insert or update the statistics of a layer, and mark cached catalogs as out of date since they include them.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    workspace_name : str
+        The name of the GeoServer workspace the layer is published in.
+    layer_name : str
+        The name of the layer.
+    statistics : dict[str, Any]
+        Maps LayerStatistics column names to their new values.
+    """
+    create_table(conn, LayerStatistics)
+    values = {
+        **statistics,
+        "workspace_name": workspace_name,
+        "layer_name": layer_name,
+        "updated_at": datetime.now(timezone.utc)
+    }
+    key_columns = {"workspace_name", "layer_name"}
+    query = insert(LayerStatistics).values(values)
+    query = query.on_conflict_do_update(
+        index_elements=[LayerStatistics.workspace_name, LayerStatistics.layer_name],
+        set_={column: query.excluded[column] for column in values if column not in key_columns}
+    )
+    conn.execute(query)
+    bump_catalog_version()
+
+
+def update_vector_layer_statistics(conn: Connection, workspace_name: str, table_name: str) -> None:
+    """
+    Calculate and record the extent, feature count, size and geometry type of a database table.
+    The feature count and extent are calculated together in one scan of the table, and only the extent's corners are
+    reprojected. They are not estimated from planner statistics since an estimated extent can leave out features,
+    which map clients would then not show.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    workspace_name : str
+        The name of the GeoServer workspace the table is published in.
+    table_name : str
+        The name of the table to calculate statistics for.
+    """
+    geometry_column = conn.execute(text("""
+        SELECT f_geometry_column, type, srid
+        FROM geometry_columns
+        WHERE f_table_schema = 'public' AND f_table_name = :table_name
+        LIMIT 1;
+    """), {"table_name": table_name}).first()
+    if geometry_column is None:
+        log.debug(f"Not recording statistics for '{table_name}' since it has no geometry column.")
+        return
+    geometry_name, geometry_type, srid = geometry_column
+    statistics = conn.execute(text(f"""
+        WITH layer AS (
+            SELECT count(*) AS feature_count,
+                   ST_Transform(ST_SetSRID(ST_Extent("{geometry_name}")::geometry, :srid), 4326) AS extent
+            FROM "{table_name}"
+        )
+        SELECT feature_count,
+               pg_total_relation_size(CAST(:qualified_name AS regclass)) AS size_bytes,
+               ST_XMin(extent) AS xmin, ST_YMin(extent) AS ymin, ST_XMax(extent) AS xmax, ST_YMax(extent) AS ymax
+        FROM layer;
+    """), {"srid": srid, "qualified_name": f'public."{table_name}"'}).mappings().one()
+    _write_layer_statistics(
+        conn, workspace_name, table_name, {**statistics, "geometry_type": geometry_type, "resolution": None})
+
+
+def update_raster_layer_statistics(
+    conn: Connection,
+    workspace_name: str,
+    layer_name: str,
+    gtiff_filepath: pathlib.Path
+) -> None:
+    """
+    Calculate and record the extent, resolution and file size of a raster layer.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    workspace_name : str
+        The name of the GeoServer workspace the layer is published in.
+    layer_name : str
+        The name of the raster layer in GeoServer.
+    gtiff_filepath : pathlib.Path
+        The filepath to the GeoTiff file the layer is served from.
+    """
+    # Imported here so that only processes that publish rasters require GDAL
+    import rasterio  # pylint: disable=import-outside-toplevel
+    from rasterio.warp import transform_bounds  # pylint: disable=import-outside-toplevel
+
+    with rasterio.open(gtiff_filepath) as dataset:
+        xmin, ymin, xmax, ymax = transform_bounds(dataset.crs, "EPSG:4326", *dataset.bounds)
+        resolution = float(dataset.res[0])
+    _write_layer_statistics(conn, workspace_name, layer_name, {
+        "geometry_type": "Raster",
+        "feature_count": None,
+        "size_bytes": gtiff_filepath.stat().st_size,
+        "resolution": resolution,
+        "xmin": xmin,
+        "ymin": ymin,
+        "xmax": xmax,
+        "ymax": ymax,
+    })
+
+
+def read_layer_statistics(conn: Connection) -> dict[tuple[str, str], Row]:
+    """
+    Read the recorded statistics of every layer.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+
+    Returns
+    -------
+    dict[tuple[str, str], Row]
+        Maps the workspace and name of each layer to its statistics. Empty if no statistics have been recorded yet.
+    """
+    # Only checked rather than created, so that reading statistics never changes the database schema
+    if not check_table_exists(conn, LayerStatistics.__tablename__):
+        return {}
+    rows = conn.execute(select(LayerStatistics.__table__)).fetchall()
+    return {(row.workspace_name, row.layer_name): row for row in rows}
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tracks the progress and throughput of ingesting geospatial layers, so that long-running tasks can report which stage and
+layer they are on, how fast they are going, and which layers and providers are slow.
+Progress is recorded against the tracker installed for the current context, so functions deep in the ingestion
+pipeline can record progress without it being passed through every call. Without a tracker, recording does nothing.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# The celery state that tasks report progress with
+PROGRESS_STATE = "PROGRESS"
+# Minimum number of seconds between progress reports, so that frequent updates do not flood the result backend
+MIN_REPORT_INTERVAL_SECONDS = 1.0
+
+
+@dataclass
+class LayerProgress:  # pylint: disable=too-many-instance-attributes
+    """
+    The progress of ingesting a single layer.
+
+    Attributes
+    ----------
+    layer_name : str
+        The name of the layer, usually its database table name.
+    data_provider : Optional[str]
+        The provider the layer is fetched from, if any.
+    stage : str
+        The step the layer is on, e.g. 'fetching', 'writing', 'publishing' or 'done'.
+    rows_fetched : int
+        The number of rows fetched from the provider.
+    rows_written : int
+        The number of rows written to the database.
+    rows_memory_bytes : int
+        The in-memory size of the rows written to the database, which approximates rather than measures the bytes
+        written, since the database stores them in its own format.
+    started_at : float
+        Monotonic time that the layer was started.
+    finished_at : Optional[float]
+        Monotonic time that the layer was finished, or None if it is still in progress.
+    """
+
+    layer_name: str
+    data_provider: Optional[str]
+    stage: str = "starting"
+    rows_fetched: int = 0
+    rows_written: int = 0
+    rows_memory_bytes: int = 0
+    started_at: float = 0.0
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed_seconds(self) -> float:
+        """The number of seconds spent on the layer so far."""
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Summarise the progress of the layer as JSON serialisable task metadata.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The layer progress, including elapsed time and write throughput.
+        """
+        elapsed = self.elapsed_seconds
+        return {
+            "dataProvider": self.data_provider,
+            "stage": self.stage,
+            "rowsFetched": self.rows_fetched,
+            "rowsWritten": self.rows_written,
+            "rowsMemoryBytes": self.rows_memory_bytes,
+            "elapsedSeconds": round(elapsed, 2),
+            "rowsPerSecond": round(self.rows_written / elapsed, 1) if elapsed > 0 else None,
+        }
+
+
+class ProgressTracker:  # pylint: disable=too-many-instance-attributes
+    """Thread-safe record of the stage and layer progress of a task, reported through a callback as it changes."""
+
+    def __init__(self,
+                 report: Callable[[Dict[str, Any]], None],
+                 min_report_interval: float = MIN_REPORT_INTERVAL_SECONDS) -> None:
+        """
+        Create a tracker for a task that has just started.
+
+        Parameters
+        ----------
+        report : Callable[[Dict[str, Any]], None]
+            Called with a snapshot of the progress, e.g. to update the celery task state.
+        min_report_interval : float = MIN_REPORT_INTERVAL_SECONDS
+            Minimum number of seconds between reports of row counts. Stage and layer changes are always reported.
+        """
+        self._report = report
+        self._min_report_interval = min_report_interval
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._last_reported_at = float("-inf")
+        self._stage = "starting"
+        self._stage_details: Dict[str, Any] = {}
+        self._expected_layers = 0
+        self._layers: Dict[str, LayerProgress] = {}
+        self._current_layer: ContextVar[Optional[LayerProgress]] = ContextVar("current_layer", default=None)
+
+    def _estimate_remaining_seconds(self) -> Optional[float]:
+        """
+        Estimate the time left to finish the expected layers from the average time of the finished layers.
+
+        Returns
+        -------
+        Optional[float]
+            The estimated number of seconds remaining, or None if no layers have finished yet.
+        """
+        finished = [layer for layer in self._layers.values() if layer.finished_at is not None]
+        remaining_layers = max(self._expected_layers - len(finished), 0)
+        if not finished:
+            return None
+        mean_seconds = sum(layer.elapsed_seconds for layer in finished) / len(finished)
+        return round(mean_seconds * remaining_layers, 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Summarise the progress of the task as JSON serialisable task metadata.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The current stage and layer, per-layer progress, totals, elapsed time and estimated time remaining.
+        """
+        with self._lock:
+            current_layer = self._current_layer.get()
+            layers = {name: layer.as_dict() for name, layer in self._layers.items()}
+            return {
+                "stage": self._stage,
+                **self._stage_details,
+                "layer": current_layer.layer_name if current_layer is not None else None,
+                "layersFinished": sum(layer.finished_at is not None for layer in self._layers.values()),
+                "layersExpected": self._expected_layers,
+                "rowsWritten": sum(layer.rows_written for layer in self._layers.values()),
+                "rowsMemoryBytes": sum(layer.rows_memory_bytes for layer in self._layers.values()),
+                "elapsedSeconds": round(time.monotonic() - self._started_at, 2),
+                "etaSeconds": self._estimate_remaining_seconds(),
+                "layers": layers,
+            }
+
+    def _publish(self, force: bool = False) -> None:
+        """
+        Report the progress through the callback, unless it was reported too recently.
+
+        Parameters
+        ----------
+        force : bool = False
+            Report even if the progress was reported within the minimum report interval.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_reported_at < self._min_report_interval:
+                return
+            self._last_reported_at = now
+        self._report(self.snapshot())
+
+    def set_stage(self, stage: str, **details: object) -> None:
+        """
+        Record the stage of the task that has started, such as 'fetching nz layers' or 'seeding'.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage.
+        **details : object
+            Extra progress details of the stage, reported alongside the layer progress.
+        """
+        with self._lock:
+            changed = stage != self._stage
+            self._stage = stage
+            self._stage_details = details
+        self._publish(force=changed)
+
+    def expect_layers(self, layer_count: int) -> None:
+        """
+        Add to the number of layers the task expects to ingest, used to estimate the time remaining.
+
+        Parameters
+        ----------
+        layer_count : int
+            The number of extra layers expected.
+        """
+        with self._lock:
+            self._expected_layers += layer_count
+
+    @contextmanager
+    def track_layer(self, layer_name: str, data_provider: Optional[str] = None) -> Iterator[LayerProgress]:
+        """
+        Track the progress of a layer for the duration of the context, and log its throughput once finished.
+
+        Parameters
+        ----------
+        layer_name : str
+            The name of the layer, usually its database table name.
+        data_provider : Optional[str] = None
+            The provider the layer is fetched from, if any.
+
+        Yields
+        ------
+        LayerProgress
+            The progress of the layer, which is also the current layer within the context.
+        """
+        layer = LayerProgress(layer_name, data_provider, started_at=time.monotonic())
+        with self._lock:
+            self._layers[layer_name] = layer
+        token = self._current_layer.set(layer)
+        self._publish(force=True)
+        try:
+            yield layer
+        finally:
+            with self._lock:
+                layer.finished_at = time.monotonic()
+                layer.stage = "done"
+            self._current_layer.reset(token)
+            log.info(
+                f"'{layer_name}' ({data_provider}): fetched {layer.rows_fetched} rows and wrote {layer.rows_written} "
+                f"rows ({layer.rows_memory_bytes / 1e6:.1f} MB in memory) in {layer.elapsed_seconds:.1f} s."
+            )
+            self._publish(force=True)
+
+    def update_current_layer(self,
+                             stage: Optional[str] = None,
+                             rows_fetched: int = 0,
+                             rows_written: int = 0,
+                             rows_memory_bytes: int = 0) -> None:
+        """
+        Record progress of the current layer. Does nothing if no layer is being tracked in the current context.
+
+        Parameters
+        ----------
+        stage : Optional[str] = None
+            The new stage of the layer, or None to keep the current stage.
+        rows_fetched : int = 0
+            The number of extra rows fetched.
+        rows_written : int = 0
+            The number of extra rows written.
+        rows_memory_bytes : int = 0
+            The in-memory size of the extra rows written.
+        """
+        layer = self._current_layer.get()
+        if layer is None:
+            return
+        with self._lock:
+            if stage is not None:
+                layer.stage = stage
+            layer.rows_fetched += rows_fetched
+            layer.rows_written += rows_written
+            layer.rows_memory_bytes += rows_memory_bytes
+        self._publish(force=stage is not None)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarise the finished task as JSON serialisable task metadata, to find slow layers and providers later.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The final progress, without the stage that was in progress.
+        """
+        summary = self.snapshot()
+        for key in ["stage", "layer", "etaSeconds"]:
+            summary.pop(key)
+        return summary
+
+
+_current_tracker: ContextVar[Optional[ProgressTracker]] = ContextVar("progress_tracker", default=None)
+
+
+@contextmanager
+def tracking(tracker: ProgressTracker) -> Iterator[ProgressTracker]:
+    """
+    Record progress of functions run within the context against the tracker.
+
+    Parameters
+    ----------
+    tracker : ProgressTracker
+        The tracker to record progress against.
+
+    Yields
+    ------
+    ProgressTracker
+        The tracker.
+    """
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_tracker.reset(token)
+
+
+def set_stage(stage: str, **details: object) -> None:
+    """
+    Record the stage of the current task, if progress is being tracked.
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage.
+    **details : object
+        Extra progress details of the stage.
+    """
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.set_stage(stage, **details)
+
+
+def expect_layers(layer_count: int) -> None:
+    """
+    Add to the number of layers the current task expects to ingest, if progress is being tracked.
+
+    Parameters
+    ----------
+    layer_count : int
+        The number of extra layers expected.
+    """
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.expect_layers(layer_count)
+
+
+@contextmanager
+def track_layer(layer_name: str, data_provider: Optional[str] = None) -> Iterator[None]:
+    """
+    Track the progress of a layer for the duration of the context, if progress is being tracked.
+
+    Parameters
+    ----------
+    layer_name : str
+        The name of the layer, usually its database table name.
+    data_provider : Optional[str] = None
+        The provider the layer is fetched from, if any.
+
+    Yields
+    ------
+    None
+        Context in which the layer is the current layer.
+    """
+    tracker = _current_tracker.get()
+    if tracker is None:
+        yield
+        return
+    with tracker.track_layer(layer_name, data_provider):
+        yield
+
+
+def set_layer_stage(stage: str) -> None:
+    """
+    Record the stage of the current layer, such as 'fetching', 'writing' or 'publishing'.
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage.
+    """
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.update_current_layer(stage=stage)
+
+
+def record_rows_fetched(row_count: int) -> None:
+    """
+    Record rows fetched from a provider for the current layer.
+
+    Parameters
+    ----------
+    row_count : int
+        The number of rows fetched.
+    """
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.update_current_layer(rows_fetched=row_count)
+
+
+def record_rows_written(data: pd.DataFrame) -> None:
+    """
+    Record rows written to the database for the current layer.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The rows written.
+    """
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.update_current_layer(
+            rows_written=len(data), rows_memory_bytes=int(data.memory_usage(deep=True).sum()))
+
+
+def merge_summaries(summaries: List[Dict[str, Any]], elapsed_seconds: float) -> Dict[str, Any]:
+    """
+    Combine the summaries of tasks that ingested layers concurrently into a single summary.
+
+    Parameters
+    ----------
+    summaries : List[Dict[str, Any]]
+        The summaries returned by ProgressTracker.summary() of each task.
+    elapsed_seconds : float
+        The wall-clock time taken by all tasks together.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The summary, with the layers of every task and the totals across them.
+    """
+    layers = {name: layer for summary in summaries for name, layer in summary["layers"].items()}
+    return {
+        "layersFinished": sum(summary["layersFinished"] for summary in summaries),
+        "layersExpected": sum(summary["layersExpected"] for summary in summaries),
+        "rowsWritten": sum(summary["rowsWritten"] for summary in summaries),
+        "rowsMemoryBytes": sum(summary["rowsMemoryBytes"] for summary in summaries),
+        "elapsedSeconds": round(elapsed_seconds, 2),
+        "layers": layers,
+    }
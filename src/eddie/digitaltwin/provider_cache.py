@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Caches vector data fetched from data providers as GeoParquet files in the shared data directory, so that rebuilding the
+database, adding workers or re-running modules reads layers from disk instead of downloading them again.
+Entries are addressed by a hash of what was fetched, expire after PROVIDER_CACHE_TTL seconds,
+and the least recently used entries are evicted once the cache is larger than PROVIDER_CACHE_MAX_SIZE_MB.
+"""
+
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import time
+from typing import Callable, Optional, Union
+import uuid
+
+import geopandas as gpd
+
+from eddie.config import EnvVariable
+
+log = logging.getLogger(__name__)
+
+CACHE_FILE_SUFFIX = ".parquet"
+
+
+@dataclass(frozen=True)
+class ProviderCacheKey:
+    """
+    Identifies a single fetch from a data provider.
+
+    Attributes
+    ----------
+    data_provider : str
+        The data provider, e.g. "LINZ", or "ArcGIS" for ArcGIS REST API feature layers.
+    layer_id : Union[int, str]
+        The ID of the layer, or the URL of an ArcGIS REST API feature layer.
+    crs : int
+        The EPSG code of the CRS the data was fetched in.
+    area_of_interest : Optional[bytes]
+        WKB of the normalised area of interest the data was fetched for, or None if the whole layer was fetched.
+    layer_version : Optional[str]
+        The version of the layer reported by the data provider, or None if it is unknown.
+    """
+
+    data_provider: str
+    layer_id: Union[int, str]
+    crs: int
+    area_of_interest: Optional[bytes]
+    layer_version: Optional[str]
+
+    @classmethod
+    def create(
+            cls: type["ProviderCacheKey"],
+            data_provider: str,
+            layer_id: Union[int, str],
+            crs: int,
+            area_of_interest: Optional[gpd.GeoDataFrame] = None,
+            layer_version: Optional[str] = None) -> "ProviderCacheKey":
+        """
+        Create the cache key of a fetch, normalising the area of interest so that equal areas have equal keys.
+
+        Parameters
+        ----------
+        data_provider : str
+            The data provider, e.g. "LINZ", or "ArcGIS" for ArcGIS REST API feature layers.
+        layer_id : Union[int, str]
+            The ID of the layer, or the URL of an ArcGIS REST API feature layer.
+        crs : int
+            The EPSG code of the CRS the data was fetched in.
+        area_of_interest : Optional[gpd.GeoDataFrame] = None
+            The area of interest the data was fetched for. Default is the whole layer.
+        layer_version : Optional[str] = None
+            The version of the layer reported by the data provider. Default is unknown.
+
+        Returns
+        -------
+        ProviderCacheKey
+            The cache key of the fetch.
+        """
+        aoi_wkb = None
+        if area_of_interest is not None:
+            aoi_wkb = area_of_interest.to_crs(crs).union_all().normalize().wkb
+        return cls(data_provider, layer_id, crs, aoi_wkb, layer_version)
+
+    def digest(self) -> str:
+        """
+        Hash the key into the name of its cache entry.
+
+        Returns
+        -------
+        str
+            The SHA-256 hex digest of the key.
+        """
+        key_hash = hashlib.sha256(json.dumps([
+            self.data_provider, str(self.layer_id), self.crs, self.layer_version
+        ]).encode())
+        if self.area_of_interest is not None:
+            key_hash.update(self.area_of_interest)
+        return key_hash.hexdigest()
+
+
+def _get_cache_file_path(key: ProviderCacheKey) -> pathlib.Path:
+    """
+    Find the path of the cache entry for a key.
+
+    Parameters
+    ----------
+    key : ProviderCacheKey
+        The key of the cache entry.
+
+    Returns
+    -------
+    pathlib.Path
+        The path of the GeoParquet file of the cache entry, which may not exist.
+    """
+    digest = key.digest()
+    # Split entries between subdirectories, so that no single directory holds too many files
+    return EnvVariable.PROVIDER_CACHE_DIR / digest[:2] / f"{digest}{CACHE_FILE_SUFFIX}"
+
+
+def read_cached(key: ProviderCacheKey) -> Optional[gpd.GeoDataFrame]:
+    """
+    Read a cache entry, if it exists and has not expired.
+
+    Parameters
+    ----------
+    key : ProviderCacheKey
+        The key of the cache entry.
+
+    Returns
+    -------
+    Optional[gpd.GeoDataFrame]
+        The cached vector data, or None if there is no valid cache entry.
+    """
+    file_path = _get_cache_file_path(key)
+    try:
+        written_at = file_path.stat().st_mtime
+        if time.time() - written_at > EnvVariable.PROVIDER_CACHE_TTL:
+            log.debug(f"Provider cache entry '{file_path.name}' has expired.")
+            file_path.unlink(missing_ok=True)
+            return None
+        cached_data = gpd.read_parquet(file_path)
+        # Record the access time for LRU eviction, keeping the modified time as the time the entry was written
+        os.utime(file_path, (time.time(), written_at))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        # A corrupt entry is treated as missing, so that it is replaced by the next fetch
+        log.warning(f"Could not read provider cache entry '{file_path.name}': {e}")
+        return None
+    return cached_data
+
+
+def write_cached(key: ProviderCacheKey, vector_data: gpd.GeoDataFrame) -> None:
+    """
+    Write a cache entry, then evict old entries if the cache is too large.
+    Failing to write is logged rather than raised, since the data has already been fetched.
+
+    Parameters
+    ----------
+    key : ProviderCacheKey
+        The key of the cache entry.
+    vector_data : gpd.GeoDataFrame
+        The fetched vector data to cache.
+    """
+    file_path = _get_cache_file_path(key)
+    # Write to a temporary file first, so that other processes never read a partially written entry
+    temp_file_path = file_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    try:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        vector_data.to_parquet(temp_file_path, index=False)
+        temp_file_path.replace(file_path)
+    except (OSError, ValueError) as e:
+        log.warning(f"Could not write provider cache entry '{file_path.name}': {e}")
+        temp_file_path.unlink(missing_ok=True)
+        return
+    evict_cache_entries()
+
+
+def evict_cache_entries() -> None:
+    """Delete expired cache entries, then the least recently used entries until the cache fits within its size limit."""
+    max_size_bytes = EnvVariable.PROVIDER_CACHE_MAX_SIZE_MB * 1024 * 1024
+    now = time.time()
+    entries = []
+    for file_path in EnvVariable.PROVIDER_CACHE_DIR.glob(f"*/*{CACHE_FILE_SUFFIX}"):
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            # Another process has already evicted it
+            continue
+        if now - stat.st_mtime > EnvVariable.PROVIDER_CACHE_TTL:
+            file_path.unlink(missing_ok=True)
+        else:
+            entries.append((stat.st_atime, stat.st_size, file_path))
+    total_size_bytes = sum(size for _, size, _ in entries)
+    # Evict the least recently accessed entries first
+    for _, size, file_path in sorted(entries):
+        if total_size_bytes <= max_size_bytes:
+            break
+        log.debug(f"Evicting provider cache entry '{file_path.name}'.")
+        file_path.unlink(missing_ok=True)
+        total_size_bytes -= size
+
+
+def fetch_with_cache(
+        key: ProviderCacheKey,
+        fetch: Callable[[], gpd.GeoDataFrame],
+        refresh: bool = False) -> gpd.GeoDataFrame:
+    """
+    Read vector data from the cache, or fetch it from the data provider and cache it if it is not cached.
+
+    Parameters
+    ----------
+    key : ProviderCacheKey
+        The key of the cache entry.
+    fetch : Callable[[], gpd.GeoDataFrame]
+        Function that fetches the vector data from the data provider.
+    refresh : bool = False
+        Whether to fetch from the data provider even if the data is cached, replacing the cache entry.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        The vector data.
+    """
+    if not EnvVariable.PROVIDER_CACHE_ENABLED:
+        return fetch()
+    cached_data = None if refresh else read_cached(key)
+    if cached_data is not None:
+        log.info(f"Read {key.data_provider} layer {key.layer_id} from the provider cache.")
+        return cached_data
+    vector_data = fetch()
+    # Empty results are cheap to fetch, and have no geometry column to store
+    if not vector_data.empty:
+        write_cached(key, vector_data)
+    return vector_data
@@ -20,11 +20,124 @@ This script automates the retrieval and storage of geospatial data from various
 It populates the 'geospatial_layers' table in the database and stores user log information for tracking and reference.
 """
 import pathlib
+from typing import List, Optional, TypedDict
 
 import geopandas as gpd
 
-from eddie.digitaltwin import data_to_db, instructions_records_to_db, setup_environment
+from eddie.digitaltwin import data_to_db, instructions_records_to_db, progress, setup_environment
 from eddie.digitaltwin.utils import LogLevel, get_catchment_area, setup_logging
+import eddie.geoserver as gs
+
+
+class LayerInstruction(TypedDict):
+    """
+    The instruction to fetch a single geospatial layer, kept JSON serialisable so that it can be sent to a task.
+
+    Attributes
+    ----------
+    data_provider : str
+        The data provider of the geospatial layer.
+    layer_id : int
+        The ID of the geospatial layer.
+    table_name : str
+        The database table name of the geospatial layer.
+    unique_column_name : Optional[str]
+        The unique column name used for record identification, or None for layers covering all of New Zealand.
+    """
+
+    data_provider: str
+    layer_id: int
+    table_name: str
+    unique_column_name: Optional[str]
+
+
+def store_instructions(
+    instruction_json_path: pathlib.Path | str | None,
+    log_level: LogLevel = LogLevel.DEBUG
+) -> List[LayerInstruction]:
+    """
+    Store the records from the instruction json in the 'geospatial_layers' table, and find the layers to fetch.
+    The GeoServer store that layers are published to is also created, so that layers can be fetched concurrently.
+
+    Parameters
+    ----------
+    instruction_json_path : pathlib.Path | str | None
+        The path to the instruction json file that specifies the geospatial data to be retrieved.
+        If this is None, then only the layers already recorded in the database are found.
+    log_level : LogLevel = LogLevel.DEBUG
+        The log level to set for the root logger. Defaults to LogLevel.DEBUG.
+
+    Returns
+    -------
+    List[LayerInstruction]
+        The instructions to fetch each layer, New Zealand layers first.
+    """
+    # Set up logging with the specified log level
+    setup_logging(log_level)
+    # Cast str paths to pathlib.Path
+    if isinstance(instruction_json_path, str):
+        instruction_json_path = pathlib.Path(instruction_json_path)
+    engine = setup_environment.get_database()
+    with engine.connect() as conn:
+        # Store records from instruction json in the 'geospatial_layers' table in the database.
+        instructions_records_to_db.store_instructions_records_to_db(conn, instruction_json_path)
+        geospatial_layers = [data_to_db.get_nz_geospatial_layers(conn), data_to_db.get_non_nz_geospatial_layers(conn)]
+    gs.create_main_db_store(gs.Workspaces.INPUT_LAYERS_WORKSPACE)
+    return [
+        LayerInstruction(
+            data_provider=layer_row["data_provider"],
+            # Cast from numpy types so that the instruction is JSON serialisable
+            layer_id=int(layer_row["layer_id"]),
+            table_name=layer_row["table_name"],
+            unique_column_name=layer_row["unique_column_name"],
+        )
+        for layers in geospatial_layers
+        for _, layer_row in layers.iterrows()
+    ]
+
+
+def fetch_layer(selected_polygon_gdf: gpd.GeoDataFrame, layer: LayerInstruction) -> None:
+    """
+    Fetch a single geospatial layer for the selected polygon and store it in the database.
+
+    Parameters
+    ----------
+    selected_polygon_gdf : gpd.GeoDataFrame
+        A GeoDataFrame representing the selected polygon, i.e., the catchment area.
+    layer : LayerInstruction
+        The instruction to fetch the layer.
+    """
+    engine = setup_environment.get_database()
+    with engine.connect() as conn:
+        if layer["unique_column_name"] is None:
+            data_to_db.nz_geospatial_layer_data_to_db(
+                conn, layer["data_provider"], layer["layer_id"], layer["table_name"])
+        else:
+            catchment_area = get_catchment_area(selected_polygon_gdf, to_crs=2193)
+            data_to_db.non_nz_geospatial_layer_data_to_db(
+                conn, catchment_area, layer["data_provider"], layer["layer_id"], layer["table_name"],
+                layer["unique_column_name"])
+
+
+def serve_static_files() -> None:
+    """Store the static files in the database, and serve them with GeoServer."""
+    engine = setup_environment.get_database()
+    with engine.connect() as conn:
+        data_to_db.serve_static_files(conn, data_to_db.STATIC_FILE_DIRECTORY)
+
+
+def store_user_log(selected_polygon_gdf: gpd.GeoDataFrame) -> None:
+    """
+    Store user log information in the database, recording that the selected polygon's layers have been fetched.
+
+    Parameters
+    ----------
+    selected_polygon_gdf : gpd.GeoDataFrame
+        A GeoDataFrame representing the selected polygon, i.e., the catchment area.
+    """
+    engine = setup_environment.get_database()
+    with engine.connect() as conn:
+        data_to_db.user_log_info_to_db(conn, get_catchment_area(selected_polygon_gdf, to_crs=2193))
 
 
 def main(
@@ -36,6 +149,7 @@ def main(
     Connect to various data providers to fetch geospatial data for the selected polygon, i.e., the catchment area.
     Subsequently, populate the 'geospatial_layers' table in the database and store user log information for
     tracking and reference.
+    Each step is run in turn. The celery task add_base_data_to_db runs the same steps, fetching layers concurrently.
 
     Parameters
     ----------
@@ -56,22 +170,16 @@ def main(
         - LogLevel.DEBUG (10)
         - LogLevel.NOTSET (0)
     """
-    # Set up logging with the specified log level
-    setup_logging(log_level)
-    # Cast str paths to pathlib.Path
-    if isinstance(instruction_json_path, str):
-        instruction_json_path = pathlib.Path(instruction_json_path)
-    # Connect to the database
-    engine = setup_environment.get_database()
-    # Get catchment area.
-    catchment_area = get_catchment_area(selected_polygon_gdf, to_crs=2193)
-    with engine.connect() as conn:
-        # Store records from instruction json in the 'geospatial_layers' table in the database.
-        instructions_records_to_db.store_instructions_records_to_db(conn, instruction_json_path)
-        # Store geospatial layers data in the database
-        data_to_db.store_geospatial_layers_data_to_db(conn, catchment_area)
-        # Store user log information in the database
-        data_to_db.user_log_info_to_db(conn, catchment_area)
+    progress.set_stage("instructions")
+    layers = store_instructions(instruction_json_path, log_level)
+    progress.set_stage("layers")
+    progress.expect_layers(len(layers))
+    for layer in layers:
+        fetch_layer(selected_polygon_gdf, layer)
+    progress.set_stage("static files")
+    serve_static_files()
+    progress.set_stage("user log")
+    store_user_log(selected_polygon_gdf)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,486 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Exports the tables managed by EDDIE to a snapshot directory, and imports them back, so that a new deployment can be
+populated in minutes without fetching every base layer from the data providers.
+A snapshot is a directory of GeoParquet or FlatGeobuf files, split into parts of at most SNAPSHOT_PART_ROWS rows per
+table so that large layers never have to fit in memory, with a manifest describing them.
+
+Usage: python -m eddie.digitaltwin.snapshot {export,import} <snapshot_dir>
+"""
+
+import argparse
+from datetime import datetime, timezone
+from enum import StrEnum
+import json
+import logging
+import pathlib
+from typing import Any, Dict, Iterator, List, Optional, Type
+
+import geopandas as gpd
+import pandas as pd
+from sqlalchemy import ARRAY, text
+from sqlalchemy.engine import Connection
+
+from eddie.digitaltwin import layer_statistics, setup_environment
+from eddie.digitaltwin.tables import Base, GeospatialLayers, UserLogInfo, check_table_exists, create_table
+from eddie.digitaltwin.utils import LogLevel, get_file_hash, setup_logging
+import eddie.geoserver as gs
+
+log = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# Metadata tables, restored into the tables created by their models so that their constraints and defaults are kept
+METADATA_TABLES = (GeospatialLayers, UserLogInfo)
+# Number of rows read from the database and written to each snapshot file, bounding the memory used for large layers
+SNAPSHOT_PART_ROWS = 100_000
+
+
+class SnapshotFormat(StrEnum):
+    """
+    Enum defining the file format that layer tables are written to in a snapshot.
+    Metadata tables are always written to GeoParquet, since FlatGeobuf cannot store their array columns.
+
+    Attributes
+    ----------
+    GEOPARQUET : str
+        GeoParquet, which is compact and fast to read.
+    FLATGEOBUF : str
+        FlatGeobuf, which can be opened directly by desktop GIS software.
+    """
+
+    GEOPARQUET = "geoparquet"
+    FLATGEOBUF = "flatgeobuf"
+
+    @property
+    def suffix(self) -> str:
+        """
+        Find the file extension of the format.
+
+        Returns
+        -------
+        str
+            The file extension, including the leading dot.
+        """
+        return {SnapshotFormat.GEOPARQUET: ".parquet", SnapshotFormat.FLATGEOBUF: ".fgb"}[self]
+
+
+class SnapshotIntegrityError(Exception):
+    """Exception raised when a snapshot file is missing or does not match its manifest entry."""
+
+
+def _get_geometry_column(conn: Connection, table_name: str) -> Optional[str]:
+    """
+    Find the name of the geometry column of a table.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    table_name : str
+        The name of the table.
+
+    Returns
+    -------
+    Optional[str]
+        The name of the geometry column, or None if the table has no geometry column.
+    """
+    return conn.execute(text("""
+        SELECT f_geometry_column
+        FROM geometry_columns
+        WHERE f_table_schema = 'public' AND f_table_name = :table_name
+        LIMIT 1;
+    """), {"table_name": table_name}).scalar()
+
+
+def write_table_file(table_data: pd.DataFrame, file_path: pathlib.Path, snapshot_format: SnapshotFormat) -> None:
+    """
+    Write the contents of a table to a snapshot file.
+
+    Parameters
+    ----------
+    table_data : pd.DataFrame
+        The contents of the table, as a GeoDataFrame if it has a geometry column.
+    file_path : pathlib.Path
+        The path of the file to write.
+    snapshot_format : SnapshotFormat
+        The format to write the file in.
+    """
+    if snapshot_format == SnapshotFormat.FLATGEOBUF:
+        table_data.to_file(file_path, driver="FlatGeobuf")
+    else:
+        table_data.to_parquet(file_path, index=False)
+
+
+def read_table_file(file_path: pathlib.Path, snapshot_format: SnapshotFormat, spatial: bool) -> pd.DataFrame:
+    """
+    Read the contents of a table from a snapshot file.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        The path of the file to read.
+    snapshot_format : SnapshotFormat
+        The format the file was written in.
+    spatial : bool
+        Whether the table has a geometry column.
+
+    Returns
+    -------
+    pd.DataFrame
+        The contents of the table, as a GeoDataFrame if it has a geometry column.
+    """
+    if snapshot_format == SnapshotFormat.FLATGEOBUF:
+        return gpd.read_file(file_path)
+    if spatial:
+        return gpd.read_parquet(file_path)
+    return pd.read_parquet(file_path)
+
+
+def _read_table_parts(conn: Connection, table_name: str, geometry_column: Optional[str]) -> Iterator[pd.DataFrame]:
+    """
+    Read the contents of a table in parts of at most SNAPSHOT_PART_ROWS rows, through a server-side cursor.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database. It must be within a transaction, since server-side cursors
+        cannot be used in autocommit mode.
+    table_name : str
+        The name of the table to read.
+    geometry_column : Optional[str]
+        The name of the geometry column of the table, or None if the table has no geometry column.
+
+    Returns
+    -------
+    Iterator[pd.DataFrame]
+        The parts of the table, as GeoDataFrames if it has a geometry column. An empty table is read as a single empty
+        part, so that its columns are still exported.
+    """
+    query = text(f'SELECT * FROM "{table_name}";').execution_options(stream_results=True)
+    if geometry_column is None:
+        return pd.read_sql(query, conn, chunksize=SNAPSHOT_PART_ROWS)
+    return gpd.read_postgis(query, conn, geom_col=geometry_column, chunksize=SNAPSHOT_PART_ROWS)
+
+
+def _export_table(
+    conn: Connection,
+    table_name: str,
+    snapshot_dir: pathlib.Path,
+    snapshot_format: SnapshotFormat
+) -> Dict[str, Any]:
+    """
+    Export a single table to a directory of snapshot files, one per part of the table.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database. It must be within a transaction.
+    table_name : str
+        The name of the table to export.
+    snapshot_dir : pathlib.Path
+        The directory of the snapshot.
+    snapshot_format : SnapshotFormat
+        The format to write the table in.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The manifest entry of the table.
+    """
+    geometry_column = _get_geometry_column(conn, table_name)
+    if geometry_column is None:
+        # Tables without geometry cannot be written to FlatGeobuf
+        snapshot_format = SnapshotFormat.GEOPARQUET
+    table_dir = snapshot_dir / table_name
+    table_dir.mkdir(exist_ok=True)
+    files = []
+    for part_number, table_data in enumerate(_read_table_parts(conn, table_name, geometry_column)):
+        file_path = table_dir / f"{part_number:05d}{snapshot_format.suffix}"
+        write_table_file(table_data, file_path, snapshot_format)
+        files.append({
+            "file_name": file_path.relative_to(snapshot_dir).as_posix(),
+            "row_count": len(table_data),
+            "sha256": get_file_hash(file_path),
+        })
+    row_count = sum(file["row_count"] for file in files)
+    log.info(f"Exported {row_count} rows of '{table_name}' to {len(files)} files in '{table_dir}'.")
+    return {
+        "table_name": table_name,
+        "format": snapshot_format,
+        "geometry_column": geometry_column,
+        "row_count": row_count,
+        "files": files,
+    }
+
+
+def export_snapshot(
+    conn: Connection,
+    snapshot_dir: pathlib.Path,
+    snapshot_format: SnapshotFormat = SnapshotFormat.GEOPARQUET
+) -> Dict[str, Any]:
+    """
+    Export the metadata tables and every ingested layer table to a snapshot directory, with a manifest.
+    The tables are read within a single REPEATABLE READ transaction on a new connection, which lets them be streamed
+    through server-side cursors and keeps the snapshot consistent while layers are being ingested.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    snapshot_dir : pathlib.Path
+        The directory to write the snapshot to. It is created if it does not exist.
+    snapshot_format : SnapshotFormat = SnapshotFormat.GEOPARQUET
+        The format to write layer tables in. Defaults to GeoParquet.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The manifest of the snapshot.
+    """
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    for table in METADATA_TABLES:
+        create_table(conn, table)
+    with conn.engine.connect() as export_conn:
+        export_conn.execution_options(isolation_level="REPEATABLE READ")
+        with export_conn.begin():
+            layer_table_names = pd.read_sql(
+                text(f"SELECT DISTINCT table_name FROM {GeospatialLayers.__tablename__} ORDER BY table_name;"),
+                export_conn
+            )["table_name"]
+            entries = [
+                _export_table(export_conn, table.__tablename__, snapshot_dir, SnapshotFormat.GEOPARQUET)
+                for table in METADATA_TABLES
+            ]
+            for table_name in layer_table_names:
+                if check_table_exists(export_conn, table_name):
+                    entries.append(_export_table(export_conn, table_name, snapshot_dir, snapshot_format))
+                else:
+                    log.info(f"Not exporting '{table_name}' since it has not been ingested.")
+    manifest = {
+        "manifest_version": MANIFEST_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "tables": entries,
+    }
+    (snapshot_dir / MANIFEST_FILE_NAME).write_text(json.dumps(manifest, indent=2))
+    log.info(f"Exported {len(entries)} tables to snapshot '{snapshot_dir}'.")
+    return manifest
+
+
+def read_manifest(snapshot_dir: pathlib.Path) -> Dict[str, Any]:
+    """
+    Read the manifest of a snapshot, and check that every file it lists is present and unchanged.
+
+    Parameters
+    ----------
+    snapshot_dir : pathlib.Path
+        The directory of the snapshot.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The manifest of the snapshot.
+
+    Raises
+    ------
+    SnapshotIntegrityError
+        If the manifest version is not supported, or a file is missing or does not match its checksum.
+    """
+    manifest = json.loads((snapshot_dir / MANIFEST_FILE_NAME).read_text())
+    if manifest.get("manifest_version") != MANIFEST_VERSION:
+        raise SnapshotIntegrityError(f"Unsupported snapshot manifest version {manifest.get('manifest_version')}.")
+    for entry in manifest["tables"]:
+        for file in entry["files"]:
+            file_path = snapshot_dir / file["file_name"]
+            if not file_path.is_file():
+                raise SnapshotIntegrityError(f"Snapshot file '{file_path}' is missing.")
+            if get_file_hash(file_path) != file["sha256"]:
+                raise SnapshotIntegrityError(f"Snapshot file '{file_path}' does not match its checksum.")
+    return manifest
+
+
+def _read_entry_parts(snapshot_dir: pathlib.Path, entry: Dict[str, Any]) -> Iterator[pd.DataFrame]:
+    """
+    Read the parts of a table from its snapshot files, one file at a time.
+
+    Parameters
+    ----------
+    snapshot_dir : pathlib.Path
+        The directory of the snapshot.
+    entry : Dict[str, Any]
+        The manifest entry of the table.
+
+    Yields
+    ------
+    pd.DataFrame
+        The parts of the table, as GeoDataFrames with the exported geometry column name if it has a geometry column.
+    """
+    geometry_column = entry["geometry_column"]
+    for file in entry["files"]:
+        table_data = read_table_file(
+            snapshot_dir / file["file_name"], SnapshotFormat(entry["format"]), geometry_column is not None
+        )
+        if geometry_column is not None and table_data.geometry.name != geometry_column:
+            table_data = table_data.rename_geometry(geometry_column)
+        yield table_data
+
+
+def _import_metadata_table(
+    conn: Connection,
+    table_parts: Iterator[pd.DataFrame],
+    table: Type[Base],
+    replace: bool
+) -> bool:
+    """
+    Import a metadata table into the table created by its model.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    table_parts : Iterator[pd.DataFrame]
+        The parts of the table read from the snapshot.
+    table : Type[Base]
+        Class representing the table.
+    replace : bool
+        Whether to replace existing rows. If False, the table is skipped if it has any rows.
+
+    Returns
+    -------
+    bool
+        True if the table was imported, False if it was skipped.
+    """
+    table_name = table.__tablename__
+    create_table(conn, table)
+    if replace:
+        conn.execute(text(f'DELETE FROM "{table_name}";'))
+    elif conn.execute(text(f'SELECT EXISTS (SELECT 1 FROM "{table_name}");')).scalar():
+        log.info(f"Not importing '{table_name}' since it already has rows.")
+        return False
+    for table_data in table_parts:
+        # Let the database assign primary keys, so that its sequences continue from the imported rows
+        table_data = table_data.drop(columns=["unique_id"], errors="ignore")
+        # Parquet reads array columns as numpy arrays, which the database driver cannot adapt
+        for column in table.__table__.columns:
+            if isinstance(column.type, ARRAY) and column.name in table_data:
+                table_data[column.name] = table_data[column.name].map(list)
+        if isinstance(table_data, gpd.GeoDataFrame):
+            table_data.to_postgis(table_name, conn, index=False, if_exists="append")
+        else:
+            table_data.to_sql(table_name, conn, index=False, if_exists="append")
+    return True
+
+
+def _import_layer_table(conn: Connection, table_name: str, table_parts: Iterator[pd.DataFrame]) -> None:
+    """
+    Import a layer table, replacing it if it already exists.
+    Each part is written with a single COPY, which geopandas uses to write to PostGIS.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    table_name : str
+        The name of the table to import.
+    table_parts : Iterator[pd.DataFrame]
+        The parts of the table read from the snapshot.
+    """
+    if_exists = "replace"
+    for table_data in table_parts:
+        table_data.to_postgis(table_name, conn, index=False, if_exists=if_exists)
+        if_exists = "append"
+
+
+def import_snapshot(conn: Connection, snapshot_dir: pathlib.Path, replace: bool = False, publish: bool = True) -> None:
+    """
+    Import the tables of a snapshot into the database, and publish the layer tables in GeoServer.
+    Every table is imported within a single transaction on a new connection, so an import that fails part way through,
+    including one that replaces existing tables, leaves the database as it was.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    snapshot_dir : pathlib.Path
+        The directory of the snapshot.
+    replace : bool = False
+        Whether to replace tables that already exist. If False, existing tables are kept.
+    publish : bool = True
+        Whether to publish imported layer tables in GeoServer.
+
+    Raises
+    ------
+    SnapshotIntegrityError
+        If the snapshot is incomplete or has been modified since it was exported.
+    """
+    manifest = read_manifest(snapshot_dir)
+    metadata_tables = {table.__tablename__: table for table in METADATA_TABLES}
+    imported_layers: List[str] = []
+    with conn.engine.connect() as import_conn:
+        import_conn.execution_options(isolation_level="READ COMMITTED")
+        with import_conn.begin():
+            for entry in manifest["tables"]:
+                table_name = entry["table_name"]
+                table_parts = _read_entry_parts(snapshot_dir, entry)
+                log.info(f"Importing {entry['row_count']} rows of '{table_name}'.")
+                if table_name in metadata_tables:
+                    _import_metadata_table(import_conn, table_parts, metadata_tables[table_name], replace)
+                elif replace or not check_table_exists(import_conn, table_name):
+                    _import_layer_table(import_conn, table_name, table_parts)
+                    imported_layers.append(table_name)
+                else:
+                    log.info(f"Not importing '{table_name}' since it already exists.")
+    # Statistics and GeoServer layers are only updated once the imported tables have been committed
+    for table_name in imported_layers:
+        layer_statistics.update_vector_layer_statistics(conn, gs.Workspaces.INPUT_LAYERS_WORKSPACE, table_name)
+    if publish and imported_layers:
+        workspace_name = gs.Workspaces.INPUT_LAYERS_WORKSPACE
+        data_store = gs.create_main_db_store(workspace_name)
+        for table_name in imported_layers:
+            gs.create_datastore_layer(conn, workspace_name, data_store, table_name)
+    log.info(f"Imported snapshot '{snapshot_dir}' created at {manifest['created_at']}.")
+
+
+def main() -> None:
+    """Export or import a snapshot from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export the database tables to a snapshot.")
+    export_parser.add_argument("snapshot_dir", type=pathlib.Path)
+    export_parser.add_argument("--format", type=SnapshotFormat, choices=list(SnapshotFormat),
+                               default=SnapshotFormat.GEOPARQUET, help="The file format of layer tables.")
+    import_parser = subparsers.add_parser("import", help="Import a snapshot into the database.")
+    import_parser.add_argument("snapshot_dir", type=pathlib.Path)
+    import_parser.add_argument("--replace", action="store_true", help="Replace tables that already exist.")
+    import_parser.add_argument("--no-publish", dest="publish", action="store_false",
+                               help="Do not publish imported layers in GeoServer.")
+    args = parser.parse_args()
+
+    setup_logging(LogLevel.INFO)
+    engine = setup_environment.get_database()
+    with engine.connect() as conn:
+        if args.command == "export":
+            export_snapshot(conn, args.snapshot_dir, args.format)
+        else:
+            import_snapshot(conn, args.snapshot_dir, args.replace, args.publish)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tracks the static files that have been loaded into the database and published, in the 'static_file_manifest' table.
+Lets unchanged static files be skipped without re-reading them.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import pathlib
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection, Row
+
+from eddie.digitaltwin.tables import StaticFileManifest, create_table
+from eddie.digitaltwin.utils import get_file_hash
+
+
+@dataclass(frozen=True)
+class StaticFileState:
+    """
+    The state of a static file on disk, and what it is published as.
+
+    Attributes
+    ----------
+    file_path : pathlib.Path
+        Path to the static file.
+    file_size : int
+        Size of the file in bytes.
+    modified_time : float
+        Modification timestamp of the file.
+    content_hash : str
+        SHA-256 hash of the file contents.
+    target_name : str
+        Name of the database table or GeoServer store the file is loaded into.
+    workspace_name : str
+        Name of the GeoServer workspace the file is published to.
+    """
+
+    file_path: pathlib.Path
+    file_size: int
+    modified_time: float
+    content_hash: str
+    target_name: str
+    workspace_name: str
+
+
+def read_manifest(conn: Connection) -> dict[str, Row]:
+    """
+    Read every entry of the static file manifest.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+
+    Returns
+    -------
+    dict[str, Row]
+        Maps the posix path of each static file to its manifest entry.
+    """
+    create_table(conn, StaticFileManifest)
+    rows = conn.execute(select(StaticFileManifest.__table__)).fetchall()
+    return {row.file_path: row for row in rows}
+
+
+def get_static_file_state(
+    file_path: pathlib.Path,
+    workspace_name: str,
+    manifest_entry: Optional[Row]
+) -> StaticFileState:
+    """
+    Find the current state of a static file.
+    The file contents are only hashed if its size or modification time differs from its manifest entry.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        Path to the static file.
+    workspace_name : str
+        Name of the GeoServer workspace the file is published to.
+    manifest_entry : Optional[Row]
+        The manifest entry recorded for the file, or None if it has not been recorded.
+
+    Returns
+    -------
+    StaticFileState
+        The current state of the file.
+    """
+    file_stat = file_path.stat()
+    if (manifest_entry is not None and
+            manifest_entry.file_size == file_stat.st_size and
+            manifest_entry.modified_time == file_stat.st_mtime):
+        content_hash = manifest_entry.content_hash
+    else:
+        content_hash = get_file_hash(file_path)
+    return StaticFileState(file_path, file_stat.st_size, file_stat.st_mtime, content_hash, file_path.stem,
+                           workspace_name)
+
+
+def is_unchanged(file_state: StaticFileState, manifest_entry: Optional[Row]) -> bool:
+    """
+    Check if a static file has been published with its current contents.
+
+    Parameters
+    ----------
+    file_state : StaticFileState
+        The current state of the file.
+    manifest_entry : Optional[Row]
+        The manifest entry recorded for the file, or None if it has not been recorded.
+
+    Returns
+    -------
+    bool
+        True if the file was successfully published with the same contents, to the same target.
+    """
+    return (manifest_entry is not None and
+            manifest_entry.published and
+            manifest_entry.content_hash == file_state.content_hash and
+            manifest_entry.target_name == file_state.target_name and
+            manifest_entry.workspace_name == file_state.workspace_name)
+
+
+def write_manifest(conn: Connection, file_states: list[StaticFileState], published: bool = True) -> None:
+    """
+    Insert or update manifest entries for static files.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    file_states : list[StaticFileState]
+        The states of the files to record.
+    published : bool = True
+        True if the files have been successfully loaded and published.
+    """
+    if not file_states:
+        return
+    create_table(conn, StaticFileManifest)
+    updated_at = datetime.now(timezone.utc)
+    query = insert(StaticFileManifest).values([
+        {
+            "file_path": file_state.file_path.as_posix(),
+            "file_size": file_state.file_size,
+            "modified_time": file_state.modified_time,
+            "content_hash": file_state.content_hash,
+            "target_name": file_state.target_name,
+            "workspace_name": file_state.workspace_name,
+            "published": published,
+            "updated_at": updated_at,
+        } for file_state in file_states
+    ])
+    query = query.on_conflict_do_update(
+        index_elements=[StaticFileManifest.file_path],
+        set_={column: query.excluded[column] for column in (
+            "file_size", "modified_time", "content_hash", "target_name", "workspace_name", "published", "updated_at"
+        )}
+    )
+    conn.execute(query)
+
+
+def delete_manifest_entries(conn: Connection, file_paths: Iterable[str]) -> None:
+    """
+    Delete the manifest entries of static files that no longer exist.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    file_paths : Iterable[str]
+        The posix paths of the deleted files.
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return
+    conn.execute(delete(StaticFileManifest).where(StaticFileManifest.file_path.in_(file_paths)))
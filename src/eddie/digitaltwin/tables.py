@@ -20,7 +20,7 @@
 from datetime import datetime, timezone
 
 from geoalchemy2 import Geometry
-from sqlalchemy import Column, DateTime, inspect, Integer, String
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, inspect, Integer, String
 from sqlalchemy.dialects.postgresql import ARRAY, JSON
 from sqlalchemy.engine import Connection
 from sqlalchemy.ext.declarative import declarative_base
@@ -125,6 +125,123 @@ class CacheResults(Base):
     geometry = Column(Geometry("POLYGON", srid=2193))
 
 
+class StaticFileManifest(Base):
+    """
+    Class representing the 'static_file_manifest' table.
+    Records the state of each static file when it was last loaded and published, so unchanged files can be skipped.
+
+    Attributes
+    ----------
+    __tablename__ : str
+        Name of the database table.
+    file_path : str
+        Path to the static file (primary key).
+    file_size : int
+        Size of the file in bytes when it was last loaded.
+    modified_time : float
+        Modification timestamp of the file when it was last loaded.
+    content_hash : str
+        SHA-256 hash of the file contents when it was last loaded.
+    target_name : str
+        Name of the database table or GeoServer store the file was loaded into.
+    workspace_name : str
+        Name of the GeoServer workspace the file was published to.
+    published : bool
+        True if the file was successfully loaded and published.
+    updated_at : datetime
+        Timestamp indicating when the entry was last updated.
+    """  # pylint: disable=too-few-public-methods
+
+    __tablename__ = "static_file_manifest"
+    file_path = Column(String, primary_key=True)
+    file_size = Column(BigInteger, nullable=False)
+    modified_time = Column(Float, nullable=False)
+    content_hash = Column(String, nullable=False)
+    target_name = Column(String, nullable=False)
+    workspace_name = Column(String, nullable=False)
+    published = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+                        comment="entry updated datetime")
+
+
+class LayerStatistics(Base):
+    """
+    Class representing the 'layer_statistics' table.
+    Records summary statistics of each published layer when it is ingested, to describe the layer to map clients.
+
+    Attributes
+    ----------
+    __tablename__ : str
+        Name of the database table.
+    workspace_name : str
+        Name of the GeoServer workspace the layer is published in (primary key).
+    layer_name : str
+        Name of the database table or GeoServer layer (primary key).
+    geometry_type : str
+        Geometry type of the layer's features, or "Raster" for raster layers.
+    feature_count : int
+        Number of features in the layer, or None for raster layers.
+    size_bytes : int
+        Size of the database table including indexes, or of the raster file.
+    resolution : float
+        Size of each raster pixel in metres, or None for vector layers.
+    xmin : float
+        Western extent of the layer in WGS84 longitude.
+    ymin : float
+        Southern extent of the layer in WGS84 latitude.
+    xmax : float
+        Eastern extent of the layer in WGS84 longitude.
+    ymax : float
+        Northern extent of the layer in WGS84 latitude.
+    updated_at : datetime
+        Timestamp indicating when the entry was last updated.
+    """  # pylint: disable=too-few-public-methods
+
+    __tablename__ = "layer_statistics"
+    workspace_name = Column(String, primary_key=True)
+    layer_name = Column(String, primary_key=True)
+    geometry_type = Column(String)
+    feature_count = Column(BigInteger)
+    size_bytes = Column(BigInteger)
+    resolution = Column(Float)
+    xmin = Column(Float)
+    ymin = Column(Float)
+    xmax = Column(Float)
+    ymax = Column(Float)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+                        comment="entry updated datetime")
+
+
+class NzBoundary(Base):
+    """
+    Class representing the 'nz_boundary' table.
+    Stores the boundary of New Zealand, derived from the 'region_geometry' table, so that it is only computed once.
+
+    Attributes
+    ----------
+    __tablename__ : str
+        Name of the database table.
+    boundary_id : int
+        Identifier of the boundary (primary key). There is only ever one boundary, with id 1.
+    source_signature : str
+        Signature of the 'region_geometry' table the boundary was computed from, used to detect changes to it.
+    geometry : Polygon
+        The largest polygon of the union of all regions, i.e. the mainland boundary.
+    simplified_geometry : Polygon
+        The geometry simplified by NZ_BOUNDARY_SIMPLIFY_TOLERANCE metres, or None if simplification is disabled.
+    updated_at : datetime
+        Timestamp indicating when the boundary was last computed.
+    """  # pylint: disable=too-few-public-methods
+
+    __tablename__ = "nz_boundary"
+    boundary_id = Column(Integer, primary_key=True)
+    source_signature = Column(String, nullable=False)
+    geometry = Column(Geometry("POLYGON", srid=2193), nullable=False)
+    simplified_geometry = Column(Geometry("POLYGON", srid=2193))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+                        comment="entry updated datetime")
+
+
 def create_table(conn: Connection, table: Base) -> None:
     """
     Create a table in the database if it doesn't already exist, using the provided conn.
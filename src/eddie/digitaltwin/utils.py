@@ -17,17 +17,26 @@
 
 """This script provides utility functions for logging configuration and geospatial data manipulation."""
 
-from enum import IntEnum
+from dataclasses import dataclass, replace
+from enum import IntEnum, StrEnum
+import hashlib
 import inspect
 import logging
 import pathlib
+import threading
 import time
 from typing import Callable, Tuple, Type, TypeVar
 import warnings
 
 import geopandas as gpd
+import shapely
+from sqlalchemy import text
 from sqlalchemy.engine import Connection
 
+from eddie import process_pool
+from eddie.config import EnvVariable
+from eddie.digitaltwin.tables import NzBoundary, create_table
+
 log = logging.getLogger(__name__)
 
 
@@ -141,9 +150,203 @@ def get_catchment_area(catchment_area: gpd.GeoDataFrame, to_crs: int = 2193) ->
     return catchment_area.to_crs(to_crs)
 
 
-def get_nz_boundary(conn: Connection, to_crs: int = 2193) -> gpd.GeoDataFrame:
+class AoiMode(StrEnum):
+    """
+    Enum defining the shape of the area of interest that data is fetched, stored and published for.
+
+    Attributes
+    ----------
+    POLYGON : str
+        Use the selected polygon exactly.
+    RECTANGLE : str
+        Use the bounding rectangle of the selected polygon in NZTM2000 (EPSG:2193).
+    """
+
+    POLYGON = "polygon"
+    RECTANGLE = "rectangle"
+
+
+def get_aoi_mode() -> AoiMode:
+    """
+    Read the configured area of interest mode.
+
+    Returns
+    -------
+    AoiMode
+        The mode set by the AOI_MODE environment variable.
+    """
+    return AoiMode(EnvVariable.AOI_MODE.lower())
+
+
+def create_area_of_interest(selected_polygon: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Create the area of interest for a selected polygon, in NZTM2000 (EPSG:2193) and shaped by the AOI_MODE.
+
+    Parameters
+    ----------
+    selected_polygon : gpd.GeoDataFrame
+        A GeoDataFrame containing the polygon selected by the user, in any CRS.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        A GeoDataFrame containing the area of interest as a single Polygon in EPSG:2193.
+    """
+    selected_polygon_2193 = selected_polygon.to_crs(2193)
+    if get_aoi_mode() == AoiMode.RECTANGLE:
+        # Recalculate the bounds to ensure it is a rectangle.
+        geometry = shapely.box(*selected_polygon_2193.total_bounds)
+    else:
+        # Repair self-intersections from hand-drawn polygons, dropping any parts that collapse to lines or points
+        valid_geometry = shapely.make_valid(selected_polygon_2193.geometry.values, method="structure",
+                                            keep_collapsed=False)
+        geometry = shapely.union_all(valid_geometry)
+        if geometry.geom_type != "Polygon":
+            # Areas of interest are stored in POLYGON columns, so cover multipart selections with a single polygon
+            log.info(f"Selected area of interest is a {geometry.geom_type}, using its convex hull instead.")
+            geometry = geometry.convex_hull
+    return gpd.GeoDataFrame(index=[0], crs="epsg:2193", geometry=[geometry])
+
+
+def filter_to_area_of_interest(vector_data: gpd.GeoDataFrame, area_of_interest: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Keep only the features that intersect the area of interest, for providers that can only filter by a rectangle.
+    Features are kept whole rather than clipped, so that features crossing the edge match those already stored.
+
+    Parameters
+    ----------
+    vector_data : gpd.GeoDataFrame
+        A GeoDataFrame containing the fetched vector data.
+    area_of_interest : gpd.GeoDataFrame
+        A GeoDataFrame representing the area of interest.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        The features of vector_data that intersect the area of interest.
+    """
+    if vector_data.empty:
+        return vector_data
+    aoi_geometry = area_of_interest.to_crs(vector_data.crs).union_all()
+    # Prepare the area of interest once, since it is tested against every feature
+    shapely.prepare(aoi_geometry)
+    return vector_data[vector_data.intersects(aoi_geometry)].reset_index(drop=True)
+
+
+def _get_region_geometry_signature(conn: Connection) -> str:
+    """
+    Find a signature of the 'region_geometry' table that changes whenever its rows change or it is replaced.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+
+    Returns
+    -------
+    str
+        The table's object id, row count, and latest transaction id to modify its rows.
+    """
+    table_oid, row_count, max_xmin = conn.execute(text("""
+        SELECT CAST('region_geometry'::regclass AS oid), count(*), max(CAST(CAST(xmin AS text) AS bigint))
+        FROM region_geometry;
+    """)).one()
+    return f"{table_oid}:{row_count}:{max_xmin}"
+
+
+def _build_nz_boundary(conn: Connection, source_signature: str) -> None:
+    """
+    Compute the boundary of New Zealand from the 'region_geometry' table within the database, and store it in the
+    'nz_boundary' table.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    source_signature : str
+        The signature of the 'region_geometry' table the boundary is computed from.
+    """
+    log.info("Computing the New Zealand boundary from 'region_geometry'.")
+    create_table(conn, NzBoundary)
+    conn.execute(text(f"""
+        INSERT INTO {NzBoundary.__tablename__}
+            (boundary_id, source_signature, geometry, simplified_geometry, updated_at)
+        SELECT 1, :source_signature, geom,
+               CASE WHEN :tolerance > 0 THEN ST_SimplifyPreserveTopology(geom, :tolerance) END,
+               now()
+        FROM (SELECT ST_Transform((ST_Dump(ST_Union(geometry))).geom, 2193) AS geom FROM region_geometry) AS parts
+        ORDER BY ST_Area(geom) DESC
+        LIMIT 1
+        ON CONFLICT (boundary_id) DO UPDATE SET
+            source_signature = EXCLUDED.source_signature,
+            geometry = EXCLUDED.geometry,
+            simplified_geometry = EXCLUDED.simplified_geometry,
+            updated_at = EXCLUDED.updated_at;
+    """), {"source_signature": source_signature, "tolerance": EnvVariable.NZ_BOUNDARY_SIMPLIFY_TOLERANCE})
+
+
+def _read_nz_boundary(conn: Connection, source_signature: str, simplified: bool) -> gpd.GeoDataFrame:
+    """
+    Read the stored boundary of New Zealand, computing it first if it is missing or out of date.
+
+    Parameters
+    ----------
+    conn : Connection
+        The connection used to connect to the database.
+    source_signature : str
+        The current signature of the 'region_geometry' table.
+    simplified : bool
+        Whether to read the simplified boundary, if there is one.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        A GeoDataFrame representing the boundary of New Zealand in EPSG:2193.
+    """
+    create_table(conn, NzBoundary)
+    geometry_column = "COALESCE(simplified_geometry, geometry)" if simplified else "geometry"
+    query = text(f"""
+        SELECT {geometry_column} AS geometry, ST_Area(geometry) AS geometry_area
+        FROM {NzBoundary.__tablename__}
+        WHERE boundary_id = 1 AND source_signature = :source_signature;
+    """).bindparams(source_signature=source_signature)
+    nz_boundary = gpd.GeoDataFrame.from_postgis(query, conn, geom_col="geometry")
+    if nz_boundary.empty:
+        _build_nz_boundary(conn, source_signature)
+        nz_boundary = gpd.GeoDataFrame.from_postgis(query, conn, geom_col="geometry")
+    return nz_boundary
+
+
+@dataclass
+class _MemoisedBoundary:
+    """
+    A boundary of New Zealand kept in memory, with the signature of the 'region_geometry' table it was computed from.
+
+    Attributes
+    ----------
+    source_signature : str
+        The signature of the 'region_geometry' table the boundary was computed from.
+    boundary : gpd.GeoDataFrame
+        The boundary, in the CRS it was requested in.
+    checked_at : float
+        Monotonic time that the signature was last checked against the database.
+    """
+
+    source_signature: str
+    boundary: gpd.GeoDataFrame
+    checked_at: float
+
+
+_memoised_boundaries: dict[Tuple[int, bool], _MemoisedBoundary] = {}
+_memoised_boundaries_lock = threading.Lock()
+
+
+def get_nz_boundary(conn: Connection, to_crs: int = 2193, simplified: bool = False) -> gpd.GeoDataFrame:
     """
     Get the boundary of New Zealand in the specified Coordinate Reference System (CRS).
+    The boundary is computed once and stored in the 'nz_boundary' table, and is kept in memory for each CRS.
+    It is only recomputed when the 'region_geometry' table changes, which is checked at most every NZ_BOUNDARY_CACHE_TTL
+    seconds.
 
     Parameters
     ----------
@@ -151,23 +354,56 @@ def get_nz_boundary(conn: Connection, to_crs: int = 2193) -> gpd.GeoDataFrame:
         The connection used to connect to the database.
     to_crs : int = 2193
         Coordinate Reference System (CRS) code to which the boundary will be converted. Default is 2193.
+    simplified : bool = False
+        Whether to get the boundary simplified by NZ_BOUNDARY_SIMPLIFY_TOLERANCE metres, which is much faster to use in
+        spatial operations. Default is False.
 
     Returns
     -------
     gpd.GeoDataFrame
         A GeoDataFrame representing the boundary of New Zealand in the specified CRS.
     """
-    # Query the 'region_geometry' table from the database
-    query = "SELECT * FROM region_geometry;"
-    region_geometry = gpd.GeoDataFrame.from_postgis(query, conn, geom_col="geometry")
-    # Dissolve and explode the geometries to get the boundary of New Zealand
-    nz_boundary = region_geometry.dissolve(aggfunc="sum").explode(index_parts=True).reset_index(level=0, drop=True)
-    # Calculate the area of each geometry and sort them in descending order
-    nz_boundary["geometry_area"] = nz_boundary["geometry"].area
-    nz_boundary = nz_boundary.sort_values(by="geometry_area", ascending=False).head(1)
-    # Convert to the desired coordinate reference system (CRS)
-    nz_boundary = nz_boundary.to_crs(to_crs)
-    return nz_boundary
+    key = (to_crs, simplified)
+    with _memoised_boundaries_lock:
+        memoised = _memoised_boundaries.get(key)
+    if memoised is not None and time.monotonic() - memoised.checked_at < EnvVariable.NZ_BOUNDARY_CACHE_TTL:
+        # A shallow copy is enough to stop callers changing the memoised boundary, since geometries are immutable
+        return memoised.boundary.copy(deep=False)
+
+    source_signature = _get_region_geometry_signature(conn)
+    if memoised is None or memoised.source_signature != source_signature:
+        nz_boundary = _read_nz_boundary(conn, source_signature, simplified)
+        # Convert to the desired coordinate reference system (CRS)
+        nz_boundary = process_pool.to_crs(nz_boundary, to_crs)
+        memoised = _MemoisedBoundary(source_signature, nz_boundary, time.monotonic())
+    else:
+        memoised = replace(memoised, checked_at=time.monotonic())
+    with _memoised_boundaries_lock:
+        _memoised_boundaries[key] = memoised
+    return memoised.boundary.copy(deep=False)
+
+
+def get_file_hash(file_path: pathlib.Path, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Calculate the SHA-256 hash of a file's contents, reading the file in chunks to limit memory use.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        The path to the file to hash.
+    chunk_size : int = 1048576
+        The number of bytes to read at a time.
+
+    Returns
+    -------
+    str
+        The hexadecimal SHA-256 digest of the file contents.
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
 
 
 # Generic type definitions to allow any function to be passed to retry_function
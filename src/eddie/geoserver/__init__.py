@@ -21,18 +21,28 @@ Imports here are accessible directly by `from eddie import geoserver`.
 """
 from .database_layers import create_datastore_layer, create_db_store_if_not_exists, create_main_db_store
 from .geoserver_common import create_workspace_if_not_exists, get_geoserver_url
+from .mosaic_layers import add_gtiff_to_mosaic
 from .raster_layers import add_gtiff_to_geoserver, add_style, style_exists
-from .terria_catalogs import Workspaces, get_terria_catalog
+from .reconcile import ChangeKind, CoverageSpec, DesiredState, ReconcileReport, StyleSpec, reconcile_geoserver
+from .terria_catalogs import Workspaces, get_cached_terria_catalog, get_terria_catalog
 
 __all__ = [
     "add_gtiff_to_geoserver",
+    "add_gtiff_to_mosaic",
     "add_style",
+    "ChangeKind",
+    "CoverageSpec",
     "create_datastore_layer",
     "create_db_store_if_not_exists",
     "create_main_db_store",
     "create_workspace_if_not_exists",
+    "DesiredState",
+    "get_cached_terria_catalog",
     "get_geoserver_url",
     "get_terria_catalog",
+    "reconcile_geoserver",
+    "ReconcileReport",
+    "StyleSpec",
     "Workspaces",
     "style_exists"
 ]
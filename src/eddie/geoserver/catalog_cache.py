@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Caches the TerriaJS catalog so that serving it does not query GeoServer on every request.
+The catalog is rebuilt when any process publishes or deletes a layer, tracked by a version number in the message broker,
+and is refreshed in the background once it is older than its time-to-live.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import redis
+
+from eddie.message_broker import get_redis_client
+
+log = logging.getLogger(__name__)
+
+CATALOG_VERSION_KEY = "eddie:terria_catalog_version"
+
+
+def bump_catalog_version() -> None:
+    """
+    Mark every process's cached catalog as out of date, after a layer has been published or deleted.
+    Failing to reach the message broker is logged rather than raised, so that publishing layers does not depend on it.
+    """
+    try:
+        get_redis_client().incr(CATALOG_VERSION_KEY)
+    except redis.RedisError as e:
+        log.warning(f"Could not invalidate cached Terria catalogs: {e}")
+
+
+def get_catalog_version() -> Optional[int]:
+    """
+    Read the current catalog version from the message broker.
+
+    Returns
+    -------
+    Optional[int]
+        The catalog version, or None if the message broker cannot be reached.
+    """
+    try:
+        version = get_redis_client().get(CATALOG_VERSION_KEY)
+    except redis.RedisError as e:
+        log.warning(f"Could not read Terria catalog version: {e}")
+        return None
+    return int(version) if version is not None else 0
+
+
+@dataclass(frozen=True)
+class CachedCatalog:
+    """
+    A serialised TerriaJS catalog, with the metadata needed for conditional HTTP requests.
+
+    Attributes
+    ----------
+    body : bytes
+        The catalog serialised as JSON.
+    etag : str
+        Hash of the serialised catalog.
+    last_modified : datetime
+        The time the catalog contents last changed.
+    built_at : float
+        Monotonic time that the catalog was built.
+    version : Optional[int]
+        The catalog version that the catalog was built for, or None if it was unknown.
+    complete : bool
+        False if parts of the catalog were left out because they could not be read.
+    """
+
+    body: bytes
+    etag: str
+    last_modified: datetime
+    built_at: float
+    version: Optional[int]
+    complete: bool
+
+
+class CatalogCache:
+    """
+    Thread-safe cache of a serialised catalog.
+
+    A catalog built for an older catalog version is rebuilt before being served,
+    by a single thread while concurrent requests wait for it.
+    A catalog older than `ttl_seconds` is still served while it is rebuilt in a background thread.
+    A partial catalog is refreshed after the shorter `partial_ttl_seconds`, so that missing parts reappear soon.
+    """
+
+    def __init__(
+        self,
+        build_catalog: Callable[[], tuple[Any, bool]],
+        ttl_seconds: float,
+        partial_ttl_seconds: float
+    ) -> None:
+        """
+        Create an empty cache.
+
+        Parameters
+        ----------
+        build_catalog : Callable[[], tuple[Any, bool]]
+            Function that queries GeoServer to build the JSON serialisable catalog, and whether it is complete.
+        ttl_seconds : float
+            The number of seconds a complete catalog is served for before it is refreshed in the background.
+        partial_ttl_seconds : float
+            The number of seconds a partial catalog is served for before it is refreshed in the background.
+        """
+        self._build_catalog = build_catalog
+        self._ttl_seconds = ttl_seconds
+        self._partial_ttl_seconds = partial_ttl_seconds
+        self._lock = threading.Lock()
+        # Held while building, so that the catalog is built once for concurrent requests
+        self._build_lock = threading.Lock()
+        self._refreshing = False
+        self._cached: Optional[CachedCatalog] = None
+
+    def _build(self, version: Optional[int]) -> CachedCatalog:
+        """
+        Build and store a new catalog, keeping the previous last modified time if the contents are unchanged.
+
+        Parameters
+        ----------
+        version : Optional[int]
+            The catalog version that the catalog is being built for.
+
+        Returns
+        -------
+        CachedCatalog
+            The newly built catalog.
+        """
+        catalog, complete = self._build_catalog()
+        body = json.dumps(catalog, separators=(",", ":")).encode()
+        etag = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            previous = self._cached
+            if previous is not None and previous.etag == etag:
+                last_modified = previous.last_modified
+            else:
+                # HTTP dates have a resolution of seconds
+                last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+            self._cached = CachedCatalog(body, etag, last_modified, time.monotonic(), version, complete)
+            return self._cached
+
+    def _is_current(self, cached: Optional[CachedCatalog], version: Optional[int]) -> bool:
+        """
+        Check whether a cached catalog can be served for a catalog version.
+
+        Parameters
+        ----------
+        cached : Optional[CachedCatalog]
+            The cached catalog, if any.
+        version : Optional[int]
+            The current catalog version, or None if it is unknown.
+
+        Returns
+        -------
+        bool
+            True if there is a cached catalog and it was built for the current catalog version.
+        """
+        return cached is not None and (version is None or version == cached.version)
+
+    def _refresh_in_background(self, version: Optional[int]) -> None:
+        """
+        Rebuild the catalog in a background thread, unless a refresh is already running.
+
+        Parameters
+        ----------
+        version : Optional[int]
+            The catalog version that the catalog is being built for.
+        """
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh() -> None:
+            """Rebuild the catalog, logging failures so that the stale catalog continues to be served."""
+            try:
+                with self._build_lock:
+                    self._build(version)
+            except Exception:  # pylint: disable=broad-exception-caught
+                log.exception("Failed to refresh the cached Terria catalog.")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=refresh, name="terria-catalog-refresh", daemon=True).start()
+
+    def get(self) -> CachedCatalog:
+        """
+        Retrieve the catalog, building it if it is missing or out of date.
+
+        Returns
+        -------
+        CachedCatalog
+            The cached catalog.
+        """
+        version = get_catalog_version()
+        with self._lock:
+            cached = self._cached
+        if not self._is_current(cached, version):
+            with self._build_lock:
+                # Another thread may have built the catalog while this one was waiting for the lock
+                with self._lock:
+                    cached = self._cached
+                if not self._is_current(cached, version):
+                    log.debug("Building Terria catalog.")
+                    cached = self._build(version)
+            return cached
+        ttl_seconds = self._ttl_seconds if cached.complete else self._partial_ttl_seconds
+        if time.monotonic() - cached.built_at > ttl_seconds:
+            self._refresh_in_background(version)
+        return cached
+
+    def invalidate(self) -> None:
+        """Forget the cached catalog so that it is rebuilt the next time it is needed."""
+        with self._lock:
+            self._cached = None
@@ -19,6 +19,7 @@
 
 from http import HTTPStatus
 import logging
+from typing import Optional
 
 import geopandas as gpd
 import requests
@@ -26,7 +27,15 @@ from sqlalchemy.engine import Connection
 
 from eddie.config import EnvVariable
 from eddie.digitaltwin.tables import check_table_exists
+from eddie.geoserver.catalog_cache import bump_catalog_version
 from eddie.geoserver.geoserver_common import create_workspace_if_not_exists, get_geoserver_url
+from eddie.geoserver.layer_registry import LayerRegistry
+from eddie.geoserver.vector_tiles import (
+    VectorLayerFormat,
+    enable_vector_tile_caching,
+    ensure_vector_tile_caching,
+    get_vector_layer_format
+)
 
 log = logging.getLogger(__name__)
 _xml_header = {"Content-type": "text/xml"}
@@ -34,7 +43,12 @@ _xml_header = {"Content-type": "text/xml"}
 MAIN_DB_STORE_NAME = f"{EnvVariable.POSTGRES_DB} PostGIS"
 
 
-def get_workspace_vector_layers(workspace_name: str, data_store_name: str = MAIN_DB_STORE_NAME) -> list[str]:
+def get_workspace_vector_layers(
+    workspace_name: str,
+    data_store_name: str = MAIN_DB_STORE_NAME,
+    session: Optional[requests.Session] = None,
+    timeout: Optional[float] = None
+) -> list[str]:
     """
     Retrieve all vector layer names from a geoserver workspace.
 
@@ -44,6 +58,10 @@ def get_workspace_vector_layers(workspace_name: str, data_store_name: str = MAIN
         The name of the geoserver workspace being queried.
     data_store_name : str = src.geoserver.database_layers.MAIN_DB_STORE_NAME
         The name of the geoserver data store to query.
+    session : Optional[requests.Session] = None
+        The session to send the request with, to reuse connections. If None, a new connection is made.
+    timeout : Optional[float] = None
+        The number of seconds to wait for geoserver to respond. If None, waits indefinitely.
 
     Returns
     -------
@@ -54,10 +72,13 @@ def get_workspace_vector_layers(workspace_name: str, data_store_name: str = MAIN
     -------
     HTTPError
         If geoserver responds with anything but OK, raises it as an exception since it is unexpected.
+    Timeout
+        If geoserver does not respond within the timeout.
     """
-    vector_layers_response = requests.get(
+    vector_layers_response = (session or requests).get(
         f'{get_geoserver_url()}/workspaces/{workspace_name}/datastores/{data_store_name}/featuretypes.json',
-        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD),
+        timeout=timeout
     )
     vector_layers_response.raise_for_status()
     response_data = vector_layers_response.json()
@@ -69,6 +90,12 @@ def get_workspace_vector_layers(workspace_name: str, data_store_name: str = MAIN
     return layer_names
 
 
+# Cached vector layer names for each workspace and data store, to avoid listing all layers when creating each layer.
+vector_layer_registry = LayerRegistry(
+    get_workspace_vector_layers, EnvVariable.GEOSERVER_LAYER_CACHE_TTL, on_change=bump_catalog_version
+)
+
+
 def create_datastore_layer(
     conn: Connection,
     workspace_name: str,
@@ -103,9 +130,12 @@ def create_datastore_layer(
     layer_full_name = f"{workspace_name}:{layer_name}"
     log.info(f"Creating datastore layer '{layer_full_name}' if it does not already exist.")
 
-    if layer_name in get_workspace_vector_layers(workspace_name):
+    if vector_layer_registry.contains(layer_name, workspace_name, data_store_name):
         # If the layer already exists, we don't have to add it again, and can instead return
         log.debug(f"Datastore layer '{layer_full_name}' already exists.")
+        if get_vector_layer_format() == VectorLayerFormat.MVT:
+            # The layer may have been created before vector tiles were configured
+            ensure_vector_tile_caching(workspace_name, layer_name)
         return
     # Find SRS/CRS information
     if check_table_exists(conn, layer_name):
@@ -157,12 +187,85 @@ def create_datastore_layer(
     )
     if response.status_code == HTTPStatus.CREATED:
         log.info(f"Created new datastore layer '{layer_full_name}'.")
+        vector_layer_registry.add(layer_name, workspace_name, data_store_name)
+        if get_vector_layer_format() == VectorLayerFormat.MVT:
+            enable_vector_tile_caching(workspace_name, layer_name)
     else:
         # If it does not meet the expected results then raise an error
         # Raise error manually so we can configure the text
         raise requests.HTTPError(response.text, response=response)
 
 
+def recalculate_datastore_layer_bounds(workspace_name: str, data_store_name: str, layer_name: str) -> None:
+    """
+    Recalculate the bounding boxes of an existing GeoServer datastore layer, after its underlying data has changed.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the workspace the data store is associated to
+    data_store_name : str
+        The name of the data store the layer is served from.
+    layer_name : str
+        The name of the existing layer.
+
+    Raises
+    ----------
+    HTTPError
+        If geoserver responds with an error, raises it as an exception since it is unexpected.
+    """
+    log.info(f"Recalculating bounds of datastore layer '{workspace_name}:{layer_name}'.")
+    response = requests.put(
+        f"{get_geoserver_url()}/workspaces/{workspace_name}/datastores/{data_store_name}/featuretypes/{layer_name}",
+        params={"recalculate": "nativebbox,latlonbbox"},
+        headers=_xml_header,
+        data=f"<featureType><name>{layer_name}</name><enabled>true</enabled></featureType>",
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+    )
+    if not response.ok:
+        # Raise error manually so we can configure the text
+        raise requests.HTTPError(response.text, response=response)
+
+
+def get_workspace_data_stores(workspace_name: str) -> list[str]:
+    """
+    Retrieve all data store names from a geoserver workspace.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the geoserver workspace being queried.
+
+    Returns
+    -------
+    list[str]
+        The names of each data store, or an empty list if the workspace does not exist.
+
+    Raises
+    -------
+    HTTPError
+        If geoserver responds with anything but OK or NOT_FOUND, raises it as an exception since it is unexpected.
+    """
+    data_stores_response = requests.get(
+        f'{get_geoserver_url()}/workspaces/{workspace_name}/datastores.json',
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+    )
+    if data_stores_response.status_code == HTTPStatus.NOT_FOUND:
+        # The workspace does not exist yet, so neither do any data stores
+        return []
+    data_stores_response.raise_for_status()
+    response_data = data_stores_response.json()
+    # Parse JSON structure to get list of data store names
+    top_data_store_node = response_data["dataStores"]
+    # defaults to empty list if no data stores exist
+    data_stores = top_data_store_node["dataStore"] if top_data_store_node else []
+    return [data_store["name"] for data_store in data_stores]
+
+
+# Cached data store names for each workspace, to avoid listing data stores each time a layer is published.
+data_store_registry = LayerRegistry(get_workspace_data_stores, EnvVariable.GEOSERVER_LAYER_CACHE_TTL)
+
+
 def create_db_store_if_not_exists(db_name: str, workspace_name: str, new_data_store_name: str) -> None:
     """
     Create PostGIS database store in a GeoServer workspace for a given database.
@@ -182,22 +285,9 @@ def create_db_store_if_not_exists(db_name: str, workspace_name: str, new_data_st
     HTTPError
         If geoserver responds with an error, raises it as an exception since it is unexpected.
     """
-    # Create request to check if database store already exists
     data_store_full_name = f"{new_data_store_name}:{workspace_name}"
     log.info(f"Creating datastore '{data_store_full_name}' if it does not already exist.")
-    db_exists_response = requests.get(
-        f'{get_geoserver_url()}/workspaces/{workspace_name}/datastores',
-        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
-    )
-    response_data = db_exists_response.json()
-
-    # Parse JSON structure to get list of data store names
-    top_data_store_node = response_data["dataStores"]
-    # defaults to empty list if no data stores exist
-    data_stores = top_data_store_node["dataStore"] if top_data_store_node else []
-    data_store_names = [data_store["name"] for data_store in data_stores]
-
-    if new_data_store_name in data_store_names:
+    if data_store_registry.contains(new_data_store_name, workspace_name):
         # If the data store already exists we don't have to do anything
         log.debug(f"Datastore '{data_store_full_name}' already exists.")
         return
@@ -226,6 +316,7 @@ def create_db_store_if_not_exists(db_name: str, workspace_name: str, new_data_st
     )
     if response.status_code == HTTPStatus.CREATED:
         log.info(f"Created new datastore '{data_store_full_name}'.")
+        data_store_registry.add(new_data_store_name, workspace_name)
     # Expected responses are CREATED if the new store is created or CONFLICT if one already exists.
     else:
         # If it does not meet the expected results then raise an error
@@ -254,6 +345,9 @@ def create_main_db_store(workspace_name: str) -> str:
        If geoserver responds with an error, raises it as an exception since it is unexpected.
     """
     log.debug(f"Creating {MAIN_DB_STORE_NAME} store if it does not exist")
+    if data_store_registry.contains(MAIN_DB_STORE_NAME, workspace_name):
+        # The store can only exist if the workspace exists, so there is nothing left to create
+        return MAIN_DB_STORE_NAME
     # Create workspace if it doesn't exist, so that the namespaces can be separated if multiple dbs are running
     create_workspace_if_not_exists(workspace_name)
     # Create a new database store if geoserver is not yet configured for that database
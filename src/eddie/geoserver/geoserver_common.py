@@ -41,6 +41,43 @@ def get_geoserver_url() -> str:
     return f"{EnvVariable.GEOSERVER_INTERNAL_HOST}:{EnvVariable.GEOSERVER_INTERNAL_PORT}/geoserver/rest"
 
 
+def get_geowebcache_url() -> str:
+    """
+    Retrieve full URL of the GeoServer integrated GeoWebCache REST API from environment variables.
+
+    Returns
+    -------
+    str
+        The full GeoWebCache REST URL
+    """
+    return f"{EnvVariable.GEOSERVER_INTERNAL_HOST}:{EnvVariable.GEOSERVER_INTERNAL_PORT}/geoserver/gwc/rest"
+
+
+def get_workspaces() -> list[str]:
+    """
+    Retrieve the names of all GeoServer workspaces.
+
+    Returns
+    -------
+    list[str]
+        The names of each workspace.
+
+    Raises
+    -------
+    HTTPError
+        If geoserver responds with anything but OK, raises it as an exception since it is unexpected.
+    """
+    workspaces_response = requests.get(
+        f"{get_geoserver_url()}/workspaces.json",
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+    )
+    workspaces_response.raise_for_status()
+    # Parse JSON structure to get list of workspace names, defaulting to empty list if no workspaces exist
+    top_workspace_node = workspaces_response.json()["workspaces"]
+    workspaces = top_workspace_node["workspace"] if top_workspace_node else []
+    return [workspace["name"] for workspace in workspaces]
+
+
 def create_workspace_if_not_exists(workspace_name: str) -> None:
     """
     Create a GeoServer workspace if it does not currently exist.
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Per-workspace registry of GeoServer layer names.
+Avoids listing every layer of a workspace each time a single layer is checked, created, or deleted.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+log = logging.getLogger(__name__)
+
+
+class LayerRegistry:
+    """
+    Thread-safe cache of the layer names within each GeoServer workspace (and optionally store).
+
+    Layer names are listed from GeoServer the first time a workspace is queried, and are then kept up to date locally
+    as layers are added or removed by this process.
+    Entries expire after `ttl_seconds` so that changes made by other processes are eventually picked up.
+    """
+
+    def __init__(
+        self,
+        list_layers: Callable[..., Iterable[str]],
+        ttl_seconds: float,
+        on_change: Optional[Callable[[], None]] = None
+    ) -> None:
+        """
+        Create an empty registry.
+
+        Parameters
+        ----------
+        list_layers : Callable[..., Iterable[str]]
+            Function that queries GeoServer for the layer names, called as `list_layers(workspace_name)` or
+            `list_layers(workspace_name, store_name)` if a store name is given.
+        ttl_seconds : float
+            The number of seconds a workspace listing is trusted for before being listed from GeoServer again.
+        on_change : Optional[Callable[[], None]] = None
+            Function called after a layer is added or discarded, to let dependent caches know that GeoServer changed.
+        """
+        self._list_layers = list_layers
+        self._ttl_seconds = ttl_seconds
+        self._on_change = on_change
+        # Guards the entries, and is never held while querying GeoServer so that different listings run concurrently
+        self._lock = threading.Lock()
+        # Maps (workspace_name, store_name) to (time the listing was loaded, set of layer names)
+        self._entries: dict[tuple[str, Optional[str]], tuple[float, set[str]]] = {}
+        # Maps (workspace_name, store_name) to a lock held while loading it, so each listing is only loaded once
+        self._load_locks: dict[tuple[str, Optional[str]], threading.Lock] = {}
+        # Maps (workspace_name, store_name) to a counter of local changes, to detect changes made during a load
+        self._versions: dict[tuple[str, Optional[str]], int] = {}
+
+    def _load(self, workspace_name: str, store_name: Optional[str]) -> set[str]:
+        """
+        Query GeoServer for the current layer names of a workspace.
+
+        Parameters
+        ----------
+        workspace_name : str
+            The name of the GeoServer workspace being queried.
+        store_name : Optional[str]
+            The name of the GeoServer store being queried, or None if the listing is not store specific.
+
+        Returns
+        -------
+        set[str]
+            The names of each layer, not including the workspace name.
+        """
+        log.debug(f"Loading layer names for workspace '{workspace_name}' from GeoServer.")
+        if store_name is None:
+            return set(self._list_layers(workspace_name))
+        return set(self._list_layers(workspace_name, store_name))
+
+    def _get_fresh_entry(self, key: tuple[str, Optional[str]]) -> Optional[set[str]]:
+        """
+        Retrieve a cached set of layer names if it has not expired.
+        Must be called while holding self._lock.
+
+        Parameters
+        ----------
+        key : tuple[str, Optional[str]]
+            The workspace name and store name of the listing.
+
+        Returns
+        -------
+        Optional[set[str]]
+            The mutable cached set of layer names, or None if it is missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self._ttl_seconds:
+            return None
+        return entry[1]
+
+    def _changed(self, key: tuple[str, Optional[str]]) -> None:
+        """
+        Record that a listing was changed locally, so that a listing loaded at the same time is not trusted.
+        Must be called while holding self._lock.
+
+        Parameters
+        ----------
+        key : tuple[str, Optional[str]]
+            The workspace name and store name of the listing.
+        """
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _get_entry(self, workspace_name: str, store_name: Optional[str]) -> set[str]:
+        """
+        Retrieve the cached set of layer names, loading it from GeoServer if it is missing or expired.
+        Must be called without holding self._lock, and the returned set must only be read while holding it.
+
+        Parameters
+        ----------
+        workspace_name : str
+            The name of the GeoServer workspace being queried.
+        store_name : Optional[str]
+            The name of the GeoServer store being queried, or None if the listing is not store specific.
+
+        Returns
+        -------
+        set[str]
+            The mutable cached set of layer names.
+        """
+        key = (workspace_name, store_name)
+        with self._lock:
+            layer_names = self._get_fresh_entry(key)
+            if layer_names is not None:
+                return layer_names
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            with self._lock:
+                # Another thread may have loaded the listing while this one was waiting
+                layer_names = self._get_fresh_entry(key)
+                if layer_names is not None:
+                    return layer_names
+                version = self._versions.get(key, 0)
+            loaded_at = time.monotonic()
+            layer_names = self._load(workspace_name, store_name)
+            with self._lock:
+                if self._versions.get(key, 0) != version:
+                    # Layers were added, removed or invalidated during the load, so the listing may already be stale
+                    loaded_at = float("-inf")
+                self._entries[key] = (loaded_at, layer_names)
+            return layer_names
+
+    def layers(self, workspace_name: str, store_name: Optional[str] = None) -> frozenset[str]:
+        """
+        Retrieve all known layer names of a workspace.
+
+        Parameters
+        ----------
+        workspace_name : str
+            The name of the GeoServer workspace being queried.
+        store_name : Optional[str] = None
+            The name of the GeoServer store being queried, if the listing is store specific.
+
+        Returns
+        -------
+        frozenset[str]
+            The names of each layer, not including the workspace name.
+        """
+        layer_names = self._get_entry(workspace_name, store_name)
+        with self._lock:
+            return frozenset(layer_names)
+
+    def contains(self, layer_name: str, workspace_name: str, store_name: Optional[str] = None) -> bool:
+        """
+        Check if a layer exists within a workspace.
+
+        Parameters
+        ----------
+        layer_name : str
+            The name of the layer to check for.
+        workspace_name : str
+            The name of the GeoServer workspace being queried.
+        store_name : Optional[str] = None
+            The name of the GeoServer store being queried, if the listing is store specific.
+
+        Returns
+        -------
+        bool
+            True if the layer is known to exist.
+        """
+        layer_names = self._get_entry(workspace_name, store_name)
+        with self._lock:
+            return layer_name in layer_names
+
+    def add(self, layer_name: str, workspace_name: str, store_name: Optional[str] = None) -> None:
+        """
+        Record that a layer has been created, without querying GeoServer.
+
+        Parameters
+        ----------
+        layer_name : str
+            The name of the layer that was created.
+        workspace_name : str
+            The name of the GeoServer workspace the layer was created in.
+        store_name : Optional[str] = None
+            The name of the GeoServer store the layer was created in, if the listing is store specific.
+        """
+        with self._lock:
+            self._changed((workspace_name, store_name))
+            entry = self._entries.get((workspace_name, store_name))
+            # If the workspace has not been loaded then there is nothing to update, it will be loaded when needed.
+            if entry is not None:
+                entry[1].add(layer_name)
+        if self._on_change is not None:
+            self._on_change()
+
+    def discard(self, layer_name: str, workspace_name: str, store_name: Optional[str] = None) -> None:
+        """
+        Record that a layer has been deleted, without querying GeoServer.
+
+        Parameters
+        ----------
+        layer_name : str
+            The name of the layer that was deleted.
+        workspace_name : str
+            The name of the GeoServer workspace the layer was deleted from.
+        store_name : Optional[str] = None
+            The name of the GeoServer store the layer was deleted from, if the listing is store specific.
+        """
+        with self._lock:
+            self._changed((workspace_name, store_name))
+            entry = self._entries.get((workspace_name, store_name))
+            if entry is not None:
+                entry[1].discard(layer_name)
+        if self._on_change is not None:
+            self._on_change()
+
+    def invalidate(self, workspace_name: Optional[str] = None) -> None:
+        """
+        Forget cached listings so that they are queried from GeoServer next time they are needed.
+
+        Parameters
+        ----------
+        workspace_name : Optional[str] = None
+            The name of the workspace to forget. If None, all workspaces are forgotten.
+        """
+        with self._lock:
+            keys = [key for key in self._entries.keys() | self._load_locks.keys()
+                    if workspace_name is None or key[0] == workspace_name]
+            for key in keys:
+                self._changed(key)
+                self._entries.pop(key, None)
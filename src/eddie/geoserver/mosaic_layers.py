@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Functions for publishing rasters as granules of a single ImageMosaic store per workspace.
+Each raster is distinguished by its time and scenario dimensions, instead of being published as its own store and layer,
+so the GeoServer catalog stays the same size however many model runs are published.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import fcntl
+from http import HTTPStatus
+import logging
+import pathlib
+import re
+from typing import Iterator, Optional
+import urllib.parse
+import uuid
+
+import requests
+
+from eddie.config import EnvVariable
+from eddie.geoserver.geoserver_common import get_geoserver_url
+from eddie.geoserver.raster_layers import raster_layer_registry, style_exists
+from eddie.geoserver.raster_preparation import prepare_gtiff_for_serving
+from eddie.geoserver.raster_storage import link_or_copy_file
+
+log = logging.getLogger(__name__)
+_xml_header = {"Content-type": "text/xml"}
+
+# Name of the ImageMosaic store, coverage and layer within each mosaic workspace
+MOSAIC_STORE_NAME = "model_outputs"
+# Scenario names become part of granule file names and CQL string literals,
+# so they are restricted to characters that are safe in both
+_SCENARIO_PATTERN = re.compile(r"^[\w .-]+$")
+_GRANULE_TIME_FORMAT = "%Y%m%dT%H%M%S"
+
+
+def get_mosaic_workspaces() -> set[str]:
+    """
+    Read the names of the workspaces whose rasters are published as granules of a shared ImageMosaic store.
+
+    Returns
+    -------
+    set[str]
+        The workspace names set by the comma-separated GEOSERVER_MOSAIC_WORKSPACES environment variable.
+    """
+    return {name.strip() for name in EnvVariable.GEOSERVER_MOSAIC_WORKSPACES.split(",") if name.strip()}
+
+
+def get_mosaic_dir(workspace_name: str) -> pathlib.Path:
+    """
+    Find the path of the ImageMosaic directory relative to the GeoServer data directory.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the GeoServer workspace the mosaic belongs to.
+
+    Returns
+    -------
+    pathlib.Path
+        The path to the directory holding the mosaic configuration and granules.
+    """
+    return pathlib.Path("data") / workspace_name / MOSAIC_STORE_NAME
+
+
+def _container_file_url(relative_path: pathlib.Path) -> str:
+    """
+    Create a file URL for a path within the GeoServer data directory, as seen from within the GeoServer container.
+
+    Parameters
+    ----------
+    relative_path : pathlib.Path
+        The path relative to the GeoServer data directory.
+
+    Returns
+    -------
+    str
+        The absolute file URL that GeoServer can read the path from.
+    """
+    container_path = pathlib.PurePosixPath(EnvVariable.GEOSERVER_CONTAINER_DATA_DIR) / relative_path.as_posix()
+    return f"file://{urllib.parse.quote(str(container_path))}"
+
+
+def get_granule_name(scenario: str, time: datetime) -> str:
+    """
+    Create a unique file name for a granule, from which GeoServer extracts its scenario and time dimensions.
+    The name ends with a random suffix, so that a replacement granule never overwrites the granule it replaces.
+
+    Parameters
+    ----------
+    scenario : str
+        The name of the scenario the granule belongs to, made of letters, numbers, spaces, dots, hyphens and
+        underscores.
+    time : datetime
+        The time that the granule represents.
+
+    Returns
+    -------
+    str
+        The granule file name.
+
+    Raises
+    ------
+    ValueError
+        If the scenario name contains characters that cannot be part of a granule file name.
+    """
+    if not _SCENARIO_PATTERN.match(scenario):
+        raise ValueError(
+            f"Scenario name '{scenario}' must only contain letters, numbers, spaces, dots, hyphens and underscores."
+        )
+    if time.tzinfo is not None:
+        time = time.astimezone(timezone.utc)
+    return f"{scenario}__{time.strftime(_GRANULE_TIME_FORMAT)}__{uuid.uuid4().hex[:8]}.tif"
+
+
+def write_mosaic_configuration(workspace_name: str) -> None:
+    """
+    Write the ImageMosaic configuration files into the mosaic directory, so that GeoServer can create the store.
+    The granule index is kept in the main PostGIS database so that granules can be harvested concurrently.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the GeoServer workspace the mosaic belongs to.
+    """
+    mosaic_dir = EnvVariable.DATA_DIR_GEOSERVER / get_mosaic_dir(workspace_name)
+    mosaic_dir.mkdir(parents=True, exist_ok=True)
+    configuration_files = {
+        "indexer.properties": "\n".join([
+            f"Name={MOSAIC_STORE_NAME}",
+            f"TypeName={workspace_name}_{MOSAIC_STORE_NAME}_granules",
+            "TimeAttribute=time",
+            "AdditionalDomainAttributes=scenario",
+            "Schema=*the_geom:Polygon,location:String,time:java.util.Date,scenario:String",
+            "PropertyCollectors=TimestampFileNameExtractorSPI[timeregex](time),"
+            "StringFileNameExtractorSPI[scenarioregex](scenario)",
+            "Caching=false",
+            "AbsolutePath=false",
+            "CanBeEmpty=true",
+        ]),
+        "timeregex.properties": "regex=[0-9]{8}T[0-9]{6}",
+        "scenarioregex.properties": "regex=^.+(?=__[0-9]{8}T[0-9]{6}__)",
+        "datastore.properties": "\n".join([
+            "SPI=org.geotools.data.postgis.PostgisNGDataStoreFactory",
+            "dbtype=postgis",
+            f"host={EnvVariable.POSTGRES_INTERNAL_HOST}",
+            f"port={EnvVariable.POSTGRES_INTERNAL_PORT}",
+            f"database={EnvVariable.POSTGRES_DB}",
+            "schema=public",
+            f"user={EnvVariable.POSTGRES_USER}",
+            f"passwd={EnvVariable.POSTGRES_PASSWORD}",
+            r"Loose\ bbox=true",
+            r"Estimated\ extends=false",
+            r"validate\ connections=true",
+        ]),
+    }
+    for file_name, contents in configuration_files.items():
+        (mosaic_dir / file_name).write_text(contents + "\n")
+
+
+def create_mosaic_store(workspace_name: str, style_name: Optional[str] = None) -> None:
+    """
+    Create the ImageMosaic store and layer of a workspace from its mosaic directory,
+    and enable the time and scenario dimensions of the layer.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the existing GeoServer workspace to create the store in.
+    style_name : Optional[str] = None
+        The name of an existing style to serve the layer with by default, or None to use the GeoServer default.
+
+    Raises
+    ----------
+    HTTPError
+        If geoserver responds with an error, raises it as an exception since it is unexpected.
+    """
+    log.info(f"Creating ImageMosaic store {workspace_name}:{MOSAIC_STORE_NAME}.")
+    store_url = f"{get_geoserver_url()}/workspaces/{workspace_name}/coveragestores/{MOSAIC_STORE_NAME}"
+    auth = (EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+    response = requests.put(
+        f"{store_url}/external.imagemosaic",
+        params={"configure": "first", "coverageName": MOSAIC_STORE_NAME},
+        headers={"Content-type": "text/plain"},
+        data=_container_file_url(get_mosaic_dir(workspace_name)),
+        auth=auth,
+    )
+    if not response.ok:
+        # Raise error manually so we can configure the text
+        raise requests.HTTPError(response.text, response=response)
+
+    dimensions_payload = """
+    <coverage>
+        <enabled>true</enabled>
+        <metadata>
+            <entry key="time">
+                <dimensionInfo>
+                    <enabled>true</enabled>
+                    <presentation>LIST</presentation>
+                    <units>ISO8601</units>
+                    <defaultValue><strategy>MAXIMUM</strategy></defaultValue>
+                </dimensionInfo>
+            </entry>
+            <entry key="custom_dimension_SCENARIO">
+                <dimensionInfo>
+                    <enabled>true</enabled>
+                    <presentation>LIST</presentation>
+                    <defaultValue><strategy>MINIMUM</strategy></defaultValue>
+                </dimensionInfo>
+            </entry>
+        </metadata>
+    </coverage>
+    """
+    response = requests.put(
+        f"{store_url}/coverages/{MOSAIC_STORE_NAME}",
+        headers=_xml_header,
+        data=dimensions_payload,
+        auth=auth,
+    )
+    if not response.ok:
+        raise requests.HTTPError(response.text, response=response)
+
+    if style_name is not None and style_exists(style_name):
+        response = requests.put(
+            f"{get_geoserver_url()}/layers/{workspace_name}:{MOSAIC_STORE_NAME}",
+            headers=_xml_header,
+            data=f"<layer><defaultStyle><name>{style_name}</name></defaultStyle></layer>",
+            auth=auth,
+        )
+        if not response.ok:
+            raise requests.HTTPError(response.text, response=response)
+    raster_layer_registry.add(MOSAIC_STORE_NAME, workspace_name)
+
+
+def harvest_granule(workspace_name: str, granule_path: pathlib.Path) -> None:
+    """
+    Add a single granule to the index of an existing ImageMosaic store.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the GeoServer workspace the mosaic belongs to.
+    granule_path : pathlib.Path
+        The path of the granule relative to the GeoServer data directory.
+
+    Raises
+    ----------
+    HTTPError
+        If geoserver responds with an error, raises it as an exception since it is unexpected.
+    """
+    response = requests.post(
+        f"{get_geoserver_url()}/workspaces/{workspace_name}/coveragestores/{MOSAIC_STORE_NAME}/external.imagemosaic",
+        headers={"Content-type": "text/plain"},
+        data=_container_file_url(granule_path),
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD),
+    )
+    if not response.ok:
+        # Raise error manually so we can configure the text
+        raise requests.HTTPError(response.text, response=response)
+
+
+def delete_scenario_granules(workspace_name: str, scenario: str, keep_granule_name: Optional[str] = None) -> None:
+    """
+    Remove the granules of a scenario from an ImageMosaic store, including their files.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the GeoServer workspace the mosaic belongs to.
+    scenario : str
+        The name of the scenario to remove.
+    keep_granule_name : Optional[str] = None
+        The file name of a granule of the scenario to keep, such as the granule replacing the others.
+
+    Raises
+    ----------
+    HTTPError
+        If geoserver responds with anything but OK or NOT_FOUND, raises it as an exception since it is unexpected.
+    """
+    cql_filter = f"scenario='{scenario}'"
+    if keep_granule_name is not None:
+        cql_filter += f" AND location<>'{keep_granule_name}'"
+    response = requests.delete(
+        f"{get_geoserver_url()}/workspaces/{workspace_name}/coveragestores/{MOSAIC_STORE_NAME}"
+        f"/coverages/{MOSAIC_STORE_NAME}/index/granules",
+        params={"filter": cql_filter, "purge": "all"},
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD),
+    )
+    if response.status_code not in (HTTPStatus.OK, HTTPStatus.NOT_FOUND):
+        raise requests.HTTPError(response.text, response=response)
+
+
+def get_mosaic_scenarios(workspace_name: str) -> set[str]:
+    """
+    List the scenarios that have granules in the ImageMosaic store of a workspace.
+    Rasters published to a mosaic are named by their scenario, so these are the raster layer names of the workspace.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the GeoServer workspace the mosaic belongs to.
+
+    Returns
+    -------
+    set[str]
+        The names of the scenarios, or an empty set if the store does not exist.
+
+    Raises
+    ----------
+    HTTPError
+        If geoserver responds with anything but OK or NOT_FOUND, raises it as an exception since it is unexpected.
+    """
+    response = requests.get(
+        f"{get_geoserver_url()}/workspaces/{workspace_name}/coveragestores/{MOSAIC_STORE_NAME}"
+        f"/coverages/{MOSAIC_STORE_NAME}/index/granules.json",
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD),
+    )
+    if response.status_code == HTTPStatus.NOT_FOUND:
+        return set()
+    if not response.ok:
+        raise requests.HTTPError(response.text, response=response)
+    return {feature["properties"]["scenario"] for feature in response.json().get("features", [])}
+
+
+@contextmanager
+def _lock_mosaic(workspace_name: str) -> Iterator[None]:
+    """
+    Hold an exclusive lock on the mosaic of a workspace, shared by every thread and process using the data directory.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the GeoServer workspace the mosaic belongs to.
+
+    Yields
+    ------
+    None
+        The mosaic store may be created within the context.
+    """
+    mosaic_dir = EnvVariable.DATA_DIR_GEOSERVER / get_mosaic_dir(workspace_name)
+    mosaic_dir.mkdir(parents=True, exist_ok=True)
+    # Each open file has its own lock, so threads of the same process also wait for each other
+    with open(mosaic_dir.with_name(f".{MOSAIC_STORE_NAME}.lock"), "a", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _place_granule(gtiff_filepath: pathlib.Path, workspace_name: str, granule_name: str) -> pathlib.Path:
+    """
+    Place a GeoTiff file in the mosaic directory of a workspace, converting it to a COG if configured.
+
+    Parameters
+    ----------
+    gtiff_filepath : pathlib.Path
+        The filepath to the GeoTiff file to be served.
+    workspace_name : str
+        The name of the GeoServer workspace the mosaic belongs to.
+    granule_name : str
+        The file name of the new granule.
+
+    Returns
+    -------
+    pathlib.Path
+        The path of the granule relative to the GeoServer data directory.
+    """
+    gtiff_filepath = prepare_gtiff_for_serving(gtiff_filepath, workspace_name)
+    granule_path = get_mosaic_dir(workspace_name) / granule_name
+    (EnvVariable.DATA_DIR_GEOSERVER / granule_path).parent.mkdir(parents=True, exist_ok=True)
+    link_or_copy_file(gtiff_filepath, EnvVariable.DATA_DIR_GEOSERVER / granule_path)
+    return granule_path
+
+
+def add_gtiff_to_mosaic(
+    gtiff_filepath: pathlib.Path,
+    workspace_name: str,
+    scenario: str,
+    time: Optional[datetime] = None,
+    style_name: Optional[str] = None
+) -> None:
+    """
+    Publish a GeoTiff file as a granule of the workspace's ImageMosaic layer, creating the store if needed.
+    Any existing granules of the same scenario are replaced, once the new granule has been harvested.
+    All granules of a mosaic must share the same CRS and band structure.
+
+    Parameters
+    ----------
+    gtiff_filepath : pathlib.Path
+        The filepath to the GeoTiff file to be served.
+    workspace_name : str
+        The name of the existing GeoServer workspace that the mosaic belongs to.
+    scenario : str
+        The value of the scenario dimension for the granule, made of letters, numbers, spaces, dots, hyphens and
+        underscores.
+    time : Optional[datetime] = None
+        The value of the time dimension for the granule. Defaults to the current time.
+    style_name : Optional[str] = None
+        The name of an existing style to serve the layer with by default, only used if the store is being created.
+
+    Raises
+    ----------
+    HTTPError
+        If geoserver responds with an error, raises it as an exception since it is unexpected.
+    ValueError
+        If the scenario name contains characters that cannot be part of a granule file name.
+    """
+    granule_name = get_granule_name(scenario, time or datetime.now(timezone.utc))
+    if not raster_layer_registry.contains(MOSAIC_STORE_NAME, workspace_name):
+        with _lock_mosaic(workspace_name):
+            # Another thread or process may have created the store since the workspace was listed
+            raster_layer_registry.invalidate(workspace_name)
+            if not raster_layer_registry.contains(MOSAIC_STORE_NAME, workspace_name):
+                write_mosaic_configuration(workspace_name)
+                _place_granule(gtiff_filepath, workspace_name, granule_name)
+                # The store is created from the directory, which indexes the granule that was just placed in it
+                create_mosaic_store(workspace_name, style_name)
+                return
+
+    granule_path = _place_granule(gtiff_filepath, workspace_name, granule_name)
+    log.info(f"Harvesting '{granule_name}' into {workspace_name}:{MOSAIC_STORE_NAME}.")
+    try:
+        harvest_granule(workspace_name, granule_path)
+    except requests.HTTPError:
+        (EnvVariable.DATA_DIR_GEOSERVER / granule_path).unlink(missing_ok=True)
+        raise
+    # Only remove the previous granules once their replacement is served, so the scenario always has data
+    delete_scenario_granules(workspace_name, scenario, keep_granule_name=granule_name)
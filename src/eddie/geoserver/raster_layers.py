@@ -21,12 +21,21 @@ from http import HTTPStatus
 from importlib import resources
 import logging
 import pathlib
-import shutil
+from typing import Optional
 
 import requests
 
 from eddie.config import EnvVariable
+from eddie.geoserver.catalog_cache import bump_catalog_version
 from eddie.geoserver.geoserver_common import get_geoserver_url
+from eddie.geoserver.layer_registry import LayerRegistry
+from eddie.geoserver.raster_preparation import prepare_gtiff_for_serving
+from eddie.geoserver.raster_storage import (
+    RasterPublishMode,
+    get_raster_publish_mode,
+    place_gtiff_in_data_dir,
+    remove_unreferenced_raster_blobs
+)
 
 log = logging.getLogger(__name__)
 _xml_header = {"Content-type": "text/xml"}
@@ -59,11 +68,8 @@ def upload_gtiff_to_store(
     """
     log.info(f"Uploading {gtiff_filepath.name} to Geoserver workspace {workspace_name}")
 
-    # Set file copying src and dest
-    geoserver_data_root = EnvVariable.DATA_DIR_GEOSERVER
-    geoserver_data_dest = pathlib.Path("data") / workspace_name / gtiff_filepath.name
-    # Copy file to geoserver data folder
-    shutil.copyfile(gtiff_filepath, geoserver_data_root / geoserver_data_dest)
+    # Make the file readable by geoserver, linking rather than copying it where possible
+    geoserver_data_dest = place_gtiff_in_data_dir(gtiff_filepath, workspace_name)
     # Send request to add data
     data = f"""
     <coverageStore>
@@ -149,6 +155,8 @@ def send_create_layer_request(geoserver_url: str, layer_name: str, workspace_nam
 def add_gtiff_to_geoserver(gtiff_filepath: pathlib.Path, workspace_name: str, layer_name: str) -> None:
     """
     Upload a GeoTiff file to GeoServer, ready for serving to clients.
+    In workspaces configured to use an ImageMosaic, the raster is instead added to the shared mosaic layer,
+    using the layer name as the value of its scenario dimension.
 
     Parameters
     ----------
@@ -159,14 +167,25 @@ def add_gtiff_to_geoserver(gtiff_filepath: pathlib.Path, workspace_name: str, la
     layer_name : str
         The name of the layer being added must be unique within the workspace. #todo check uniqueness
     """
+    # Imported here to avoid a circular import, since mosaic layers are tracked by the raster layer registry
+    from eddie.geoserver import mosaic_layers  # pylint: disable=import-outside-toplevel
+    if workspace_name in mosaic_layers.get_mosaic_workspaces():
+        mosaic_layers.add_gtiff_to_mosaic(gtiff_filepath, workspace_name, scenario=layer_name)
+        return
     gs_url = get_geoserver_url()
-    if layer_name in get_workspace_raster_layers(workspace_name):
+    if raster_layer_registry.contains(layer_name, workspace_name):
         log.info(f"Replacing raster layer {workspace_name}:{layer_name} because it already exists.")
-        delete_store(layer_name, workspace_name)
+        # Rasters registered in place are not owned by geoserver, so their files must not be deleted
+        purge = "metadata" if get_raster_publish_mode() == RasterPublishMode.REFERENCE else "all"
+        delete_store(layer_name, workspace_name, purge)
+        remove_unreferenced_raster_blobs()
+    # Convert the raster to a Cloud-Optimized GeoTIFF, if enabled for the workspace
+    gtiff_filepath = prepare_gtiff_for_serving(gtiff_filepath, workspace_name)
     # Upload the raster into geoserver
     upload_gtiff_to_store(gs_url, gtiff_filepath, layer_name, workspace_name)
     # Create a GIS layer from the raster file to be served from geoserver
     create_layer_from_gtiff_store(gs_url, layer_name, workspace_name)
+    raster_layer_registry.add(layer_name, workspace_name)
 
 
 def style_exists(style_name: str) -> bool:
@@ -203,6 +222,31 @@ def style_exists(style_name: str) -> bool:
     raise requests.HTTPError(response.text, response=response)
 
 
+def get_styles() -> list[str]:
+    """
+    Retrieve the names of all styles in the default geoserver workspace.
+
+    Returns
+    -------
+    list[str]
+        The names of each style.
+
+    Raises
+    -------
+    HTTPError
+        If geoserver responds with anything but OK, raises it as an exception since it is unexpected.
+    """
+    styles_response = requests.get(
+        f'{get_geoserver_url()}/styles.json',
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+    )
+    styles_response.raise_for_status()
+    # Parse JSON structure to get list of style names, defaulting to empty list if no styles exist
+    top_style_node = styles_response.json()["styles"]
+    styles = top_style_node["style"] if top_style_node else []
+    return [style["name"] for style in styles]
+
+
 def delete_style(style_name: str) -> None:
     """
     Delete a style from the default geoserver workspace
@@ -266,7 +310,7 @@ def add_style(style_file: pathlib.Path, replace: bool = False) -> None:
     log.info(f"Style '{style_name}.sld' created.")
 
 
-def delete_store(store_name: str, workspace_name: str) -> None:
+def delete_store(store_name: str, workspace_name: str, purge: str = "all") -> None:
     """
     Delete a Geoserver CoverageStore from a workspace.
 
@@ -276,6 +320,8 @@ def delete_store(store_name: str, workspace_name: str) -> None:
         The name of the Geoserver CoverageStore to delete.
     workspace_name : str
         The name of the workspace to delete the store from.
+    purge : str = "all"
+        Which files geoserver should delete along with the store: "none", "metadata", or "all" to include the data.
 
     Raises
     ------
@@ -285,12 +331,17 @@ def delete_store(store_name: str, workspace_name: str) -> None:
     delete_store_request = requests.delete(
         f'{get_geoserver_url()}/workspaces/{workspace_name}/coveragestores/{store_name}',
         auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD),
-        params={"purge": "all", "recurse": True}
+        params={"purge": purge, "recurse": True}
     )
     delete_store_request.raise_for_status()
+    raster_layer_registry.discard(store_name, workspace_name)
 
 
-def get_workspace_raster_layers(workspace_name: str) -> list[str]:
+def get_workspace_raster_layers(
+    workspace_name: str,
+    session: Optional[requests.Session] = None,
+    timeout: Optional[float] = None
+) -> list[str]:
     """
     Retrieve all raster layer names from a geoserver workspace.
 
@@ -298,6 +349,10 @@ def get_workspace_raster_layers(workspace_name: str) -> list[str]:
     ----------
     workspace_name : str
         The name of the geoserver workspace being queried.
+    session : Optional[requests.Session] = None
+        The session to send the request with, to reuse connections. If None, a new connection is made.
+    timeout : Optional[float] = None
+        The number of seconds to wait for geoserver to respond. If None, waits indefinitely.
 
     Returns
     -------
@@ -308,10 +363,13 @@ def get_workspace_raster_layers(workspace_name: str) -> list[str]:
     -------
     HTTPError
         If geoserver responds with anything but OK, raises it as an exception since it is unexpected.
+    Timeout
+        If geoserver does not respond within the timeout.
     """
-    raster_stores_request = requests.get(
+    raster_stores_request = (session or requests).get(
         f'{get_geoserver_url()}/workspaces/{workspace_name}/coveragestores.json',
-        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD),
+        timeout=timeout
     )
     raster_stores_request.raise_for_status()
     response_data = raster_stores_request.json()
@@ -322,3 +380,9 @@ def get_workspace_raster_layers(workspace_name: str) -> list[str]:
     layer_names = [layer["name"] for layer in layers]
 
     return layer_names
+
+
+# Cached raster layer names for each workspace, to avoid listing all layers when adding each layer.
+raster_layer_registry = LayerRegistry(
+    get_workspace_raster_layers, EnvVariable.GEOSERVER_LAYER_CACHE_TTL, on_change=bump_catalog_version
+)
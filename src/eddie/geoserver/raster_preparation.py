@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Functions for preparing rasters before they are served by GeoServer.
+Rasters are converted to tiled, compressed Cloud-Optimized GeoTIFFs (COGs) with internal overviews, so that zoomed out
+map requests read from the overviews instead of the full resolution data.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import time
+from typing import Any
+import uuid
+
+from eddie.config import EnvVariable
+from eddie.digitaltwin.utils import get_file_hash
+from eddie.geoserver.raster_storage import RasterPublishMode, get_raster_publish_mode
+
+log = logging.getLogger(__name__)
+
+# Directory within the GeoServer data directory holding converted rasters, named by the hash of their source and
+# creation options
+COG_CACHE_DIR = pathlib.Path("data") / "_cog_cache"
+# Number of seconds since a converted raster was last used before it may be evicted, so that a raster is not evicted
+# between being prepared and being published
+COG_CACHE_EVICTION_GRACE_SECONDS = 3600
+# COG creation options that do not depend on the raster being converted
+_COG_CREATION_OPTIONS = {
+    "BLOCKSIZE": 512,
+    "OVERVIEWS": "AUTO",
+    "BIGTIFF": "IF_SAFER",
+}
+
+
+def get_cog_workspaces() -> set[str]:
+    """
+    Read the names of the workspaces whose rasters are converted to COGs before publishing.
+
+    Returns
+    -------
+    set[str]
+        The workspace names set by the comma-separated GEOSERVER_COG_WORKSPACES environment variable.
+    """
+    return {name.strip() for name in EnvVariable.GEOSERVER_COG_WORKSPACES.split(",") if name.strip()}
+
+
+def get_cog_creation_options() -> dict[str, Any]:
+    """
+    Get the COG creation options that do not depend on the raster being converted.
+
+    Returns
+    -------
+    dict[str, Any]
+        The creation options, including the compression set by the GEOSERVER_COG_COMPRESSION environment variable.
+    """
+    return {**_COG_CREATION_OPTIONS, "COMPRESS": EnvVariable.GEOSERVER_COG_COMPRESSION}
+
+
+def convert_gtiff_to_cog(gtiff_filepath: pathlib.Path, cog_filepath: pathlib.Path) -> None:
+    """
+    Convert a GeoTiff into a tiled, compressed Cloud-Optimized GeoTIFF with internal overviews.
+    Floating point rasters such as flood depths use the floating point predictor, which compresses them far better,
+    and their overviews are averaged. Integer rasters are assumed to be categorical and use nearest neighbour overviews.
+
+    Parameters
+    ----------
+    gtiff_filepath : pathlib.Path
+        The filepath to the GeoTiff file to convert.
+    cog_filepath : pathlib.Path
+        The filepath to write the converted COG to.
+    """
+    # Imported here so that only processes that publish rasters require GDAL
+    import rasterio  # pylint: disable=import-outside-toplevel
+    from rasterio.shutil import copy as rasterio_copy  # pylint: disable=import-outside-toplevel
+
+    with rasterio.open(gtiff_filepath) as dataset:
+        is_floating_point = dataset.dtypes[0].startswith("float")
+    log.info(f"Converting '{gtiff_filepath.name}' to a Cloud-Optimized GeoTIFF.")
+    rasterio_copy(
+        gtiff_filepath,
+        cog_filepath,
+        driver="COG",
+        PREDICTOR="FLOATING_POINT" if is_floating_point else "YES",
+        OVERVIEW_RESAMPLING="AVERAGE" if is_floating_point else "NEAREST",
+        NUM_THREADS="ALL_CPUS",
+        **get_cog_creation_options(),
+    )
+
+
+def _get_cog_cache_key(gtiff_filepath: pathlib.Path) -> str:
+    """
+    Create the key of a converted raster in the COG cache.
+    The predictor and overview resampling are chosen from the source data type, so are covered by its hash.
+
+    Parameters
+    ----------
+    gtiff_filepath : pathlib.Path
+        The filepath to the GeoTiff file to be converted.
+
+    Returns
+    -------
+    str
+        Hash of the source raster contents and the COG creation options.
+    """
+    key = {"source": get_file_hash(gtiff_filepath), "options": get_cog_creation_options()}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def evict_cog_cache_entries() -> None:
+    """
+    Delete the least recently used converted rasters until the COG cache fits within GEOSERVER_COG_CACHE_MAX_SIZE_MB.
+    Rasters used within the last COG_CACHE_EVICTION_GRACE_SECONDS are kept.
+    Nothing is evicted in the 'reference' raster publishing mode, since GeoServer then reads cached rasters in place.
+    """
+    if get_raster_publish_mode() == RasterPublishMode.REFERENCE:
+        return
+    cache_dir = EnvVariable.DATA_DIR_GEOSERVER / COG_CACHE_DIR
+    max_size_bytes = EnvVariable.GEOSERVER_COG_CACHE_MAX_SIZE_MB * 1024 * 1024
+    entries = []
+    for cog_filepath in cache_dir.glob("*/*"):
+        try:
+            stat = cog_filepath.stat()
+        except FileNotFoundError:
+            # Another process has already evicted it
+            continue
+        entries.append((stat.st_mtime, stat.st_size, cog_filepath))
+    total_size_bytes = sum(size for _, size, _ in entries)
+    # Evict the least recently used entries first
+    for used_at, size, cog_filepath in sorted(entries):
+        if total_size_bytes <= max_size_bytes or time.time() - used_at < COG_CACHE_EVICTION_GRACE_SECONDS:
+            break
+        log.debug(f"Evicting cached Cloud-Optimized GeoTIFF '{cog_filepath.parent.name}'.")
+        cog_filepath.unlink(missing_ok=True)
+        total_size_bytes -= size
+        try:
+            cog_filepath.parent.rmdir()
+        except OSError:
+            # Another raster is being converted into the same entry
+            pass
+
+
+def prepare_gtiff_for_serving(gtiff_filepath: pathlib.Path, workspace_name: str) -> pathlib.Path:
+    """
+    Convert a GeoTiff to a Cloud-Optimized GeoTIFF if its workspace is configured for it.
+    Converted rasters are cached by the hash of their source and creation options,
+    so an unchanged raster is only converted once.
+
+    Parameters
+    ----------
+    gtiff_filepath : pathlib.Path
+        The filepath to the GeoTiff file to be served.
+    workspace_name : str
+        The name of the GeoServer workspace that the raster is being published to.
+
+    Returns
+    -------
+    pathlib.Path
+        The filepath of the raster to publish. This is the original filepath if the workspace is not configured for
+        COG conversion.
+    """
+    if workspace_name not in get_cog_workspaces():
+        return gtiff_filepath
+    # Keep the original file name, so that published file names stay recognisable
+    cache_entry_dir = EnvVariable.DATA_DIR_GEOSERVER / COG_CACHE_DIR / _get_cog_cache_key(gtiff_filepath)
+    cog_filepath = cache_entry_dir / gtiff_filepath.name
+    try:
+        # Record the use, so that recently used rasters are evicted last
+        os.utime(cog_filepath)
+        log.info(f"Using cached Cloud-Optimized GeoTIFF for '{gtiff_filepath.name}'.")
+        return cog_filepath
+    except FileNotFoundError:
+        pass
+    cog_filepath.parent.mkdir(parents=True, exist_ok=True)
+    # Convert to a temporary file first so that other threads and processes never see a partially written raster
+    temp_filepath = cog_filepath.with_name(f"{uuid.uuid4().hex}_{cog_filepath.name}")
+    convert_gtiff_to_cog(gtiff_filepath, temp_filepath)
+    os.replace(temp_filepath, cog_filepath)
+    evict_cog_cache_entries()
+    return cog_filepath
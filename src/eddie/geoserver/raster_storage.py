@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Functions for placing raster files within the GeoServer data directory so that GeoServer can read them.
+Avoids copying rasters where possible, and stores identical rasters only once.
+"""
+
+from contextlib import contextmanager
+from enum import StrEnum
+import errno
+import fcntl
+import logging
+import os
+import pathlib
+import shutil
+from typing import Iterator
+import uuid
+
+from eddie.config import EnvVariable
+from eddie.digitaltwin.utils import get_file_hash
+
+log = logging.getLogger(__name__)
+
+# Directory within the GeoServer data directory holding one content-addressed copy of each published raster
+RASTER_BLOB_DIR = pathlib.Path("data") / "_raster_blobs"
+# Lock file within the blob directory, held while rasters are placed or unreferenced rasters are removed
+RASTER_BLOB_LOCK_FILE_NAME = ".lock"
+# Linux ioctl request code to clone the extents of one file into another (copy-on-write reflink)
+_FICLONE = 0x40049409
+
+
+class RasterPublishMode(StrEnum):
+    """
+    Enum defining how raster files are made available to GeoServer.
+
+    Attributes
+    ----------
+    COPY : str
+        Copy every raster into the GeoServer data directory.
+    LINK : str
+        Store each distinct raster once in the GeoServer data directory, reflinking it from the source where the
+        filesystem allows and copying otherwise, and hardlink each published location to the stored raster.
+    REFERENCE : str
+        Register rasters that are already within the GeoServer data directory at their original path.
+        Other rasters are published as for LINK.
+    """
+
+    COPY = "copy"
+    LINK = "link"
+    REFERENCE = "reference"
+
+
+def get_raster_publish_mode() -> RasterPublishMode:
+    """
+    Read the configured raster publishing mode.
+
+    Returns
+    -------
+    RasterPublishMode
+        The mode set by the GEOSERVER_RASTER_PUBLISH_MODE environment variable.
+    """
+    return RasterPublishMode(EnvVariable.GEOSERVER_RASTER_PUBLISH_MODE.lower())
+
+
+def _reflink(src: pathlib.Path, dest: pathlib.Path) -> None:
+    """
+    Create dest as a copy-on-write clone of src, sharing the same data blocks on disk.
+
+    Parameters
+    ----------
+    src : pathlib.Path
+        The file to clone.
+    dest : pathlib.Path
+        The path of the new clone.
+
+    Raises
+    ------
+    OSError
+        If the filesystem does not support reflinks, or the files are on different filesystems.
+    """
+    with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+        try:
+            fcntl.ioctl(dest_file.fileno(), _FICLONE, src_file.fileno())
+        except OSError:
+            dest_file.close()
+            dest.unlink(missing_ok=True)
+            raise
+
+
+def reflink_or_copy_file(src: pathlib.Path, dest: pathlib.Path) -> None:
+    """
+    Copy src to dest, sharing its data blocks through a copy-on-write reflink where the filesystem allows.
+    Unlike a hardlink, dest keeps its contents if src is later rewritten in place.
+
+    Parameters
+    ----------
+    src : pathlib.Path
+        The file to copy.
+    dest : pathlib.Path
+        The path to copy the file to.
+    """
+    try:
+        _reflink(src, dest)
+        log.debug(f"Reflinked '{src}' to '{dest}'.")
+        return
+    except OSError:
+        pass
+    log.debug(f"Copying '{src}' to '{dest}' since it cannot be reflinked.")
+    shutil.copyfile(src, dest)
+
+
+def link_or_copy_file(src: pathlib.Path, dest: pathlib.Path) -> None:
+    """
+    Make the contents of src available at dest, using the cheapest method supported by the filesystem.
+    Tries a copy-on-write reflink, then a hardlink, and copies the file if neither is possible.
+
+    Parameters
+    ----------
+    src : pathlib.Path
+        The file to make available.
+    dest : pathlib.Path
+        The path to make the file available at. Must not already exist.
+
+    Raises
+    ------
+    OSError
+        If src cannot be hardlinked for a reason other than the filesystem not supporting it, such as dest existing.
+    """
+    try:
+        _reflink(src, dest)
+        log.debug(f"Reflinked '{src}' to '{dest}'.")
+        return
+    except OSError:
+        pass
+    try:
+        os.link(src, dest)
+        log.debug(f"Hardlinked '{src}' to '{dest}'.")
+        return
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EACCES):
+            raise
+    log.debug(f"Copying '{src}' to '{dest}' since it cannot be linked.")
+    shutil.copyfile(src, dest)
+
+
+@contextmanager
+def _lock_raster_blobs(exclusive: bool) -> Iterator[None]:
+    """
+    Lock the stored rasters, shared by every thread and process using the GeoServer data directory.
+    Placing rasters takes a shared lock so that placements run concurrently,
+    while removing unreferenced rasters takes an exclusive lock so that it never removes a raster being placed.
+
+    Parameters
+    ----------
+    exclusive : bool
+        True to wait for every other holder to release the lock, False to share it with other placements.
+
+    Yields
+    ------
+    None
+        The stored rasters may be used within the context.
+    """
+    blob_dir = EnvVariable.DATA_DIR_GEOSERVER / RASTER_BLOB_DIR
+    blob_dir.mkdir(parents=True, exist_ok=True)
+    # Each open file has its own lock, so threads of the same process also wait for each other
+    with open(blob_dir / RASTER_BLOB_LOCK_FILE_NAME, "a", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _store_raster_blob(gtiff_filepath: pathlib.Path) -> pathlib.Path:
+    """
+    Ensure a single content-addressed copy of the raster exists within the GeoServer data directory.
+    The source is never hardlinked, so that the stored raster keeps matching its hash if the source is rewritten,
+    and so that only published locations count towards its links.
+    Must be called while holding the raster blob lock, until the stored raster has been linked to.
+
+    Parameters
+    ----------
+    gtiff_filepath : pathlib.Path
+        The filepath to the GeoTiff file to be stored.
+
+    Returns
+    -------
+    pathlib.Path
+        The absolute path to the stored raster.
+    """
+    blob_dir = EnvVariable.DATA_DIR_GEOSERVER / RASTER_BLOB_DIR
+    blob_dir.mkdir(parents=True, exist_ok=True)
+    blob_path = blob_dir / f"{get_file_hash(gtiff_filepath)}{gtiff_filepath.suffix}"
+    if blob_path.exists():
+        log.info(f"'{gtiff_filepath.name}' is identical to an already stored raster, reusing it.")
+        return blob_path
+    # Place under a temporary name first so that other processes never see a partially written raster
+    temp_path = blob_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    reflink_or_copy_file(gtiff_filepath, temp_path)
+    os.replace(temp_path, blob_path)
+    return blob_path
+
+
+def place_gtiff_in_data_dir(gtiff_filepath: pathlib.Path, workspace_name: str) -> pathlib.Path:
+    """
+    Make a GeoTiff file readable by GeoServer, according to the configured RasterPublishMode.
+
+    Parameters
+    ----------
+    gtiff_filepath : pathlib.Path
+        The filepath to the GeoTiff file to be served.
+    workspace_name : str
+        The name of the GeoServer workspace that the raster is being published to.
+
+    Returns
+    -------
+    pathlib.Path
+        The path to the raster relative to the GeoServer data directory, as used by GeoServer store URLs.
+    """
+    geoserver_data_root = EnvVariable.DATA_DIR_GEOSERVER
+    publish_mode = get_raster_publish_mode()
+    if publish_mode == RasterPublishMode.REFERENCE and gtiff_filepath.resolve().is_relative_to(
+            geoserver_data_root.resolve()):
+        log.debug(f"Registering '{gtiff_filepath}' in place since GeoServer can already read it.")
+        return gtiff_filepath.resolve().relative_to(geoserver_data_root.resolve())
+
+    geoserver_data_dest = pathlib.Path("data") / workspace_name / gtiff_filepath.name
+    dest_path = geoserver_data_root / geoserver_data_dest
+    dest_path.unlink(missing_ok=True)
+    if publish_mode == RasterPublishMode.COPY:
+        shutil.copyfile(gtiff_filepath, dest_path)
+    else:
+        with _lock_raster_blobs(exclusive=False):
+            # The blob and destination share a filesystem, so this is always a hardlink to the single stored copy
+            os.link(_store_raster_blob(gtiff_filepath), dest_path)
+    return geoserver_data_dest
+
+
+def remove_unreferenced_raster_blobs() -> None:
+    """
+    Delete stored rasters that are no longer linked to from any published location.
+    A stored raster with a single hardlink is only referenced by the store of blobs itself.
+    Waits for rasters that are being placed, so that a newly stored raster is not removed before it is linked to.
+    """
+    blob_dir = EnvVariable.DATA_DIR_GEOSERVER / RASTER_BLOB_DIR
+    if not blob_dir.exists():
+        return
+    with _lock_raster_blobs(exclusive=True):
+        for blob_path in blob_dir.iterdir():
+            if blob_path.name == RASTER_BLOB_LOCK_FILE_NAME or blob_path.suffix == ".tmp":
+                continue
+            if blob_path.stat().st_nlink == 1:
+                log.debug(f"Removing unreferenced raster '{blob_path.name}'.")
+                blob_path.unlink(missing_ok=True)
@@ -0,0 +1,600 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Declaratively reconcile GeoServer with a desired state.
+The current state is read in a few bulk listings, compared with the desired state, and only the differences are applied.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from enum import StrEnum
+from contextlib import contextmanager
+import fcntl
+import json
+import logging
+import os
+import pathlib
+import time
+from typing import Iterator, Optional
+import uuid
+
+from sqlalchemy.engine import Engine
+
+from eddie.config import EnvVariable
+from eddie.geoserver.database_layers import (
+    MAIN_DB_STORE_NAME,
+    create_datastore_layer,
+    create_main_db_store,
+    data_store_registry,
+    recalculate_datastore_layer_bounds,
+    vector_layer_registry
+)
+from eddie.geoserver.geoserver_common import get_workspaces
+from eddie.geoserver.mosaic_layers import get_mosaic_scenarios, get_mosaic_workspaces
+from eddie.geoserver.raster_layers import add_gtiff_to_geoserver, add_style, get_styles, raster_layer_registry
+from eddie.geoserver.terria_catalogs import Workspaces
+from eddie.geoserver.vector_tiles import VectorLayerFormat, ensure_vector_tile_caching, get_vector_layer_format
+
+log = logging.getLogger(__name__)
+
+# File within the GeoServer data directory recording the content hashes of resources applied by the reconciler.
+APPLIED_HASHES_FILE_NAME = "eddie_reconcile_state.json"
+
+
+class ChangeKind(StrEnum):
+    """Types of GeoServer resources that can be reconciled."""
+
+    DATASTORE = "datastore"
+    FEATURETYPE = "featuretype"
+    COVERAGE = "coverage"
+    STYLE = "style"
+
+
+class ChangeAction(StrEnum):
+    """Actions that can be applied to a GeoServer resource to reconcile it."""
+
+    CREATE = "create"
+    UPDATE = "update"
+
+
+@dataclass(frozen=True)
+class CoverageSpec:
+    """
+    Desired state of a GeoTIFF raster layer.
+
+    Attributes
+    ----------
+    gtiff_filepath : pathlib.Path
+        The filepath to the GeoTiff file to be served.
+    content_hash : str
+        Hash of the GeoTiff file contents, used to detect changes.
+    """
+
+    gtiff_filepath: pathlib.Path
+    content_hash: str
+
+
+@dataclass(frozen=True)
+class StyleSpec:
+    """
+    Desired state of a GeoServer style.
+
+    Attributes
+    ----------
+    style_file : pathlib.Path
+        The path to the style definition (SLD) file.
+    content_hash : str
+        Hash of the SLD file contents, used to detect changes.
+    """
+
+    style_file: pathlib.Path
+    content_hash: str
+
+
+@dataclass
+class DesiredState:
+    """
+    The GeoServer resources that should exist.
+    Every workspace is given a store for the main PostGIS database.
+
+    Attributes
+    ----------
+    workspaces : set[str]
+        Names of the workspaces that should exist.
+    featuretypes : dict[tuple[str, str], Optional[str]]
+        Maps (workspace_name, layer_name) of each main database layer to a hash of its source data,
+        or None if changes to the layer's data are not tracked.
+    coverages : dict[tuple[str, str], CoverageSpec]
+        Maps (workspace_name, layer_name) of each GeoTIFF layer to its desired state.
+    styles : dict[str, StyleSpec]
+        Maps the name of each style to its desired state.
+    """
+
+    workspaces: set[str] = field(default_factory=set)
+    featuretypes: dict[tuple[str, str], Optional[str]] = field(default_factory=dict)
+    coverages: dict[tuple[str, str], CoverageSpec] = field(default_factory=dict)
+    styles: dict[str, StyleSpec] = field(default_factory=dict)
+
+
+@dataclass
+class CurrentState:
+    """
+    The GeoServer resources that currently exist, and the content hashes recorded when they were last applied.
+
+    Attributes
+    ----------
+    workspaces_with_main_db_store : set[str]
+        Names of the workspaces that contain the main PostGIS database store.
+    featuretypes : set[tuple[str, str]]
+        (workspace_name, layer_name) of each layer in a main database store.
+    coverages : set[tuple[str, str]]
+        (workspace_name, layer_name) of each raster layer.
+    styles : set[str]
+        Names of each style in the default workspace.
+    applied_hashes : dict[str, str]
+        Maps the key of each resource to the content hash it was last applied with.
+    """
+
+    workspaces_with_main_db_store: set[str] = field(default_factory=set)
+    featuretypes: set[tuple[str, str]] = field(default_factory=set)
+    coverages: set[tuple[str, str]] = field(default_factory=set)
+    styles: set[str] = field(default_factory=set)
+    applied_hashes: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Change:
+    """
+    A single change required to reconcile GeoServer.
+
+    Attributes
+    ----------
+    kind : ChangeKind
+        The type of resource being changed.
+    action : ChangeAction
+        Whether the resource is being created or updated.
+    name : str
+        The name of the resource.
+    workspace_name : Optional[str] = None
+        The workspace containing the resource, or None for resources in the default workspace.
+    """
+
+    kind: ChangeKind
+    action: ChangeAction
+    name: str
+    workspace_name: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        """
+        Identify the resource, used as the key when recording applied content hashes.
+
+        Returns
+        -------
+        str
+            A key unique to the resource being changed.
+        """
+        return f"{self.kind}:{self.workspace_name or ''}:{self.name}"
+
+
+@dataclass
+class ReconcileReport:
+    """
+    Summary of the changes applied while reconciling GeoServer.
+
+    Attributes
+    ----------
+    applied : list[Change]
+        The changes that were successfully applied.
+    failed : list[Change]
+        The changes that raised an exception when applied.
+    unchanged : int
+        The number of desired resources that already matched.
+    elapsed_seconds : float
+        The time taken to reconcile.
+    """
+
+    applied: list[Change] = field(default_factory=list)
+    failed: list[Change] = field(default_factory=list)
+    unchanged: int = 0
+    elapsed_seconds: float = 0.0
+
+    def __str__(self) -> str:
+        """
+        Summarise the report in a form suitable for logging.
+
+        Returns
+        -------
+        str
+            The summarised report.
+        """
+        changes = ", ".join(f"{change.action} {change.kind} '{change.name}'" for change in self.applied)
+        return (f"{len(self.applied)} applied, {len(self.failed)} failed, {self.unchanged} unchanged"
+                f" in {self.elapsed_seconds:.2f}s. {changes}")
+
+
+def _get_applied_hashes_path() -> pathlib.Path:
+    """
+    Get the path of the file recording the content hashes of applied resources.
+
+    Returns
+    -------
+    pathlib.Path
+        The path of the applied hashes file, within the GeoServer data directory.
+    """
+    return EnvVariable.DATA_DIR_GEOSERVER / APPLIED_HASHES_FILE_NAME
+
+
+def read_applied_hashes() -> dict[str, str]:
+    """
+    Read the content hashes that resources were last applied with.
+
+    Returns
+    -------
+    dict[str, str]
+        Maps the key of each resource to the content hash it was last applied with.
+    """
+    applied_hashes_path = _get_applied_hashes_path()
+    if not applied_hashes_path.exists():
+        return {}
+    try:
+        with open(applied_hashes_path, "r", encoding="utf-8") as applied_hashes_file:
+            return json.load(applied_hashes_file)
+    except json.JSONDecodeError:
+        log.warning(f"Could not read '{applied_hashes_path}', all tracked resources will be re-applied.")
+        return {}
+
+
+@contextmanager
+def _lock_applied_hashes() -> Iterator[None]:
+    """
+    Hold an exclusive lock on the applied hashes file, shared by every thread and process using the data directory.
+
+    Yields
+    ------
+    None
+        The applied hashes file may be read and replaced within the context.
+    """
+    lock_path = _get_applied_hashes_path().with_suffix(".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    # Each open file has its own lock, so threads of the same process also wait for each other
+    with open(lock_path, "a", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_applied_hashes(new_hashes: dict[str, str]) -> None:
+    """
+    Record the content hashes that resources have been applied with, merging them with those already recorded.
+    The merge is done while holding a lock so that concurrent reconciles do not lose each other's hashes,
+    and the file is replaced atomically so that concurrent readers never see a partially written file.
+
+    Parameters
+    ----------
+    new_hashes : dict[str, str]
+        Maps the key of each newly applied resource to its content hash.
+    """
+    if not new_hashes:
+        return
+    with _lock_applied_hashes():
+        applied_hashes = read_applied_hashes() | new_hashes
+        applied_hashes_path = _get_applied_hashes_path()
+        temp_path = applied_hashes_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as applied_hashes_file:
+            json.dump(applied_hashes, applied_hashes_file, indent=2, sort_keys=True)
+        os.replace(temp_path, applied_hashes_path)
+
+
+def read_current_state(workspace_names: set[str]) -> CurrentState:
+    """
+    Read the current GeoServer state for the given workspaces, issuing listings for each workspace concurrently.
+    The layer registries are refreshed with the results so that later lookups do not need to list them again.
+
+    Parameters
+    ----------
+    workspace_names : set[str]
+        The names of the workspaces to read.
+
+    Returns
+    -------
+    CurrentState
+        The resources currently in GeoServer.
+    """
+    existing_workspaces = set(get_workspaces()) & workspace_names
+    for workspace_name in existing_workspaces:
+        data_store_registry.invalidate(workspace_name)
+        vector_layer_registry.invalidate(workspace_name)
+        raster_layer_registry.invalidate(workspace_name)
+
+    current_state = CurrentState(applied_hashes=read_applied_hashes())
+    with ThreadPoolExecutor(max_workers=EnvVariable.GEOSERVER_RECONCILE_WORKERS) as executor:
+        styles_future = executor.submit(get_styles)
+        data_store_futures = {
+            workspace_name: executor.submit(data_store_registry.layers, workspace_name)
+            for workspace_name in existing_workspaces
+        }
+        # Rasters published to a mosaic are granules named by their scenario, rather than layers of their own
+        mosaic_workspaces = get_mosaic_workspaces()
+        raster_futures = {
+            workspace_name: executor.submit(get_mosaic_scenarios, workspace_name)
+            if workspace_name in mosaic_workspaces
+            else executor.submit(raster_layer_registry.layers, workspace_name)
+            for workspace_name in existing_workspaces
+        }
+        for workspace_name, data_store_future in data_store_futures.items():
+            if MAIN_DB_STORE_NAME in data_store_future.result():
+                current_state.workspaces_with_main_db_store.add(workspace_name)
+        vector_futures = {
+            workspace_name: executor.submit(vector_layer_registry.layers, workspace_name, MAIN_DB_STORE_NAME)
+            for workspace_name in current_state.workspaces_with_main_db_store
+        }
+        for workspace_name, vector_future in vector_futures.items():
+            current_state.featuretypes.update((workspace_name, layer) for layer in vector_future.result())
+        for workspace_name, raster_future in raster_futures.items():
+            current_state.coverages.update((workspace_name, layer) for layer in raster_future.result())
+        current_state.styles = set(styles_future.result())
+    return current_state
+
+
+def _resource_action(
+    exists: bool,
+    change_key: str,
+    content_hash: Optional[str],
+    applied_hashes: dict[str, str]
+) -> Optional[ChangeAction]:
+    """
+    Decide what action is required to reconcile a single resource.
+
+    Parameters
+    ----------
+    exists : bool
+        True if the resource currently exists in GeoServer.
+    change_key : str
+        The key identifying the resource in applied_hashes.
+    content_hash : Optional[str]
+        The desired content hash of the resource, or None if its content is not tracked.
+    applied_hashes : dict[str, str]
+        Maps the key of each resource to the content hash it was last applied with.
+
+    Returns
+    -------
+    Optional[ChangeAction]
+        The action to apply, or None if the resource is already up to date.
+    """
+    if not exists:
+        return ChangeAction.CREATE
+    if content_hash is not None and applied_hashes.get(change_key) != content_hash:
+        # Resources that exist but were not applied by the reconciler are updated once, so that their hash is known.
+        return ChangeAction.UPDATE
+    return None
+
+
+def plan_changes(desired_state: DesiredState, current_state: CurrentState) -> tuple[list[Change], int]:
+    """
+    Compare the desired and current GeoServer states to find the changes required to reconcile them.
+    Resources that exist in GeoServer but not in the desired state are left untouched.
+
+    Parameters
+    ----------
+    desired_state : DesiredState
+        The GeoServer resources that should exist.
+    current_state : CurrentState
+        The GeoServer resources that currently exist.
+
+    Returns
+    -------
+    tuple[list[Change], int]
+        The changes required, and the number of desired resources that require no changes.
+    """
+    changes = []
+    unchanged = 0
+    for workspace_name in sorted(desired_state.workspaces):
+        if workspace_name in current_state.workspaces_with_main_db_store:
+            unchanged += 1
+        else:
+            changes.append(Change(ChangeKind.DATASTORE, ChangeAction.CREATE, MAIN_DB_STORE_NAME, workspace_name))
+
+    desired_resources = [
+        (ChangeKind.FEATURETYPE, workspace_name, layer_name, content_hash,
+         (workspace_name, layer_name) in current_state.featuretypes)
+        for (workspace_name, layer_name), content_hash in desired_state.featuretypes.items()
+    ] + [
+        (ChangeKind.COVERAGE, workspace_name, layer_name, coverage.content_hash,
+         (workspace_name, layer_name) in current_state.coverages)
+        for (workspace_name, layer_name), coverage in desired_state.coverages.items()
+    ] + [
+        (ChangeKind.STYLE, None, style_name, style.content_hash, style_name in current_state.styles)
+        for style_name, style in desired_state.styles.items()
+    ]
+    for kind, workspace_name, name, content_hash, exists in desired_resources:
+        change_key = Change(kind, ChangeAction.CREATE, name, workspace_name).key
+        action = _resource_action(exists, change_key, content_hash, current_state.applied_hashes)
+        if action is None:
+            unchanged += 1
+        else:
+            changes.append(Change(kind, action, name, workspace_name))
+    return changes, unchanged
+
+
+def _apply_change(change: Change, desired_state: DesiredState, engine: Engine) -> None:
+    """
+    Apply a single change to GeoServer.
+
+    Parameters
+    ----------
+    change : Change
+        The change to apply.
+    desired_state : DesiredState
+        The desired state the change was planned from, used to look up resource details.
+    engine : Engine
+        The engine used to connect to the database, when layer details need to be read from it.
+    """
+    match change.kind, change.action:
+        case ChangeKind.DATASTORE, _:
+            create_main_db_store(change.workspace_name)
+        case ChangeKind.FEATURETYPE, ChangeAction.CREATE:
+            with engine.connect() as conn:
+                create_datastore_layer(conn, change.workspace_name, MAIN_DB_STORE_NAME, change.name)
+        case ChangeKind.FEATURETYPE, ChangeAction.UPDATE:
+            recalculate_datastore_layer_bounds(change.workspace_name, MAIN_DB_STORE_NAME, change.name)
+        case ChangeKind.COVERAGE, _:
+            coverage = desired_state.coverages[(change.workspace_name, change.name)]
+            add_gtiff_to_geoserver(coverage.gtiff_filepath, change.workspace_name, change.name)
+        case ChangeKind.STYLE, _:
+            style = desired_state.styles[change.name]
+            add_style(style.style_file, replace=change.action == ChangeAction.UPDATE)
+
+
+def _desired_hash(change: Change, desired_state: DesiredState) -> Optional[str]:
+    """
+    Find the desired content hash of the resource being changed.
+
+    Parameters
+    ----------
+    change : Change
+        The change being applied.
+    desired_state : DesiredState
+        The desired state the change was planned from.
+
+    Returns
+    -------
+    Optional[str]
+        The content hash of the resource, or None if its content is not tracked.
+    """
+    match change.kind:
+        case ChangeKind.FEATURETYPE:
+            return desired_state.featuretypes[(change.workspace_name, change.name)]
+        case ChangeKind.COVERAGE:
+            return desired_state.coverages[(change.workspace_name, change.name)].content_hash
+        case ChangeKind.STYLE:
+            return desired_state.styles[change.name].content_hash
+    return None
+
+
+def apply_changes(changes: list[Change], desired_state: DesiredState, engine: Engine) -> ReconcileReport:
+    """
+    Apply changes to GeoServer in parallel.
+    Data stores are created first, since the layers depend on them.
+
+    Parameters
+    ----------
+    changes : list[Change]
+        The changes to apply.
+    desired_state : DesiredState
+        The desired state the changes were planned from.
+    engine : Engine
+        The engine used to connect to the database, when layer details need to be read from it.
+
+    Returns
+    -------
+    ReconcileReport
+        The changes that were applied and those that failed.
+    """
+    report = ReconcileReport()
+    new_hashes = {}
+    first_error = None
+    store_changes = [change for change in changes if change.kind == ChangeKind.DATASTORE]
+    layer_changes = [change for change in changes if change.kind != ChangeKind.DATASTORE]
+    with ThreadPoolExecutor(max_workers=EnvVariable.GEOSERVER_RECONCILE_WORKERS) as executor:
+        for phase in (store_changes, layer_changes):
+            futures = {change: executor.submit(_apply_change, change, desired_state, engine) for change in phase}
+            for change, future in futures.items():
+                error = future.exception()
+                if error is None:
+                    report.applied.append(change)
+                    content_hash = _desired_hash(change, desired_state)
+                    if content_hash is not None:
+                        new_hashes[change.key] = content_hash
+                else:
+                    log.error(f"Failed to {change.action} {change.kind} '{change.name}': {error}")
+                    report.failed.append(change)
+                    first_error = first_error or error
+            if first_error is not None:
+                # Layers cannot be created if their stores failed to be created
+                break
+    # Record what was applied even if something failed, so that it is not re-applied next time
+    write_applied_hashes(new_hashes)
+    if first_error is not None:
+        raise first_error
+    return report
+
+
+def ensure_featuretype_vector_tile_caching(featuretypes: set[tuple[str, str]]) -> None:
+    """
+    Enable vector tile caching for every vector layer served as vector tiles, including layers that already existed.
+    Failures are logged rather than raised, so that they are retried by the next reconciliation.
+
+    Parameters
+    ----------
+    featuretypes : set[tuple[str, str]]
+        The (workspace, layer) names of the vector layers in GeoServer.
+    """
+    # Extruded layers are served through WFS even when vector tiles are configured
+    featuretypes = {
+        (workspace_name, layer_name) for workspace_name, layer_name in featuretypes
+        if workspace_name != Workspaces.EXTRUDED_LAYERS_WORKSPACE
+    }
+    with ThreadPoolExecutor(max_workers=EnvVariable.GEOSERVER_RECONCILE_WORKERS) as executor:
+        futures = {
+            executor.submit(ensure_vector_tile_caching, workspace_name, layer_name): f"{workspace_name}:{layer_name}"
+            for workspace_name, layer_name in featuretypes
+        }
+    for future, layer_full_name in futures.items():
+        error = future.exception()
+        if error is not None:
+            log.warning(f"Failed to enable vector tile caching for '{layer_full_name}': {error}")
+
+
+def reconcile_geoserver(desired_state: DesiredState, engine: Engine) -> ReconcileReport:
+    """
+    Bring GeoServer in line with the desired state, applying only the differences.
+
+    Parameters
+    ----------
+    desired_state : DesiredState
+        The GeoServer resources that should exist.
+    engine : Engine
+        The engine used to connect to the database, when layer details need to be read from it.
+
+    Returns
+    -------
+    ReconcileReport
+        Summary of the changes applied.
+
+    Raises
+    ----------
+    HTTPError
+        If geoserver responds with an error while applying a change, after all other changes have been attempted.
+    """
+    start_time = time.perf_counter()
+    # Layers can only be created in workspaces with stores, so ensure their workspaces are reconciled too
+    workspace_names = desired_state.workspaces | {workspace_name for workspace_name, _ in desired_state.featuretypes}
+    workspace_names |= {workspace_name for workspace_name, _ in desired_state.coverages}
+    desired_state = replace(desired_state, workspaces=workspace_names)
+    current_state = read_current_state(workspace_names)
+    changes, unchanged = plan_changes(desired_state, current_state)
+    report = apply_changes(changes, desired_state, engine)
+    if get_vector_layer_format() == VectorLayerFormat.MVT:
+        ensure_featuretype_vector_tile_caching(current_state.featuretypes | set(desired_state.featuretypes))
+    report.unchanged = unchanged
+    report.elapsed_seconds = time.perf_counter() - start_time
+    log.info(f"Reconciled GeoServer: {report}")
+    return report
@@ -16,17 +16,39 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 """Functions for handling creating TerriaJS catalog items by reading the geoserver workspaces."""
+from concurrent.futures import Future, ThreadPoolExecutor
 from enum import StrEnum
-from typing import Literal, TypeAlias
+import logging
+import math
+import threading
+import time
+from typing import Callable, Literal, Optional, TypeAlias
+
+import requests
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import SQLAlchemyError
 
 from eddie.config import EnvVariable
+from eddie.digitaltwin import layer_statistics, setup_environment
+from .catalog_cache import CachedCatalog, CatalogCache
 from .database_layers import get_workspace_vector_layers
+from .mosaic_layers import MOSAIC_STORE_NAME
 from .raster_layers import get_workspace_raster_layers
+from .vector_tiles import VectorLayerFormat, get_vector_layer_format, get_vector_tile_url
 
-CatalogItem: TypeAlias = dict[str, str | int]
+CatalogItem: TypeAlias = dict[str, str | int | float | dict[str, float]]
 CatalogGroup: TypeAlias = dict[str, str | bool | list[CatalogItem]]
 Catalog: TypeAlias = dict[Literal["catalog"], list[CatalogGroup]]
 
+log = logging.getLogger(__name__)
+
+# OGC standardised rendering pixel size in metres, used to convert a raster resolution into a scale denominator
+_OGC_PIXEL_SIZE = 0.00028
+# Vector tiles are not requested at zoom levels where a tile would be expected to hold more features than this
+_MAX_FEATURES_PER_TILE = 5000
+# Width of a zoom level 0 web mercator tile at the equator, in metres
+_ZOOM_0_TILE_WIDTH = 40075016.686
+
 
 class Workspaces(StrEnum):
     """
@@ -45,14 +67,83 @@ class Workspaces(StrEnum):
     EXTRUDED_LAYERS_WORKSPACE = "extruded_layers"
 
 
+def get_layer_rectangle(statistics: Optional[Row]) -> Optional[dict[str, float]]:
+    """
+    Create a TerriaJS rectangle from the recorded extent of a layer.
+
+    Parameters
+    ----------
+    statistics : Optional[Row]
+        The recorded statistics of the layer, or None if there are none.
+
+    Returns
+    -------
+    Optional[dict[str, float]]
+        The WGS84 west, south, east and north extent of the layer, or None if the extent is unknown.
+    """
+    if statistics is None or statistics.xmin is None:
+        return None
+    return {"west": statistics.xmin, "south": statistics.ymin, "east": statistics.xmax, "north": statistics.ymax}
+
+
+def get_minimum_zoom(statistics: Optional[Row]) -> int:
+    """
+    Find the lowest zoom level at which the vector tiles of a layer hold a manageable number of features.
+    Assumes that features are spread evenly over the extent of the layer.
+
+    Parameters
+    ----------
+    statistics : Optional[Row]
+        The recorded statistics of the layer, or None if there are none.
+
+    Returns
+    -------
+    int
+        The minimum zoom level to request vector tiles for.
+    """
+    if statistics is None or statistics.xmin is None or not statistics.feature_count:
+        return 0
+    mid_latitude = math.radians((statistics.ymin + statistics.ymax) / 2)
+    metres_per_degree = _ZOOM_0_TILE_WIDTH / 360
+    # Floor the extent at roughly 1 m so that point layers do not divide by zero
+    extent_area = (max((statistics.xmax - statistics.xmin) * metres_per_degree * math.cos(mid_latitude), 1) *
+                   max((statistics.ymax - statistics.ymin) * metres_per_degree, 1))
+    feature_density = statistics.feature_count / extent_area
+
+    def features_per_tile(zoom: int) -> float:
+        """
+        Estimate the number of features within a tile at a zoom level, which cannot exceed the whole layer.
+
+        Parameters
+        ----------
+        zoom : int
+            The zoom level of the tile.
+
+        Returns
+        -------
+        float
+            The estimated number of features within the tile.
+        """
+        tile_area = (_ZOOM_0_TILE_WIDTH * math.cos(mid_latitude) / 2 ** zoom) ** 2
+        return min(statistics.feature_count, feature_density * tile_area)
+
+    zoom = 0
+    while zoom < 20 and features_per_tile(zoom) > _MAX_FEATURES_PER_TILE:
+        zoom += 1
+    return zoom
+
+
 def create_vector_layer_catalog_item(
     workspace_name: str,
     workspace_url: str,
     layer_name: str,
-    max_features: int = 60000
+    max_features: int = 60000,
+    statistics: Optional[Row] = None
 ) -> CatalogItem:
     """
-    Create a JSON TerriaJS catalog item for a single GeoServer vector WFS layer.
+    Create a JSON TerriaJS catalog item for a single GeoServer vector layer.
+    The layer is served as Mapbox Vector Tiles if TERRIA_VECTOR_LAYER_FORMAT is "mvt",
+    except for extruded layers since vector tiles do not support extrusion in TerriaJS.
 
     Parameters
     ----------
@@ -64,28 +155,53 @@ def create_vector_layer_catalog_item(
         The name of the layer in Geoserver.
     max_features : int = 60000
         The maximum number of features to fetch from Geoserver.
+    statistics : Optional[Row] = None
+        The recorded statistics of the layer, used to add its extent, feature count and zoom hints.
 
     Returns
     -------
     CatalogItem
-        JSON TerriaJS catalog item for a single GeoServer raster WMS layer.
+        JSON TerriaJS catalog item for a single GeoServer vector layer.
     """
-    catalog_item = {
-        "type": "wfs",
-        "name": layer_name,
-        "description": "Geospatial layers fetched through the Flood Resilience Digital Twin backend.",
-        "url": f"{workspace_url}/ows",
-        "typeNames": f"{workspace_name}:{layer_name}",
-        "maxFeatures": max_features,
-    }
-    if workspace_name == Workspaces.EXTRUDED_LAYERS_WORKSPACE:
-        catalog_item["heightProperty"] = "Ext_height"
+    if (get_vector_layer_format() == VectorLayerFormat.MVT and
+            workspace_name != Workspaces.EXTRUDED_LAYERS_WORKSPACE):
+        catalog_item = {
+            "type": "mvt",
+            "name": layer_name,
+            "description": "Geospatial layers fetched through the Flood Resilience Digital Twin backend.",
+            "url": get_vector_tile_url(workspace_name, layer_name),
+            "layer": layer_name,
+            "minimumZoom": get_minimum_zoom(statistics),
+        }
+    else:
+        if statistics is not None and statistics.feature_count is not None:
+            # Do not ask for more features than the layer holds
+            max_features = max(min(max_features, statistics.feature_count), 1)
+        catalog_item = {
+            "type": "wfs",
+            "name": layer_name,
+            "description": "Geospatial layers fetched through the Flood Resilience Digital Twin backend.",
+            "url": f"{workspace_url}/ows",
+            "typeNames": f"{workspace_name}:{layer_name}",
+            "maxFeatures": max_features,
+        }
+        if workspace_name == Workspaces.EXTRUDED_LAYERS_WORKSPACE:
+            catalog_item["heightProperty"] = "Ext_height"
+    rectangle = get_layer_rectangle(statistics)
+    if rectangle is not None:
+        catalog_item["rectangle"] = rectangle
     return catalog_item
 
 
-def create_raster_layer_catalog_item(workspace_url: str, layer_name: str) -> CatalogItem:
+def create_raster_layer_catalog_item(
+    workspace_url: str,
+    layer_name: str,
+    statistics: Optional[Row] = None
+) -> CatalogItem:
     """
     Create a JSON TerriaJS catalog item for a single GeoServer raster WMS layer.
+    ImageMosaic layers use their default style, and Terria reads their time and scenario dimensions from the WMS
+    capabilities so that users can switch between model runs within the one layer.
 
     Parameters
     ----------
@@ -93,6 +209,8 @@ def create_raster_layer_catalog_item(workspace_url: str, layer_name: str) -> Cat
         The URL to the GeoServer workspace.
     layer_name : str
         The name of the layer in Geoserver.
+    statistics : Optional[Row] = None
+        The recorded statistics of the layer, used to add its extent and native resolution.
 
     Returns
     -------
@@ -104,38 +222,53 @@ def create_raster_layer_catalog_item(workspace_url: str, layer_name: str) -> Cat
         "name": layer_name,
         "url": f"{workspace_url}/wms",
         "layers": layer_name,
-        "styles": layer_name,
     }
+    if layer_name != MOSAIC_STORE_NAME:
+        catalog_item["styles"] = layer_name
+    rectangle = get_layer_rectangle(statistics)
+    if rectangle is not None:
+        catalog_item["rectangle"] = rectangle
+    if statistics is not None and statistics.resolution:
+        # Zooming in past the native resolution of the raster only enlarges its pixels, so reuse those tiles instead
+        catalog_item["minScaleDenominator"] = statistics.resolution / _OGC_PIXEL_SIZE
     return catalog_item
 
 
-def get_layers_as_terria_group(workspace_name: str) -> CatalogGroup:
+def create_terria_group(
+    workspace_name: str,
+    vector_layers: list[str],
+    raster_layers: list[str],
+    statistics: Optional[dict[tuple[str, str], Row]] = None
+) -> CatalogGroup:
     """
-    Query geoserver for available layers within a workspace, and return a terria catalog to serve the data.
-    The style definition may be empty.
+    Create a terria catalog group for the layers of a workspace.
 
     Parameters
     ----------
     workspace_name : str
-        The name of the geoserver workspace to query for.
+        The name of the geoserver workspace.
+    vector_layers : list[str]
+        The names of the vector layers within the workspace.
+    raster_layers : list[str]
+        The names of the raster layers within the workspace.
+    statistics : Optional[dict[tuple[str, str], Row]] = None
+        Maps the workspace and name of layers to their recorded statistics.
 
     Returns
     -------
     CatalogGroup
         Represents the Terria JSON catalog group items for each layer within the workspace.
-
-    Raises
-    -------
-    HTTPError
-        If geoserver responds with anything but OK or NOT_FOUND, raises it as an exception since it is unexpected.
     """
+    statistics = statistics or {}
     catalog_group = []
     workspace_url = f"{EnvVariable.GEOSERVER_HOST}:{EnvVariable.GEOSERVER_PORT}/geoserver/{workspace_name}"
-    for vector_layer in get_workspace_vector_layers(workspace_name):
-        catalog_item = create_vector_layer_catalog_item(workspace_name, workspace_url, vector_layer)
+    for vector_layer in vector_layers:
+        catalog_item = create_vector_layer_catalog_item(
+            workspace_name, workspace_url, vector_layer, statistics=statistics.get((workspace_name, vector_layer)))
         catalog_group.append(catalog_item)
-    for raster_layer in get_workspace_raster_layers(workspace_name):
-        catalog_item = create_raster_layer_catalog_item(workspace_url, raster_layer)
+    for raster_layer in raster_layers:
+        catalog_item = create_raster_layer_catalog_item(
+            workspace_url, raster_layer, statistics.get((workspace_name, raster_layer)))
         catalog_group.append(catalog_item)
     return {
         "type": "group",
@@ -145,18 +278,184 @@ def get_layers_as_terria_group(workspace_name: str) -> CatalogGroup:
     }
 
 
+def get_layers_as_terria_group(workspace_name: str) -> CatalogGroup:
+    """
+    Query geoserver for available layers within a workspace, and return a terria catalog to serve the data.
+    The style definition may be empty.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the geoserver workspace to query for.
+
+    Returns
+    -------
+    CatalogGroup
+        Represents the Terria JSON catalog group items for each layer within the workspace.
+
+    Raises
+    -------
+    HTTPError
+        If geoserver responds with anything but OK or NOT_FOUND, raises it as an exception since it is unexpected.
+    """
+    return create_terria_group(
+        workspace_name, get_workspace_vector_layers(workspace_name), get_workspace_raster_layers(workspace_name)
+    )
+
+
+# Vector and raster listings for each workspace, and the layer statistics
+_LISTING_COUNT = 2 * len(Workspaces) + 1
+# Listings run on long-lived threads so that each thread's session reuses its connections between catalog builds
+_listing_executor = ThreadPoolExecutor(max_workers=_LISTING_COUNT, thread_name_prefix="terria-catalog-listing")
+# Sessions are not thread-safe, so each listing thread has its own
+_listing_sessions = threading.local()
+
+
+def _list_workspace_layers(list_layers: Callable[..., list[str]], workspace_name: str) -> list[str]:
+    """
+    List the layers of a workspace using the session of the current listing thread.
+
+    Parameters
+    ----------
+    list_layers : Callable[..., list[str]]
+        Function that lists the vector or raster layers of a workspace.
+    workspace_name : str
+        The name of the workspace to list the layers of.
+
+    Returns
+    -------
+    list[str]
+        The names of each layer.
+    """
+    session = getattr(_listing_sessions, "session", None)
+    if session is None:
+        session = _listing_sessions.session = requests.Session()
+    return list_layers(workspace_name, session=session, timeout=EnvVariable.TERRIA_CATALOG_REQUEST_TIMEOUT)
+
+
+def _listing_result(listing: Future[list[str]], description: str, deadline: float) -> Optional[list[str]]:
+    """
+    Retrieve the layer names from a concurrent geoserver listing, giving up once the catalog deadline has passed.
+
+    Parameters
+    ----------
+    listing : Future[list[str]]
+        The submitted listing of layer names.
+    description : str
+        Describes the listing for logging purposes.
+    deadline : float
+        The monotonic time by which the listing must have finished.
+
+    Returns
+    -------
+    Optional[list[str]]
+        The names of each layer, or None if the listing failed or did not finish in time.
+    """
+    try:
+        return listing.result(timeout=max(deadline - time.monotonic(), 0))
+    except TimeoutError:
+        log.warning(f"Leaving {description} out of the Terria catalog since listing them took too long.")
+    except requests.RequestException as e:
+        log.warning(f"Leaving {description} out of the Terria catalog since listing them failed: {e}")
+    return None
+
+
+def _read_layer_statistics() -> Optional[dict[tuple[str, str], Row]]:
+    """
+    Read the recorded statistics of every layer.
+
+    Returns
+    -------
+    Optional[dict[tuple[str, str], Row]]
+        Maps the workspace and name of each layer to its statistics, or None if reading them failed.
+    """
+    try:
+        engine = setup_environment.get_database()
+        try:
+            with engine.connect() as conn:
+                return layer_statistics.read_layer_statistics(conn)
+        finally:
+            engine.dispose()
+    except SQLAlchemyError as e:
+        log.warning(f"Leaving layer statistics out of the Terria catalog since reading them failed: {e}")
+        return None
+
+
+def build_terria_catalog() -> tuple[Catalog, bool]:
+    """
+    Query geoserver for available layers from key workspaces, and build a terria catalog to serve the data.
+    Every workspace is listed concurrently. A listing that fails or is not finished within
+    TERRIA_CATALOG_REQUEST_TIMEOUT of the build starting is left out,
+    so a slow or broken workspace gives a partial catalog instead of delaying the whole catalog.
+
+    Returns
+    -------
+    tuple[Catalog, bool]
+        Represents the Terria JSON catalog items for each layer within the workspaces,
+        and whether every listing succeeded so that the catalog is complete.
+    """
+    deadline = time.monotonic() + EnvVariable.TERRIA_CATALOG_REQUEST_TIMEOUT
+    statistics_listing = _listing_executor.submit(_read_layer_statistics)
+    listings = {
+        workspace: (
+            _listing_executor.submit(_list_workspace_layers, get_workspace_vector_layers, workspace),
+            _listing_executor.submit(_list_workspace_layers, get_workspace_raster_layers, workspace),
+        ) for workspace in Workspaces
+    }
+    complete = True
+    catalog_groups = []
+    for workspace, (vector_listing, raster_listing) in listings.items():
+        vector_layers = _listing_result(vector_listing, f"vector layers of '{workspace}'", deadline)
+        raster_layers = _listing_result(raster_listing, f"raster layers of '{workspace}'", deadline)
+        complete = complete and vector_layers is not None and raster_layers is not None
+        catalog_groups.append((workspace, vector_layers or [], raster_layers or []))
+    try:
+        statistics = statistics_listing.result(timeout=max(deadline - time.monotonic(), 0))
+    except TimeoutError:
+        log.warning("Leaving layer statistics out of the Terria catalog since reading them took too long.")
+        statistics = None
+    complete = complete and statistics is not None
+    catalog = {
+        "catalog": [
+            create_terria_group(workspace, vector_layers, raster_layers, statistics or {})
+            for workspace, vector_layers, raster_layers in catalog_groups
+        ]
+    }
+    return catalog, complete
+
+
 def get_terria_catalog() -> Catalog:
     """
     Query geoserver for available layers from key workspaces, and return a terria catalog to serve the data.
+    Listings that fail or take too long are left out, as described in `build_terria_catalog`.
 
     Returns
     -------
     Catalog
         Represents the Terria JSON catalog items for each layer within the workspaces.
+    """
+    catalog, _complete = build_terria_catalog()
+    return catalog
+
+
+# Cached catalog shared by all requests within the process
+terria_catalog_cache = CatalogCache(
+    build_terria_catalog, EnvVariable.TERRIA_CATALOG_CACHE_TTL, EnvVariable.TERRIA_CATALOG_PARTIAL_CACHE_TTL
+)
+
+
+def get_cached_terria_catalog() -> CachedCatalog:
+    """
+    Retrieve the serialised terria catalog, only querying geoserver if layers have changed or the cache has expired.
+
+    Returns
+    -------
+    CachedCatalog
+        The serialised Terria JSON catalog, with its ETag and last modified time.
 
     Raises
     -------
     HTTPError
-        If geoserver responds with anything but OK or NOT_FOUND, raises it as an exception since it is unexpected.
+        If the catalog has to be built and geoserver responds with an unexpected error.
     """
-    return {"catalog": [get_layers_as_terria_group(workspace) for workspace in Workspaces]}
+    return terria_catalog_cache.get()
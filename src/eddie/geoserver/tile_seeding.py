@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Functions for seeding the GeoWebCache tile cache of GeoServer layers for an area of interest, and for truncating it.
+Seeding renders the tiles ahead of time, so the first users to view a freshly ingested area do not pay the render cost.
+"""
+
+from http import HTTPStatus
+import logging
+import time
+from typing import Callable, Iterable, Optional
+
+import geopandas as gpd
+import redis
+import requests
+
+from eddie.config import EnvVariable
+from eddie.geoserver.database_layers import MAIN_DB_STORE_NAME, vector_layer_registry
+from eddie.geoserver.geoserver_common import get_geowebcache_url
+from eddie.geoserver.raster_layers import raster_layer_registry
+from eddie.message_broker import get_redis_client
+
+log = logging.getLogger(__name__)
+
+# GeoWebCache identifies the legacy web mercator gridset by an alias of EPSG:3857
+_SRS_ALIASES = {900913: 3857}
+# Prefix of the message broker locks held while submitting seed jobs for a layer
+SEED_SUBMIT_LOCK_PREFIX = "eddie:seed_submit"
+# Number of seconds that a seed submission lock is held for at most, in case its holder stops
+SEED_SUBMIT_LOCK_TIMEOUT = 60
+
+
+def get_seed_gridsets() -> list[str]:
+    """
+    Read the names of the GeoWebCache gridsets to seed.
+
+    Returns
+    -------
+    list[str]
+        The gridset names set by the comma-separated GEOSERVER_SEED_GRIDSETS environment variable, e.g. "EPSG:900913".
+    """
+    return [name.strip() for name in EnvVariable.GEOSERVER_SEED_GRIDSETS.split(",") if name.strip()]
+
+
+def get_gridset_srs(gridset_id: str) -> int:
+    """
+    Find the EPSG code of a GeoWebCache gridset.
+
+    Parameters
+    ----------
+    gridset_id : str
+        The name of the gridset, in the form "EPSG:<code>".
+
+    Returns
+    -------
+    int
+        The EPSG code that GeoWebCache expects seed bounds in for the gridset.
+
+    Raises
+    ------
+    ValueError
+        If the gridset is not named by its EPSG code.
+    """
+    authority, _, code = gridset_id.partition(":")
+    if authority.upper() != "EPSG" or not code.isdigit():
+        raise ValueError(f"Gridset '{gridset_id}' must be named in the form 'EPSG:<code>' to be seeded.")
+    return int(code)
+
+
+def get_area_bounds(area_of_interest: gpd.GeoDataFrame, srs: int) -> list[float]:
+    """
+    Find the bounds of an area of interest in the coordinates of a gridset.
+
+    Parameters
+    ----------
+    area_of_interest : gpd.GeoDataFrame
+        A GeoDataFrame representing the area of interest.
+    srs : int
+        The EPSG code of the gridset.
+
+    Returns
+    -------
+    list[float]
+        The bounds of the area, as [xmin, ymin, xmax, ymax].
+    """
+    return [float(bound) for bound in area_of_interest.to_crs(_SRS_ALIASES.get(srs, srs)).total_bounds]
+
+
+def _post_seed_request(
+    layer_name: str,
+    workspace_name: str,
+    area_of_interest: gpd.GeoDataFrame,
+    gridset_id: str
+) -> bool:
+    """
+    Ask GeoWebCache to seed the tiles of a layer that cover an area of interest, at the configured zoom levels.
+
+    Parameters
+    ----------
+    layer_name : str
+        The name of the layer to seed.
+    workspace_name : str
+        The name of the GeoServer workspace the layer belongs to.
+    area_of_interest : gpd.GeoDataFrame
+        A GeoDataFrame representing the area of interest.
+    gridset_id : str
+        The name of the gridset to seed, in the form "EPSG:<code>".
+
+    Returns
+    -------
+    bool
+        True if the seed job was submitted, False if the layer is not tile cached.
+
+    Raises
+    -------
+    HTTPError
+        If geoserver responds with anything but OK or NOT_FOUND, raises it as an exception since it is unexpected.
+    """
+    srs = get_gridset_srs(gridset_id)
+    seed_request = {
+        "seedRequest": {
+            "name": f"{workspace_name}:{layer_name}",
+            "bounds": {"coords": {"double": get_area_bounds(area_of_interest, srs)}},
+            "srs": {"number": srs},
+            "gridSetId": gridset_id,
+            "zoomStart": EnvVariable.GEOSERVER_SEED_ZOOM_START,
+            "zoomStop": EnvVariable.GEOSERVER_SEED_ZOOM_STOP,
+            "format": EnvVariable.GEOSERVER_SEED_FORMAT,
+            "type": "seed",
+            "threadCount": EnvVariable.GEOSERVER_SEED_THREADS,
+        }
+    }
+    response = requests.post(
+        f"{get_geowebcache_url()}/seed/{workspace_name}:{layer_name}.json",
+        json=seed_request,
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+    )
+    if response.status_code == HTTPStatus.NOT_FOUND:
+        log.warning(f"Not seeding {workspace_name}:{layer_name} since it is not tile cached.")
+        return False
+    if not response.ok:
+        # Raise error manually so we can configure the text
+        raise requests.HTTPError(response.text, response=response)
+    return True
+
+
+def truncate_layer_cache(layer_name: str, workspace_name: str) -> bool:
+    """
+    Ask GeoWebCache to delete every cached tile of a layer, so that tiles are rendered again from its current data.
+
+    Parameters
+    ----------
+    layer_name : str
+        The name of the layer to truncate.
+    workspace_name : str
+        The name of the GeoServer workspace the layer belongs to.
+
+    Returns
+    -------
+    bool
+        True if the tile cache was truncated, False if the layer is not tile cached.
+
+    Raises
+    -------
+    HTTPError
+        If geoserver responds with anything but OK or NOT_FOUND, raises it as an exception since it is unexpected.
+    """
+    response = requests.post(
+        f"{get_geowebcache_url()}/masstruncate",
+        headers={"Content-type": "text/xml"},
+        data=f"<truncateLayer><layerName>{workspace_name}:{layer_name}</layerName></truncateLayer>",
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+    )
+    if response.status_code == HTTPStatus.NOT_FOUND:
+        log.debug(f"Not truncating {workspace_name}:{layer_name} since it is not tile cached.")
+        return False
+    if not response.ok:
+        # Raise error manually so we can configure the text
+        raise requests.HTTPError(response.text, response=response)
+    return True
+
+
+def get_seed_tasks(layer_name: str, workspace_name: str) -> list[list[int]]:
+    """
+    Retrieve the seed tasks of a layer that are still pending or running.
+
+    Parameters
+    ----------
+    layer_name : str
+        The name of the layer being seeded.
+    workspace_name : str
+        The name of the GeoServer workspace the layer belongs to.
+
+    Returns
+    -------
+    list[list[int]]
+        For each task, [tiles processed, total tiles, estimated seconds remaining, task id, task status].
+
+    Raises
+    -------
+    HTTPError
+        If geoserver responds with anything but OK, raises it as an exception since it is unexpected.
+    """
+    response = requests.get(
+        f"{get_geowebcache_url()}/seed/{workspace_name}:{layer_name}.json",
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+    )
+    response.raise_for_status()
+    return response.json()["long-array-array"]
+
+
+def submit_seed_job(
+    layer_name: str,
+    workspace_name: str,
+    area_of_interest: gpd.GeoDataFrame,
+    gridset_id: str
+) -> list[int]:
+    """
+    Ask GeoWebCache to seed the tiles of a layer that cover an area of interest, and find the IDs of the seed tasks.
+    GeoWebCache does not return the IDs, so they are the tasks of the layer that appear once the job is submitted.
+    Submissions for the same layer hold a lock in the message broker, so that they do not claim each other's tasks.
+
+    Parameters
+    ----------
+    layer_name : str
+        The name of the layer to seed.
+    workspace_name : str
+        The name of the GeoServer workspace the layer belongs to.
+    area_of_interest : gpd.GeoDataFrame
+        A GeoDataFrame representing the area of interest.
+    gridset_id : str
+        The name of the gridset to seed, in the form "EPSG:<code>".
+
+    Returns
+    -------
+    list[int]
+        The IDs of the seed tasks of this job that are still pending or running, empty if the layer is not tile cached.
+
+    Raises
+    -------
+    HTTPError
+        If geoserver responds with an unexpected error.
+    """
+    lock = get_redis_client().lock(
+        f"{SEED_SUBMIT_LOCK_PREFIX}:{workspace_name}:{layer_name}",
+        timeout=SEED_SUBMIT_LOCK_TIMEOUT,
+        blocking_timeout=SEED_SUBMIT_LOCK_TIMEOUT
+    )
+    try:
+        locked = lock.acquire()
+    except redis.RedisError as e:
+        log.warning(f"Could not lock seed submission of {workspace_name}:{layer_name}, seeding anyway: {e}")
+        locked = False
+    try:
+        previous_task_ids = {task[3] for task in get_seed_tasks(layer_name, workspace_name)}
+        if not _post_seed_request(layer_name, workspace_name, area_of_interest, gridset_id):
+            return []
+        return [task[3] for task in get_seed_tasks(layer_name, workspace_name) if task[3] not in previous_task_ids]
+    finally:
+        if locked:
+            try:
+                lock.release()
+            except redis.RedisError as e:
+                log.warning(f"Could not unlock seed submission of {workspace_name}:{layer_name}, it will expire: {e}")
+
+
+def seed_layers_for_area(
+    layers: Iterable[tuple[str, str]],
+    area_of_interest: gpd.GeoDataFrame
+) -> dict[str, list[int]]:
+    """
+    Submit seed jobs for the tiles of each layer that cover an area of interest, without waiting for them to finish.
+
+    Parameters
+    ----------
+    layers : Iterable[tuple[str, str]]
+        The (workspace name, layer name) of each layer to seed.
+    area_of_interest : gpd.GeoDataFrame
+        A GeoDataFrame representing the area of interest.
+
+    Returns
+    -------
+    dict[str, list[int]]
+        Maps the full name "<workspace>:<layer>" of each seeding layer to the IDs of its seed tasks.
+
+    Raises
+    -------
+    HTTPError
+        If geoserver responds with an unexpected error.
+    """
+    seed_task_ids: dict[str, list[int]] = {}
+    for workspace_name, layer_name in layers:
+        for gridset_id in get_seed_gridsets():
+            task_ids = submit_seed_job(layer_name, workspace_name, area_of_interest, gridset_id)
+            if task_ids:
+                seed_task_ids.setdefault(f"{workspace_name}:{layer_name}", []).extend(task_ids)
+    log.info(f"Seeding tile caches of {len(seed_task_ids)} layers.")
+    return seed_task_ids
+
+
+def wait_for_seeding(
+    seed_task_ids: dict[str, list[int]],
+    progress_callback: Optional[Callable[[dict[str, int]], None]] = None,
+    poll_interval: float = 5
+) -> dict[str, int]:
+    """
+    Wait for the given seed tasks to finish, ignoring other seed tasks of the same layers.
+    Stops waiting after GEOSERVER_SEED_TIMEOUT seconds, leaving any remaining seeding to continue in GeoServer.
+
+    Parameters
+    ----------
+    seed_task_ids : dict[str, list[int]]
+        Maps the full name "<workspace>:<layer>" of each seeding layer to the IDs of its seed tasks.
+    progress_callback : Optional[Callable[[dict[str, int]], None]] = None
+        Called with the seeding progress each time it is polled.
+    poll_interval : float = 5
+        The number of seconds to wait between checking seeding progress.
+
+    Returns
+    -------
+    dict[str, int]
+        The final seeding progress, with the number of layers seeding and tiles processed by the remaining tasks.
+
+    Raises
+    -------
+    HTTPError
+        If geoserver responds with an unexpected error.
+    """
+    seeding_layers = {layer_full_name: set(task_ids) for layer_full_name, task_ids in seed_task_ids.items()}
+    total_layers = len(seeding_layers)
+    deadline = time.monotonic() + EnvVariable.GEOSERVER_SEED_TIMEOUT
+    progress = {"layers_total": total_layers, "layers_seeding": total_layers, "tiles_done": 0, "tiles_total": 0}
+    while seeding_layers:
+        tiles_done = tiles_total = 0
+        for layer_full_name, task_ids in list(seeding_layers.items()):
+            workspace_name, layer_name = layer_full_name.split(":", 1)
+            tasks = [task for task in get_seed_tasks(layer_name, workspace_name) if task[3] in task_ids]
+            if not tasks:
+                # Finished tasks are removed from the list, so no remaining tasks means the layer is seeded
+                del seeding_layers[layer_full_name]
+            for task in tasks:
+                tiles_done += max(task[0], 0)
+                tiles_total += max(task[1], 0)
+        progress = {"layers_total": total_layers, "layers_seeding": len(seeding_layers),
+                    "tiles_done": tiles_done, "tiles_total": tiles_total}
+        if progress_callback is not None:
+            progress_callback(progress)
+        if seeding_layers and time.monotonic() > deadline:
+            log.warning(f"Stopped waiting for {len(seeding_layers)} layers to finish seeding.")
+            break
+        if seeding_layers:
+            time.sleep(poll_interval)
+    return progress
+
+
+def seed_workspace_for_area(workspace_name: str, area_of_interest: gpd.GeoDataFrame) -> dict[str, list[int]]:
+    """
+    Submit seed jobs for the tiles of every vector and raster layer in a workspace that cover an area of interest.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the GeoServer workspace to seed.
+    area_of_interest : gpd.GeoDataFrame
+        A GeoDataFrame representing the area of interest.
+
+    Returns
+    -------
+    dict[str, list[int]]
+        Maps the full name "<workspace>:<layer>" of each seeding layer to the IDs of its seed tasks.
+    """
+    vector_layer_names = vector_layer_registry.layers(workspace_name, MAIN_DB_STORE_NAME)
+    raster_layer_names = raster_layer_registry.layers(workspace_name)
+    layers = [(workspace_name, layer_name) for layer_name in sorted(vector_layer_names | raster_layer_names)]
+    return seed_layers_for_area(layers, area_of_interest)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Functions for serving vector layers as cached Mapbox Vector Tiles (MVT) through GeoWebCache.
+Vector tiles only contain the features within the viewport, simplified to the zoom level,
+instead of every feature of the layer at full precision.
+"""
+
+from enum import StrEnum
+from http import HTTPStatus
+import logging
+import threading
+
+import requests
+
+from eddie.config import EnvVariable
+from eddie.geoserver.geoserver_common import get_geowebcache_url
+
+log = logging.getLogger(__name__)
+_xml_header = {"Content-type": "text/xml"}
+
+MVT_FORMAT = "application/vnd.mapbox-vector-tile"
+# Gridset matching the XYZ tiling scheme used by web maps
+VECTOR_TILE_GRIDSET = "EPSG:900913"
+
+# Layers known to have vector tile caching enabled, so that GeoWebCache is only checked once per layer per process
+_vector_tile_cached_layers: set[str] = set()
+_vector_tile_cached_layers_lock = threading.Lock()
+
+
+class VectorLayerFormat(StrEnum):
+    """
+    Enum defining how vector layers are served to TerriaJS.
+
+    Attributes
+    ----------
+    WFS : str
+        Serve every feature of the layer as GeoJSON through WFS.
+    MVT : str
+        Serve cached Mapbox Vector Tiles through GeoWebCache.
+    """
+
+    WFS = "wfs"
+    MVT = "mvt"
+
+
+def get_vector_layer_format() -> VectorLayerFormat:
+    """
+    Read the configured vector layer format.
+
+    Returns
+    -------
+    VectorLayerFormat
+        The format set by the TERRIA_VECTOR_LAYER_FORMAT environment variable.
+    """
+    return VectorLayerFormat(EnvVariable.TERRIA_VECTOR_LAYER_FORMAT.lower())
+
+
+def enable_vector_tile_caching(workspace_name: str, layer_name: str) -> None:
+    """
+    Configure the GeoWebCache tile layer of a GeoServer layer to cache Mapbox Vector Tiles as well as PNG images.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the GeoServer workspace the layer belongs to.
+    layer_name : str
+        The name of the layer to cache vector tiles for.
+
+    Raises
+    ----------
+    HTTPError
+        If geoserver responds with an error, raises it as an exception since it is unexpected.
+    """
+    layer_full_name = f"{workspace_name}:{layer_name}"
+    log.debug(f"Enabling vector tile caching for '{layer_full_name}'.")
+    data = f"""
+    <GeoServerLayer>
+        <enabled>true</enabled>
+        <name>{layer_full_name}</name>
+        <mimeFormats>
+            <string>image/png</string>
+            <string>{MVT_FORMAT}</string>
+        </mimeFormats>
+        <gridSubsets>
+            <gridSubset><gridSetName>{VECTOR_TILE_GRIDSET}</gridSetName></gridSubset>
+            <gridSubset><gridSetName>EPSG:4326</gridSetName></gridSubset>
+        </gridSubsets>
+        <metaWidthHeight><int>4</int><int>4</int></metaWidthHeight>
+        <gutter>0</gutter>
+    </GeoServerLayer>
+    """
+    response = requests.put(
+        f"{get_geowebcache_url()}/layers/{layer_full_name}.xml",
+        headers=_xml_header,
+        data=data,
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+    )
+    if not response.ok:
+        # Raise error manually so we can configure the text
+        raise requests.HTTPError(response.text, response=response)
+    with _vector_tile_cached_layers_lock:
+        _vector_tile_cached_layers.add(layer_full_name)
+
+
+def is_vector_tile_caching_enabled(workspace_name: str, layer_name: str) -> bool:
+    """
+    Check whether the GeoWebCache tile layer of a GeoServer layer caches Mapbox Vector Tiles.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the GeoServer workspace the layer belongs to.
+    layer_name : str
+        The name of the layer to check.
+
+    Returns
+    -------
+    bool
+        True if the tile layer exists and caches Mapbox Vector Tiles.
+
+    Raises
+    ----------
+    HTTPError
+        If geoserver responds with an error other than the tile layer not existing.
+    """
+    response = requests.get(
+        f"{get_geowebcache_url()}/layers/{workspace_name}:{layer_name}.xml",
+        auth=(EnvVariable.GEOSERVER_ADMIN_NAME, EnvVariable.GEOSERVER_ADMIN_PASSWORD)
+    )
+    if response.status_code == HTTPStatus.NOT_FOUND:
+        return False
+    if not response.ok:
+        # Raise error manually so we can configure the text
+        raise requests.HTTPError(response.text, response=response)
+    return MVT_FORMAT in response.text
+
+
+def ensure_vector_tile_caching(workspace_name: str, layer_name: str) -> None:
+    """
+    Enable vector tile caching for a GeoServer layer if it is not already enabled.
+    Layers created before vector tiles were configured are covered too, since GeoWebCache is checked for each layer.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the GeoServer workspace the layer belongs to.
+    layer_name : str
+        The name of the layer to cache vector tiles for.
+    """
+    layer_full_name = f"{workspace_name}:{layer_name}"
+    with _vector_tile_cached_layers_lock:
+        if layer_full_name in _vector_tile_cached_layers:
+            return
+    if not is_vector_tile_caching_enabled(workspace_name, layer_name):
+        enable_vector_tile_caching(workspace_name, layer_name)
+    with _vector_tile_cached_layers_lock:
+        _vector_tile_cached_layers.add(layer_full_name)
+
+
+def get_vector_tile_url(workspace_name: str, layer_name: str) -> str:
+    """
+    Create the public XYZ template URL for the cached vector tiles of a layer.
+
+    Parameters
+    ----------
+    workspace_name : str
+        The name of the GeoServer workspace the layer belongs to.
+    layer_name : str
+        The name of the layer.
+
+    Returns
+    -------
+    str
+        The WMTS GetTile URL with {z}, {x} and {y} placeholders.
+    """
+    return (
+        f"{EnvVariable.GEOSERVER_HOST}:{EnvVariable.GEOSERVER_PORT}/geoserver/gwc/service/wmts"
+        f"?REQUEST=GetTile&SERVICE=WMTS&VERSION=1.0.0&LAYER={workspace_name}:{layer_name}&STYLE="
+        f"&TILEMATRIXSET={VECTOR_TILE_GRIDSET}&TILEMATRIX={VECTOR_TILE_GRIDSET}:{{z}}&TILEROW={{y}}&TILECOL={{x}}"
+        f"&FORMAT={MVT_FORMAT}"
+    )
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Access to the Redis message broker, shared by Celery and by state that must be consistent between processes."""
+from functools import cache
+
+import redis
+
+from eddie.config import EnvVariable
+
+message_broker_url = f"redis://{EnvVariable.MESSAGE_BROKER_HOST}:6379/0"
+
+
+@cache
+def get_redis_client() -> redis.Redis:
+    """
+    Retrieve the Redis client for the message broker, shared within the process.
+    The client keeps a pool of connections, so it is safe to use from multiple threads.
+
+    Returns
+    -------
+    redis.Redis
+        The Redis client connected to the message broker.
+    """
+    return redis.Redis.from_url(message_broker_url, socket_timeout=5, socket_connect_timeout=5)
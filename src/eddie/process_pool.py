@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A shared process pool for CPU-bound geometry operations, such as overlays, reprojections and parsing GeoJSON.
+Celery workers and the API run tasks in threads, so these operations would otherwise hold the GIL and stall every other
+task in the same process. The pool is only used if PROCESS_POOL_ENABLED, and is started the first time it is needed.
+Geometries are sent to and from the pool as arrays of WKB, which is much cheaper than pickling each geometry.
+"""
+
+import asyncio
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import json
+import logging
+import multiprocessing
+import threading
+from typing import Callable, NamedTuple, Optional, TypeVar
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from pyproj import CRS
+import shapely
+
+from eddie.config import EnvVariable
+
+log = logging.getLogger(__name__)
+
+ReturnT = TypeVar("ReturnT")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Retrieve the process pool shared within this process, starting it if it has not been started yet.
+    Worker processes are spawned rather than forked, since forking a process with running threads can deadlock.
+
+    Returns
+    -------
+    ProcessPoolExecutor
+        The shared process pool.
+    """
+    global _pool  # pylint: disable=global-statement
+    with _pool_lock:
+        if _pool is None:
+            log.info(f"Starting process pool with {EnvVariable.PROCESS_POOL_WORKERS} workers.")
+            _pool = ProcessPoolExecutor(
+                max_workers=EnvVariable.PROCESS_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(_pool.shutdown, cancel_futures=True)
+        return _pool
+
+
+def _discard_process_pool(broken_pool: ProcessPoolExecutor) -> None:
+    """
+    Forget a process pool that broke because one of its worker processes died, so that the next use starts a new pool.
+
+    Parameters
+    ----------
+    broken_pool : ProcessPoolExecutor
+        The broken process pool.
+    """
+    global _pool  # pylint: disable=global-statement
+    with _pool_lock:
+        # Another thread may have already replaced the broken pool
+        if _pool is broken_pool:
+            _pool = None
+    atexit.unregister(broken_pool.shutdown)
+    broken_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_in_process_pool(func: Callable[..., ReturnT], *args: object) -> ReturnT:
+    """
+    Run a function in the shared process pool and wait for its result, or run it directly if the pool is disabled.
+    If a worker process dies, the broken pool is replaced by a new one and the function is retried once.
+
+    Parameters
+    ----------
+    func : Callable[..., ReturnT]
+        A module-level function, so that it can be sent to the worker processes.
+    *args : object
+        The arguments for func, which must be picklable.
+
+    Returns
+    -------
+    ReturnT
+        The result of func(*args).
+
+    Raises
+    ------
+    BrokenProcessPool
+        If a worker process died while running func in the new pool as well.
+    """
+    if not EnvVariable.PROCESS_POOL_ENABLED:
+        return func(*args)
+    pool = get_process_pool()
+    try:
+        return pool.submit(func, *args).result()
+    except BrokenProcessPool:
+        _discard_process_pool(pool)
+        log.warning(f"Process pool broke while running '{func.__name__}', retrying in a new pool.")
+    pool = get_process_pool()
+    try:
+        return pool.submit(func, *args).result()
+    except BrokenProcessPool:
+        _discard_process_pool(pool)
+        raise
+
+
+async def run_in_process_pool_async(func: Callable[..., ReturnT], *args: object) -> ReturnT:
+    """
+    Run a function in the shared process pool without blocking the event loop, or run it directly if the pool is
+    disabled. If a worker process dies, the broken pool is replaced by a new one and the function is retried once.
+
+    Parameters
+    ----------
+    func : Callable[..., ReturnT]
+        A module-level function, so that it can be sent to the worker processes.
+    *args : object
+        The arguments for func, which must be picklable.
+
+    Returns
+    -------
+    ReturnT
+        The result of func(*args).
+
+    Raises
+    ------
+    BrokenProcessPool
+        If a worker process died while running func in the new pool as well.
+    """
+    if not EnvVariable.PROCESS_POOL_ENABLED:
+        return func(*args)
+    pool = get_process_pool()
+    try:
+        return await asyncio.wrap_future(pool.submit(func, *args))
+    except BrokenProcessPool:
+        _discard_process_pool(pool)
+        log.warning(f"Process pool broke while running '{func.__name__}', retrying in a new pool.")
+    pool = get_process_pool()
+    try:
+        return await asyncio.wrap_future(pool.submit(func, *args))
+    except BrokenProcessPool:
+        _discard_process_pool(pool)
+        raise
+
+
+class PackedGeoDataFrame(NamedTuple):
+    """
+    A GeoDataFrame with its geometries encoded as an array of WKB, so that it can be sent between processes cheaply.
+
+    Attributes
+    ----------
+    attributes : pd.DataFrame
+        The non-geometry columns and the index.
+    wkb : np.ndarray
+        The geometries encoded as WKB.
+    geometry_name : str
+        The name of the geometry column.
+    crs : Optional[str]
+        The coordinate reference system as WKT, or None if it is not set.
+    """
+
+    attributes: pd.DataFrame
+    wkb: np.ndarray
+    geometry_name: str
+    crs: Optional[str]
+
+
+def pack_geodataframe(gdf: gpd.GeoDataFrame) -> PackedGeoDataFrame:
+    """
+    Encode a GeoDataFrame so that it can be sent between processes cheaply.
+
+    Parameters
+    ----------
+    gdf : gpd.GeoDataFrame
+        The GeoDataFrame to encode.
+
+    Returns
+    -------
+    PackedGeoDataFrame
+        The encoded GeoDataFrame.
+    """
+    geometry_name = gdf.geometry.name
+    return PackedGeoDataFrame(
+        attributes=pd.DataFrame(gdf.drop(columns=geometry_name)),
+        wkb=shapely.to_wkb(gdf.geometry.values, include_srid=False),
+        geometry_name=geometry_name,
+        crs=gdf.crs.to_wkt() if gdf.crs is not None else None,
+    )
+
+
+def unpack_geodataframe(packed: PackedGeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Decode a GeoDataFrame that was encoded by pack_geodataframe.
+
+    Parameters
+    ----------
+    packed : PackedGeoDataFrame
+        The encoded GeoDataFrame.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        The decoded GeoDataFrame, with the same columns, index and CRS as the original.
+    """
+    gdf = packed.attributes.copy()
+    gdf[packed.geometry_name] = gpd.GeoSeries(shapely.from_wkb(packed.wkb), index=gdf.index, crs=packed.crs)
+    return gpd.GeoDataFrame(gdf, geometry=packed.geometry_name, crs=packed.crs)
+
+
+def _is_heavy(*gdfs: gpd.GeoDataFrame) -> bool:
+    """
+    Check if GeoDataFrames have enough coordinates to be worth sending to the process pool.
+
+    Parameters
+    ----------
+    gdfs : gpd.GeoDataFrame
+        The GeoDataFrames that an operation will process.
+
+    Returns
+    -------
+    bool
+        True if the process pool is enabled and the GeoDataFrames have at least PROCESS_POOL_MIN_COORDINATES in total.
+    """
+    if not EnvVariable.PROCESS_POOL_ENABLED:
+        return False
+    coordinate_count = sum(int(shapely.get_num_coordinates(gdf.geometry.values).sum()) for gdf in gdfs)
+    return coordinate_count >= EnvVariable.PROCESS_POOL_MIN_COORDINATES
+
+
+def _packed_overlay(left: PackedGeoDataFrame, right: PackedGeoDataFrame, how: str) -> PackedGeoDataFrame:
+    """Overlay two encoded GeoDataFrames in a worker process."""
+    return pack_geodataframe(unpack_geodataframe(left).overlay(unpack_geodataframe(right), how=how))
+
+
+def overlay(left: gpd.GeoDataFrame, right: gpd.GeoDataFrame, how: str = "intersection") -> gpd.GeoDataFrame:
+    """
+    Overlay two GeoDataFrames, in the process pool if they are large enough.
+
+    Parameters
+    ----------
+    left : gpd.GeoDataFrame
+        The GeoDataFrame to overlay onto.
+    right : gpd.GeoDataFrame
+        The GeoDataFrame to overlay.
+    how : str = "intersection"
+        The overlay method, as used by geopandas.GeoDataFrame.overlay.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        The result of left.overlay(right, how=how).
+    """
+    if not _is_heavy(left, right):
+        return left.overlay(right, how=how)
+    packed = run_in_process_pool(_packed_overlay, pack_geodataframe(left), pack_geodataframe(right), how)
+    return unpack_geodataframe(packed)
+
+
+def _packed_to_crs(gdf: PackedGeoDataFrame, crs: CRS | str | int) -> PackedGeoDataFrame:
+    """Reproject an encoded GeoDataFrame in a worker process."""
+    return pack_geodataframe(unpack_geodataframe(gdf).to_crs(crs))
+
+
+def to_crs(gdf: gpd.GeoDataFrame, crs: CRS | str | int) -> gpd.GeoDataFrame:
+    """
+    Reproject a GeoDataFrame, in the process pool if it is large enough.
+
+    Parameters
+    ----------
+    gdf : gpd.GeoDataFrame
+        The GeoDataFrame to reproject.
+    crs : CRS | str | int
+        The coordinate reference system to reproject to, as accepted by geopandas.GeoDataFrame.to_crs.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        The result of gdf.to_crs(crs).
+    """
+    if not _is_heavy(gdf):
+        return gdf.to_crs(crs)
+    return unpack_geodataframe(run_in_process_pool(_packed_to_crs, pack_geodataframe(gdf), crs))
+
+
+def _parse_geojson(geojson: bytes) -> Optional[PackedGeoDataFrame]:
+    """Parse a GeoJSON FeatureCollection into an encoded GeoDataFrame in a worker process, or None if it is empty."""
+    gdf = gpd.GeoDataFrame.from_features(json.loads(geojson))
+    return pack_geodataframe(gdf) if not gdf.empty else None
+
+
+async def parse_geojson_async(geojson: bytes) -> gpd.GeoDataFrame:
+    """
+    Parse a GeoJSON FeatureCollection into a GeoDataFrame, in the process pool if it is enabled.
+    Responses are parsed in the pool regardless of their size, since parsing JSON is slow relative to sending bytes.
+
+    Parameters
+    ----------
+    geojson : bytes
+        The GeoJSON FeatureCollection.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+        The features of the GeoJSON, without a CRS.
+    """
+    if not EnvVariable.PROCESS_POOL_ENABLED:
+        return gpd.GeoDataFrame.from_features(json.loads(geojson))
+    packed = await run_in_process_pool_async(_parse_geojson, geojson)
+    return unpack_geodataframe(packed) if packed is not None else gpd.GeoDataFrame()
@@ -0,0 +1,538 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Rate limits requests to external data providers, shared by every thread and worker through the message broker.
+Each provider has a token bucket limiting its requests per second, and a set of leases limiting its concurrent
+connections, so that the workers together use the full budget of each provider without being rejected by it.
+Leases are renewed while they are held, so that long fetches keep their connection, and expire
+PROVIDER_RATE_LIMIT_LEASE_TTL seconds after a worker stops renewing them.
+"""
+import asyncio
+from contextlib import asynccontextmanager, contextmanager, suppress
+from dataclasses import dataclass
+from functools import cache
+import logging
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, Optional
+import uuid
+
+import redis
+from redis.commands.core import Script
+
+from eddie.config import EnvVariable
+from eddie.message_broker import get_redis_client
+
+log = logging.getLogger(__name__)
+
+RATE_LIMIT_KEY_PREFIX = "eddie:rate_limit"
+# Number of seconds to wait before checking again for a free connection, when all of a provider's connections are used
+CONCURRENCY_POLL_SECONDS = 0.05
+
+# Atomically takes a concurrency lease and a token from the bucket of a provider, or neither.
+# Uses the time of the Redis server so that the clocks of the workers do not need to agree.
+# Returns the number of milliseconds to wait before trying again, or 0 if the lease and token were taken.
+_ACQUIRE_SCRIPT = """
+local bucket_key, leases_key = KEYS[1], KEYS[2]
+local rate, max_concurrency = tonumber(ARGV[1]), tonumber(ARGV[2])
+local lease_id, lease_ttl, poll_ms = ARGV[3], tonumber(ARGV[4]), tonumber(ARGV[5])
+local server_time = redis.call('TIME')
+local now = tonumber(server_time[1]) + tonumber(server_time[2]) / 1000000
+
+if max_concurrency > 0 then
+    -- Leases of workers that stopped without releasing them expire
+    redis.call('ZREMRANGEBYSCORE', leases_key, '-inf', now)
+    if redis.call('ZCARD', leases_key) >= max_concurrency then
+        return poll_ms
+    end
+end
+
+if rate > 0 then
+    -- Allow bursts of up to one second of requests
+    local capacity = math.max(rate, 1)
+    local bucket = redis.call('HMGET', bucket_key, 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(now - updated_at, 0) * rate)
+    if tokens < 1 then
+        return math.max(math.ceil((1 - tokens) / rate * 1000), 1)
+    end
+    redis.call('HSET', bucket_key, 'tokens', tostring(tokens - 1), 'updated_at', tostring(now))
+    redis.call('EXPIRE', bucket_key, math.ceil(capacity / rate) + 60)
+end
+
+if max_concurrency > 0 then
+    redis.call('ZADD', leases_key, now + lease_ttl, lease_id)
+    redis.call('EXPIRE', leases_key, math.ceil(lease_ttl) + 1)
+end
+return 0
+"""
+
+# Extends a concurrency lease that is still held, so that requests that take longer than its TTL keep their connection.
+_RENEW_SCRIPT = """
+local leases_key = KEYS[1]
+local lease_id, lease_ttl = ARGV[1], tonumber(ARGV[2])
+local server_time = redis.call('TIME')
+local now = tonumber(server_time[1]) + tonumber(server_time[2]) / 1000000
+-- A lease that has already expired may have been given to another request, so it is not taken back
+if redis.call('ZSCORE', leases_key, lease_id) then
+    redis.call('ZADD', leases_key, 'XX', now + lease_ttl, lease_id)
+    redis.call('EXPIRE', leases_key, math.ceil(lease_ttl) + 1)
+end
+"""
+
+# Empties the token bucket of a provider until a given number of seconds from now, after it rejected a request.
+_BACK_OFF_SCRIPT = """
+local bucket_key = KEYS[1]
+local rate, delay = tonumber(ARGV[1]), tonumber(ARGV[2])
+local server_time = redis.call('TIME')
+local now = tonumber(server_time[1]) + tonumber(server_time[2]) / 1000000
+redis.call('HSET', bucket_key, 'tokens', tostring(-delay * rate), 'updated_at', tostring(now))
+redis.call('EXPIRE', bucket_key, math.ceil(delay + math.max(rate, 1) / rate) + 60)
+"""
+
+
+@dataclass(frozen=True)
+class ProviderBudget:
+    """
+    The rate of requests that a data provider allows.
+
+    Attributes
+    ----------
+    requests_per_second : float
+        The number of requests per second allowed across all workers, or 0 for no limit.
+    max_concurrency : int
+        The number of requests allowed to be in progress at once across all workers, or 0 for no limit.
+    """
+
+    requests_per_second: float
+    max_concurrency: int
+
+
+def parse_provider_budgets(provider_rate_limits: str) -> Dict[str, ProviderBudget]:
+    """
+    Parse provider budgets from a comma separated list such as "LINZ=10/4,ArcGIS=20/8",
+    where each provider is followed by its requests per second and the number of concurrent requests.
+
+    Parameters
+    ----------
+    provider_rate_limits : str
+        The comma separated list of provider budgets.
+
+    Returns
+    -------
+    Dict[str, ProviderBudget]
+        Maps the name of each data provider to its budget.
+
+    Raises
+    ------
+    ValueError
+        If a provider budget is not in the format "<provider>=<requests_per_second>/<max_concurrency>".
+    """
+    budgets = {}
+    for provider_rate_limit in filter(None, (item.strip() for item in provider_rate_limits.split(","))):
+        try:
+            provider, budget = provider_rate_limit.split("=")
+            requests_per_second, max_concurrency = budget.split("/")
+            budgets[provider.strip()] = ProviderBudget(float(requests_per_second), int(max_concurrency))
+        except ValueError as e:
+            raise ValueError(
+                f"Invalid provider rate limit '{provider_rate_limit}',"
+                " expected '<provider>=<requests_per_second>/<max_concurrency>'."
+            ) from e
+    return budgets
+
+
+@cache
+def get_provider_budgets() -> Dict[str, ProviderBudget]:
+    """
+    Read the provider budgets set by the PROVIDER_RATE_LIMITS environment variable.
+
+    Returns
+    -------
+    Dict[str, ProviderBudget]
+        Maps the name of each rate limited data provider to its budget.
+    """
+    return parse_provider_budgets(EnvVariable.PROVIDER_RATE_LIMITS)
+
+
+@cache
+def _get_acquire_script() -> Script:
+    """
+    Register the script that acquires a request slot with the message broker.
+
+    Returns
+    -------
+    Script
+        The registered script, which is loaded into Redis the first time it is run.
+    """
+    return get_redis_client().register_script(_ACQUIRE_SCRIPT)
+
+
+@cache
+def _get_renew_script() -> Script:
+    """
+    Register the script that renews a concurrency lease with the message broker.
+
+    Returns
+    -------
+    Script
+        The registered script, which is loaded into Redis the first time it is run.
+    """
+    return get_redis_client().register_script(_RENEW_SCRIPT)
+
+
+@cache
+def _get_back_off_script() -> Script:
+    """
+    Register the script that empties the token bucket of a provider with the message broker.
+
+    Returns
+    -------
+    Script
+        The registered script, which is loaded into Redis the first time it is run.
+    """
+    return get_redis_client().register_script(_BACK_OFF_SCRIPT)
+
+
+def _get_keys(provider: str) -> tuple[str, str]:
+    """
+    Find the message broker keys of the token bucket and concurrency leases of a provider.
+
+    Parameters
+    ----------
+    provider : str
+        The name of the data provider.
+
+    Returns
+    -------
+    tuple[str, str]
+        The key of the token bucket, and the key of the concurrency leases.
+    """
+    return f"{RATE_LIMIT_KEY_PREFIX}:{provider}:tokens", f"{RATE_LIMIT_KEY_PREFIX}:{provider}:leases"
+
+
+def _try_acquire(provider: str, budget: ProviderBudget, lease_id: str) -> float:
+    """
+    Try to take a concurrency lease and a request token of a provider.
+
+    Parameters
+    ----------
+    provider : str
+        The name of the data provider.
+    budget : ProviderBudget
+        The budget of the data provider.
+    lease_id : str
+        Unique ID of the request, used to release its concurrency lease.
+
+    Returns
+    -------
+    float
+        The number of seconds to wait before trying again, or 0 if the request may be sent now.
+
+    Raises
+    ------
+    redis.RedisError
+        If the message broker cannot be reached.
+    """
+    wait_ms = _get_acquire_script()(
+        keys=_get_keys(provider),
+        args=[
+            budget.requests_per_second, budget.max_concurrency, lease_id,
+            EnvVariable.PROVIDER_RATE_LIMIT_LEASE_TTL, int(CONCURRENCY_POLL_SECONDS * 1000)
+        ]
+    )
+    return int(wait_ms) / 1000
+
+
+def _release(provider: str, lease_id: str) -> None:
+    """
+    Release the concurrency lease of a finished request, logging rather than raising if the broker cannot be reached.
+
+    Parameters
+    ----------
+    provider : str
+        The name of the data provider.
+    lease_id : str
+        Unique ID of the request.
+    """
+    try:
+        get_redis_client().zrem(_get_keys(provider)[1], lease_id)
+    except redis.RedisError as e:
+        log.warning(f"Could not release rate limit lease for '{provider}', it will expire instead: {e}")
+
+
+def _renew(provider: str, lease_id: str) -> None:
+    """
+    Renew the concurrency lease of a request in progress, logging rather than raising if the broker cannot be reached.
+
+    Parameters
+    ----------
+    provider : str
+        The name of the data provider.
+    lease_id : str
+        Unique ID of the request.
+    """
+    try:
+        _get_renew_script()(keys=[_get_keys(provider)[1]], args=[lease_id, EnvVariable.PROVIDER_RATE_LIMIT_LEASE_TTL])
+    except redis.RedisError as e:
+        log.warning(f"Could not renew rate limit lease for '{provider}', it may expire before the request ends: {e}")
+
+
+def _renew_interval() -> float:
+    """
+    Find the number of seconds between renewals of a held concurrency lease.
+
+    Returns
+    -------
+    float
+        The number of seconds, a third of the lease TTL so that a renewal can fail without the lease expiring.
+    """
+    return EnvVariable.PROVIDER_RATE_LIMIT_LEASE_TTL / 3
+
+
+@contextmanager
+def _renewing_lease(provider: str, lease_id: str) -> Iterator[None]:
+    """
+    Renew the concurrency lease of a request from a background thread until exiting.
+
+    Parameters
+    ----------
+    provider : str
+        The name of the data provider.
+    lease_id : str
+        Unique ID of the request.
+
+    Yields
+    ------
+    None
+        The lease is renewed within the context.
+    """
+    stopped = threading.Event()
+
+    def renew_until_stopped() -> None:
+        """Renew the lease periodically until the request ends."""
+        while not stopped.wait(_renew_interval()):
+            _renew(provider, lease_id)
+
+    renewer = threading.Thread(target=renew_until_stopped, name=f"rate-limit-lease-{provider}", daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        renewer.join()
+
+
+@asynccontextmanager
+async def _renewing_lease_async(provider: str, lease_id: str) -> AsyncIterator[None]:
+    """
+    Renew the concurrency lease of a request from a background task until exiting, without blocking the event loop.
+
+    Parameters
+    ----------
+    provider : str
+        The name of the data provider.
+    lease_id : str
+        Unique ID of the request.
+
+    Yields
+    ------
+    None
+        The lease is renewed within the context.
+    """
+    async def renew_forever() -> None:
+        """Renew the lease periodically until cancelled when the request ends."""
+        while True:
+            await asyncio.sleep(_renew_interval())
+            await asyncio.to_thread(_renew, provider, lease_id)
+
+    renewer = asyncio.create_task(renew_forever())
+    try:
+        yield
+    finally:
+        renewer.cancel()
+        with suppress(asyncio.CancelledError):
+            await renewer
+
+
+def _acquire_timeout_error(provider: str) -> TimeoutError:
+    """
+    Create the error raised when a request to a provider waited too long for its budget.
+
+    Parameters
+    ----------
+    provider : str
+        The name of the data provider.
+
+    Returns
+    -------
+    TimeoutError
+        The error to raise.
+    """
+    return TimeoutError(
+        f"Waited more than {EnvVariable.PROVIDER_RATE_LIMIT_TIMEOUT} seconds for the rate limit of '{provider}'."
+    )
+
+
+@contextmanager
+def provider_slot(provider: str) -> Iterator[None]:
+    """
+    Wait until a request may be sent to a data provider within its budget, and hold a connection until exiting.
+    The connection's lease is renewed while it is held, so the context may be held for longer than its TTL.
+    Providers without a budget are not limited.
+    If the message broker cannot be reached, the request is sent without limiting rather than failing.
+
+    Parameters
+    ----------
+    provider : str
+        The name of the data provider, as used in the PROVIDER_RATE_LIMITS environment variable.
+
+    Yields
+    ------
+    None
+        The request may be sent within the context.
+
+    Raises
+    ------
+    TimeoutError
+        If the request could not be sent within PROVIDER_RATE_LIMIT_TIMEOUT seconds.
+    """
+    budget = get_provider_budgets().get(provider)
+    if budget is None:
+        yield
+        return
+    lease_id = uuid.uuid4().hex
+    deadline = time.monotonic() + EnvVariable.PROVIDER_RATE_LIMIT_TIMEOUT
+    acquired = False
+    try:
+        while (wait_seconds := _try_acquire(provider, budget, lease_id)) > 0:
+            if time.monotonic() + wait_seconds > deadline:
+                raise _acquire_timeout_error(provider)
+            time.sleep(wait_seconds)
+        acquired = True
+    except redis.RedisError as e:
+        log.warning(f"Could not reach the message broker, sending request to '{provider}' without rate limiting: {e}")
+    if not acquired or budget.max_concurrency <= 0:
+        yield
+        return
+    try:
+        with _renewing_lease(provider, lease_id):
+            yield
+    finally:
+        _release(provider, lease_id)
+
+
+@asynccontextmanager
+async def provider_slot_async(provider: str) -> AsyncIterator[None]:
+    """
+    Wait until a request may be sent to a data provider within its budget, without blocking the event loop,
+    and hold a connection until exiting.
+    The connection's lease is renewed while it is held, so the context may be held for longer than its TTL.
+    Providers without a budget are not limited.
+    If the message broker cannot be reached, the request is sent without limiting rather than failing.
+
+    Parameters
+    ----------
+    provider : str
+        The name of the data provider, as used in the PROVIDER_RATE_LIMITS environment variable.
+
+    Yields
+    ------
+    None
+        The request may be sent within the context.
+
+    Raises
+    ------
+    TimeoutError
+        If the request could not be sent within PROVIDER_RATE_LIMIT_TIMEOUT seconds.
+    """
+    budget = get_provider_budgets().get(provider)
+    if budget is None:
+        yield
+        return
+    lease_id = uuid.uuid4().hex
+    deadline = time.monotonic() + EnvVariable.PROVIDER_RATE_LIMIT_TIMEOUT
+    acquired = False
+    try:
+        while (wait_seconds := await asyncio.to_thread(_try_acquire, provider, budget, lease_id)) > 0:
+            if time.monotonic() + wait_seconds > deadline:
+                raise _acquire_timeout_error(provider)
+            await asyncio.sleep(wait_seconds)
+        acquired = True
+    except redis.RedisError as e:
+        log.warning(f"Could not reach the message broker, sending request to '{provider}' without rate limiting: {e}")
+    if not acquired or budget.max_concurrency <= 0:
+        yield
+        return
+    try:
+        async with _renewing_lease_async(provider, lease_id):
+            yield
+    finally:
+        await asyncio.to_thread(_release, provider, lease_id)
+
+
+def parse_retry_after(retry_after: Optional[str]) -> float:
+    """
+    Read the number of seconds to wait from the Retry-After header of a rejected response.
+
+    Parameters
+    ----------
+    retry_after : Optional[str]
+        The value of the Retry-After header, if the response had one.
+
+    Returns
+    -------
+    float
+        The number of seconds to wait, or PROVIDER_RATE_LIMIT_BACK_OFF if the header is missing or is not a number.
+    """
+    try:
+        return max(float(retry_after), 0)
+    except (TypeError, ValueError):
+        return EnvVariable.PROVIDER_RATE_LIMIT_BACK_OFF
+
+
+def back_off(provider: str, delay_seconds: float) -> float:
+    """
+    Pause requests to a data provider from every worker, after it rejected a request for exceeding its rate limit.
+    Failing to reach the message broker is logged rather than raised.
+
+    Parameters
+    ----------
+    provider : str
+        The name of the data provider.
+    delay_seconds : float
+        The number of seconds to pause requests for.
+
+    Returns
+    -------
+    float
+        The number of seconds that the caller must wait itself before retrying,
+        which is 0 if the pause was recorded in the provider's token bucket.
+    """
+    log.warning(f"'{provider}' rejected a request for exceeding its rate limit, pausing for {delay_seconds} seconds.")
+    budget = get_provider_budgets().get(provider)
+    if budget is None or budget.requests_per_second <= 0:
+        return delay_seconds
+    try:
+        _get_back_off_script()(keys=[_get_keys(provider)[0]], args=[budget.requests_per_second, delay_seconds])
+    except redis.RedisError as e:
+        log.warning(f"Could not pause requests to '{provider}': {e}")
+        return delay_seconds
+    return 0
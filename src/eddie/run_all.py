@@ -22,9 +22,9 @@ from types import ModuleType
 from typing import Dict, Union
 
 import geopandas as gpd
-import shapely
 
 from eddie.digitaltwin import cache_new_results
+from eddie.digitaltwin.utils import create_area_of_interest
 
 
 def main(
@@ -61,23 +61,18 @@ def main(
 
 def create_sample_polygon() -> gpd.GeoDataFrame:
     """
-    Create a sample area of interest polygon for development purposes.
-    This sample polygon is rectangular, but has non-whole number edges caused by serialisation rounding errors.
+    Create a sample area of interest polygon for development purposes, shaped by the AOI_MODE.
+    This sample polygon has non-whole number edges caused by serialisation rounding errors.
     These deliberate errors are to simulate the production system more accurarately.
 
     Returns
     ----------
     gpd.GeoDataFrame
-        A GeoDataFrame containing a single rectangular polygon for the area of interest.
+        A GeoDataFrame containing a single polygon for the area of interest.
     """
     # Read the area of interest file in
     aoi = gpd.read_file("selected_polygon.geojson")
     # Convert to WGS84 to deliberately introduce rounding errors. Ensures our development acts like production.
     # These rounding errors occur in production when serialising WGS84 polygons
     aoi = aoi.to_crs(4326)
-
-    # Convert the polygon back to 2193 crs, and recalculate the bounds to ensure it is a rectangle.
-    bbox_2193 = aoi.to_crs(2193).bounds.rename(columns={"minx": "xmin", "maxx": "xmax", "miny": "ymin", "maxy": "ymax"})
-    # Create sample polygon from bounding box
-    sample_polygon = gpd.GeoDataFrame(index=[0], crs="epsg:2193", geometry=[shapely.box(**bbox_2193.iloc[0])])
-    return sample_polygon
+    return create_area_of_interest(aoi)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Publishes task state changes through the message broker, and streams them to clients as Server-Sent Events (SSE).
+Clients can then wait for a task on a single long-lived request, rather than polling its status every few seconds.
+"""
+import json
+import logging
+import time
+from typing import Any, Iterator, Optional
+
+from celery import Task, signals, states
+from celery.result import AsyncResult
+from celery.worker.request import Request
+import redis
+
+from eddie.message_broker import get_redis_client
+
+log = logging.getLogger(__name__)
+
+# Number of seconds without an event before a comment is sent, so that proxies do not close idle streams
+KEEPALIVE_SECONDS = 15
+# Number of milliseconds a client waits before reconnecting to a dropped stream
+RECONNECT_MILLISECONDS = 5000
+# Number of seconds a stream lasts before it is ended, after which clients reconnect and receive the current state
+MAX_STREAM_SECONDS = 3600
+# Number of seconds a stream waits for a pending task to start, since unknown task ids are also reported as pending
+PENDING_TIMEOUT_SECONDS = 300
+
+
+def get_task_channel(task_id: str) -> str:
+    """
+    Find the message broker channel that events of a task are published to.
+
+    Parameters
+    ----------
+    task_id : str
+        The id of the celery task.
+
+    Returns
+    -------
+    str
+        The name of the pub/sub channel.
+    """
+    return f"eddie:task_events:{task_id}"
+
+
+def create_task_event(task_id: str, task_status: str, task_value: object = None) -> dict[str, Any]:
+    """
+    Create a task event, with the same fields as the task status responses of the API.
+
+    Parameters
+    ----------
+    task_id : str
+        The id of the celery task.
+    task_status : str
+        The celery.State of the task, or a custom state such as 'PROGRESS'.
+    task_value : object = None
+        The value returned from a successful task, or the progress metadata of a running task.
+        Values from failed tasks are left out, since they may contain tracebacks.
+
+    Returns
+    -------
+    dict[str, Any]
+        The task event.
+    """
+    if task_status == states.FAILURE:
+        task_value = None
+    return {"taskId": task_id, "taskStatus": task_status, "taskValue": task_value}
+
+
+def publish_task_event(task_id: str, task_status: str, task_value: object = None) -> None:
+    """
+    Publish a task event to the clients streaming the task's events.
+    Failing to reach the message broker is logged rather than raised, so that tasks do not depend on it.
+
+    Parameters
+    ----------
+    task_id : str
+        The id of the celery task.
+    task_status : str
+        The celery.State of the task, or a custom state such as 'PROGRESS'.
+    task_value : object = None
+        The value returned from a successful task, or the progress metadata of a running task.
+    """
+    event = create_task_event(task_id, task_status, task_value)
+    try:
+        get_redis_client().publish(get_task_channel(task_id), json.dumps(event, default=str))
+    except redis.RedisError as e:
+        log.warning(f"Could not publish event for task '{task_id}': {e}")
+
+
+class EventPublishingTask(Task):  # pylint: disable=abstract-method
+    """
+    Task that publishes an event whenever it updates its own state, such as when it reports progress.
+    Events for finished tasks are published by signal handlers instead, once the result is stored.
+    """
+
+    def update_state(self, task_id: Optional[str] = None, state: Optional[str] = None, meta: object = None,
+                     **kwargs: object) -> None:
+        """
+        Update the task state in the result backend, and publish it as a task event.
+
+        Parameters
+        ----------
+        task_id : Optional[str] = None
+            The id of the task to update. Defaults to the currently executing task.
+        state : Optional[str] = None
+            The new state of the task.
+        meta : object = None
+            The state metadata, such as the progress of the task.
+        **kwargs : object
+            Other keyword arguments passed to Task.update_state.
+        """
+        super().update_state(task_id, state, meta, **kwargs)
+        task_id = task_id or self.request.id
+        if task_id is not None and state is not None and state not in states.READY_STATES:
+            publish_task_event(task_id, state, meta)
+
+
+@signals.task_prerun.connect
+def _publish_task_started(task_id: str, **_kwargs: object) -> None:
+    """Publish an event when a worker starts running a task."""
+    publish_task_event(task_id, states.STARTED)
+
+
+@signals.task_success.connect
+def _publish_task_succeeded(sender: Task, result: object, **_kwargs: object) -> None:
+    """Publish an event with the task result when a task succeeds, after the result is stored in the backend."""
+    publish_task_event(sender.request.id, states.SUCCESS, result)
+
+
+@signals.task_failure.connect
+def _publish_task_failed(task_id: str, **_kwargs: object) -> None:
+    """Publish an event when a task raises an exception."""
+    publish_task_event(task_id, states.FAILURE)
+
+
+@signals.task_revoked.connect
+def _publish_task_revoked(request: Request, **_kwargs: object) -> None:
+    """Publish an event when a task is stopped."""
+    publish_task_event(request.id, states.REVOKED)
+
+
+def format_server_sent_event(event: dict[str, Any]) -> str:
+    """
+    Format a task event as a Server-Sent Event message.
+    Every message is typed with the task status, so browsers dispatch it to listeners added for that status with
+    `EventSource.addEventListener` rather than to `EventSource.onmessage`, which only receives untyped messages.
+
+    Parameters
+    ----------
+    event : dict[str, Any]
+        The task event.
+
+    Returns
+    -------
+    str
+        The message, with the event type set to the task status.
+    """
+    return f"event: {event['taskStatus']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def stream_task_events(result: AsyncResult) -> Iterator[str]:
+    """
+    Stream the events of a task as Server-Sent Events, starting with its current state, until the task finishes.
+    The channel is subscribed to before the current state is read, so that no update between the two is missed.
+    Tasks can also finish without publishing an event, such as a chord callback failed by one of its subtasks,
+    so the state is read again from the result backend whenever no event arrives within KEEPALIVE_SECONDS.
+    Streams are also ended after MAX_STREAM_SECONDS, or after PENDING_TIMEOUT_SECONDS if the task has not started,
+    so that abandoned streams and streams of unknown tasks do not hold a connection open forever.
+    Clients reconnecting to an ended stream receive the current state again.
+
+    Parameters
+    ----------
+    result : AsyncResult
+        The result of the celery task to stream events for.
+
+    Yields
+    ------
+    str
+        The Server-Sent Event messages, ending after the task succeeds, fails, or is stopped, or the stream times out.
+    """
+    pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(get_task_channel(result.id))
+        started_at = time.monotonic()
+        yield f"retry: {RECONNECT_MILLISECONDS}\n\n"
+        task_status = result.status
+        yield format_server_sent_event(create_task_event(result.id, task_status, result.result))
+        while task_status not in states.READY_STATES:
+            elapsed = time.monotonic() - started_at
+            if elapsed > MAX_STREAM_SECONDS or (task_status == states.PENDING and elapsed > PENDING_TIMEOUT_SECONDS):
+                log.debug(f"Ending event stream of task '{result.id}' in state {task_status} after {elapsed:.0f}s.")
+                break
+            message = pubsub.get_message(timeout=KEEPALIVE_SECONDS)
+            if message is None:
+                if (backend_status := result.status) in states.READY_STATES:
+                    task_status = backend_status
+                    yield format_server_sent_event(create_task_event(result.id, task_status, result.result))
+                else:
+                    yield ": keep-alive\n\n"
+                continue
+            event = json.loads(message["data"])
+            task_status = event["taskStatus"]
+            yield format_server_sent_event(event)
+    finally:
+        pubsub.close()
@@ -18,30 +18,92 @@
 Runs backend tasks using Celery. Allowing for multiple long-running tasks to complete in the background.
 Allows the frontend to send tasks and retrieve status later.
 """
+from enum import IntEnum, StrEnum
 import importlib
 import logging
+import time
 import traceback
-from typing import Dict, Tuple
+from typing import Any, Callable, Dict, List, ParamSpec, Tuple, TypeVar
 
 import billiard.einfo
-from celery import Celery, states
+from celery import Celery, chord, states, uuid
 import geopandas as gpd
 import shapely
 import sqlalchemy.exc
 
 from eddie.config import EnvVariable
-from eddie.digitaltwin import retrieve_from_instructions
-from eddie.digitaltwin.utils import retry_function, setup_logging
+from eddie.digitaltwin import layer_refresh, progress, retrieve_from_instructions, setup_environment
+from eddie.digitaltwin.retrieve_from_instructions import LayerInstruction
+from eddie.digitaltwin.utils import create_area_of_interest, retry_function, setup_logging
 from eddie.discover_plugins import discover_plugins
+from eddie.geoserver import Workspaces
+from eddie.geoserver.tile_seeding import seed_workspace_for_area, wait_for_seeding
+from eddie.message_broker import message_broker_url
+from eddie.task_events import EventPublishingTask
+from eddie.worker_heartbeat import HeartbeatStep
 
 # Setup celery backend task management
-message_broker_url = f"redis://{EnvVariable.MESSAGE_BROKER_HOST}:6379/0"
-app = Celery("tasks", backend=message_broker_url, broker=message_broker_url)
+# Tasks publish their state changes, so that clients can stream them instead of polling
+app = Celery("tasks", backend=message_broker_url, broker=message_broker_url, task_cls=EventPublishingTask)
+# Workers record heartbeats so that health checks do not have to ping them
+app.steps["worker"].add(HeartbeatStep)
 
 setup_logging()
 log = logging.getLogger(__name__)
 
 
+class TaskQueue(StrEnum):
+    """
+    Enum defining the queues that tasks are routed to. Each queue is consumed by its own workers, see
+    celery_worker_entrypoint.sh, so that long-running tasks cannot hold up quick ones.
+    Tasks choose their queue with the `queue` task option, e.g. `@app.task(queue=TaskQueue.INGEST)`,
+    and plugins may instead route tasks by name with a TASK_ROUTES dict in their tasks module.
+
+    Attributes
+    ----------
+    INTERACTIVE : str
+        Quick tasks that a user is waiting on. The default queue.
+    INGEST : str
+        Long-running tasks that fetch and store data.
+    MAINTENANCE : str
+        Background upkeep, such as refreshing datasets.
+    """
+
+    INTERACTIVE = "interactive"
+    INGEST = "ingest"
+    MAINTENANCE = "maintenance"
+
+
+class TaskPriority(IntEnum):
+    """
+    Enum defining the priorities of tasks within a queue. Lower numbers are run first.
+
+    Attributes
+    ----------
+    HIGH : int
+        Tasks that others are waiting on, such as the final task of a chord.
+    NORMAL : int
+        The default priority.
+    LOW : int
+        Tasks that can wait until the queue is otherwise empty.
+    """
+
+    HIGH = 0
+    NORMAL = 5
+    LOW = 9
+
+
+app.conf.update(
+    task_default_queue=TaskQueue.INTERACTIVE,
+    task_default_priority=TaskPriority.NORMAL,
+    task_routes={},
+    # Each worker thread reserves one task at a time, so long tasks do not hold queued tasks that others could run
+    worker_prefetch_multiplier=1,
+    # Let the Redis broker order tasks within each queue by priority
+    broker_transport_options={"priority_steps": list(range(10)), "sep": ":", "queue_order_strategy": "priority"},
+)
+
+
 class OnFailureStateTask(app.Task):
     """Task that switches state to FAILURE if an exception occurs."""  # pylint: disable=too-few-public-methods
 
@@ -67,34 +129,249 @@ class OnFailureStateTask(app.Task):
         })
 
 
-@app.task(base=OnFailureStateTask)
-def add_base_data_to_db(selected_polygon_wkt: str, base_data_parameters: Dict[str, str]) -> None:
+def _track_progress(task: app.Task) -> progress.ProgressTracker:
+    """
+    Create a progress tracker that reports progress as the PROGRESS state of a task.
+
+    Parameters
+    ----------
+    task : app.Task
+        The bound task instance to report progress for.
+
+    Returns
+    -------
+    progress.ProgressTracker
+        The progress tracker.
+    """
+    return progress.ProgressTracker(lambda meta: task.update_state(state=progress.PROGRESS_STATE, meta=meta))
+
+
+# Generic type definitions to allow any database function to be passed to _retry_on_integrity_error
+DbFuncParams = ParamSpec("DbFuncParams")
+DbFuncReturnT = TypeVar("DbFuncReturnT")
+
+
+def _retry_on_integrity_error(
+    func: Callable[DbFuncParams, DbFuncReturnT],
+    *args: DbFuncParams.args,
+    **kwargs: DbFuncParams.kwargs
+) -> DbFuncReturnT:
+    """
+    Run a database function, retrying in case of database exceptions that happen when concurrent access occurs.
+
+    Parameters
+    ----------
+    func : Callable[DbFuncParams, DbFuncReturnT]
+        The function to run.
+    *args : DbFuncParams.args
+        The standard arguments for func.
+    **kwargs : DbFuncParams.kwargs
+        The keyword arguments for func.
+
+    Returns
+    -------
+    DbFuncReturnT
+        The result of func(*args, **kwargs).
+    """
+    # Set up retry/timeout controls
+    retries = 3
+    delay_seconds = 30
+    return retry_function(func, retries, delay_seconds, sqlalchemy.exc.IntegrityError, *args, **kwargs)
+
+
+@app.task(base=OnFailureStateTask, bind=True, queue=TaskQueue.INGEST)
+def add_base_data_to_db(self: app.Task, selected_polygon_wkt: str, base_data_parameters: Dict[str, str]) -> None:
     """
     Task to ensure static base data for the given area is added to the database.
+    The instructions are stored, then this task is replaced by a chord of subtasks that fetch each layer and serve the
+    static files across all workers, followed by finalise_base_data.
+    The result of this task is the result of finalise_base_data, and the ids of the subtasks are reported in the
+    PROGRESS task metadata so that their progress can be followed.
 
     Parameters
     ----------
+    self : app.Task
+        The bound task instance, used to report progress and to be replaced by the subtasks.
     selected_polygon_wkt : str
         The polygon defining the selected area to add base data for. Defined in WKT form.
     base_data_parameters : Dict[str, str]
         The parameters from DEFAULT_MODULES_TO_PARAMETERS[retrieve_from_instructions] for the particular module.
+
+    Raises
+    ------
+    celery.exceptions.Ignore
+        Always raised once the chord is sent, since this task has been replaced by it.
+    """
+    started_at = time.time()
+    self.update_state(state=progress.PROGRESS_STATE, meta={"stage": "instructions"})
+    layers = _retry_on_integrity_error(retrieve_from_instructions.store_instructions, **base_data_parameters)
+    subtasks = {
+        layer["table_name"]: fetch_base_data_layer.si(selected_polygon_wkt, layer).set(task_id=uuid())
+        for layer in layers
+    }
+    subtasks["static files"] = serve_static_base_data.si().set(task_id=uuid())
+    self.update_state(state=progress.PROGRESS_STATE, meta={
+        "stage": "layers",
+        "subtaskIds": {name: subtask.id for name, subtask in subtasks.items()},
+    })
+    raise self.replace(chord(subtasks.values(), finalise_base_data.s(selected_polygon_wkt, started_at)))
+
+
+@app.task(base=OnFailureStateTask, bind=True, queue=TaskQueue.INGEST)
+def fetch_base_data_layer(self: app.Task, selected_polygon_wkt: str, layer: LayerInstruction) -> Dict[str, Any]:
+    """
+    Subtask of add_base_data_to_db that fetches a single layer for the given area and adds it to the database.
+    The stage, row counts and throughput of the layer are reported as PROGRESS task metadata.
+
+    Parameters
+    ----------
+    self : app.Task
+        The bound task instance, used to report progress.
+    selected_polygon_wkt : str
+        The polygon defining the selected area to add base data for. Defined in WKT form.
+    layer : LayerInstruction
+        The instruction to fetch the layer.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The rows written, their in-memory size and the time taken for the layer.
+    """
+    tracker = _track_progress(self)
+    tracker.expect_layers(1)
+    with progress.tracking(tracker):
+        _retry_on_integrity_error(retrieve_from_instructions.fetch_layer, wkt_to_gdf(selected_polygon_wkt), layer)
+    return tracker.summary()
+
+
+@app.task(base=OnFailureStateTask, bind=True, queue=TaskQueue.INGEST)
+def serve_static_base_data(self: app.Task) -> Dict[str, Any]:
+    """
+    Subtask of add_base_data_to_db that adds the static files to the database and serves them.
+
+    Parameters
+    ----------
+    self : app.Task
+        The bound task instance, used to report progress.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The progress summary of the task, which has no layers of its own.
+    """
+    tracker = _track_progress(self)
+    with progress.tracking(tracker):
+        tracker.set_stage("static files")
+        _retry_on_integrity_error(retrieve_from_instructions.serve_static_files)
+    return tracker.summary()
+
+
+# Finalising runs ahead of queued layers, so finished requests are not held up behind later ones
+@app.task(base=OnFailureStateTask, bind=True, queue=TaskQueue.INGEST, priority=TaskPriority.HIGH)
+def finalise_base_data(self: app.Task,
+                       subtask_summaries: List[Dict[str, Any]],
+                       selected_polygon_wkt: str,
+                       started_at: float) -> Dict[str, Any]:
+    """
+    Finish add_base_data_to_db once every layer has been fetched.
+    Records that the area's layers have been fetched in the user log information.
+    If GEOSERVER_SEED_ENABLED, seed jobs are then submitted for the tile caches of the input layers within the area,
+    and their progress is followed by a track_tile_seeding task so that this worker is not held up waiting for them.
+
+    Parameters
+    ----------
+    self : app.Task
+        The bound task instance, used to report progress.
+    subtask_summaries : List[Dict[str, Any]]
+        The progress summaries returned by each subtask.
+    selected_polygon_wkt : str
+        The polygon defining the selected area to add base data for. Defined in WKT form.
+    started_at : float
+        The time that add_base_data_to_db started, as seconds since the epoch.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The rows written, their in-memory size and the time taken for each layer,
+        kept in the result backend to find slow layers.
+        If tile seeding was started, the id of the track_tile_seeding task is included as "seedingTaskId".
     """
     selected_polygon = wkt_to_gdf(selected_polygon_wkt)
-    # Set up retry/timeout controls
-    retries = 3
-    delay_seconds = 30
-    # Try to initialise db, with a retry set up in case of database exceptions that happen when concurrent access occurs
-    retry_function(retrieve_from_instructions.main,
-                   retries,
-                   delay_seconds,
-                   sqlalchemy.exc.IntegrityError,
-                   selected_polygon,
-                   **base_data_parameters)
+    tracker = _track_progress(self)
+    seeding_task_id = None
+    with progress.tracking(tracker):
+        tracker.set_stage("user log")
+        _retry_on_integrity_error(retrieve_from_instructions.store_user_log, selected_polygon)
+        if EnvVariable.GEOSERVER_SEED_ENABLED:
+            tracker.set_stage("seeding")
+            seed_task_ids = seed_workspace_for_area(Workspaces.INPUT_LAYERS_WORKSPACE, selected_polygon)
+            if seed_task_ids:
+                seeding_task_id = track_tile_seeding.delay(seed_task_ids).id
+    summary = progress.merge_summaries(subtask_summaries, time.time() - started_at)
+    if seeding_task_id is not None:
+        summary["seedingTaskId"] = seeding_task_id
+    return summary
+
+
+@app.task(base=OnFailureStateTask, bind=True, queue=TaskQueue.MAINTENANCE, priority=TaskPriority.LOW)
+def track_tile_seeding(self: app.Task, seed_task_ids: Dict[str, List[int]]) -> Dict[str, int]:
+    """
+    Task to follow the GeoWebCache seed tasks submitted by finalise_base_data until they finish,
+    reporting the seeding progress as PROGRESS task metadata.
+    Runs on the maintenance queue so that waiting for seeding does not hold up ingestion workers.
+
+    Parameters
+    ----------
+    self : app.Task
+        The bound task instance, used to report progress.
+    seed_task_ids : Dict[str, List[int]]
+        Maps the full name "<workspace>:<layer>" of each seeding layer to the IDs of its seed tasks.
+
+    Returns
+    -------
+    Dict[str, int]
+        The final seeding progress, with the number of layers seeding and tiles processed by the remaining tasks.
+    """
+    tracker = _track_progress(self)
+    with progress.tracking(tracker):
+        return wait_for_seeding(seed_task_ids, lambda seed_progress: tracker.set_stage("seeding", **seed_progress))
+
+
+@app.task(base=OnFailureStateTask, bind=True, queue=TaskQueue.MAINTENANCE, priority=TaskPriority.LOW)
+def refresh_nz_layers(self: app.Task) -> Dict[str, Any]:
+    """
+    Task to refresh every New Zealand-wide layer from its data provider, swapping each new version in without
+    interrupting readers. Runs on the maintenance queue so that it does not hold up interactive or ingestion tasks.
+
+    Parameters
+    ----------
+    self : app.Task
+        The bound task instance, used to report progress.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Whether each layer was refreshed, with the rows written, their in-memory size and the time taken for each layer.
+    """
+    tracker = _track_progress(self)
+    with progress.tracking(tracker):
+        engine = setup_environment.get_database()
+        with engine.connect() as conn:
+            refreshed = layer_refresh.refresh_nz_geospatial_layers(conn)
+    return {"refreshed": refreshed, **tracker.summary()}
+
+
+if EnvVariable.NZ_LAYER_REFRESH_INTERVAL > 0:
+    # Sent by the celery_beat service, see celery_beat_entrypoint.sh. Added to any schedule plugins have defined.
+    app.conf.beat_schedule = {
+        **(app.conf.beat_schedule or {}),
+        "refresh-nz-layers": {"task": refresh_nz_layers.name, "schedule": EnvVariable.NZ_LAYER_REFRESH_INTERVAL},
+    }
 
 
 def wkt_to_gdf(wkt: str) -> gpd.GeoDataFrame:
     """
-    Transform a WKT string polygon into a GeoDataFrame.
+    Transform a WKT string polygon into the area of interest GeoDataFrame, shaped by the AOI_MODE.
 
     Parameters
     ----------
@@ -104,20 +381,15 @@ def wkt_to_gdf(wkt: str) -> gpd.GeoDataFrame:
     Returns
     -------
     gpd.GeoDataFrame
-        The GeoDataFrame form of the polygon after being transformed.
+        The area of interest in NZTM2000 (epsg:2193), either the exact polygon or its bounding rectangle.
     """
     selected_polygon = gpd.GeoDataFrame(index=[0], crs="epsg:4326", geometry=[shapely.from_wkt(wkt)])
-
-    # Convert the polygon to 2193 crs, and recalculate the bounds to ensure it is a rectangle.
-    bbox_2193 = selected_polygon.to_crs(2193).bounds
-    xmin, ymin, xmax, ymax = (bbox_2193[bound_variable][0] for bound_variable in ("minx", "miny", "maxx", "maxy"))
-    selected_as_rectangle_2193 = gpd.GeoDataFrame(index=[0], crs="epsg:2193",
-                                                  geometry=[shapely.box(xmin, ymin, xmax, ymax)])
-
-    return selected_as_rectangle_2193
+    return create_area_of_interest(selected_polygon)
 
 
 # Plugins must be imported after app to remove a circular dependency
 eddie_plugins = discover_plugins()
 for name, module in eddie_plugins.items():
-    importlib.import_module(f"{name}.tasks")
+    plugin_tasks = importlib.import_module(f"{name}.tasks")
+    # Plugins can route their tasks to queues by name, e.g. {"eddie_plugin.tasks.*": {"queue": TaskQueue.INGEST}}
+    app.conf.task_routes.update(getattr(plugin_tasks, "TASK_ROUTES", {}))
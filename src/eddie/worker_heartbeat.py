@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Heartbeat-based liveness of Celery workers.
+Each worker periodically records a heartbeat in the message broker, so checking liveness is a single cheap read
+instead of broadcasting a ping to every worker and waiting for replies.
+Heartbeats are recorded by the worker's timer thread rather than by its task pool, so a heartbeat shows that a worker
+process is alive and connected to the message broker, not that it has free capacity to take tasks.
+"""
+import logging
+import threading
+import time
+from typing import Optional
+
+from celery import bootsteps
+from celery.worker import WorkController
+from kombu.asynchronous.timer import Entry
+import redis
+
+from eddie.config import EnvVariable
+from eddie.message_broker import get_redis_client
+
+log = logging.getLogger(__name__)
+
+# Sorted set of worker host names, scored by the time of their latest heartbeat
+HEARTBEAT_KEY = "eddie:worker_heartbeats"
+# Number of seconds that the live worker count is reused for before reading the message broker again
+LIVENESS_CACHE_SECONDS = 2
+
+
+def get_heartbeat_ttl() -> float:
+    """
+    Find the number of seconds after its latest heartbeat that a worker is considered alive.
+
+    Returns
+    -------
+    float
+        Three heartbeat intervals, so that one late heartbeat does not mark a worker as dead.
+    """
+    return 3 * EnvVariable.CELERY_HEARTBEAT_INTERVAL
+
+
+def record_heartbeat(worker_name: str) -> None:
+    """
+    Record that a worker is alive, and forget workers whose heartbeats have expired.
+
+    Parameters
+    ----------
+    worker_name : str
+        The host name of the worker.
+    """
+    now = time.time()
+    try:
+        with get_redis_client().pipeline() as pipeline:
+            pipeline.zadd(HEARTBEAT_KEY, {worker_name: now})
+            pipeline.zremrangebyscore(HEARTBEAT_KEY, "-inf", now - get_heartbeat_ttl())
+            # If every worker stops, the whole set expires
+            pipeline.expire(HEARTBEAT_KEY, int(get_heartbeat_ttl()) + 1)
+            pipeline.execute()
+    except redis.RedisError as e:
+        log.warning(f"Could not record heartbeat for worker '{worker_name}': {e}")
+
+
+def remove_heartbeat(worker_name: str) -> None:
+    """
+    Record that a worker has shut down.
+
+    Parameters
+    ----------
+    worker_name : str
+        The host name of the worker.
+    """
+    try:
+        get_redis_client().zrem(HEARTBEAT_KEY, worker_name)
+    except redis.RedisError as e:
+        log.warning(f"Could not remove heartbeat for worker '{worker_name}': {e}")
+
+
+def count_live_workers() -> int:
+    """
+    Count the workers that have recorded a heartbeat recently.
+
+    Returns
+    -------
+    int
+        The number of live workers.
+
+    Raises
+    ------
+    redis.RedisError
+        If the message broker cannot be reached.
+    """
+    return get_redis_client().zcount(HEARTBEAT_KEY, time.time() - get_heartbeat_ttl(), "+inf")
+
+
+class _LivenessCache:  # pylint: disable=too-few-public-methods
+    """Reuses the live worker count for a few seconds, so that frequent health checks do not each query Redis."""
+
+    def __init__(self) -> None:
+        """Create an empty cache."""
+        self._lock = threading.Lock()
+        self._checked_at = float("-inf")
+        self._worker_count = 0
+
+    def get(self) -> int:
+        """
+        Retrieve the number of live workers, counting them again if the cached count is too old.
+        The message broker is read outside the lock, so a slow read does not hold up checks that can use the cache.
+
+        Returns
+        -------
+        int
+            The number of live workers, or 0 if the message broker cannot be reached.
+        """
+        with self._lock:
+            if time.monotonic() - self._checked_at <= LIVENESS_CACHE_SECONDS:
+                return self._worker_count
+        try:
+            worker_count = count_live_workers()
+        except redis.RedisError as e:
+            log.warning(f"Could not read worker heartbeats: {e}")
+            worker_count = 0
+        with self._lock:
+            self._worker_count = worker_count
+            self._checked_at = time.monotonic()
+        return worker_count
+
+
+_liveness_cache = _LivenessCache()
+
+
+def get_live_worker_count() -> int:
+    """
+    Retrieve the number of live workers, cached for a few seconds.
+
+    Returns
+    -------
+    int
+        The number of live workers, or 0 if the message broker cannot be reached.
+    """
+    return _liveness_cache.get()
+
+
+class HeartbeatStep(bootsteps.StartStopStep):
+    """
+    Celery worker bootstep that records a heartbeat on a timer for as long as the worker runs.
+    The heartbeat continues while every pool process is busy, so it indicates liveness rather than readiness.
+    """
+
+    requires = {"celery.worker.components:Timer"}
+
+    def __init__(self, parent: WorkController, **kwargs: object) -> None:
+        """
+        Create the bootstep.
+
+        Parameters
+        ----------
+        parent : celery.worker.WorkController
+            The worker being started.
+        **kwargs : object
+            Other keyword arguments passed to the bootstep by Celery.
+        """
+        super().__init__(parent, **kwargs)
+        self.timer_entry: Optional[Entry] = None
+
+    def start(self, parent: WorkController) -> None:
+        """
+        Record a heartbeat now, and every CELERY_HEARTBEAT_INTERVAL seconds after.
+
+        Parameters
+        ----------
+        parent : celery.worker.WorkController
+            The worker being started.
+        """
+        record_heartbeat(parent.hostname)
+        self.timer_entry = parent.timer.call_repeatedly(
+            EnvVariable.CELERY_HEARTBEAT_INTERVAL, record_heartbeat, (parent.hostname,), priority=10
+        )
+
+    def stop(self, parent: WorkController) -> None:
+        """
+        Stop recording heartbeats, and remove this worker's heartbeat.
+
+        Parameters
+        ----------
+        parent : celery.worker.WorkController
+            The worker being stopped.
+        """
+        if self.timer_entry is not None:
+            self.timer_entry.cancel()
+            self.timer_entry = None
+        remove_heartbeat(parent.hostname)
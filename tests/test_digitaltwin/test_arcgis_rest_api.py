@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for arcgis_rest_api.py"""
+import json
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+import shapely
+
+from eddie.digitaltwin import arcgis_rest_api
+
+
+class GenQueryParamListTest(unittest.TestCase):
+    """Tests that ArcGIS REST API queries filter by the area of interest polygon"""
+
+    URL = "https://example.com/arcgis/rest/services/Layer/FeatureServer/0"
+
+    def setUp(self):
+        """Sets up a mock feature layer with 5 records within the area of interest, before each test is run."""
+        get_patcher = mock.patch.object(arcgis_rest_api.requests, "get")
+        post_patcher = mock.patch.object(arcgis_rest_api.requests, "post")
+        self.mock_get = get_patcher.start()
+        self.mock_post = post_patcher.start()
+        self.addCleanup(get_patcher.stop)
+        self.addCleanup(post_patcher.stop)
+        self.mock_get.return_value.json.return_value = {"maxRecordCount": 2}
+        self.mock_post.return_value.json.return_value = {"count": 5}
+        triangle = shapely.Polygon([(1570000, 5180000), (1580000, 5180000), (1570000, 5190000)])
+        self.area_of_interest = gpd.GeoDataFrame(geometry=[triangle], crs=2193)
+
+    def test_queries_intersect_polygon(self):
+        query_params_list = arcgis_rest_api.gen_query_param_list(self.URL, self.area_of_interest)
+        self.assertEqual([0, 2, 4], [query_params["resultOffset"] for query_params in query_params_list])
+        for query_params in query_params_list:
+            self.assertEqual("esriGeometryPolygon", query_params["geometryType"])
+            self.assertEqual("esriSpatialRelIntersects", query_params["spatialRel"])
+            self.assertEqual(2193, query_params["outSR"])
+
+    def test_record_count_filtered_by_polygon(self):
+        query_params_list = arcgis_rest_api.gen_query_param_list(self.URL, self.area_of_interest)
+        count_params = self.mock_post.call_args.kwargs["data"]
+        self.assertEqual(query_params_list[0]["geometry"], count_params["geometry"])
+        self.assertEqual("esriSpatialRelIntersects", count_params["spatialRel"])
+
+    def test_esri_polygon_covers_area_of_interest(self):
+        esri_polygon = json.loads(arcgis_rest_api.to_esri_polygon_json(self.area_of_interest))
+        self.assertEqual({"wkid": 2193}, esri_polygon["spatialReference"])
+        query_polygon = shapely.Polygon(esri_polygon["rings"][0])
+        self.assertTrue(query_polygon.covers(self.area_of_interest.geometry[0]))
+        # Esri outer rings are clockwise
+        self.assertFalse(query_polygon.exterior.is_ccw)
+
+    def test_multipart_area_of_interest_in_single_polygon(self):
+        multipart = shapely.MultiPolygon([shapely.box(0, 0, 10, 10), shapely.box(100, 100, 110, 110)])
+        area_of_interest = gpd.GeoDataFrame(geometry=[multipart], crs=2193)
+        esri_polygon = json.loads(arcgis_rest_api.to_esri_polygon_json(area_of_interest))
+        self.assertEqual(2, len(esri_polygon["rings"]))
+
+    def test_no_area_of_interest_fetches_all(self):
+        query_params_list = arcgis_rest_api.gen_query_param_list(self.URL)
+        self.assertEqual(3, len(query_params_list))
+        self.assertNotIn("geometry", query_params_list[0])
+        self.assertEqual(2193, query_params_list[0]["outSR"])
+
+
+class FetchArcgisRestApiDataTest(unittest.TestCase):
+    """Tests that the feature layer version is only requested when the provider cache is enabled"""
+
+    def setUp(self):
+        """Sets up a mock fetch of an empty feature layer before each test is run."""
+        self.mock_version = mock.patch.object(arcgis_rest_api, "get_feature_layer_version", return_value="1").start()
+        mock.patch.object(arcgis_rest_api, "fetch_geo_data_for_aoi", new=mock.AsyncMock(
+            return_value=gpd.GeoDataFrame())).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_version_not_requested_without_cache(self):
+        with mock.patch.object(arcgis_rest_api.EnvVariable, "PROVIDER_CACHE_ENABLED", False):
+            arcgis_rest_api.fetch_arcgis_rest_api_data("https://example.com/FeatureServer/0", output_sr=2193)
+        self.mock_version.assert_not_called()
+
+    def test_version_requested_with_cache(self):
+        with mock.patch.object(arcgis_rest_api.EnvVariable, "PROVIDER_CACHE_ENABLED", True), \
+                mock.patch.object(arcgis_rest_api.provider_cache, "read_cached", return_value=None):
+            arcgis_rest_api.fetch_arcgis_rest_api_data("https://example.com/FeatureServer/0", output_sr=2193)
+        self.mock_version.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
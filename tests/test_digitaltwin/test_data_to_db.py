@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for data_to_db.py"""
+import unittest
+from unittest import mock
+
+import requests
+
+from eddie.digitaltwin import data_to_db
+
+
+class ProcessExistingNonNzLayersTest(unittest.TestCase):
+    """Tests that fetching existing layers falls back to fetching every feature when fetching by ID fails"""
+
+    def setUp(self):
+        """Sets up mock fetches that find no new features, before each test is run."""
+        self.mock_fetch_all = mock.patch.object(data_to_db, "_fetch_vector_data_not_in_db", return_value=None).start()
+        self.mock_fetch_by_ids = mock.patch.object(data_to_db, "_fetch_vector_data_not_in_db_by_ids").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def process_existing_layer(self) -> None:
+        """Processes an existing layer with a mock connection and area of interest."""
+        data_to_db.process_existing_non_nz_geospatial_layers(mock.Mock(), "LINZ", 123, "layer", "id", mock.Mock())
+
+    def test_fallback_after_connection_error(self):
+        self.mock_fetch_by_ids.side_effect = requests.ConnectionError("Connection reset")
+        self.process_existing_layer()
+        self.mock_fetch_all.assert_called_once()
+
+    def test_fallback_after_exception_report(self):
+        self.mock_fetch_by_ids.side_effect = requests.JSONDecodeError("Expecting value", "<ows:ExceptionReport/>", 0)
+        self.process_existing_layer()
+        self.mock_fetch_all.assert_called_once()
+
+    def test_no_fallback_after_success(self):
+        self.mock_fetch_by_ids.return_value = None
+        self.process_existing_layer()
+        self.mock_fetch_all.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for get_data_using_geoapis.py"""
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+import requests
+import shapely
+
+from eddie.digitaltwin import get_data_using_geoapis
+
+
+def _point_feature(feature_id: int, x: float, y: float) -> dict:
+    """Create a GeoJSON point feature with an 'ID' property."""
+    return {"type": "Feature", "properties": {"ID": feature_id}, "geometry": {"type": "Point", "coordinates": [x, y]}}
+
+
+class FetchByIdsTest(unittest.TestCase):
+    """Tests that features are probed by ID, and fetched by ID in batches"""
+
+    def setUp(self):
+        """Sets up a mock WFS response and a triangular area of interest, before each test is run."""
+        get_patcher = mock.patch.object(get_data_using_geoapis.requests, "get")
+        self.mock_get = get_patcher.start()
+        self.addCleanup(get_patcher.stop)
+        triangle = shapely.Polygon([(1570000, 5180000), (1580000, 5180000), (1570000, 5190000)])
+        self.area_of_interest = gpd.GeoDataFrame(geometry=[triangle], crs=2193)
+
+    def test_probe_requests_ids_only(self):
+        self.mock_get.return_value.json.return_value = {
+            "features": [{"type": "Feature", "properties": {"ID": 1}, "geometry": None}]
+        }
+        ids = get_data_using_geoapis.fetch_vector_data_ids_using_geoapis("LINZ", 123, "id", self.area_of_interest)
+        self.assertEqual([1], ids)
+        params = self.mock_get.call_args.kwargs["params"]
+        self.assertEqual("id", params["propertyName"])
+        self.assertTrue(params["cql_filter"].startswith("bbox(GEOMETRY,"))
+
+    def test_probe_tries_each_geometry_name(self):
+        failed_response = mock.Mock()
+        failed_response.raise_for_status.side_effect = requests.HTTPError("Unknown property")
+        ok_response = mock.Mock()
+        ok_response.json.return_value = {"features": []}
+        self.mock_get.side_effect = [failed_response, ok_response]
+        ids = get_data_using_geoapis.fetch_vector_data_ids_using_geoapis("LINZ", 123, "id", self.area_of_interest)
+        self.assertEqual([], ids)
+        self.assertTrue(self.mock_get.call_args.kwargs["params"]["cql_filter"].startswith("bbox(shape,"))
+
+    def test_probe_tries_next_geometry_name_after_exception_report(self):
+        exception_report = mock.Mock()
+        exception_report.json.side_effect = requests.JSONDecodeError("Expecting value", "<ows:ExceptionReport/>", 0)
+        ok_response = mock.Mock()
+        ok_response.json.return_value = {"features": []}
+        self.mock_get.side_effect = [exception_report, ok_response]
+        ids = get_data_using_geoapis.fetch_vector_data_ids_using_geoapis("LINZ", 123, "id", self.area_of_interest)
+        self.assertEqual([], ids)
+        self.assertEqual(2, self.mock_get.call_count)
+
+    def test_fetch_by_ids_in_batches(self):
+        self.mock_get.return_value.json.return_value = {
+            "type": "FeatureCollection",
+            # The second feature is within the bounding box, but not the triangle
+            "features": [_point_feature(1, 1572000, 5182000), _point_feature(2, 1578000, 5188000)],
+        }
+        with mock.patch.object(get_data_using_geoapis.config.EnvVariable, "WFS_ID_BATCH_SIZE", 2):
+            vector_data = get_data_using_geoapis.fetch_vector_data_by_ids_using_geoapis(
+                "LINZ", 123, "id", [1, 2, "a'b"], self.area_of_interest)
+        cql_filters = [call.kwargs["params"]["cql_filter"] for call in self.mock_get.call_args_list]
+        self.assertEqual(["id IN (1, 2)", "id IN ('a''b')"], cql_filters)
+        self.assertEqual([1, 1], vector_data["id"].tolist())
+        self.assertEqual("geometry", vector_data.columns[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for layer_refresh.py"""
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+
+from eddie.digitaltwin import layer_refresh
+
+
+class RenameTableTest(unittest.TestCase):
+    """Tests that renaming a table also renames the indexes named after it"""
+
+    def test_indexes_renamed_with_table(self):
+        conn = mock.Mock()
+        conn.execute.return_value.scalars.return_value = ["idx_roads_next_geometry", "unrelated_index"]
+        layer_refresh._rename_table(conn, "roads_next", "roads")
+        statements = [str(call.args[0]) for call in conn.execute.call_args_list]
+        self.assertEqual('ALTER TABLE "roads_next" RENAME TO "roads";', statements[0])
+        self.assertIn('ALTER INDEX "idx_roads_next_geometry" RENAME TO "idx_roads_geometry";', statements)
+        self.assertFalse(any("unrelated_index" in statement for statement in statements))
+
+
+class RefreshLayerTest(unittest.TestCase):
+    """Tests that layers are only swapped when a new version has been loaded"""
+
+    def setUp(self):
+        """Sets up mocks for fetching, swapping and publishing, before each test is run."""
+        patchers = {
+            "fetch": mock.patch.object(layer_refresh, "fetch_vector_data_using_geoapis"),
+            "swap": mock.patch.object(layer_refresh, "_swap_tables_with_retries"),
+            "publish": mock.patch.object(layer_refresh, "_publish_refreshed_layer"),
+        }
+        self.mocks = {name: patcher.start() for name, patcher in patchers.items()}
+        for patcher in patchers.values():
+            self.addCleanup(patcher.stop)
+        self.conn = mock.Mock()
+
+    def test_empty_fetch_keeps_current_version(self):
+        self.mocks["fetch"].return_value = gpd.GeoDataFrame()
+        self.assertFalse(layer_refresh.refresh_nz_geospatial_layer(self.conn, "LINZ", 1, "roads"))
+        self.mocks["swap"].assert_not_called()
+
+    def test_new_version_loaded_into_shadow_table_then_swapped(self):
+        vector_data = mock.Mock(empty=False)
+        vector_data.__len__ = mock.Mock(return_value=1)
+        self.mocks["fetch"].return_value = vector_data
+        self.assertTrue(layer_refresh.refresh_nz_geospatial_layer(self.conn, "LINZ", 1, "roads"))
+        self.assertTrue(self.mocks["fetch"].call_args.kwargs["refresh_cache"])
+        self.assertEqual("roads_next", vector_data.to_postgis.call_args.args[0])
+        self.mocks["swap"].assert_called_once_with(self.conn, "roads", "roads_next", "roads_previous")
+        self.mocks["publish"].assert_called_once_with(self.conn, "roads")
+
+    def test_long_table_name_rejected(self):
+        with self.assertRaises(ValueError):
+            layer_refresh.refresh_nz_geospatial_layer(self.conn, "LINZ", 1, "x" * 60)
+        self.mocks["fetch"].assert_not_called()
+
+    def test_table_name_rejected_when_index_name_too_long(self):
+        # "idx_<table>_previous_swap_geometry" would be 64 characters, although the table names themselves fit
+        table_name = "x" * 37
+        with self.assertRaises(ValueError):
+            layer_refresh.refresh_nz_geospatial_layer(self.conn, "LINZ", 1, table_name)
+        layer_refresh._check_table_name_length(table_name[:-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for progress.py"""
+import unittest
+
+import pandas as pd
+
+from eddie.digitaltwin import progress
+
+
+class ProgressTrackerTest(unittest.TestCase):
+    """Tests that layer progress is recorded against the tracker of the current context and reported"""
+
+    def setUp(self):
+        """Sets up a tracker that keeps every report before each test is run."""
+        self.reports = []
+        self.tracker = progress.ProgressTracker(self.reports.append, min_report_interval=60)
+
+    def test_layer_progress_recorded(self):
+        with progress.tracking(self.tracker):
+            progress.set_stage("new zealand layers")
+            progress.expect_layers(2)
+            with progress.track_layer("nz_roads", "LINZ"):
+                progress.record_rows_fetched(3)
+                progress.set_layer_stage("writing")
+                progress.record_rows_written(pd.DataFrame({"id": [1, 2, 3]}))
+                self.assertEqual("nz_roads", self.reports[-1]["layer"])
+                self.assertEqual("writing", self.reports[-1]["layers"]["nz_roads"]["stage"])
+
+        summary = self.tracker.summary()
+        layer = summary["layers"]["nz_roads"]
+        self.assertEqual(("LINZ", "done", 3, 3), (layer["dataProvider"], layer["stage"], layer["rowsFetched"],
+                                                  layer["rowsWritten"]))
+        self.assertGreater(layer["rowsMemoryBytes"], 0)
+        self.assertEqual((1, 2, 3), (summary["layersFinished"], summary["layersExpected"], summary["rowsWritten"]))
+
+    def test_row_counts_reported_at_most_once_per_interval(self):
+        with progress.tracking(self.tracker), progress.track_layer("nz_roads"):
+            report_count = len(self.reports)
+            progress.record_rows_fetched(1)
+            progress.record_rows_fetched(1)
+        # Only the end of the layer is reported, since it changes the layer stage
+        self.assertEqual(report_count + 1, len(self.reports))
+        self.assertEqual(2, self.reports[-1]["layers"]["nz_roads"]["rowsFetched"])
+
+    def test_recording_without_tracker_does_nothing(self):
+        with progress.track_layer("nz_roads"):
+            progress.record_rows_fetched(1)
+        self.assertEqual([], self.reports)
+
+    def test_concurrent_task_summaries_merged(self):
+        summaries = []
+        for layer_name in ["nz_roads", "nz_rivers"]:
+            tracker = progress.ProgressTracker(self.reports.append)
+            tracker.expect_layers(1)
+            with progress.tracking(tracker), progress.track_layer(layer_name):
+                progress.record_rows_written(pd.DataFrame({"id": [1, 2]}))
+            summaries.append(tracker.summary())
+
+        merged = progress.merge_summaries(summaries, elapsed_seconds=3)
+        self.assertEqual({"nz_roads", "nz_rivers"}, set(merged["layers"]))
+        self.assertEqual((2, 2, 4, 3), (merged["layersFinished"], merged["layersExpected"], merged["rowsWritten"],
+                                        merged["elapsedSeconds"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for provider_cache.py"""
+import os
+import pathlib
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+import shapely
+
+from eddie.digitaltwin import provider_cache
+from eddie.digitaltwin.provider_cache import ProviderCacheKey
+
+
+class ProviderCacheTest(unittest.TestCase):
+    """Tests that fetched vector data is cached on disk, expires, and is evicted when the cache is too large"""
+
+    def setUp(self):
+        """Sets up an empty cache directory, before each test is run."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache_dir = pathlib.Path(temp_dir.name)
+        patchers = [
+            mock.patch.object(provider_cache.EnvVariable, "PROVIDER_CACHE_ENABLED", True),
+            mock.patch.object(provider_cache.EnvVariable, "PROVIDER_CACHE_DIR", self.cache_dir),
+            mock.patch.object(provider_cache.EnvVariable, "PROVIDER_CACHE_TTL", 60),
+            mock.patch.object(provider_cache.EnvVariable, "PROVIDER_CACHE_MAX_SIZE_MB", 10),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.vector_data = gpd.GeoDataFrame({"id": [1, 2]}, geometry=[shapely.Point(0, 0), shapely.Point(1, 1)],
+                                            crs=2193)
+        self.fetch = mock.Mock(return_value=self.vector_data)
+
+    def _cache_files(self) -> list[pathlib.Path]:
+        """List the cache entry files."""
+        return list(self.cache_dir.glob("*/*.parquet"))
+
+    def test_second_fetch_read_from_cache(self):
+        key = ProviderCacheKey.create("LINZ", 123, 2193)
+        provider_cache.fetch_with_cache(key, self.fetch)
+        cached_data = provider_cache.fetch_with_cache(key, self.fetch)
+        self.fetch.assert_called_once()
+        self.assertEqual([1, 2], cached_data["id"].tolist())
+        self.assertEqual(2193, cached_data.crs.to_epsg())
+
+    def test_key_includes_area_of_interest(self):
+        area_of_interest = gpd.GeoDataFrame(geometry=[shapely.box(0, 0, 10, 10)], crs=2193)
+        other_area_of_interest = gpd.GeoDataFrame(geometry=[shapely.box(0, 0, 20, 20)], crs=2193)
+        # The same polygon, with its vertices starting from a different corner
+        same_area_of_interest = gpd.GeoDataFrame(geometry=[shapely.box(0, 0, 10, 10, ccw=False)], crs=2193)
+        self.assertEqual(ProviderCacheKey.create("LINZ", 123, 2193, area_of_interest).digest(),
+                         ProviderCacheKey.create("LINZ", 123, 2193, same_area_of_interest).digest())
+        self.assertNotEqual(ProviderCacheKey.create("LINZ", 123, 2193, area_of_interest).digest(),
+                            ProviderCacheKey.create("LINZ", 123, 2193, other_area_of_interest).digest())
+
+    def test_key_includes_layer_version(self):
+        self.assertNotEqual(ProviderCacheKey.create("ArcGIS", "url", 2193, layer_version="1").digest(),
+                            ProviderCacheKey.create("ArcGIS", "url", 2193, layer_version="2").digest())
+
+    def test_expired_entry_fetched_again(self):
+        key = ProviderCacheKey.create("LINZ", 123, 2193)
+        provider_cache.fetch_with_cache(key, self.fetch)
+        # Age the entry past its time-to-live
+        (cache_file,) = self._cache_files()
+        old_time = time.time() - 120
+        os.utime(cache_file, (old_time, old_time))
+        provider_cache.fetch_with_cache(key, self.fetch)
+        self.assertEqual(2, self.fetch.call_count)
+
+    def test_least_recently_used_entry_evicted(self):
+        first_key = ProviderCacheKey.create("LINZ", 1, 2193)
+        second_key = ProviderCacheKey.create("LINZ", 2, 2193)
+        provider_cache.fetch_with_cache(first_key, self.fetch)
+        provider_cache.fetch_with_cache(second_key, self.fetch)
+        # Make the second entry the least recently used
+        second_file = provider_cache._get_cache_file_path(second_key)
+        os.utime(second_file, (time.time() - 30, second_file.stat().st_mtime))
+        entry_size_bytes = second_file.stat().st_size
+        with mock.patch.object(provider_cache.EnvVariable, "PROVIDER_CACHE_MAX_SIZE_MB",
+                               1.5 * entry_size_bytes / 1024 / 1024):
+            provider_cache.evict_cache_entries()
+        self.assertEqual([provider_cache._get_cache_file_path(first_key)], self._cache_files())
+
+    def test_empty_results_not_cached(self):
+        key = ProviderCacheKey.create("LINZ", 123, 2193)
+        provider_cache.fetch_with_cache(key, mock.Mock(return_value=gpd.GeoDataFrame()))
+        self.assertEqual([], self._cache_files())
+
+    def test_disabled_cache_always_fetches(self):
+        key = ProviderCacheKey.create("LINZ", 123, 2193)
+        with mock.patch.object(provider_cache.EnvVariable, "PROVIDER_CACHE_ENABLED", False):
+            provider_cache.fetch_with_cache(key, self.fetch)
+            provider_cache.fetch_with_cache(key, self.fetch)
+        self.assertEqual(2, self.fetch.call_count)
+        self.assertEqual([], self._cache_files())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for snapshot.py"""
+import json
+import pathlib
+import tempfile
+import unittest
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+from eddie.digitaltwin import snapshot
+from eddie.digitaltwin.snapshot import SnapshotFormat, SnapshotIntegrityError
+from eddie.digitaltwin.utils import get_file_hash
+
+
+class SnapshotFilesTest(unittest.TestCase):
+    """Tests that snapshot files round trip, and that modified snapshots are rejected"""
+
+    def setUp(self):
+        """Sets up an empty snapshot directory and a small layer table, before each test is run."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.snapshot_dir = pathlib.Path(temp_dir.name)
+        self.layer = gpd.GeoDataFrame({"name": ["a", "b"]}, geometry=[shapely.Point(1570000, 5180000),
+                                                                      shapely.Point(1571000, 5181000)], crs=2193)
+
+    def _write_snapshot(self, table_data: pd.DataFrame, snapshot_format: SnapshotFormat) -> pathlib.Path:
+        """Write a snapshot containing a single table in a single part, returning the path to the table file."""
+        (self.snapshot_dir / "layer").mkdir()
+        file_path = self.snapshot_dir / "layer" / f"00000{snapshot_format.suffix}"
+        snapshot.write_table_file(table_data, file_path, snapshot_format)
+        manifest = {
+            "manifest_version": snapshot.MANIFEST_VERSION,
+            "created_at": "2026-01-01T00:00:00+00:00",
+            "tables": [{
+                "table_name": "layer",
+                "format": snapshot_format,
+                "geometry_column": "geometry",
+                "row_count": len(table_data),
+                "files": [{
+                    "file_name": "layer/" + file_path.name,
+                    "row_count": len(table_data),
+                    "sha256": get_file_hash(file_path),
+                }],
+            }],
+        }
+        (self.snapshot_dir / snapshot.MANIFEST_FILE_NAME).write_text(json.dumps(manifest))
+        return file_path
+
+    def test_geoparquet_round_trip(self):
+        file_path = self._write_snapshot(self.layer, SnapshotFormat.GEOPARQUET)
+        table_data = snapshot.read_table_file(file_path, SnapshotFormat.GEOPARQUET, spatial=True)
+        self.assertTrue(self.layer.equals(table_data))
+        self.assertEqual(2193, table_data.crs.to_epsg())
+
+    def test_flatgeobuf_round_trip(self):
+        file_path = self._write_snapshot(self.layer, SnapshotFormat.FLATGEOBUF)
+        table_data = snapshot.read_table_file(file_path, SnapshotFormat.FLATGEOBUF, spatial=True)
+        # FlatGeobuf files are ordered by their spatial index
+        table_data = table_data.sort_values("name", ignore_index=True)
+        self.assertEqual(["a", "b"], table_data["name"].tolist())
+        self.assertTrue(self.layer.geometry.geom_equals(table_data.geometry).all())
+
+    def test_non_spatial_table_round_trip(self):
+        table = pd.DataFrame({"table_name": ["layer"], "layer_id": [1]})
+        file_path = self.snapshot_dir / "geospatial_layers.parquet"
+        snapshot.write_table_file(table, file_path, SnapshotFormat.GEOPARQUET)
+        self.assertTrue(table.equals(snapshot.read_table_file(file_path, SnapshotFormat.GEOPARQUET, spatial=False)))
+
+    def test_manifest_accepted_when_unchanged(self):
+        self._write_snapshot(self.layer, SnapshotFormat.GEOPARQUET)
+        manifest = snapshot.read_manifest(self.snapshot_dir)
+        self.assertEqual(["layer"], [entry["table_name"] for entry in manifest["tables"]])
+
+    def test_parts_read_in_order(self):
+        (self.snapshot_dir / "layer").mkdir()
+        files = []
+        for part_number in range(2):
+            file_path = self.snapshot_dir / "layer" / f"{part_number:05d}.parquet"
+            snapshot.write_table_file(self.layer.iloc[[part_number]], file_path, SnapshotFormat.GEOPARQUET)
+            files.append({"file_name": f"layer/{file_path.name}", "row_count": 1, "sha256": get_file_hash(file_path)})
+        entry = {"table_name": "layer", "format": SnapshotFormat.GEOPARQUET, "geometry_column": "geom",
+                 "row_count": 2, "files": files}
+        table_parts = list(snapshot._read_entry_parts(self.snapshot_dir, entry))
+        self.assertEqual([["a"], ["b"]], [table_data["name"].tolist() for table_data in table_parts])
+        # The geometry column is given the name it had in the database
+        self.assertEqual(["geom", "geom"], [table_data.geometry.name for table_data in table_parts])
+
+    def test_modified_file_rejected(self):
+        file_path = self._write_snapshot(self.layer, SnapshotFormat.GEOPARQUET)
+        with open(file_path, "ab") as file:
+            file.write(b"modified")
+        with self.assertRaises(SnapshotIntegrityError):
+            snapshot.read_manifest(self.snapshot_dir)
+
+    def test_missing_file_rejected(self):
+        self._write_snapshot(self.layer, SnapshotFormat.GEOPARQUET).unlink()
+        with self.assertRaises(SnapshotIntegrityError):
+            snapshot.read_manifest(self.snapshot_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
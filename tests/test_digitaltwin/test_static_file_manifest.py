@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for static_file_manifest.py"""
+import os
+import pathlib
+import tempfile
+from types import SimpleNamespace
+import unittest
+from unittest import mock
+
+from eddie.digitaltwin import data_to_db, layer_statistics, static_file_manifest
+from eddie.digitaltwin.utils import get_file_hash
+import eddie.geoserver as gs
+
+
+def manifest_entry(file_path: pathlib.Path, workspace_name: str, content_hash: str = None) -> SimpleNamespace:
+    """Create a manifest entry recording that a file was published with its current size and modification time."""
+    file_stat = file_path.stat()
+    return SimpleNamespace(
+        file_path=file_path.as_posix(),
+        file_size=file_stat.st_size,
+        modified_time=file_stat.st_mtime,
+        content_hash=content_hash or get_file_hash(file_path),
+        target_name=file_path.stem,
+        workspace_name=workspace_name,
+        published=True,
+    )
+
+
+class StaticFileStateTest(unittest.TestCase):
+    """Tests that static files are only hashed when they may have changed, and compared with their manifest entry"""
+
+    def setUp(self):
+        """Sets up a static file, before each test is run."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.file_path = pathlib.Path(temp_dir.name) / "roads.geojson"
+        self.file_path.write_text('{"type": "FeatureCollection", "features": []}')
+        self.workspace = gs.Workspaces.STATIC_FILES_WORKSPACE
+
+    def test_unchanged_file_not_hashed(self):
+        entry = manifest_entry(self.file_path, self.workspace)
+        with mock.patch.object(static_file_manifest, "get_file_hash") as get_file_hash_mock:
+            file_state = static_file_manifest.get_static_file_state(self.file_path, self.workspace, entry)
+        get_file_hash_mock.assert_not_called()
+        self.assertTrue(static_file_manifest.is_unchanged(file_state, entry))
+
+    def test_touched_file_with_same_contents_unchanged(self):
+        entry = manifest_entry(self.file_path, self.workspace)
+        os.utime(self.file_path, (0, 0))
+        file_state = static_file_manifest.get_static_file_state(self.file_path, self.workspace, entry)
+        self.assertTrue(static_file_manifest.is_unchanged(file_state, entry))
+
+    def test_modified_file_changed(self):
+        entry = manifest_entry(self.file_path, self.workspace)
+        self.file_path.write_text('{"type": "FeatureCollection", "features": [], "name": "roads"}')
+        file_state = static_file_manifest.get_static_file_state(self.file_path, self.workspace, entry)
+        self.assertFalse(static_file_manifest.is_unchanged(file_state, entry))
+
+    def test_unpublished_file_changed(self):
+        entry = manifest_entry(self.file_path, self.workspace)
+        entry.published = False
+        file_state = static_file_manifest.get_static_file_state(self.file_path, self.workspace, entry)
+        self.assertFalse(static_file_manifest.is_unchanged(file_state, entry))
+
+    def test_new_file_changed(self):
+        file_state = static_file_manifest.get_static_file_state(self.file_path, self.workspace, None)
+        self.assertFalse(static_file_manifest.is_unchanged(file_state, None))
+
+
+class ServeStaticFilesTest(unittest.TestCase):
+    """Tests that serve_static_files only loads new or changed files, and forgets deleted files"""
+
+    def setUp(self):
+        """Sets up a static file directory with an unchanged file, a changed file and a deleted file."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = pathlib.Path(temp_dir.name)
+        workspace = gs.Workspaces.STATIC_FILES_WORKSPACE
+        unchanged_file = self.directory / "unchanged.geojson"
+        unchanged_file.write_text('{"type": "FeatureCollection", "features": []}')
+        self.changed_file = self.directory / "changed.geojson"
+        self.changed_file.write_text('{"type": "FeatureCollection", "features": []}')
+        changed_entry = manifest_entry(self.changed_file, workspace, content_hash="old_hash")
+        changed_entry.modified_time = 0
+        self.deleted_file = self.directory / "deleted.geojson"
+        self.manifest = {
+            unchanged_file.as_posix(): manifest_entry(unchanged_file, workspace),
+            self.changed_file.as_posix(): changed_entry,
+            self.deleted_file.as_posix(): SimpleNamespace(
+                file_path=self.deleted_file.as_posix(), file_size=1, modified_time=0, content_hash="deleted_hash",
+                target_name="deleted", workspace_name=workspace, published=True
+            ),
+        }
+        self.mock_manifest = mock.patch.multiple(
+            static_file_manifest, read_manifest=mock.DEFAULT, write_manifest=mock.DEFAULT,
+            delete_manifest_entries=mock.DEFAULT
+        ).start()
+        self.mock_manifest["read_manifest"].return_value = self.manifest
+        mock.patch.object(data_to_db, "check_table_exists", return_value=True).start()
+        self.mock_load = mock.patch.object(data_to_db, "_load_vector_file").start()
+        self.mock_reconcile = mock.patch.object(data_to_db.gs, "reconcile_geoserver").start()
+        self.mock_reconcile.return_value = gs.ReconcileReport()
+        self.mock_read_statistics = mock.patch.object(
+            layer_statistics, "read_layer_statistics", return_value={}
+        ).start()
+        self.mock_update_raster_statistics = mock.patch.object(
+            layer_statistics, "update_raster_layer_statistics"
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_only_changed_files_loaded(self):
+        data_to_db.serve_static_files(mock.Mock(), self.directory)
+        self.assertEqual([self.changed_file], [call.args[1] for call in self.mock_load.call_args_list])
+
+    def test_unchanged_files_still_desired(self):
+        data_to_db.serve_static_files(mock.Mock(), self.directory)
+        desired_state = self.mock_reconcile.call_args.args[0]
+        static_workspace = gs.Workspaces.STATIC_FILES_WORKSPACE
+        static_layers = {name for (workspace, name) in desired_state.featuretypes if workspace == static_workspace}
+        self.assertEqual({"unchanged", "changed"}, static_layers)
+
+    def test_deleted_files_forgotten(self):
+        data_to_db.serve_static_files(mock.Mock(), self.directory)
+        written_states = self.mock_manifest["write_manifest"].call_args.args[1]
+        self.assertNotIn(self.deleted_file, [file_state.file_path for file_state in written_states])
+        deleted_paths = self.mock_manifest["delete_manifest_entries"].call_args.args[1]
+        self.assertEqual({self.deleted_file.as_posix()}, set(deleted_paths))
+
+    def test_only_published_raster_statistics_updated(self):
+        workspace = gs.Workspaces.STATIC_FILES_WORKSPACE
+        for raster_name in ("published", "unchanged", "unrecorded"):
+            (self.directory / f"{raster_name}.tif").write_bytes(raster_name.encode())
+        self.mock_reconcile.return_value = gs.ReconcileReport(applied=[
+            gs.reconcile.Change(gs.ChangeKind.COVERAGE, gs.reconcile.ChangeAction.UPDATE, "published", workspace)
+        ])
+        self.mock_read_statistics.return_value = {(workspace, "published"): None, (workspace, "unchanged"): None}
+        data_to_db.serve_static_files(mock.Mock(), self.directory)
+        updated_layers = {call.args[2] for call in self.mock_update_raster_statistics.call_args_list}
+        self.assertEqual({"published", "unrecorded"}, updated_layers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,7 +16,12 @@
 
 """Tests for utils.py"""
 import unittest
+from unittest import mock
 
+import geopandas as gpd
+import shapely
+
+from eddie.digitaltwin import utils
 from eddie.digitaltwin.utils import retry_function
 
 
@@ -126,5 +131,82 @@ class RetryFunctionTest(unittest.TestCase):
         self.assertEqual(self.MAX_RETRIES + 1, self.number_of_func_calls)
 
 
+class GetNzBoundaryTest(unittest.TestCase):
+    """Tests that the NZ boundary is memoised for each CRS, and only read again when region_geometry changes"""
+
+    def setUp(self):
+        """Sets up a mock database that stores a square boundary, before each test is run."""
+        self.signature = "1:16:100"
+        self.conn = mock.Mock()
+        patchers = [
+            mock.patch.object(utils, "_get_region_geometry_signature", side_effect=lambda conn: self.signature),
+            mock.patch.object(utils, "_read_nz_boundary", side_effect=lambda conn, signature, simplified:
+                              gpd.GeoDataFrame(geometry=[shapely.box(1570000, 5180000, 1580000, 5190000)], crs=2193)),
+            mock.patch.dict(utils._memoised_boundaries, clear=True),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_boundary_memoised_within_ttl(self):
+        first = utils.get_nz_boundary(self.conn)
+        second = utils.get_nz_boundary(self.conn)
+        self.assertTrue(first.equals(second))
+        utils._read_nz_boundary.assert_called_once()
+        utils._get_region_geometry_signature.assert_called_once()
+
+    def test_boundary_memoised_per_crs(self):
+        utils.get_nz_boundary(self.conn)
+        wgs84 = utils.get_nz_boundary(self.conn, to_crs=4326)
+        self.assertEqual(4326, wgs84.crs.to_epsg())
+        self.assertEqual(2, utils._read_nz_boundary.call_count)
+
+    def test_boundary_read_again_when_regions_change(self):
+        with mock.patch.object(utils.EnvVariable, "NZ_BOUNDARY_CACHE_TTL", 0):
+            utils.get_nz_boundary(self.conn)
+            utils.get_nz_boundary(self.conn)
+            # The signature was checked again, but is unchanged
+            utils._read_nz_boundary.assert_called_once()
+            self.signature = "1:17:101"
+            utils.get_nz_boundary(self.conn)
+        self.assertEqual(2, utils._read_nz_boundary.call_count)
+
+
+class AreaOfInterestTest(unittest.TestCase):
+    """Tests that areas of interest follow the AOI_MODE, and that features are filtered to them"""
+
+    def setUp(self):
+        """Sets up a triangular selected polygon, before each test is run."""
+        self.triangle = shapely.Polygon([(1570000, 5180000), (1580000, 5180000), (1570000, 5190000)])
+        self.selected_polygon = gpd.GeoDataFrame(geometry=[self.triangle], crs=2193).to_crs(4326)
+
+    def test_polygon_mode_keeps_exact_polygon(self):
+        with mock.patch.object(utils.EnvVariable, "AOI_MODE", "polygon"):
+            area_of_interest = utils.create_area_of_interest(self.selected_polygon)
+        self.assertEqual(2193, area_of_interest.crs.to_epsg())
+        self.assertAlmostEqual(self.triangle.area, area_of_interest.geometry[0].area, delta=1)
+
+    def test_rectangle_mode_uses_bounding_box(self):
+        with mock.patch.object(utils.EnvVariable, "AOI_MODE", "rectangle"):
+            area_of_interest = utils.create_area_of_interest(self.selected_polygon)
+        self.assertAlmostEqual(2 * self.triangle.area, area_of_interest.geometry[0].area, delta=1)
+
+    def test_self_intersecting_polygon_becomes_single_polygon(self):
+        bow_tie = shapely.Polygon([(1570000, 5180000), (1580000, 5190000), (1580000, 5180000), (1570000, 5190000)])
+        with mock.patch.object(utils.EnvVariable, "AOI_MODE", "polygon"):
+            area_of_interest = utils.create_area_of_interest(gpd.GeoDataFrame(geometry=[bow_tie], crs=2193))
+        self.assertEqual("Polygon", area_of_interest.geometry[0].geom_type)
+        self.assertTrue(area_of_interest.geometry[0].is_valid)
+
+    def test_filter_drops_features_outside_polygon(self):
+        area_of_interest = gpd.GeoDataFrame(geometry=[self.triangle], crs=2193)
+        # Both points are within the bounding box of the triangle, but only the first is within the triangle
+        vector_data = gpd.GeoDataFrame(
+            {"id": [1, 2]}, geometry=[shapely.Point(1572000, 5182000), shapely.Point(1578000, 5188000)], crs=2193
+        )
+        filtered = utils.filter_to_area_of_interest(vector_data, area_of_interest)
+        self.assertEqual([1], filtered["id"].tolist())
+
+
 if __name__ == '__main__':
     unittest.main()
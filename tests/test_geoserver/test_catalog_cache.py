@@ -0,0 +1,89 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for catalog_cache.py"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import time
+import unittest
+from unittest import mock
+
+from eddie.geoserver import catalog_cache
+
+
+class CatalogCacheTest(unittest.TestCase):
+    """Tests that the catalog is only rebuilt when layers change or the cache expires"""
+
+    def setUp(self):
+        """Sets up a cache around a catalog builder that counts its calls before each test is run."""
+        self.builds = 0
+        self.version = 0
+        self.complete = True
+        patcher = mock.patch.object(catalog_cache, "get_catalog_version", side_effect=lambda: self.version)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def build_catalog(self) -> tuple[dict, bool]:
+        """Mock catalog builder that records how many times it is called."""
+        self.builds += 1
+        return {"catalog": [{"name": "layer"}]}, self.complete
+
+    def test_catalog_reused_until_version_changes(self):
+        cache = catalog_cache.CatalogCache(self.build_catalog, ttl_seconds=300, partial_ttl_seconds=300)
+        first = cache.get()
+        second = cache.get()
+        self.assertEqual(1, self.builds)
+        self.assertIs(first, second)
+        self.assertEqual({"catalog": [{"name": "layer"}]}, json.loads(first.body))
+
+        self.version += 1
+        rebuilt = cache.get()
+        self.assertEqual(2, self.builds)
+        # The contents did not change, so neither do the validators sent to clients
+        self.assertEqual(first.etag, rebuilt.etag)
+        self.assertEqual(first.last_modified, rebuilt.last_modified)
+
+    def test_concurrent_misses_build_once(self):
+        def slow_build_catalog() -> tuple[dict, bool]:
+            time.sleep(0.2)
+            return self.build_catalog()
+
+        cache = catalog_cache.CatalogCache(slow_build_catalog, ttl_seconds=300, partial_ttl_seconds=300)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            catalogs = list(executor.map(lambda _: cache.get(), range(8)))
+        self.assertEqual(1, self.builds)
+        self.assertTrue(all(catalog is catalogs[0] for catalog in catalogs))
+
+    def test_expired_catalog_served_while_refreshing(self):
+        cache = catalog_cache.CatalogCache(self.build_catalog, ttl_seconds=-1, partial_ttl_seconds=-1)
+        first = cache.get()
+        with mock.patch.object(catalog_cache.threading, "Thread") as thread:
+            stale = cache.get()
+        self.assertIs(first, stale)
+        thread.return_value.start.assert_called_once()
+
+    def test_partial_catalog_refreshed_sooner(self):
+        self.complete = False
+        cache = catalog_cache.CatalogCache(self.build_catalog, ttl_seconds=300, partial_ttl_seconds=-1)
+        partial = cache.get()
+        self.assertFalse(partial.complete)
+        with mock.patch.object(catalog_cache.threading, "Thread") as thread:
+            cache.get()
+        thread.return_value.start.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
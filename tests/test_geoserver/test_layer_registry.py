@@ -0,0 +1,114 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for layer_registry.py"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import unittest
+
+from eddie.geoserver.layer_registry import LayerRegistry
+
+
+class LayerRegistryTest(unittest.TestCase):
+    """Tests LayerRegistry caching behaviour"""
+    WORKSPACE = "test_workspace"
+
+    def setUp(self):
+        """Sets up a fake GeoServer listing before each test is run."""
+        self.geoserver_layers = {"layer_a", "layer_b"}
+        self.number_of_list_calls = 0
+
+    def list_layers(self, workspace_name: str, store_name: str = None) -> list[str]:
+        """Fake GeoServer listing that counts the number of times it is called."""
+        self.number_of_list_calls += 1
+        return list(self.geoserver_layers)
+
+    def test_listing_loaded_once(self):
+        """Tests that repeated lookups within the TTL only list the workspace once."""
+        registry = LayerRegistry(self.list_layers, ttl_seconds=60)
+        for _ in range(10):
+            self.assertTrue(registry.contains("layer_a", self.WORKSPACE))
+        self.assertEqual(1, self.number_of_list_calls)
+
+    def test_add_and_discard_update_locally(self):
+        """Tests that added and deleted layers are reflected without listing again."""
+        registry = LayerRegistry(self.list_layers, ttl_seconds=60)
+        self.assertFalse(registry.contains("layer_c", self.WORKSPACE))
+        registry.add("layer_c", self.WORKSPACE)
+        registry.discard("layer_a", self.WORKSPACE)
+        self.assertEqual(frozenset({"layer_b", "layer_c"}), registry.layers(self.WORKSPACE))
+        self.assertEqual(1, self.number_of_list_calls)
+
+    def test_listing_expires_after_ttl(self):
+        """Tests that changes made by other processes are picked up once the TTL expires."""
+        registry = LayerRegistry(self.list_layers, ttl_seconds=0.01)
+        self.assertFalse(registry.contains("layer_c", self.WORKSPACE))
+        self.geoserver_layers.add("layer_c")
+        time.sleep(0.02)
+        self.assertTrue(registry.contains("layer_c", self.WORKSPACE))
+        self.assertEqual(2, self.number_of_list_calls)
+
+    def test_stores_cached_separately(self):
+        """Tests that store specific listings do not share cache entries."""
+        registry = LayerRegistry(self.list_layers, ttl_seconds=60)
+        registry.add("layer_c", self.WORKSPACE, "store_1")
+        registry.layers(self.WORKSPACE, "store_1")
+        registry.layers(self.WORKSPACE, "store_2")
+        self.assertEqual(2, self.number_of_list_calls)
+
+    def test_invalidate_forces_reload(self):
+        """Tests that invalidating a workspace causes it to be listed again."""
+        registry = LayerRegistry(self.list_layers, ttl_seconds=60)
+        registry.layers(self.WORKSPACE)
+        registry.invalidate(self.WORKSPACE)
+        registry.layers(self.WORKSPACE)
+        self.assertEqual(2, self.number_of_list_calls)
+
+    def test_different_workspaces_listed_concurrently(self):
+        """Tests that listing one workspace does not wait for the listing of another workspace."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def list_layers_together(workspace_name: str) -> list[str]:
+            """Fake GeoServer listing that only returns once both workspaces are being listed at the same time."""
+            barrier.wait()
+            return [f"{workspace_name}_layer"]
+
+        registry = LayerRegistry(list_layers_together, ttl_seconds=60)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            listings = list(executor.map(registry.layers, ["workspace_1", "workspace_2"]))
+        self.assertEqual([frozenset({"workspace_1_layer"}), frozenset({"workspace_2_layer"})], listings)
+
+    def test_layer_added_during_load_triggers_reload(self):
+        """Tests that a listing loaded while a layer was being added is not trusted for the rest of the TTL."""
+        registry = LayerRegistry(self.list_layers, ttl_seconds=60)
+
+        def list_layers_then_add(workspace_name: str) -> list[str]:
+            """Fake GeoServer listing during which another thread adds a layer."""
+            layer_names = self.list_layers(workspace_name)
+            registry.add("layer_c", workspace_name)
+            return layer_names
+
+        registry._list_layers = list_layers_then_add
+        self.assertFalse(registry.contains("layer_c", self.WORKSPACE))
+        registry._list_layers = self.list_layers
+        self.geoserver_layers.add("layer_c")
+        self.assertTrue(registry.contains("layer_c", self.WORKSPACE))
+        self.assertEqual(2, self.number_of_list_calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for mosaic_layers.py"""
+from datetime import datetime, timedelta, timezone
+import pathlib
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+
+from eddie.config import EnvVariable
+from eddie.geoserver import mosaic_layers
+
+
+class GranuleNameTest(unittest.TestCase):
+    """Tests that granule file names encode the dimensions GeoServer extracts from them"""
+
+    def test_dimensions_extracted_by_mosaic_regexes(self):
+        for scenario in ("flood_run-3", "flood run 3.1"):
+            granule_name = mosaic_layers.get_granule_name(scenario, datetime(2024, 2, 13, 9, 30, 0))
+            self.assertRegex(granule_name, r"__20240213T093000__[0-9a-f]{8}\.tif$")
+            # Same regular expressions as written to timeregex.properties and scenarioregex.properties
+            self.assertEqual("20240213T093000", re.search(r"[0-9]{8}T[0-9]{6}", granule_name).group())
+            self.assertEqual(scenario, re.search(r"^.+(?=__[0-9]{8}T[0-9]{6}__)", granule_name).group())
+
+    def test_aware_times_converted_to_utc(self):
+        nz_time = datetime(2024, 2, 13, 22, 30, 0, tzinfo=timezone(timedelta(hours=13)))
+        self.assertTrue(mosaic_layers.get_granule_name("run", nz_time).startswith("run__20240213T093000__"))
+
+    def test_granule_names_unique(self):
+        time = datetime(2024, 2, 13)
+        self.assertNotEqual(mosaic_layers.get_granule_name("run", time), mosaic_layers.get_granule_name("run", time))
+
+    def test_unsafe_scenario_rejected(self):
+        with self.assertRaises(ValueError):
+            mosaic_layers.get_granule_name("../run", datetime(2024, 2, 13))
+
+
+class AddGtiffToMosaicTest(unittest.TestCase):
+    """Tests that scenarios are replaced without losing their data, and that the store is only created once"""
+    WORKSPACE = "mosaic_workspace"
+
+    def setUp(self):
+        """Sets up a temporary GeoServer data directory and source raster, and mocks GeoServer, before each test."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.data_root = pathlib.Path(temp_dir.name) / "geoserver"
+        self.source_raster = pathlib.Path(temp_dir.name) / "depth.tif"
+        self.source_raster.write_bytes(b"not really a geotiff")
+        mock.patch.object(EnvVariable, "DATA_DIR_GEOSERVER", self.data_root).start()
+        mock.patch.object(mosaic_layers, "prepare_gtiff_for_serving", side_effect=lambda path, _workspace: path).start()
+        self.mock_registry = mock.patch.object(mosaic_layers, "raster_layer_registry").start()
+        self.mock_harvest = mock.patch.object(mosaic_layers, "harvest_granule").start()
+        self.mock_delete = mock.patch.object(mosaic_layers, "delete_scenario_granules").start()
+        self.mock_create = mock.patch.object(mosaic_layers, "create_mosaic_store").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def granules(self) -> list[str]:
+        """Lists the names of the granule files in the mosaic directory."""
+        mosaic_dir = self.data_root / mosaic_layers.get_mosaic_dir(self.WORKSPACE)
+        return [path.name for path in mosaic_dir.glob("*.tif")]
+
+    def test_old_granules_deleted_after_harvest(self):
+        self.mock_registry.contains.return_value = True
+        manager = mock.Mock()
+        manager.attach_mock(self.mock_harvest, "harvest")
+        manager.attach_mock(self.mock_delete, "delete")
+        mosaic_layers.add_gtiff_to_mosaic(self.source_raster, self.WORKSPACE, "run")
+        granule_name = self.granules()[0]
+        self.assertEqual([
+            mock.call.harvest(self.WORKSPACE, mosaic_layers.get_mosaic_dir(self.WORKSPACE) / granule_name),
+            mock.call.delete(self.WORKSPACE, "run", keep_granule_name=granule_name),
+        ], manager.mock_calls)
+
+    def test_failed_harvest_keeps_old_granules(self):
+        self.mock_registry.contains.return_value = True
+        self.mock_harvest.side_effect = requests.HTTPError("Harvest failed")
+        with self.assertRaises(requests.HTTPError):
+            mosaic_layers.add_gtiff_to_mosaic(self.source_raster, self.WORKSPACE, "run")
+        self.mock_delete.assert_not_called()
+        self.assertEqual([], self.granules())
+
+    def test_store_created_by_other_process_not_created_again(self):
+        # The store is missing from the cached listing, but found once the listing is refreshed
+        self.mock_registry.contains.side_effect = [False, True]
+        mosaic_layers.add_gtiff_to_mosaic(self.source_raster, self.WORKSPACE, "run")
+        self.mock_registry.invalidate.assert_called_once_with(self.WORKSPACE)
+        self.mock_create.assert_not_called()
+        self.mock_harvest.assert_called_once()
+
+    def test_missing_store_created(self):
+        self.mock_registry.contains.return_value = False
+        mosaic_layers.add_gtiff_to_mosaic(self.source_raster, self.WORKSPACE, "run")
+        self.mock_create.assert_called_once_with(self.WORKSPACE, None)
+        self.mock_harvest.assert_not_called()
+        self.assertEqual(1, len(self.granules()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for raster_preparation.py"""
+import os
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from eddie.config import EnvVariable
+from eddie.geoserver import raster_preparation
+
+
+class PrepareGtiffForServingTest(unittest.TestCase):
+    """Tests that rasters are only converted to COGs for configured workspaces, and only once"""
+    WORKSPACE = "cog_workspace"
+
+    def setUp(self):
+        """Sets up a temporary GeoServer data directory and source raster before each test is run."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.data_root = pathlib.Path(self.temp_dir.name) / "geoserver"
+        self.source_raster = pathlib.Path(self.temp_dir.name) / "depth.tif"
+        self.source_raster.write_bytes(b"not really a geotiff")
+        for name, value in (("DATA_DIR_GEOSERVER", self.data_root), ("GEOSERVER_COG_WORKSPACES", self.WORKSPACE)):
+            patcher = mock.patch.object(EnvVariable, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_other_workspaces_not_converted(self):
+        with mock.patch.object(raster_preparation, "convert_gtiff_to_cog") as convert:
+            prepared = raster_preparation.prepare_gtiff_for_serving(self.source_raster, "other_workspace")
+        convert.assert_not_called()
+        self.assertEqual(self.source_raster, prepared)
+
+    def test_conversion_cached_by_content(self):
+        def fake_convert(_src: pathlib.Path, dest: pathlib.Path) -> None:
+            dest.write_bytes(b"cog")
+
+        with mock.patch.object(raster_preparation, "convert_gtiff_to_cog", side_effect=fake_convert) as convert:
+            first = raster_preparation.prepare_gtiff_for_serving(self.source_raster, self.WORKSPACE)
+            second = raster_preparation.prepare_gtiff_for_serving(self.source_raster, self.WORKSPACE)
+        convert.assert_called_once()
+        self.assertEqual(first, second)
+        self.assertEqual("depth.tif", first.name)
+        self.assertEqual(b"cog", first.read_bytes())
+
+    def test_changed_compression_converted_again(self):
+        def fake_convert(_src: pathlib.Path, dest: pathlib.Path) -> None:
+            dest.write_bytes(EnvVariable.GEOSERVER_COG_COMPRESSION.encode())
+
+        with mock.patch.object(raster_preparation, "convert_gtiff_to_cog", side_effect=fake_convert) as convert:
+            first = raster_preparation.prepare_gtiff_for_serving(self.source_raster, self.WORKSPACE)
+            with mock.patch.object(EnvVariable, "GEOSERVER_COG_COMPRESSION", "ZSTD"):
+                second = raster_preparation.prepare_gtiff_for_serving(self.source_raster, self.WORKSPACE)
+        self.assertEqual(2, convert.call_count)
+        self.assertNotEqual(first, second)
+        self.assertEqual(b"ZSTD", second.read_bytes())
+
+    def test_least_recently_used_evicted(self):
+        cache_dir = self.data_root / raster_preparation.COG_CACHE_DIR
+        for name, used_at in (("old", 0), ("older", -1), ("recent", None)):
+            cog_filepath = cache_dir / name / "depth.tif"
+            cog_filepath.parent.mkdir(parents=True)
+            cog_filepath.write_bytes(b"x" * 1024 * 1024)
+            if used_at is not None:
+                os.utime(cog_filepath, (used_at, used_at))
+        with mock.patch.object(EnvVariable, "GEOSERVER_COG_CACHE_MAX_SIZE_MB", 2):
+            raster_preparation.evict_cog_cache_entries()
+        # Only one entry needs evicting, and the recently used entry is kept within the grace period
+        self.assertEqual({"old", "recent"}, {path.name for path in cache_dir.iterdir()})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for raster_storage.py"""
+import pathlib
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from eddie.config import EnvVariable
+from eddie.geoserver import raster_storage
+
+
+class PlaceGtiffInDataDirTest(unittest.TestCase):
+    """Tests that rasters are placed in the GeoServer data directory without duplicating them"""
+    WORKSPACE = "test_workspace"
+
+    def setUp(self):
+        """Sets up a temporary GeoServer data directory and source raster before each test is run."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.data_root = pathlib.Path(self.temp_dir.name) / "geoserver"
+        (self.data_root / "data" / self.WORKSPACE).mkdir(parents=True)
+        self.source_raster = pathlib.Path(self.temp_dir.name) / "depth.tif"
+        self.source_raster.write_bytes(b"not really a geotiff")
+        patcher = mock.patch.object(EnvVariable, "DATA_DIR_GEOSERVER", self.data_root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def set_mode(self, mode: raster_storage.RasterPublishMode) -> None:
+        """Sets the raster publishing mode for the duration of the test."""
+        patcher = mock.patch.object(EnvVariable, "GEOSERVER_RASTER_PUBLISH_MODE", mode.value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stored_rasters(self) -> list[pathlib.Path]:
+        """Lists the rasters in the store of blobs."""
+        blob_dir = self.data_root / raster_storage.RASTER_BLOB_DIR
+        return [path for path in blob_dir.iterdir() if path.name != raster_storage.RASTER_BLOB_LOCK_FILE_NAME]
+
+    def test_link_mode_places_readable_file(self):
+        self.set_mode(raster_storage.RasterPublishMode.LINK)
+        relative_path = raster_storage.place_gtiff_in_data_dir(self.source_raster, self.WORKSPACE)
+        self.assertEqual(pathlib.Path("data") / self.WORKSPACE / "depth.tif", relative_path)
+        self.assertEqual(self.source_raster.read_bytes(), (self.data_root / relative_path).read_bytes())
+
+    def test_identical_rasters_stored_once(self):
+        self.set_mode(raster_storage.RasterPublishMode.LINK)
+        duplicate_raster = self.source_raster.with_name("depth_copy.tif")
+        duplicate_raster.write_bytes(self.source_raster.read_bytes())
+        first = raster_storage.place_gtiff_in_data_dir(self.source_raster, self.WORKSPACE)
+        second = raster_storage.place_gtiff_in_data_dir(duplicate_raster, self.WORKSPACE)
+        self.assertEqual(1, len(self.stored_rasters()))
+        self.assertTrue((self.data_root / first).samefile(self.data_root / second))
+
+    def test_copy_mode_copies(self):
+        self.set_mode(raster_storage.RasterPublishMode.COPY)
+        relative_path = raster_storage.place_gtiff_in_data_dir(self.source_raster, self.WORKSPACE)
+        self.assertFalse((self.data_root / relative_path).samefile(self.source_raster))
+        self.assertFalse((self.data_root / raster_storage.RASTER_BLOB_DIR).exists())
+
+    def test_reference_mode_registers_in_place(self):
+        self.set_mode(raster_storage.RasterPublishMode.REFERENCE)
+        raster_in_data_dir = self.data_root / "data" / self.WORKSPACE / "existing.tif"
+        raster_in_data_dir.write_bytes(b"already readable by geoserver")
+        relative_path = raster_storage.place_gtiff_in_data_dir(raster_in_data_dir, self.WORKSPACE)
+        self.assertEqual(pathlib.Path("data") / self.WORKSPACE / "existing.tif", relative_path)
+
+    def test_unreferenced_blobs_removed(self):
+        self.set_mode(raster_storage.RasterPublishMode.LINK)
+        relative_path = raster_storage.place_gtiff_in_data_dir(self.source_raster, self.WORKSPACE)
+        # Simulate geoserver purging the published file, while the source raster is kept
+        (self.data_root / relative_path).unlink()
+        raster_storage.remove_unreferenced_raster_blobs()
+        self.assertEqual([], self.stored_rasters())
+
+    def test_source_edited_after_publishing_leaves_stored_raster_unchanged(self):
+        self.set_mode(raster_storage.RasterPublishMode.LINK)
+        relative_path = raster_storage.place_gtiff_in_data_dir(self.source_raster, self.WORKSPACE)
+        original_contents = self.source_raster.read_bytes()
+        with open(self.source_raster, "r+b") as source_file:
+            source_file.write(b"rewritten in place")
+        [blob_path] = self.stored_rasters()
+        self.assertEqual(original_contents, blob_path.read_bytes())
+        self.assertEqual(original_contents, (self.data_root / relative_path).read_bytes())
+
+    def test_raster_being_placed_not_removed(self):
+        self.set_mode(raster_storage.RasterPublishMode.LINK)
+        with mock.patch.object(raster_storage, "reflink_or_copy_file", shutil.copyfile):
+            with raster_storage._lock_raster_blobs(exclusive=False):
+                blob_path = raster_storage._store_raster_blob(self.source_raster)
+                remover = threading.Thread(target=raster_storage.remove_unreferenced_raster_blobs)
+                remover.start()
+                remover.join(timeout=0.2)
+                # The stored raster has not been linked to yet, so removal waits instead of deleting it
+                self.assertTrue(remover.is_alive())
+                (self.data_root / "data" / self.WORKSPACE / "depth.tif").hardlink_to(blob_path)
+            remover.join(timeout=5)
+        self.assertEqual([blob_path], self.stored_rasters())
+
+
+if __name__ == '__main__':
+    unittest.main()
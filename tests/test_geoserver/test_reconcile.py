@@ -0,0 +1,131 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for reconcile.py"""
+from concurrent.futures import ThreadPoolExecutor
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from eddie.geoserver import reconcile
+from eddie.geoserver.database_layers import MAIN_DB_STORE_NAME
+from eddie.geoserver.reconcile import (
+    Change,
+    ChangeAction,
+    ChangeKind,
+    CoverageSpec,
+    CurrentState,
+    DesiredState,
+    StyleSpec,
+    ensure_featuretype_vector_tile_caching,
+    plan_changes,
+    read_applied_hashes,
+    write_applied_hashes
+)
+
+
+class PlanChangesTest(unittest.TestCase):
+    """Tests that plan_changes only plans the differences between desired and current state"""
+    WORKSPACE = "test_workspace"
+
+    def setUp(self):
+        """Sets up a desired state containing one of each resource type."""
+        self.desired_state = DesiredState(
+            workspaces={self.WORKSPACE},
+            featuretypes={(self.WORKSPACE, "vector"): "vector_hash"},
+            coverages={(self.WORKSPACE, "raster"): CoverageSpec(pathlib.Path("raster.tif"), "raster_hash")},
+            styles={"style": StyleSpec(pathlib.Path("style.sld"), "style_hash")},
+        )
+
+    def matching_current_state(self) -> CurrentState:
+        """Creates a current state that exactly matches the desired state."""
+        return CurrentState(
+            workspaces_with_main_db_store={self.WORKSPACE},
+            featuretypes={(self.WORKSPACE, "vector")},
+            coverages={(self.WORKSPACE, "raster")},
+            styles={"style"},
+            applied_hashes={
+                f"featuretype:{self.WORKSPACE}:vector": "vector_hash",
+                f"coverage:{self.WORKSPACE}:raster": "raster_hash",
+                "style::style": "style_hash",
+            }
+        )
+
+    def test_empty_geoserver_creates_everything(self):
+        changes, unchanged = plan_changes(self.desired_state, CurrentState())
+        self.assertEqual(0, unchanged)
+        self.assertEqual(4, len(changes))
+        self.assertTrue(all(change.action == ChangeAction.CREATE for change in changes))
+        self.assertIn(Change(ChangeKind.DATASTORE, ChangeAction.CREATE, MAIN_DB_STORE_NAME, self.WORKSPACE), changes)
+
+    def test_matching_state_has_no_changes(self):
+        changes, unchanged = plan_changes(self.desired_state, self.matching_current_state())
+        self.assertEqual([], changes)
+        self.assertEqual(4, unchanged)
+
+    def test_changed_hash_is_updated(self):
+        current_state = self.matching_current_state()
+        current_state.applied_hashes["style::style"] = "old_style_hash"
+        changes, _unchanged = plan_changes(self.desired_state, current_state)
+        self.assertEqual([Change(ChangeKind.STYLE, ChangeAction.UPDATE, "style")], changes)
+
+    def test_untracked_featuretype_is_not_updated(self):
+        self.desired_state.featuretypes[(self.WORKSPACE, "vector")] = None
+        current_state = self.matching_current_state()
+        current_state.applied_hashes.clear()
+        changes, _unchanged = plan_changes(self.desired_state, current_state)
+        self.assertNotIn(ChangeKind.FEATURETYPE, [change.kind for change in changes])
+
+
+class AppliedHashesTest(unittest.TestCase):
+    """Tests that applied hashes are merged into the recorded hashes without losing concurrent updates"""
+
+    def setUp(self):
+        """Sets up an empty GeoServer data directory, before each test is run."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        data_dir_patcher = mock.patch.object(reconcile.EnvVariable, "DATA_DIR_GEOSERVER", pathlib.Path(temp_dir.name))
+        data_dir_patcher.start()
+        self.addCleanup(data_dir_patcher.stop)
+
+    def test_hashes_merged(self):
+        write_applied_hashes({"style::a": "1", "style::b": "1"})
+        write_applied_hashes({"style::b": "2"})
+        self.assertEqual({"style::a": "1", "style::b": "2"}, read_applied_hashes())
+
+    def test_concurrent_writes_not_lost(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: write_applied_hashes({f"style::{i}": str(i)}), range(32)))
+        self.assertEqual({f"style::{i}": str(i) for i in range(32)}, read_applied_hashes())
+
+
+class EnsureFeaturetypeVectorTileCachingTest(unittest.TestCase):
+    """Tests for ensure_featuretype_vector_tile_caching."""
+
+    @mock.patch.object(reconcile, "ensure_vector_tile_caching")
+    def test_existing_layers_enabled_except_extruded(self, mock_ensure: mock.Mock):
+        ensure_featuretype_vector_tile_caching({("ws", "existing"), ("extruded_layers", "buildings")})
+        mock_ensure.assert_called_once_with("ws", "existing")
+
+    @mock.patch.object(reconcile, "ensure_vector_tile_caching", side_effect=ConnectionError)
+    def test_failures_not_raised(self, mock_ensure: mock.Mock):
+        ensure_featuretype_vector_tile_caching({("ws", "a"), ("ws", "b")})
+        self.assertEqual(2, mock_ensure.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for terria_catalogs.py"""
+import time
+from types import SimpleNamespace
+import unittest
+from unittest import mock
+
+import requests
+
+from eddie.config import EnvVariable
+from eddie.geoserver import terria_catalogs
+from eddie.geoserver.terria_catalogs import Workspaces
+
+
+class VectorLayerCatalogItemTest(unittest.TestCase):
+    """Tests that vector layers are served in the configured format"""
+    WORKSPACE_URL = "http://localhost:8088/geoserver/input_layers"
+
+    def set_format(self, vector_layer_format: str) -> None:
+        """Sets the vector layer format for the duration of the test."""
+        patcher = mock.patch.object(EnvVariable, "TERRIA_VECTOR_LAYER_FORMAT", vector_layer_format)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_wfs_format(self):
+        self.set_format("wfs")
+        item = terria_catalogs.create_vector_layer_catalog_item(
+            Workspaces.INPUT_LAYERS_WORKSPACE, self.WORKSPACE_URL, "rivers")
+        self.assertEqual("wfs", item["type"])
+        self.assertEqual("input_layers:rivers", item["typeNames"])
+
+    def test_mvt_format(self):
+        self.set_format("mvt")
+        item = terria_catalogs.create_vector_layer_catalog_item(
+            Workspaces.INPUT_LAYERS_WORKSPACE, self.WORKSPACE_URL, "rivers")
+        self.assertEqual("mvt", item["type"])
+        self.assertEqual("rivers", item["layer"])
+        for placeholder in ("{z}", "{x}", "{y}"):
+            self.assertIn(placeholder, item["url"])
+
+    def test_extruded_layers_stay_wfs(self):
+        self.set_format("mvt")
+        item = terria_catalogs.create_vector_layer_catalog_item(
+            Workspaces.EXTRUDED_LAYERS_WORKSPACE, self.WORKSPACE_URL, "buildings")
+        self.assertEqual("wfs", item["type"])
+        self.assertEqual("Ext_height", item["heightProperty"])
+
+
+class LayerStatisticsCatalogItemTest(unittest.TestCase):
+    """Tests that recorded layer statistics are turned into catalog item hints"""
+    WORKSPACE_URL = "http://localhost:8088/geoserver/input_layers"
+
+    @staticmethod
+    def make_statistics(feature_count: int | None, resolution: float | None = None) -> SimpleNamespace:
+        """Creates statistics for a layer covering roughly the Christchurch region."""
+        return SimpleNamespace(feature_count=feature_count, resolution=resolution,
+                               xmin=172.0, ymin=-44.0, xmax=173.0, ymax=-43.0)
+
+    def test_wfs_item_hints(self):
+        with mock.patch.object(EnvVariable, "TERRIA_VECTOR_LAYER_FORMAT", "wfs"):
+            item = terria_catalogs.create_vector_layer_catalog_item(
+                Workspaces.INPUT_LAYERS_WORKSPACE, self.WORKSPACE_URL, "rivers", statistics=self.make_statistics(120))
+        self.assertEqual(120, item["maxFeatures"])
+        self.assertEqual({"west": 172.0, "south": -44.0, "east": 173.0, "north": -43.0}, item["rectangle"])
+
+    def test_dense_layers_hidden_when_zoomed_out(self):
+        with mock.patch.object(EnvVariable, "TERRIA_VECTOR_LAYER_FORMAT", "mvt"):
+            sparse = terria_catalogs.create_vector_layer_catalog_item(
+                Workspaces.INPUT_LAYERS_WORKSPACE, self.WORKSPACE_URL, "rivers", statistics=self.make_statistics(100))
+            dense = terria_catalogs.create_vector_layer_catalog_item(
+                Workspaces.INPUT_LAYERS_WORKSPACE, self.WORKSPACE_URL, "buildings",
+                statistics=self.make_statistics(2_000_000))
+        self.assertEqual(0, sparse["minimumZoom"])
+        self.assertGreater(dense["minimumZoom"], sparse["minimumZoom"])
+
+    def test_raster_item_hints(self):
+        item = terria_catalogs.create_raster_layer_catalog_item(
+            self.WORKSPACE_URL, "depth", self.make_statistics(None, resolution=2.8))
+        self.assertAlmostEqual(10000, item["minScaleDenominator"])
+        self.assertIn("rectangle", item)
+
+
+class TerriaCatalogTest(unittest.TestCase):
+    """Tests that the catalog is assembled from concurrent listings, leaving out listings that fail"""
+
+    def test_failed_listing_gives_partial_catalog(self):
+        def list_vector_layers(workspace_name: str, **_kwargs) -> list[str]:
+            if workspace_name == Workspaces.STATIC_FILES_WORKSPACE:
+                raise requests.Timeout("GeoServer took too long")
+            return [f"{workspace_name}_vector"]
+
+        with mock.patch.object(terria_catalogs, "get_workspace_vector_layers", side_effect=list_vector_layers), \
+                mock.patch.object(terria_catalogs, "get_workspace_raster_layers", return_value=[]), \
+                mock.patch.object(terria_catalogs, "_read_layer_statistics", return_value={}), \
+                mock.patch.object(EnvVariable, "TERRIA_VECTOR_LAYER_FORMAT", "wfs"):
+            catalog, complete = terria_catalogs.build_terria_catalog()
+
+        self.assertFalse(complete)
+        groups = {group["name"]: group["members"] for group in catalog["catalog"]}
+        self.assertEqual(len(Workspaces), len(groups))
+        self.assertEqual([], groups["Static Files"])
+        self.assertEqual(["input_layers_vector"], [item["name"] for item in groups["Input Layers"]])
+
+    def test_slow_listing_left_out_at_deadline(self):
+        def list_vector_layers(workspace_name: str, **_kwargs) -> list[str]:
+            if workspace_name == Workspaces.STATIC_FILES_WORKSPACE:
+                time.sleep(1)
+            return [f"{workspace_name}_vector"]
+
+        with mock.patch.object(terria_catalogs, "get_workspace_vector_layers", side_effect=list_vector_layers), \
+                mock.patch.object(terria_catalogs, "get_workspace_raster_layers", return_value=[]), \
+                mock.patch.object(terria_catalogs, "_read_layer_statistics", return_value={}), \
+                mock.patch.object(EnvVariable, "TERRIA_CATALOG_REQUEST_TIMEOUT", 0.2), \
+                mock.patch.object(EnvVariable, "TERRIA_VECTOR_LAYER_FORMAT", "wfs"):
+            start_time = time.monotonic()
+            catalog, complete = terria_catalogs.build_terria_catalog()
+            elapsed = time.monotonic() - start_time
+
+        self.assertLess(elapsed, 1)
+        self.assertFalse(complete)
+        groups = {group["name"]: group["members"] for group in catalog["catalog"]}
+        self.assertEqual([], groups["Static Files"])
+
+
+if __name__ == '__main__':
+    unittest.main()
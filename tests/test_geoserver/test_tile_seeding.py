@@ -0,0 +1,81 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for tile_seeding.py"""
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+import redis
+import shapely
+
+from eddie.geoserver import tile_seeding
+
+
+class TileSeedingTest(unittest.TestCase):
+    """Tests that seed jobs are requested in gridset coordinates, and only their own progress is tracked"""
+
+    def setUp(self):
+        """Creates a small area of interest around Christchurch before each test is run."""
+        self.area = gpd.GeoDataFrame(index=[0], crs=4326, geometry=[shapely.box(172.5, -43.6, 172.7, -43.4)])
+
+    def test_gridset_srs_parsed(self):
+        self.assertEqual(900913, tile_seeding.get_gridset_srs("EPSG:900913"))
+        with self.assertRaises(ValueError):
+            tile_seeding.get_gridset_srs("GoogleMapsCompatible")
+
+    def test_web_mercator_alias_bounds(self):
+        xmin, ymin, xmax, ymax = tile_seeding.get_area_bounds(self.area, 900913)
+        expected = self.area.to_crs(3857).total_bounds
+        self.assertAlmostEqual(expected[0], xmin)
+        self.assertAlmostEqual(expected[3], ymax)
+        self.assertLess(xmin, xmax)
+        self.assertLess(ymin, ymax)
+
+    def test_submitted_task_ids_found(self):
+        # Another request's task 1 is already seeding the layer when this job adds tasks 2 and 3
+        task_lists = iter([[[0, 100, 10, 1, 1]], [[0, 100, 10, 1, 1], [0, 50, 10, 2, 0], [0, 50, 10, 3, 0]]])
+        with mock.patch.object(tile_seeding, "_post_seed_request", return_value=True), \
+                mock.patch.object(tile_seeding, "get_seed_tasks", side_effect=lambda *_: next(task_lists)), \
+                mock.patch.object(tile_seeding, "get_redis_client"):
+            task_ids = tile_seeding.submit_seed_job("layer", "ws", self.area, "EPSG:900913")
+        self.assertEqual([2, 3], task_ids)
+
+    def test_unreachable_broker_still_seeds(self):
+        with mock.patch.object(tile_seeding, "_post_seed_request", return_value=True) as post_seed_request, \
+                mock.patch.object(tile_seeding, "get_seed_tasks", return_value=[]), \
+                mock.patch.object(tile_seeding, "get_redis_client") as get_redis_client:
+            get_redis_client.return_value.lock.return_value.acquire.side_effect = redis.ConnectionError()
+            tile_seeding.submit_seed_job("layer", "ws", self.area, "EPSG:900913")
+        post_seed_request.assert_called_once()
+        get_redis_client.return_value.lock.return_value.release.assert_not_called()
+
+    def test_progress_reported_until_seeded(self):
+        # First poll has this job's task running alongside another request's task, second poll has only the other task
+        other_task = [1000, 5000, 60, 9, 1]
+        task_polls = iter([[[50, 200, 10, 1, 1], other_task], [other_task]])
+        progress_updates = []
+        with mock.patch.object(tile_seeding, "get_seed_tasks", side_effect=lambda *_: next(task_polls)), \
+                mock.patch.object(tile_seeding.time, "sleep"):
+            final = tile_seeding.wait_for_seeding({"ws:layer": [1]}, progress_updates.append)
+        self.assertEqual(2, len(progress_updates))
+        self.assertEqual({"layers_total": 1, "layers_seeding": 1, "tiles_done": 50, "tiles_total": 200},
+                         progress_updates[0])
+        self.assertEqual(0, final["layers_seeding"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for vector_tiles.py"""
+import unittest
+from unittest import mock
+
+from eddie.geoserver import vector_tiles
+from eddie.geoserver.vector_tiles import MVT_FORMAT, ensure_vector_tile_caching
+
+
+class EnsureVectorTileCachingTest(unittest.TestCase):
+    """Tests for ensure_vector_tile_caching."""
+
+    def setUp(self):
+        vector_tiles._vector_tile_cached_layers.clear()
+
+    @mock.patch.object(vector_tiles.requests, "put")
+    @mock.patch.object(vector_tiles.requests, "get")
+    def test_missing_format_enabled_once(self, mock_get: mock.Mock, mock_put: mock.Mock):
+        mock_get.return_value = mock.Mock(ok=True, status_code=200, text="<mimeFormats>image/png</mimeFormats>")
+        mock_put.return_value = mock.Mock(ok=True)
+        ensure_vector_tile_caching("ws", "layer")
+        ensure_vector_tile_caching("ws", "layer")
+        mock_get.assert_called_once()
+        mock_put.assert_called_once()
+
+    @mock.patch.object(vector_tiles.requests, "put")
+    @mock.patch.object(vector_tiles.requests, "get")
+    def test_enabled_layer_not_reconfigured(self, mock_get: mock.Mock, mock_put: mock.Mock):
+        mock_get.return_value = mock.Mock(ok=True, status_code=200, text=f"<string>{MVT_FORMAT}</string>")
+        ensure_vector_tile_caching("ws", "layer")
+        mock_put.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
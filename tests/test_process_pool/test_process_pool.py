@@ -0,0 +1,106 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for process_pool.py"""
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+import os
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+import shapely
+
+from eddie import process_pool
+
+
+class ProcessPoolTest(unittest.TestCase):
+    """Tests that geometries survive being sent to the process pool, and that small operations are not sent"""
+
+    def setUp(self):
+        """Sets up a GeoDataFrame with attributes, a custom index and a CRS before each test is run."""
+        self.gdf = gpd.GeoDataFrame(
+            {"name": ["a", "b"]},
+            index=[3, 7],
+            geometry=[shapely.box(0, 0, 2, 2), shapely.box(5, 5, 6, 6)],
+            crs=2193,
+        )
+
+    def test_pack_round_trip(self):
+        unpacked = process_pool.unpack_geodataframe(process_pool.pack_geodataframe(self.gdf))
+        self.assertTrue(unpacked.equals(self.gdf))
+        self.assertEqual(self.gdf.crs, unpacked.crs)
+        self.assertEqual("geometry", unpacked.geometry.name)
+
+    def test_small_overlay_runs_in_thread(self):
+        other = gpd.GeoDataFrame(geometry=[shapely.box(1, 1, 3, 3)], crs=2193)
+        with mock.patch.object(process_pool.EnvVariable, "PROCESS_POOL_ENABLED", True), \
+                mock.patch.object(process_pool, "run_in_process_pool") as run_in_process_pool:
+            difference = process_pool.overlay(self.gdf, other, how="difference")
+        run_in_process_pool.assert_not_called()
+        self.assertEqual(4.0, difference.area.sum())
+
+
+class SharedProcessPoolTest(unittest.TestCase):
+    """Tests that work runs in the shared process pool, and that the pool is replaced after a worker process dies"""
+
+    def setUp(self):
+        """Enables a single-process pool before each test is run, and shuts it down afterwards."""
+        self.gdf = gpd.GeoDataFrame(geometry=[shapely.box(0, 0, 2, 2), shapely.box(1, 1, 3, 3)], crs=2193)
+        mock.patch.multiple(process_pool.EnvVariable, PROCESS_POOL_ENABLED=True, PROCESS_POOL_WORKERS=1).start()
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(self.shutdown_pool)
+
+    @staticmethod
+    def shutdown_pool() -> None:
+        """Shuts down the shared process pool, if it was started."""
+        with process_pool._pool_lock:
+            pool, process_pool._pool = process_pool._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    def test_work_runs_in_pool(self):
+        other = gpd.GeoDataFrame(geometry=[shapely.box(1, 1, 3, 3)], crs=2193)
+        packed = process_pool.run_in_process_pool(
+            process_pool._packed_overlay, process_pool.pack_geodataframe(self.gdf),
+            process_pool.pack_geodataframe(other), "difference")
+        difference = process_pool.unpack_geodataframe(packed)
+        self.assertAlmostEqual(3.0, difference.area.sum())
+        self.assertNotEqual(os.getpid(), process_pool.run_in_process_pool(os.getpid))
+
+    def test_async_work_runs_in_pool(self):
+        worker_pid = asyncio.run(process_pool.run_in_process_pool_async(os.getpid))
+        self.assertNotEqual(os.getpid(), worker_pid)
+
+    def test_broken_pool_replaced(self):
+        first_pool = process_pool.get_process_pool()
+        process_pool.run_in_process_pool(os.getpid)
+        # A worker process dying breaks the pool, and retrying in a new pool dies again
+        with self.assertRaises(BrokenProcessPool):
+            process_pool.run_in_process_pool(os._exit, 1)
+        self.assertIsNot(first_pool, process_pool.get_process_pool())
+        self.assertNotEqual(os.getpid(), process_pool.run_in_process_pool(os.getpid))
+
+    def test_pool_broken_by_other_task_retried(self):
+        broken_pool = process_pool.get_process_pool()
+        with self.assertRaises(BrokenProcessPool):
+            broken_pool.submit(os._exit, 1).result()
+        self.assertNotEqual(os.getpid(), process_pool.run_in_process_pool(os.getpid))
+        self.assertIsNot(broken_pool, process_pool.get_process_pool())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for rate_limiter.py"""
+import asyncio
+import threading
+import unittest
+from unittest import mock
+import uuid
+
+import redis
+
+from eddie import message_broker, rate_limiter
+from eddie.rate_limiter import ProviderBudget
+
+
+class ParseProviderBudgetsTest(unittest.TestCase):
+    """Tests that provider budgets are read from a comma separated list"""
+
+    def test_budgets_parsed(self):
+        budgets = rate_limiter.parse_provider_budgets("LINZ=10/4, ArcGIS=2.5/0,")
+        self.assertEqual({"LINZ": ProviderBudget(10, 4), "ArcGIS": ProviderBudget(2.5, 0)}, budgets)
+
+    def test_empty_list_has_no_budgets(self):
+        self.assertEqual({}, rate_limiter.parse_provider_budgets(""))
+
+    def test_invalid_budget_raises(self):
+        with self.assertRaises(ValueError):
+            rate_limiter.parse_provider_budgets("LINZ=10")
+
+
+class ProviderSlotTest(unittest.TestCase):
+    """Tests that requests wait for their provider's budget, and are not blocked when the broker is unreachable"""
+
+    def setUp(self):
+        """Sets up a budget for LINZ and mocks the message broker, before each test is run."""
+        budgets_patcher = mock.patch.object(
+            rate_limiter, "get_provider_budgets", return_value={"LINZ": ProviderBudget(10, 4)}
+        )
+        release_patcher = mock.patch.object(rate_limiter, "_release")
+        sleep_patcher = mock.patch.object(rate_limiter.time, "sleep")
+        budgets_patcher.start()
+        self.mock_release = release_patcher.start()
+        self.mock_sleep = sleep_patcher.start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_waits_until_acquired(self):
+        with mock.patch.object(rate_limiter, "_try_acquire", side_effect=[0.2, 0.1, 0]) as try_acquire:
+            with rate_limiter.provider_slot("LINZ"):
+                self.mock_release.assert_not_called()
+        self.assertEqual(3, try_acquire.call_count)
+        self.assertEqual([mock.call(0.2), mock.call(0.1)], self.mock_sleep.call_args_list)
+        self.mock_release.assert_called_once()
+
+    def test_lease_released_on_error(self):
+        with mock.patch.object(rate_limiter, "_try_acquire", return_value=0), self.assertRaises(RuntimeError):
+            with rate_limiter.provider_slot("LINZ"):
+                raise RuntimeError()
+        self.mock_release.assert_called_once()
+
+    def test_provider_without_budget_not_limited(self):
+        with mock.patch.object(rate_limiter, "_try_acquire") as try_acquire:
+            with rate_limiter.provider_slot("StatsNZ"):
+                pass
+        try_acquire.assert_not_called()
+        self.mock_release.assert_not_called()
+
+    def test_unreachable_broker_not_limited(self):
+        with mock.patch.object(rate_limiter, "_try_acquire", side_effect=redis.ConnectionError()):
+            with rate_limiter.provider_slot("LINZ"):
+                pass
+        self.mock_release.assert_not_called()
+
+    def test_wait_past_timeout_raises(self):
+        with mock.patch.object(rate_limiter, "_try_acquire", return_value=1), \
+                mock.patch.object(rate_limiter.EnvVariable, "PROVIDER_RATE_LIMIT_TIMEOUT", 0.5), \
+                self.assertRaises(TimeoutError):
+            with rate_limiter.provider_slot("LINZ"):
+                pass
+        self.mock_sleep.assert_not_called()
+        self.mock_release.assert_not_called()
+
+    def test_async_slot_waits_until_acquired(self):
+        async def send_request():
+            async with rate_limiter.provider_slot_async("LINZ"):
+                self.mock_release.assert_not_called()
+
+        with mock.patch.object(rate_limiter, "_try_acquire", side_effect=[0.01, 0]) as try_acquire:
+            asyncio.run(send_request())
+        self.assertEqual(2, try_acquire.call_count)
+        self.mock_release.assert_called_once()
+
+
+class LeaseRenewalTest(unittest.TestCase):
+    """Tests that held leases are renewed until their request ends"""
+
+    def setUp(self):
+        """Sets up a budget for LINZ and a short renewal interval, before each test is run."""
+        mock.patch.object(rate_limiter, "get_provider_budgets", return_value={"LINZ": ProviderBudget(10, 4)}).start()
+        mock.patch.object(rate_limiter, "_try_acquire", return_value=0).start()
+        mock.patch.object(rate_limiter, "_renew_interval", return_value=0.01).start()
+        self.mock_release = mock.patch.object(rate_limiter, "_release").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_lease_renewed_while_held(self):
+        renewed = threading.Event()
+        with mock.patch.object(rate_limiter, "_renew", side_effect=lambda *_: renewed.set()) as renew:
+            with rate_limiter.provider_slot("LINZ"):
+                self.assertTrue(renewed.wait(5))
+            renew_count = renew.call_count
+        # Renewal stops once the slot is released
+        self.assertEqual(renew_count, renew.call_count)
+        self.mock_release.assert_called_once()
+
+    def test_async_lease_renewed_while_held(self):
+        async def send_request():
+            async with rate_limiter.provider_slot_async("LINZ"):
+                await asyncio.sleep(0.1)
+
+        with mock.patch.object(rate_limiter, "_renew") as renew:
+            asyncio.run(send_request())
+        self.assertGreater(renew.call_count, 0)
+        self.mock_release.assert_called_once()
+
+    def test_provider_without_concurrency_limit_not_renewed(self):
+        with mock.patch.object(rate_limiter, "get_provider_budgets", return_value={"LINZ": ProviderBudget(10, 0)}), \
+                mock.patch.object(rate_limiter, "_renew") as renew:
+            with rate_limiter.provider_slot("LINZ"):
+                pass
+        renew.assert_not_called()
+        self.mock_release.assert_not_called()
+
+
+class BrokerScriptsTest(unittest.TestCase):
+    """Tests the rate limiting scripts against the Redis message broker, skipped when it cannot be reached"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Connects to the message broker, skipping the tests if it cannot be reached."""
+        cls.client = redis.Redis.from_url(message_broker.message_broker_url, socket_connect_timeout=1, socket_timeout=5)
+        try:
+            cls.client.ping()
+        except redis.RedisError as e:
+            raise unittest.SkipTest(f"The message broker cannot be reached: {e}")
+
+    def setUp(self):
+        """Sets up the keys of a provider unique to the test, removed after the test is run."""
+        self.keys = rate_limiter._get_keys(f"test-{uuid.uuid4().hex}")
+        self.addCleanup(self.client.delete, *self.keys)
+        self.acquire = self.client.register_script(rate_limiter._ACQUIRE_SCRIPT)
+
+    def _acquire(self, budget: ProviderBudget, lease_id: str) -> int:
+        """Run the acquire script with a lease TTL of 60 seconds, returning the number of milliseconds to wait."""
+        return int(self.acquire(keys=self.keys, args=[budget.requests_per_second, budget.max_concurrency, lease_id,
+                                                      60, 50]))
+
+    def test_concurrency_limited(self):
+        budget = ProviderBudget(0, 2)
+        self.assertEqual([0, 0, 50], [self._acquire(budget, lease_id) for lease_id in ["a", "b", "c"]])
+        self.client.zrem(self.keys[1], "a")
+        self.assertEqual(0, self._acquire(budget, "c"))
+
+    def test_requests_per_second_limited(self):
+        budget = ProviderBudget(2, 0)
+        self.assertEqual([0, 0], [self._acquire(budget, lease_id) for lease_id in ["a", "b"]])
+        # The bucket is empty after a burst of one second of requests, and refills at two tokens per second
+        self.assertTrue(0 < self._acquire(budget, "c") <= 500)
+        self.assertFalse(self.client.exists(self.keys[1]))
+
+    def test_expired_leases_removed(self):
+        budget = ProviderBudget(0, 1)
+        self.client.zadd(self.keys[1], {"stopped-worker": 0})
+        self.assertEqual(0, self._acquire(budget, "a"))
+        self.assertEqual([b"a"], self.client.zrange(self.keys[1], 0, -1))
+
+    def test_lease_renewed_only_while_held(self):
+        self.assertEqual(0, self._acquire(ProviderBudget(0, 1), "a"))
+        expiry = self.client.zscore(self.keys[1], "a")
+        renew = self.client.register_script(rate_limiter._RENEW_SCRIPT)
+        renew(keys=[self.keys[1]], args=["a", 120])
+        self.assertGreater(self.client.zscore(self.keys[1], "a"), expiry)
+        # A lease that has expired and been removed is not taken back
+        renew(keys=[self.keys[1]], args=["b", 120])
+        self.assertIsNone(self.client.zscore(self.keys[1], "b"))
+
+
+class BackOffTest(unittest.TestCase):
+    """Tests that rejected requests pause every worker through the broker, or the caller when that is not possible"""
+
+    def setUp(self):
+        """Sets up a budget for LINZ, before each test is run."""
+        budgets_patcher = mock.patch.object(
+            rate_limiter, "get_provider_budgets", return_value={"LINZ": ProviderBudget(10, 4)}
+        )
+        budgets_patcher.start()
+        self.addCleanup(budgets_patcher.stop)
+
+    def test_pause_shared_through_broker(self):
+        with mock.patch.object(rate_limiter, "_get_back_off_script") as get_back_off_script:
+            self.assertEqual(0, rate_limiter.back_off("LINZ", 3))
+        get_back_off_script.return_value.assert_called_once_with(keys=[mock.ANY], args=[10, 3])
+
+    def test_provider_without_budget_waits_locally(self):
+        self.assertEqual(3, rate_limiter.back_off("StatsNZ", 3))
+
+    def test_unreachable_broker_waits_locally(self):
+        with mock.patch.object(rate_limiter, "_get_back_off_script") as get_back_off_script:
+            get_back_off_script.return_value.side_effect = redis.ConnectionError()
+            self.assertEqual(3, rate_limiter.back_off("LINZ", 3))
+
+    def test_retry_after_header_parsed(self):
+        self.assertEqual(7, rate_limiter.parse_retry_after("7"))
+        with mock.patch.object(rate_limiter.EnvVariable, "PROVIDER_RATE_LIMIT_BACK_OFF", 5):
+            self.assertEqual(5, rate_limiter.parse_retry_after(None))
+            self.assertEqual(5, rate_limiter.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"))
+
+
+if __name__ == '__main__':
+    unittest.main()
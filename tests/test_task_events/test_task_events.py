@@ -0,0 +1,111 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for task_events.py"""
+import json
+import unittest
+from unittest import mock
+
+from celery import states
+
+from eddie import task_events
+
+
+class StreamTaskEventsTest(unittest.TestCase):
+    """Tests that task events are streamed from the current state until the task finishes"""
+
+    def setUp(self):
+        """Sets up a mock message broker before each test is run."""
+        self.pubsub = mock.MagicMock()
+        redis_client = mock.MagicMock()
+        redis_client.pubsub.return_value = self.pubsub
+        patcher = mock.patch.object(task_events, "get_redis_client", return_value=redis_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def published_message(task_status: str, task_value=None) -> dict:
+        """Creates the pub/sub message that would be received for a published task event."""
+        event = task_events.create_task_event("task", task_status, task_value)
+        return {"type": "message", "data": json.dumps(event).encode()}
+
+    @staticmethod
+    def read_events(messages: list) -> list:
+        """Reads the data of each Server-Sent Event, skipping retry fields and comments."""
+        return [json.loads(message.split("data: ")[1]) for message in messages if "data: " in message]
+
+    def test_stream_ends_when_task_succeeds(self):
+        self.pubsub.get_message.side_effect = [
+            self.published_message(states.STARTED),
+            None,
+            self.published_message("PROGRESS", {"stage": "seeding"}),
+            self.published_message(states.SUCCESS, 17),
+        ]
+        result = mock.Mock(id="task", status=states.PENDING, result=None)
+        messages = list(task_events.stream_task_events(result))
+
+        self.assertIn(": keep-alive\n\n", messages)
+        self.assertEqual(
+            [states.PENDING, states.STARTED, "PROGRESS", states.SUCCESS],
+            [event["taskStatus"] for event in self.read_events(messages)]
+        )
+        self.assertEqual(17, self.read_events(messages)[-1]["taskValue"])
+        self.pubsub.subscribe.assert_called_once_with(task_events.get_task_channel("task"))
+        self.pubsub.close.assert_called_once()
+
+    def test_stream_ends_when_task_fails_without_publishing(self):
+        # A chord callback failed by one of its subtasks is marked as failed without a task_failure signal
+        self.pubsub.get_message.side_effect = [self.published_message("PROGRESS", {"stage": "layers"}), None, None]
+        result = mock.Mock(id="task", result=ValueError("subtask failed"))
+        type(result).status = mock.PropertyMock(side_effect=[states.STARTED, "PROGRESS", states.FAILURE])
+        messages = list(task_events.stream_task_events(result))
+
+        self.assertEqual(
+            [states.STARTED, "PROGRESS", states.FAILURE],
+            [event["taskStatus"] for event in self.read_events(messages)]
+        )
+        self.assertIsNone(self.read_events(messages)[-1]["taskValue"])
+        self.assertEqual(3, self.pubsub.get_message.call_count)
+
+    def test_finished_task_sends_only_current_state(self):
+        result = mock.Mock(id="task", status=states.FAILURE, result=ValueError("traceback"))
+        events = self.read_events(list(task_events.stream_task_events(result)))
+
+        self.assertEqual([task_events.create_task_event("task", states.FAILURE)], events)
+        self.pubsub.get_message.assert_not_called()
+
+    def test_pending_task_stream_times_out(self):
+        self.pubsub.get_message.return_value = None
+        result = mock.Mock(id="task", status=states.PENDING, result=None)
+        with mock.patch.object(task_events, "PENDING_TIMEOUT_SECONDS", -1):
+            events = self.read_events(list(task_events.stream_task_events(result)))
+
+        self.assertEqual([states.PENDING], [event["taskStatus"] for event in events])
+        self.pubsub.get_message.assert_not_called()
+        self.pubsub.close.assert_called_once()
+
+    def test_running_task_stream_ends_after_maximum_duration(self):
+        self.pubsub.get_message.side_effect = [self.published_message(states.STARTED)]
+        result = mock.Mock(id="task", status=states.PENDING, result=None)
+        with mock.patch.object(task_events, "MAX_STREAM_SECONDS", 0), \
+                mock.patch.object(task_events.time, "monotonic", side_effect=[0, 0, 1]):
+            events = self.read_events(list(task_events.stream_task_events(result)))
+
+        self.assertEqual([states.PENDING, states.STARTED], [event["taskStatus"] for event in events])
+
+
+if __name__ == '__main__':
+    unittest.main()
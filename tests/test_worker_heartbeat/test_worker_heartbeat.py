@@ -0,0 +1,60 @@
+# Copyright © 2021-2026 Geospatial Research Institute Toi Hangarau
+# LICENSE: https://github.com/GeospatialResearch/Digital-Twins/blob/master/LICENSE
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for worker_heartbeat.py"""
+import unittest
+from unittest import mock
+
+import redis
+
+from eddie import worker_heartbeat
+
+
+class LivenessCacheTest(unittest.TestCase):
+    """Tests that the live worker count is cached, and that an unreachable broker means no live workers"""
+
+    def test_count_reused_within_cache_period(self):
+        cache = worker_heartbeat._LivenessCache()
+        with mock.patch.object(worker_heartbeat, "count_live_workers", return_value=2) as count_live_workers:
+            self.assertEqual(2, cache.get())
+            self.assertEqual(2, cache.get())
+        count_live_workers.assert_called_once()
+
+    def test_count_refreshed_after_cache_period(self):
+        cache = worker_heartbeat._LivenessCache()
+        with mock.patch.object(worker_heartbeat, "count_live_workers", side_effect=[2, 1]), \
+                mock.patch.object(worker_heartbeat, "LIVENESS_CACHE_SECONDS", -1):
+            self.assertEqual(2, cache.get())
+            self.assertEqual(1, cache.get())
+
+    def test_unreachable_broker_has_no_live_workers(self):
+        cache = worker_heartbeat._LivenessCache()
+        with mock.patch.object(worker_heartbeat, "count_live_workers", side_effect=redis.ConnectionError()):
+            self.assertEqual(0, cache.get())
+
+    def test_broker_read_outside_lock(self):
+        cache = worker_heartbeat._LivenessCache()
+
+        def count_live_workers() -> int:
+            self.assertFalse(cache._lock.locked())
+            return 1
+
+        with mock.patch.object(worker_heartbeat, "count_live_workers", side_effect=count_live_workers):
+            self.assertEqual(1, cache.get())
+
+
+if __name__ == '__main__':
+    unittest.main()